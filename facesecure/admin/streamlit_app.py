@@ -4,8 +4,7 @@ FaceSecure Admin Panel - Streamlit Arayüzü
 import streamlit as st
 import requests
 import pandas as pd
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 from pathlib import Path
 import sys
 import os
@@ -15,7 +14,7 @@ import time
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from utils.db import DBManager
+from utils.storage import embedding_count, open_storage
 from utils.auth import AdminAuthManager
 from dotenv import load_dotenv
 
@@ -32,10 +31,13 @@ st.set_page_config(
 # API URL
 API_URL = "http://127.0.0.1:8000"
 
+# Kullanıcı ve log tablolarında sayfa başına kayıt (filtreleme backend'de yapılır)
+PAGE_SIZE = 50
+
 # Veritabanı ve auth yöneticisi
 @st.cache_resource
 def get_db_manager():
-    return DBManager(os.getenv('MONGO_URI'))
+    return open_storage(os.getenv('MONGO_URI'))
 
 @st.cache_resource
 def get_auth_manager():
@@ -44,6 +46,9 @@ def get_auth_manager():
 db = get_db_manager()
 auth = get_auth_manager()
 
+# API'nin yaptığı kayıtlar her yeniden çalıştırmada yüklensin (değişiklik yoksa ucuz)
+db.refresh()
+
 
 # Session state başlatma
 if 'logged_in' not in st.session_state:
@@ -62,23 +67,45 @@ def check_api_health():
 
 
 def get_statistics():
-    """Sistem istatistiklerini getir"""
-    users = db.get_all_users()
-    
-    total_users = len(users)
-    total_embeddings = sum(len(user.get('embeddings', [])) for user in users)
-    
-    # Failed attempts
-    data = json.load(open(db.json_path, 'r', encoding='utf-8'))
-    failed_attempts = len(data.get('failed_attempts', []))
+    """Sistem istatistiklerini getir (şifreli kayıtlar yüklenmeden)"""
+    user_stats = db.user_stats()
     
     return {
-        'total_users': total_users,
-        'total_embeddings': total_embeddings,
-        'failed_attempts': failed_attempts
+        'total_users': user_stats['users'],
+        'total_embeddings': user_stats['embeddings'],
+        # Veritabanı + deneme log'u segmentleri (filtresiz sayım satır sayar)
+        'failed_attempts': db.count_failed_attempts()
     }
 
 
+def paginate(key, fetch):
+    """
+    Cursor tabanlı sayfalama - önceki sayfaların cursor'ları session_state'te
+    
+    Args:
+        key: Sayfalama durumu anahtarı (filtreler değişince farklı olmalı)
+        fetch: fetch(cursor) -> (kayıtlar, next_cursor)
+    
+    Returns:
+        Mevcut sayfanın kayıtları
+    """
+    cursors = st.session_state.setdefault(f'{key}_cursors', [None])
+    items, next_cursor = fetch(cursors[-1])
+    
+    col1, col2, col3 = st.columns([1, 3, 1])
+    with col1:
+        if len(cursors) > 1 and st.button("◀ Önceki", key=f'{key}_prev'):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Sayfa {len(cursors)}")
+    with col3:
+        if next_cursor and st.button("Sonraki ▶", key=f'{key}_next'):
+            cursors.append(next_cursor)
+            st.rerun()
+    return items
+
+
 def main():
     # Login kontrolü
     if not st.session_state.logged_in:
@@ -190,16 +217,18 @@ def show_dashboard():
     
     st.markdown("---")
     
-    # Kullanıcı listesi
+    # Kullanıcı listesi (sadece metadata, en yeni kayıtlar önce)
     st.subheader("📋 Kayıtlı Kullanıcılar")
-    users = db.get_all_users()
+    users = paginate('dashboard_users', lambda cursor: db.query_users(
+        sort='created_at', descending=True, limit=PAGE_SIZE, cursor=cursor
+    ))
     
     if users:
         user_data = []
         for user in users:
             user_data.append({
                 'Kullanıcı Adı': user['username'],
-                'Embedding Sayısı': len(user.get('embeddings', [])),
+                'Embedding Sayısı': embedding_count(user),
                 'Kayıt Tarihi': user.get('created_at', 'N/A')[:19],
                 'Son Güncelleme': user.get('updated_at', 'N/A')[:19]
             })
@@ -219,10 +248,13 @@ def show_user_management():
         st.cache_resource.clear()
         st.rerun()
     
-    users = db.get_all_users()
+    prefix = st.text_input("🔍 Kullanıcı adı ile başlayan", key="user_prefix").strip()
+    users = paginate(f'manage_users:{prefix}', lambda cursor: db.query_users(
+        username_prefix=prefix or None, limit=PAGE_SIZE, cursor=cursor
+    ))
     
     if not users:
-        st.info("Henüz kayıtlı kullanıcı yok")
+        st.info("Kullanıcı bulunamadı" if prefix else "Henüz kayıtlı kullanıcı yok")
         return
     
     # Her kullanıcı için kart
@@ -232,7 +264,7 @@ def show_user_management():
             
             with col1:
                 st.write(f"**User ID:** {user.get('_id', 'N/A')}")
-                st.write(f"**Embedding Sayısı:** {len(user.get('embeddings', []))}")
+                st.write(f"**Embedding Sayısı:** {embedding_count(user)}")
                 st.write(f"**Kayıt Tarihi:** {user.get('created_at', 'N/A')[:19]}")
                 st.write(f"**Son Güncelleme:** {user.get('updated_at', 'N/A')[:19]}")
             
@@ -683,62 +715,63 @@ def show_logs():
     """Log görüntüleme sayfası"""
     st.header("📈 Başarısız Doğrulama Denemeleri")
     
-    # Logları yükle
-    data = json.load(open(db.json_path, 'r', encoding='utf-8'))
-    failed_attempts = data.get('failed_attempts', [])
+    # Filtreler (veritabanında / log segmentlerinde uygulanır)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        username_filter = st.text_input("Kullanıcı", key="log_username").strip()
+    with col2:
+        ip_filter = st.text_input("IP Adresi", key="log_ip").strip()
+    with col3:
+        reason_filter = st.text_input("Neden (içeren)", key="log_reason").strip()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        since_date = st.date_input("Başlangıç", value=None, key="log_since")
+    with col2:
+        until_date = st.date_input("Bitiş (dahil)", value=None, key="log_until")
+    
+    filters = {
+        'username': username_filter or None,
+        'ip_address': ip_filter or None,
+        'reason': reason_filter or None,
+        'since': since_date.isoformat() if since_date else None,
+        # Bitiş günü dahil: ertesi günün başına kadar
+        'until': (until_date + timedelta(days=1)).isoformat() if until_date else None
+    }
+    
+    failed_attempts = paginate(f'logs:{sorted(filters.items())}', lambda cursor: (
+        db.query_failed_attempts(limit=PAGE_SIZE, cursor=cursor, **filters)
+    ))
     
     if not failed_attempts:
-        st.info("Henüz başarısız deneme yok")
+        st.info("Filtreye uyan başarısız deneme yok" if any(filters.values())
+                else "Henüz başarısız deneme yok")
         return
     
-    # DataFrame oluştur
     log_data = []
     for attempt in failed_attempts:
         log_data.append({
-            'Kullanıcı': attempt.get('username', 'N/A'),
+            'Kullanıcı': attempt.get('username') or 'N/A',
             'IP Adresi': attempt.get('ip_address', 'N/A'),
-            'Benzerlik': f"{attempt.get('similarity_score', 0):.3f}",
+            'Benzerlik': f"{attempt.get('similarity_score') or 0:.3f}",
             'Neden': attempt.get('reason', 'N/A'),
             'Tarih': attempt.get('timestamp', 'N/A')[:19]
         })
     
     df = pd.DataFrame(log_data)
-    
-    # Filtreler
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        username_filter = st.selectbox(
-            "Kullanıcıya Göre Filtrele",
-            ['Tümü'] + list(df['Kullanıcı'].unique())
-        )
-    
-    with col2:
-        reason_filter = st.selectbox(
-            "Nedene Göre Filtrele",
-            ['Tümü'] + list(df['Neden'].unique())
-        )
-    
-    # Filtreleme uygula
-    filtered_df = df.copy()
-    if username_filter != 'Tümü':
-        filtered_df = filtered_df[filtered_df['Kullanıcı'] == username_filter]
-    if reason_filter != 'Tümü':
-        filtered_df = filtered_df[filtered_df['Neden'] == reason_filter]
-    
-    st.dataframe(filtered_df, use_container_width=True, hide_index=True)
+    st.dataframe(df, use_container_width=True, hide_index=True)
     
     # İstatistikler
     st.markdown("---")
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Toplam Deneme", len(failed_attempts))
+        st.metric("Toplam Deneme", db.count_failed_attempts())
     with col2:
-        st.metric("Filtrelenmiş", len(filtered_df))
+        st.metric("Bu Sayfada", len(df))
     with col3:
-        avg_similarity = filtered_df['Benzerlik'].astype(float).mean()
-        st.metric("Ort. Benzerlik", f"{avg_similarity:.3f}")
+        avg_similarity = df['Benzerlik'].astype(float).mean()
+        st.metric("Ort. Benzerlik (sayfa)", f"{avg_similarity:.3f}")
 
 
 def show_live_test():
@@ -751,8 +784,8 @@ def show_live_test():
         st.code("cd facesecure\n.\\start_api.bat", language="bash")
         return
     
-    # Kullanıcı seçimi
-    users = db.get_all_users()
+    # Kullanıcı seçimi (sadece metadata)
+    users = db.query_users(limit=1000)[0]
     if not users:
         st.warning("⚠️ Henüz kayıtlı kullanıcı yok!")
         return
@@ -1,11 +1,12 @@
 """
 Flask API ana dosyası
 """
-from flask import Flask
+from flask import Flask, jsonify
 from dotenv import load_dotenv
 import os
 import sys
 from pathlib import Path
+from typing import Optional
 
 # Proje root'unu path'e ekle
 project_root = Path(__file__).parent.parent
@@ -14,36 +15,96 @@ sys.path.insert(0, str(project_root))
 # .env dosyasını yükle
 load_dotenv()
 
-# Flask app oluştur
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('JWT_SECRET', 'dev-secret-key')
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max upload (10+ fotoğraf için)
+from utils.registry import ResourceRegistry, get_registry
 
-# Route'ları import et (api. prefix olmadan)
-from routes import enroll, verify
 
-# Blueprint'leri kaydet
-app.register_blueprint(enroll.bp)
-app.register_blueprint(verify.bp)
+def create_app(registry: Optional[ResourceRegistry] = None) -> Flask:
+    """
+    Flask uygulamasını oluşturur
 
+    Model, dedektör, anahtarlar, depo ve galeri registry'de tutulur; tüm
+    blueprint'ler aynı örnekleri kullanır. FS_WARM_ON_START=1 (varsayılan)
+    iken kaynaklar arka planda hazırlanır, /ready bitince 200 döner.
 
-@app.route('/')
-def index():
-    """API ana sayfası"""
-    return {
-        'service': 'FaceSecure API',
-        'version': '1.0.0',
-        'endpoints': {
-            'enroll': '/api/enroll',
-            'verify': '/api/verify'
+    Args:
+        registry: Kaynak registry'si (None ise süreç registry'si)
+
+    Returns:
+        Flask uygulaması
+    """
+    registry = registry or get_registry()
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('JWT_SECRET', 'dev-secret-key')
+    app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max upload (10+ fotoğraf için)
+    app.extensions['facesecure'] = registry
+
+    # Route'ları import et (api. prefix olmadan); import sırasında model yüklenmez
+    from routes import enroll, verify, identify, admin
+
+    # Blueprint'leri kaydet
+    app.register_blueprint(enroll.bp)
+    app.register_blueprint(verify.bp)
+    app.register_blueprint(identify.bp)
+    app.register_blueprint(admin.bp)
+
+    @app.route('/')
+    def index():
+        """API ana sayfası"""
+        return {
+            'service': 'FaceSecure API',
+            'version': '1.0.0',
+            'endpoints': {
+                'enroll': '/api/enroll',
+                'verify': '/api/verify',
+                'identify': '/api/identify',
+                'admin': '/api/admin/{users,failed-attempts,stats}',
+                'ready': '/ready',
+                'metrics': '/metrics'
+            }
         }
-    }
 
+    @app.route('/health')
+    def health():
+        """Sağlık kontrolü (süreç ayakta)"""
+        return {'status': 'healthy'}
+
+    @app.route('/ready')
+    def ready():
+        """Hazırlık kontrolü - model yüklenip ısınana kadar 503"""
+        status = registry.status()
+        return jsonify(status), 200 if status['ready'] else 503
+
+    @app.route('/metrics')
+    def metrics():
+        """Çıkarım kuyruğu (batch boyutları, kuyruk derinliği, bekleme) ve önbellek metrikleri"""
+        inference = registry.get('embedder').stats() if registry.is_loaded('embedder') else None
+        embedding_cache = (registry.get('embedding_cache').stats()
+                           if registry.is_loaded('embedding_cache') else None)
+        return jsonify({'inference': inference, 'embedding_cache': embedding_cache}), 200
+
+    if os.getenv('FS_WARM_ON_START', '1') == '1':
+        registry.warm_async()
+
+    return app
+
+
+app = create_app()
+
+# Anahtar rotasyonu (FS_KEY_ROTATION=1): eski anahtarlı kayıtlar API çalışırken
+# arka planda aktif anahtarla yeniden şifrelenir
+key_rotation = None
+if os.getenv('FS_KEY_ROTATION') == '1':
+    from utils.key_rotation import KeyRotationJob
+    key_rotation = KeyRotationJob(
+        app.extensions['facesecure'].get('crypto'),
+        storage=app.extensions['facesecure'].get('storage'),
+        checkpoint_path=os.getenv('FS_ROTATION_CHECKPOINT', 'facesecure_rotation.json'),
+        chunk_size=int(os.getenv('FS_ROTATION_CHUNK', '256')),
+        workers=int(os.getenv('FS_ROTATION_WORKERS', '4'))
+    )
+    key_rotation.start()
 
-@app.route('/health')
-def health():
-    """Sağlık kontrolü"""
-    return {'status': 'healthy'}
 
 if __name__ == '__main__':
     print("🚀 FaceSecure API başlatılıyor...")
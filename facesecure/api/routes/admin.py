@@ -0,0 +1,161 @@
+"""
+Yönetim (admin) endpoint'leri - sayfalı, sunucu tarafında filtrelenen sorgular
+
+Tüm istekler FS_ADMIN_TOKEN ile korunur (X-Admin-Token veya
+Authorization: Bearer <token>); token ayarlı değilse endpoint'ler kapalıdır.
+"""
+from flask import Blueprint, request, jsonify
+from datetime import datetime
+import hmac
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from utils.registry import current_registry
+from utils.storage import USER_SORT_KEYS
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+ADMIN_TOKEN = os.getenv('FS_ADMIN_TOKEN', '')
+
+# Sayfa boyutu sınırları
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = int(os.getenv('FS_ADMIN_MAX_PAGE', '1000'))
+
+
+def _iso_arg(name: str) -> Optional[str]:
+    """ISO tarih/zaman parametresi -> kayıtlarla karşılaştırılabilir ISO dizesi"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} ISO formatında olmalı (ör. 2024-01-31T12:00:00)")
+
+
+def _limit_arg() -> int:
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit tam sayı olmalı")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit 1-{MAX_PAGE_SIZE} arasında olmalı")
+    return limit
+
+
+@bp.before_request
+def require_admin_token():
+    """Token kontrolü ve başka süreçlerin yazmalarının yüklenmesi"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Yönetim API\'si kapalı (FS_ADMIN_TOKEN ayarlı değil)'}), 403
+
+    token = request.headers.get('X-Admin-Token', '')
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        token = auth_header[len('Bearer '):]
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'Yetkisiz'}), 401
+
+    current_registry().get('storage').refresh()
+
+
+@bp.route('/users', methods=['GET'])
+def list_users():
+    """
+    Kullanıcı listesi (sayfalı)
+
+    Query:
+        - username_prefix: str (opsiyonel)
+        - created_since, created_until: ISO zaman (opsiyonel, [since, until))
+        - sort: 'username' | 'created_at' (varsayılan 'username')
+        - order: 'asc' | 'desc' (varsayılan 'asc')
+        - limit: int (varsayılan 100)
+        - cursor: önceki yanıttaki next_cursor
+        - include_records: 1 ise şifreli embedding kayıtları da döner
+
+    Response:
+        - users: [{_id, username, embedding_count, created_at, updated_at, ...}]
+        - next_cursor: str | null
+    """
+    sort = request.args.get('sort', 'username')
+    order = request.args.get('order', 'asc')
+    if sort not in USER_SORT_KEYS:
+        return jsonify({'error': f"sort {', '.join(USER_SORT_KEYS)} olmalı"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': "order 'asc' veya 'desc' olmalı"}), 400
+
+    try:
+        users, next_cursor = current_registry().get('storage').query_users(
+            username_prefix=request.args.get('username_prefix') or None,
+            created_since=_iso_arg('created_since'),
+            created_until=_iso_arg('created_until'),
+            sort=sort,
+            descending=order == 'desc',
+            limit=_limit_arg(),
+            cursor=request.args.get('cursor'),
+            metadata_only=request.args.get('include_records') != '1'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'users': users, 'next_cursor': next_cursor}), 200
+
+
+@bp.route('/failed-attempts', methods=['GET'])
+def list_failed_attempts():
+    """
+    Başarısız doğrulama denemeleri, yeniden eskiye (sayfalı)
+
+    Query:
+        - username: str (opsiyonel, tam eşleşme)
+        - ip: str (opsiyonel, tam eşleşme)
+        - reason: str (opsiyonel, neden metninde geçen ifade)
+        - since, until: ISO zaman (opsiyonel, [since, until))
+        - limit: int (varsayılan 100)
+        - cursor: önceki yanıttaki next_cursor
+
+    Response:
+        - attempts: [{username, ip_address, similarity_score, reason, timestamp}]
+        - next_cursor: str | null
+    """
+    try:
+        attempts, next_cursor = current_registry().get('storage').query_failed_attempts(
+            username=request.args.get('username') or None,
+            ip_address=request.args.get('ip') or None,
+            reason=request.args.get('reason') or None,
+            since=_iso_arg('since'),
+            until=_iso_arg('until'),
+            limit=_limit_arg(),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'attempts': attempts, 'next_cursor': next_cursor}), 200
+
+
+@bp.route('/stats', methods=['GET'])
+def stats():
+    """
+    Özet sayılar (şifreli kayıtlar ve log satırları ayrıştırılmadan)
+
+    Response:
+        - total_users: int
+        - total_embeddings: int
+        - failed_attempts: int
+    """
+    # Model yüklenmez; sadece paylaşılan depo handle'ı kullanılır
+    db_manager = current_registry().get('storage')
+    user_stats = db_manager.user_stats()
+    return jsonify({
+        'total_users': user_stats['users'],
+        'total_embeddings': user_stats['embeddings'],
+        'failed_attempts': db_manager.count_failed_attempts()
+    }), 200
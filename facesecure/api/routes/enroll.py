@@ -6,30 +6,30 @@ import cv2
 import numpy as np
 from werkzeug.utils import secure_filename
 import os
+import queue
 import sys
 from pathlib import Path
 
 # Proje root'u path'e ekle
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from face.detector import FaceDetector
-from face.processor import FaceEmbeddingProcessor
-from utils.crypto import CryptoManager
-from utils.db import DBManager
+from face.gallery import compute_prototypes
+from utils.crypto import DEFAULT_KEY_ID, user_associated_data
+from utils.registry import current_registry
 from dotenv import load_dotenv
 
 load_dotenv()
 
 bp = Blueprint('enroll', __name__, url_prefix='/api')
 
-# Global instances (production'da singleton pattern kullan)
-detector = FaceDetector()
-processor = FaceEmbeddingProcessor()
-crypto_manager = CryptoManager(
-    os.getenv('FS_AES_KEY_B64'),
-    os.getenv('FS_HMAC_KEY_B64')
-)
-db_manager = DBManager(os.getenv('MONGO_URI'))
+# Model, anahtarlar, depo ve embedding kodeği (FS_EMBEDDING_CODEC: float32 | float16 |
+# int8 | pq) süreç registry'sinden alınır; verify/identify ile aynı örnekler
+
+# Kullanıcı başına centroid dışında saklanacak küme prototipi sayısı
+PROTOTYPE_CLUSTERS = int(os.getenv('FS_PROTOTYPE_CLUSTERS', '0'))
+
+# Kayıt formatı: 'sealed' (kullanıcı başına tek AEAD blob) | 'legacy' (embedding başına kayıt)
+RECORD_FORMAT = os.getenv('FS_RECORD_FORMAT', 'sealed').lower()
 
 
 @bp.route('/enroll', methods=['POST'])
@@ -52,8 +52,11 @@ def enroll_user():
     if not username:
         return jsonify({'error': 'username gerekli'}), 400
     
-    # Kullanıcı zaten var mı kontrol et
-    existing_user = db_manager.get_user_by_username(username)
+    registry = current_registry()
+    db_manager = registry.get('storage')
+    
+    # Kullanıcı zaten var mı kontrol et (şifreli kayıtlar yüklenmez)
+    existing_user = db_manager.get_user_metadata(username)
     if existing_user:
         return jsonify({'error': f'Kullanıcı "{username}" zaten mevcut'}), 409
     
@@ -65,10 +68,14 @@ def enroll_user():
             'error': f'En az 10 görüntü gerekli, {len(images)} tane gönderildi'
         }), 400
     
-    embeddings = []
+    face_crops = []
+    pose_indices = []
     processed_count = 0
     
     try:
+        detector = registry.get('detector')
+        embedder = registry.get('embedder')
+        
         for idx, image_file in enumerate(images):
             # Dosyayı oku
             file_bytes = np.frombuffer(image_file.read(), dtype=np.uint8)
@@ -84,17 +91,9 @@ def enroll_user():
                 if not faces:
                     continue
                 
-                # Embedding üret
-                embedding = processor.get_embedding(faces[0], normalize=True)
-                
-                # Şifrele
-                encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(embedding)
-                
-                embeddings.append({
-                    'encrypted': encrypted_b64,
-                    'hmac': hmac_b64,
-                    'pose_index': idx
-                })
+                # Embedding'ler tüm crop'lar toplandıktan sonra tek batch'te üretilir
+                face_crops.append(faces[0])
+                pose_indices.append(idx)
                 
                 processed_count += 1
                 
@@ -107,8 +106,51 @@ def enroll_user():
                 'error': f'En az 10 geçerli yüz embedding\'i gerekli, {processed_count} tane işlendi'
             }), 400
         
-        # Kullanıcıyı kaydet
-        user_id = db_manager.create_user(username, embeddings)
+        # Embedding üret (tek forward pass, eşzamanlı isteklerle aynı kuyrukta)
+        raw_embeddings = embedder.get_embeddings(face_crops, normalize=True)
+        
+        # Prototipleri (centroid + opsiyonel kümeler) hesapla
+        prototype_vectors = compute_prototypes(raw_embeddings, PROTOTYPE_CLUSTERS)
+        crypto_manager = registry.get('crypto')
+        embedding_codec = registry.get('codec')
+        
+        if RECORD_FORMAT == 'sealed':
+            # Tüm embedding'ler + prototipler tek blob, kullanıcı kimliğine bağlı
+            user_id = db_manager.create_sealed_user(
+                username,
+                lambda new_id: crypto_manager.seal_embeddings(
+                    raw_embeddings,
+                    user_associated_data(new_id, username),
+                    prototypes=prototype_vectors,
+                    codec=embedding_codec
+                ),
+                embedding_count=processed_count,
+                pose_indices=pose_indices
+            )
+        else:
+            # Şifrele (kodek seçiliyse sıkıştırılmış formda)
+            embeddings = []
+            records = crypto_manager.encrypt_many(raw_embeddings, codec=embedding_codec)
+            for (encrypted_b64, hmac_b64), idx in zip(records, pose_indices):
+                emb_doc = {
+                    'encrypted': encrypted_b64,
+                    'hmac': hmac_b64,
+                    'pose_index': idx
+                }
+                if embedding_codec.name != 'float32':
+                    emb_doc['codec'] = embedding_codec.name
+                embeddings.append(emb_doc)
+            
+            prototypes = [
+                {'encrypted': encrypted_b64, 'hmac': hmac_b64}
+                for encrypted_b64, hmac_b64 in crypto_manager.encrypt_many(prototype_vectors)
+            ]
+            
+            # Anahtar rotasyonundan sonra kayıtlar anahtar ID'si ile etiketlenir
+            if crypto_manager.key_id != DEFAULT_KEY_ID:
+                for doc in embeddings + prototypes:
+                    doc['kid'] = crypto_manager.key_id
+            user_id = db_manager.create_user(username, embeddings, prototypes=prototypes)
         
         return jsonify({
             'user_id': user_id,
@@ -117,5 +159,9 @@ def enroll_user():
             'message': 'Kullanıcı başarıyla kaydedildi'
         }), 201
         
+    except queue.Full:
+        # Çıkarım kuyruğu dolu - istemci tekrar denemeli
+        return jsonify({'error': 'Sunucu meşgul, tekrar deneyin'}), 503
+        
     except Exception as e:
         return jsonify({'error': f'İşlem hatası: {str(e)}'}), 500
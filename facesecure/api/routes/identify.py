@@ -0,0 +1,151 @@
+"""
+Yüz tanımlama (identification) endpoint'i - sıralı top-k aday listesi
+"""
+from flask import Blueprint, request, jsonify
+import cv2
+import numpy as np
+import os
+import queue
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from utils.registry import current_registry
+from dotenv import load_dotenv
+
+# Threshold verify ile paylaşılır; model, galeri ve depo registry'den gelir
+from routes.verify import SIMILARITY_THRESHOLD
+
+load_dotenv()
+
+bp = Blueprint('identify', __name__, url_prefix='/api')
+
+# Sınırlar
+MAX_TOP_K = int(os.getenv('FS_IDENTIFY_MAX_K', '50'))
+DEFAULT_TOP_M = int(os.getenv('FS_IDENTIFY_TOP_M', '3'))
+
+
+@bp.route('/identify', methods=['POST'])
+def identify_face():
+    """
+    Yüz tanımlama - en olası k kullanıcıyı skorlarıyla döndürür
+    
+    Request:
+        - image: file veya images: List[file] (aynı kişiye ait sorgu görüntüleri)
+        - k: int (opsiyonel, varsayılan 5)
+        - top_m: int (opsiyonel, ortalama skor için en iyi m embedding)
+        - rank_by: 'max' | 'mean' (opsiyonel, varsayılan 'max')
+    
+    Response:
+        - candidates: [{rank, username, max_similarity, mean_similarity, above_threshold}]
+        - faces_used: int
+        - threshold: float
+    """
+    image_files = request.files.getlist('images') or request.files.getlist('image')
+    if not image_files:
+        return jsonify({'error': 'image gerekli'}), 400
+    
+    try:
+        k = int(request.form.get('k', 5))
+        top_m = int(request.form.get('top_m', DEFAULT_TOP_M))
+    except ValueError:
+        return jsonify({'error': 'k ve top_m tam sayı olmalı'}), 400
+    
+    if not 1 <= k <= MAX_TOP_K or top_m < 1:
+        return jsonify({'error': f'k 1-{MAX_TOP_K} arasında, top_m en az 1 olmalı'}), 400
+    
+    rank_by = request.form.get('rank_by', 'max')
+    if rank_by not in ('max', 'mean'):
+        return jsonify({'error': "rank_by 'max' veya 'mean' olmalı"}), 400
+    
+    registry = current_registry()
+    detector = registry.get('detector')
+    embedder = registry.get('embedder')
+    embedding_cache = registry.get('embedding_cache')
+    
+    try:
+        # Tüm görüntülerden yüz crop'larını topla (önbellekte olanlar hariç)
+        cached_embeddings = []
+        face_crops = []
+        crop_keys = []
+        for image_file in image_files:
+            raw = image_file.read()
+            image_key = embedding_cache.key(raw)
+            embedding = embedding_cache.get(image_key)
+            if embedding is not None:
+                cached_embeddings.append(embedding)
+                continue
+            
+            file_bytes = np.frombuffer(raw, dtype=np.uint8)
+            image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+            
+            if image is None:
+                continue
+            
+            faces = detector.detect_faces(image)
+            if not faces:
+                continue
+            
+            crop_key = embedding_cache.key(faces[0])
+            embedding = embedding_cache.get(crop_key)
+            if embedding is not None:
+                cached_embeddings.append(embedding)
+                embedding_cache.put(embedding, image_key)
+                continue
+            
+            face_crops.append(faces[0])
+            crop_keys.append((image_key, crop_key))
+        
+        if not face_crops and not cached_embeddings:
+            return jsonify({
+                'candidates': [],
+                'faces_used': 0,
+                'reason': 'Yüz tespit edilemedi'
+            }), 200
+        
+        # Kalan sorgu embedding'lerini tek forward pass ile üret
+        query_embeddings = cached_embeddings
+        if face_crops:
+            computed = embedder.get_embeddings(face_crops, normalize=True)
+            for embedding, keys in zip(computed, crop_keys):
+                embedding_cache.put(embedding, *keys)
+            query_embeddings = query_embeddings + list(computed)
+        query_embeddings = np.stack(query_embeddings)
+        
+        # Dış değişiklikleri galeriye yansıt (değişen kullanıcılar artımlı)
+        registry.get('storage').refresh()
+        gallery = registry.get('gallery')
+        if not gallery.snapshot.usernames:
+            return jsonify({'error': 'Kayıtlı kullanıcı yok'}), 404
+        
+        # Tüm sorgular tek matris çarpımıyla skorlanır
+        ranked = gallery.rank_users(
+            query_embeddings,
+            k=k,
+            top_m=top_m,
+            rank_by=rank_by
+        )
+        
+        candidates = []
+        for rank, candidate in enumerate(ranked, start=1):
+            candidate['rank'] = rank
+            candidate['above_threshold'] = candidate['max_similarity'] >= SIMILARITY_THRESHOLD
+            candidates.append(candidate)
+        
+        return jsonify({
+            'candidates': candidates,
+            'faces_used': len(query_embeddings),
+            'threshold': SIMILARITY_THRESHOLD
+        }), 200
+        
+    except ValueError as e:
+        # Çoklu yüz hatası
+        return jsonify({'error': str(e)}), 400
+        
+    except queue.Full:
+        # Çıkarım kuyruğu dolu - istemci tekrar denemeli
+        return jsonify({'error': 'Sunucu meşgul, tekrar deneyin'}), 503
+        
+    except Exception as e:
+        return jsonify({'error': f'İşlem hatası: {str(e)}'}), 500
@@ -5,29 +5,26 @@ from flask import Blueprint, request, jsonify
 import cv2
 import numpy as np
 import os
+import queue
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from face.detector import FaceDetector
-from face.processor import FaceEmbeddingProcessor
-from utils.crypto import CryptoManager
-from utils.db import DBManager
+from utils.registry import current_registry, lazy_gallery
 from dotenv import load_dotenv
 
 load_dotenv()
 
 bp = Blueprint('verify', __name__, url_prefix='/api')
 
-# Global instances
-detector = FaceDetector()
-processor = FaceEmbeddingProcessor()
-crypto_manager = CryptoManager(
-    os.getenv('FS_AES_KEY_B64'),
-    os.getenv('FS_HMAC_KEY_B64')
-)
-db_manager = DBManager(os.getenv('MONGO_URI'))
+# Model, galeri, anahtarlar ve depo süreç registry'sinden alınır (ilk kullanımda
+# bir kez yüklenir, enroll/identify ile paylaşılır)
+
+# FS_LAZY_GALLERY=1: galeri açılışta deşifre edilmez, ilk 1:N isteğinde kurulur.
+# O zamana kadar 1:1 doğrulama sadece istenen kullanıcının şablonunu yükler
+# (en fazla FS_TEMPLATE_CACHE kullanıcı LRU'da tutulur)
+LAZY_GALLERY = lazy_gallery()
 
 # Threshold
 SIMILARITY_THRESHOLD = float(os.getenv('FS_THRESHOLD', '0.70'))
@@ -48,8 +45,12 @@ def verify_face():
         - similarity: float
         - threshold: float
     """
-    # Her request'te DBManager'ı yeniden yükle (fresh data)
-    db = DBManager(os.getenv('MONGO_URI'))
+    registry = current_registry()
+    db_manager = registry.get('storage')
+    
+    # Başka süreçlerin (admin paneli, diğer worker'lar) değişikliklerini al;
+    # değişiklik yoksa sadece stat / data_version kontrolü yapılır
+    db_manager.refresh()
     
     # İstemci IP'sini al
     client_ip = request.remote_addr
@@ -63,63 +64,63 @@ def verify_face():
     target_username = request.form.get('username')
     
     try:
-        # Görüntüyü oku
-        file_bytes = np.frombuffer(image_file.read(), dtype=np.uint8)
-        image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            return jsonify({'error': 'Geçersiz görüntü'}), 400
-        
-        # Yüz tespit et
-        faces = detector.detect_faces(image)
+        # Aynı dosya daha önce işlendiyse (istemci tekrarı, admin paneli)
+        # decode, tespit ve çıkarım atlanır
+        embedding_cache = registry.get('embedding_cache')
+        raw = image_file.read()
+        image_key = embedding_cache.key(raw)
+        query_embedding = embedding_cache.get(image_key)
         
-        if not faces:
-            db.log_failed_attempt(
-                target_username,
-                client_ip,
-                0.0,
-                'Yüz tespit edilemedi'
-            )
-            return jsonify({
-                'verified': False,
-                'reason': 'Yüz tespit edilemedi'
-            }), 200
-        
-        # Embedding üret
-        query_embedding = processor.get_embedding(faces[0], normalize=True)
+        if query_embedding is None:
+            # Görüntüyü oku
+            file_bytes = np.frombuffer(raw, dtype=np.uint8)
+            image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+            
+            if image is None:
+                return jsonify({'error': 'Geçersiz görüntü'}), 400
+            
+            # Yüz tespit et
+            faces = registry.get('detector').detect_faces(image)
+            
+            if not faces:
+                db_manager.log_failed_attempt(
+                    target_username,
+                    client_ip,
+                    0.0,
+                    'Yüz tespit edilemedi'
+                )
+                return jsonify({
+                    'verified': False,
+                    'reason': 'Yüz tespit edilemedi'
+                }), 200
+            
+            # Embedding üret (aynı crop önbellekteyse çıkarım atlanır)
+            crop_key = embedding_cache.key(faces[0])
+            query_embedding = embedding_cache.get(crop_key)
+            if query_embedding is None:
+                query_embedding = registry.get('embedder').get_embedding(faces[0], normalize=True)
+            embedding_cache.put(query_embedding, image_key, crop_key)
         
-        # Kullanıcıları al
+        # Kullanıcıları kontrol et (sadece metadata; galeri dinleyici ile güncel tutulur)
         if target_username:
-            users = [db.get_user_by_username(target_username)]
-            if users[0] is None:
+            if db_manager.get_user_metadata(target_username) is None:
                 return jsonify({'error': 'Kullanıcı bulunamadı'}), 404
-        else:
-            users = db.get_all_users()
         
-        if not users:
-            return jsonify({'error': 'Kayıtlı kullanıcı yok'}), 404
-        
-        # En yüksek benzerliği bul
-        best_match = None
-        best_similarity = 0.0
-        
-        for user in users:
-            for emb_doc in user['embeddings']:
-                # Embedding'i deşifre et
-                stored_embedding = crypto_manager.decrypt_embedding(
-                    emb_doc['encrypted'],
-                    emb_doc['hmac']
-                )
-                
-                # Benzerlik hesapla
-                similarity = processor.compute_similarity(
-                    query_embedding,
-                    stored_embedding
-                )
-                
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = user['username']
+        if target_username and LAZY_GALLERY and not registry.is_loaded('gallery'):
+            # Lazy mod: sadece bu kullanıcının şablonu (önbellekte yoksa) deşifre edilir
+            best_match, best_similarity = registry.get('templates').best_match(
+                query_embedding, target_username
+            )
+        else:
+            gallery = registry.get('gallery')
+            if not gallery.snapshot.usernames:
+                return jsonify({'error': 'Kayıtlı kullanıcı yok'}), 404
+            
+            # En yüksek benzerliği bul (tek matris çarpımı)
+            best_match, best_similarity = gallery.best_match(
+                query_embedding,
+                username=target_username
+            )
         
         # Threshold kontrolü
         if best_similarity >= SIMILARITY_THRESHOLD:
@@ -131,7 +132,7 @@ def verify_face():
             }), 200
         else:
             # Başarısız denemeyi logla
-            db.log_failed_attempt(
+            db_manager.log_failed_attempt(
                 best_match,
                 client_ip,
                 best_similarity,
@@ -147,7 +148,7 @@ def verify_face():
         
     except ValueError as e:
         # Çoklu yüz hatası
-        db.log_failed_attempt(
+        db_manager.log_failed_attempt(
             target_username,
             client_ip,
             0.0,
@@ -155,5 +156,9 @@ def verify_face():
         )
         return jsonify({'error': str(e)}), 400
         
+    except queue.Full:
+        # Çıkarım kuyruğu dolu - istemci tekrar denemeli
+        return jsonify({'error': 'Sunucu meşgul, tekrar deneyin'}), 503
+        
     except Exception as e:
         return jsonify({'error': f'İşlem hatası: {str(e)}'}), 500
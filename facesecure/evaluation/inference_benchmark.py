@@ -0,0 +1,146 @@
+"""
+FaceNet çıkarım ölçümü - eager ve derlenmiş (tf.function / XLA) yol, bucket başına
+
+Her bucket boyutu (varsayılan 1, 4, 8, 16, 32) ve her mod için:
+    first    : ilk çağrı süresi (graph kurulumu / XLA derlemesi dahil)
+    latency  : sonraki çağrıların medyan süresi (batch başına)
+    faces/s  : sıcak çağrılarda saniyedeki yüz sayısı
+    cosine   : eager yola göre en düşük cosine benzerliği
+
+Modlar:
+    eager     keras_facenet.embeddings (model.predict)
+    compiled  sabit imzalı tf.function (FS_INFER_COMPILED=1, varsayılan)
+    xla       tf.function(jit_compile=True) (FS_INFER_XLA=1)
+
+    python evaluation/inference_benchmark.py
+    python evaluation/inference_benchmark.py --buckets 1,8,32 --iterations 50 --json infer.json
+
+Gerekenler: tensorflow + keras-facenet.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from face.backends import KerasBackend, standardize_batch
+from face.export import sample_faces
+
+MODES = ('eager', 'compiled', 'xla')
+
+
+def mode_runner(backend: KerasBackend, mode: str) -> Callable[[np.ndarray], np.ndarray]:
+    """Moda göre (n, 160, 160, 3) uint8 -> embedding fonksiyonu"""
+    if mode == 'eager':
+        return backend.eager_embeddings
+    forward = backend.compile(jit_compile=(mode == 'xla'))
+    return lambda images: forward(standardize_batch(images)).numpy()
+
+
+def cosine_min(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.sum(a * b, axis=1).min())
+
+
+def benchmark_bucket(run: Callable[[np.ndarray], np.ndarray], faces: np.ndarray,
+                     iterations: int) -> Dict:
+    """
+    Tek mod / tek bucket ölçümü
+
+    Args:
+        run: Embedding fonksiyonu
+        faces: Bucket boyutunda crop batch'i
+        iterations: Sıcak çağrı sayısı
+
+    Returns:
+        {'first', 'latency', 'faces_per_second', 'embeddings'}
+    """
+    started = time.perf_counter()
+    embeddings = np.asarray(run(faces))
+    first = time.perf_counter() - started
+
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run(faces)
+        durations.append(time.perf_counter() - started)
+    latency = statistics.median(durations)
+    return {
+        'first': first,
+        'latency': latency,
+        'faces_per_second': len(faces) / latency if latency > 0 else float('inf'),
+        'embeddings': embeddings,
+    }
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='FaceNet eager / derlenmiş çıkarım ölçümü')
+    parser.add_argument('--buckets', default='1,4,8,16,32', help='Virgülle ayrılmış batch boyutları')
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help=f"Virgülle ayrılmış modlar ({', '.join(MODES)})")
+    parser.add_argument('--iterations', type=int, default=20, help='Bucket başına sıcak çağrı')
+    parser.add_argument('--images', default=None,
+                        help='Yüz fotoğrafları dizini (yoksa sentetik crop)')
+    parser.add_argument('--json', default=None, help='Sonuçları bu dosyaya yaz')
+    args = parser.parse_args(argv)
+
+    buckets = sorted({int(size) for size in args.buckets.split(',') if size.strip()})
+    modes = [mode.strip().lower() for mode in args.modes.split(',') if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Bilinmeyen mod: {', '.join(sorted(unknown))}")
+
+    print("🔄 FaceNet yükleniyor...")
+    backend = KerasBackend(compiled=False)
+    faces = sample_faces(args.images, max(buckets))
+    if len(faces) < max(buckets):
+        faces = np.resize(faces, (max(buckets),) + faces.shape[1:])
+
+    report: Dict[str, List[Dict]] = {}
+    reference: Dict[int, np.ndarray] = {}
+    for mode in modes:
+        print(f"⏱️  {mode} ölçülüyor...")
+        run = mode_runner(backend, mode)
+        report[mode] = []
+        for size in buckets:
+            result = benchmark_bucket(run, faces[:size], args.iterations)
+            embeddings = result.pop('embeddings')
+            if mode == 'eager':
+                reference[size] = embeddings
+            result['cosine_min'] = (cosine_min(reference[size], embeddings)
+                                    if size in reference else None)
+            report[mode].append({'batch_size': size, **result})
+
+    print(f"\n📊 Çıkarım ({args.iterations} sıcak çağrı, medyan)\n")
+    print(f"{'Mod':<10}{'batch':>6}{'ilk (ms)':>11}{'gecikme (ms)':>14}{'yüz/s':>10}{'cosine':>9}")
+    for mode, rows in report.items():
+        for row in rows:
+            cosine = f"{row['cosine_min']:.4f}" if row['cosine_min'] is not None else '-'
+            print(f"{mode:<10}{row['batch_size']:>6}{row['first'] * 1000:>11.1f}"
+                  f"{row['latency'] * 1000:>14.2f}{row['faces_per_second']:>10.1f}{cosine:>9}")
+
+    if 'eager' in report:
+        for mode in report:
+            if mode == 'eager':
+                continue
+            speedups = [eager['latency'] / row['latency']
+                        for eager, row in zip(report['eager'], report[mode])]
+            print(f"\n🚀 {mode}: eager'a göre hızlanma "
+                  + ', '.join(f"{row['batch_size']}→{s:.2f}x"
+                              for row, s in zip(report[mode], speedups)))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Sonuçlar kaydedildi: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Embedding kodekleri için doğruluk / recall raporu
+
+Kayıtlı galeriyi (veya sentetik veriyi) float32 tam arama ile karşılaştırır:
+
+    python evaluation/quantization_report.py
+    python evaluation/quantization_report.py --synthetic 20000 --pq-m 64
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from face.quantization import PQCodec, evaluate_codec, get_codec
+
+
+def load_store_embeddings(dim: int) -> np.ndarray:
+    """Kayıtlı tüm embedding'leri deşifre eder (FS_AES_KEY_B64/FS_HMAC_KEY_B64 gerekli)"""
+    from dotenv import load_dotenv
+    from face.gallery import EmbeddingGallery
+    from utils.crypto import CryptoManager
+    from utils.storage import open_storage
+
+    load_dotenv()
+    crypto_manager = CryptoManager.from_env()
+    db = open_storage(os.getenv('MONGO_URI'))
+
+    # Galeri tüm kayıt formatlarını (eski, mühürlü, binary) float32'ye açar
+    gallery = EmbeddingGallery(crypto_manager, embedding_dim=dim,
+                               store=db.embedding_store)
+    gallery.sync(db.get_all_users())
+    return gallery.snapshot.live_matrix()
+
+
+def synthetic_embeddings(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Kimlik başına 10 gürültülü örnekten oluşan sentetik galeri"""
+    rng = np.random.default_rng(seed)
+    identities = rng.standard_normal((max(count // 10, 1), dim)).astype(np.float32)
+    samples = np.repeat(identities, 10, axis=0)[:count]
+    samples += 0.6 * rng.standard_normal(samples.shape).astype(np.float32)
+    return samples / np.linalg.norm(samples, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Store yerine bu kadar sentetik embedding kullan')
+    parser.add_argument('--dim', type=int, default=512, help='Embedding boyutu')
+    parser.add_argument('--queries', type=int, default=200, help='Sorgu sayısı')
+    parser.add_argument('--k', type=int, default=10, help='recall@k için k')
+    parser.add_argument('--pq-m', type=int, default=64, help='PQ alt uzay sayısı')
+    parser.add_argument('--save-pq', type=str, default=None,
+                        help='Eğitilen PQ kod kitabını bu yola kaydet (FS_PQ_CODEBOOK)')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_embeddings(args.synthetic, args.dim)
+    else:
+        vectors = load_store_embeddings(args.dim)
+
+    if len(vectors) <= args.queries:
+        print(f"❌ Yetersiz embedding ({len(vectors)}); --synthetic kullanın")
+        return
+
+    # Sorgular galeriden ayrılır (leave-out), böylece kendini bulma etkisi olmaz
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    queries = vectors[order[:args.queries]]
+    gallery = vectors[order[args.queries:]]
+
+    codecs = [get_codec('float32'), get_codec('float16'), get_codec('int8')]
+    print(f"🔄 PQ eğitiliyor (m={args.pq_m}, {len(gallery)} vektör)...")
+    pq = PQCodec.train(gallery, m=args.pq_m)
+    codecs.append(pq)
+    if args.save_pq:
+        pq.save(args.save_pq)
+        print(f"✅ PQ kod kitabı kaydedildi: {args.save_pq}")
+
+    print(f"\n📊 Galeri: {len(gallery)} embedding, {len(queries)} sorgu\n")
+    print(f"{'Kodek':<14}{'Byte':>7}{'Oran':>8}{'R@1':>8}{f'R@{args.k}':>8}{'MAE':>10}")
+    for codec in codecs:
+        report = evaluate_codec(codec, gallery, queries, k=args.k)
+        print(f"{report['codec']:<14}{report['bytes_per_vector']:>7}"
+              f"{report['compression']:>7.1f}x{report['recall@1']:>8.3f}"
+              f"{report[f'recall@{min(args.k, len(gallery))}']:>8.3f}"
+              f"{report['mean_abs_error']:>10.5f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+API soğuk başlangıç ölçümü - import süresi, hazır olma süresi, ilk istek
+
+Her tur yeni bir Python sürecinde çalışır (gerçek worker yeniden başlatması):
+    import   : api/app.py import süresi
+    ready    : import + warm() (model yükleme ve her batch boyutuyla ısınma)
+    first    : ilk /api/verify isteğinin süresi
+    second   : ikinci (sıcak) isteğin süresi
+
+'warm' modunda istekten önce warm() çağrılır (FS_WARM_ON_START=1 ile aynı),
+'cold' modunda kaynaklar ilk istekte yüklenir. Sonuçlar tur medyanıdır.
+
+    python evaluation/startup_benchmark.py
+    python evaluation/startup_benchmark.py --runs 5 --image yuz.jpg --json startup.json
+    FS_INFER_BACKEND=onnx FS_MODEL_PATH=models/facenet.int8.onnx python evaluation/startup_benchmark.py
+
+Varsayılan olarak geçici bir SQLite veritabanı ve (ayarlı değilse) rastgele
+anahtarlar kullanılır; gerçek veriye dokunulmaz. Sentetik görüntüde yüz
+bulunamazsa istek çıkarıma ulaşmaz (face_detected=false) - anlamlı ilk istek
+süresi için --image ile gerçek bir yüz fotoğrafı verin.
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+METRICS = ('import', 'ready', 'first', 'second')
+
+
+def _synthetic_image() -> bytes:
+    """Ortasında yüz benzeri bir şekil olan JPEG"""
+    import cv2
+    import numpy as np
+
+    image = np.full((480, 640, 3), 180, dtype=np.uint8)
+    cv2.ellipse(image, (320, 240), (90, 120), 0, 0, 360, (150, 170, 210), -1)
+    for x in (285, 355):
+        cv2.circle(image, (x, 210), 10, (40, 40, 40), -1)
+    cv2.ellipse(image, (320, 300), (35, 12), 0, 0, 180, (60, 60, 120), 3)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def run_child(mode: str, image_path: Optional[str]) -> Dict:
+    """Tek ölçüm turu (yeni süreçte çalışır)"""
+    from io import BytesIO
+
+    started = time.perf_counter()
+    sys.path.insert(0, str(PROJECT_ROOT))
+    sys.path.insert(0, str(PROJECT_ROOT / 'api'))
+    import api.app as app_module
+    result = {'mode': mode, 'import': time.perf_counter() - started}
+
+    app = app_module.app
+    registry = app.extensions['facesecure']
+    if mode == 'warm':
+        registry.warm()
+        result['ready'] = time.perf_counter() - started
+        result['warmup_batches'] = registry.status()['warmup_batches']
+
+    image = Path(image_path).read_bytes() if image_path else _synthetic_image()
+    client = app.test_client()
+    for metric in ('first', 'second'):
+        request_started = time.perf_counter()
+        response = client.post('/api/verify', data={'image': (BytesIO(image), 'face.jpg')},
+                               content_type='multipart/form-data')
+        result[metric] = time.perf_counter() - request_started
+        body = response.get_json() or {}
+        result['face_detected'] = body.get('reason') != 'Yüz tespit edilemedi'
+        result['status'] = response.status_code
+
+    if mode == 'cold':
+        # Kaynaklar ilk istekte yüklendi; hazır olma = import + ilk istek
+        result['ready'] = result['import'] + result['first']
+    return result
+
+
+def child_env(use_env_db: bool, workdir: str) -> Dict[str, str]:
+    """Ölçüm süreçlerinin ortamı (ısınmayı tur kendisi yönetir)"""
+    env = dict(os.environ)
+    env['FS_WARM_ON_START'] = '0'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    if not use_env_db:
+        env['MONGO_URI'] = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+        env.pop('FS_ATTEMPT_LOG', None)
+    if not (env.get('FS_AES_KEY_B64') and env.get('FS_HMAC_KEY_B64')):
+        env['FS_AES_KEY_B64'] = base64.b64encode(os.urandom(32)).decode()
+        env['FS_HMAC_KEY_B64'] = base64.b64encode(os.urandom(32)).decode()
+    return env
+
+
+def summarize(results: List[Dict]) -> Dict[str, float]:
+    """Tur medyanları (saniye)"""
+    return {metric: statistics.median(r[metric] for r in results) for metric in METRICS}
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='FaceSecure API başlangıç süresi ölçümü')
+    parser.add_argument('--runs', type=int, default=3, help='Mod başına tur (yeni süreç)')
+    parser.add_argument('--modes', default='warm,cold', help="Virgülle ayrılmış: warm, cold")
+    parser.add_argument('--image', default=None, help='İstekte kullanılacak yüz fotoğrafı')
+    parser.add_argument('--use-env-db', action='store_true',
+                        help='Geçici veritabanı yerine MONGO_URI kullan')
+    parser.add_argument('--json', default=None, help='Ham sonuçları bu dosyaya yaz')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        # Ölçüm süreci: sonucu son satırda JSON olarak yazar
+        print(json.dumps(run_child(args.child, args.image)))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    report = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in modes:
+            results = []
+            for run in range(args.runs):
+                command = [sys.executable, __file__, '--child', mode]
+                if args.image:
+                    command += ['--image', args.image]
+                completed = subprocess.run(command, env=child_env(args.use_env_db, workdir),
+                                           cwd=str(PROJECT_ROOT), capture_output=True, text=True)
+                if completed.returncode != 0:
+                    print(completed.stderr)
+                    sys.exit(f"❌ Ölçüm süreci başarısız oldu ({mode}, tur {run + 1})")
+                results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            report[mode] = {'median': summarize(results), 'runs': results}
+
+    print(f"\n📊 Başlangıç süreleri (medyan, {args.runs} tur)\n")
+    print(f"{'Mod':<8}" + ''.join(f"{metric:>10}" for metric in METRICS) + f"{'yüz':>6}")
+    for mode, data in report.items():
+        detected = all(r['face_detected'] for r in data['runs'])
+        print(f"{mode:<8}" + ''.join(f"{data['median'][m]:>9.3f}s" for m in METRICS)
+              + f"{'evet' if detected else 'hayır':>6}")
+    if 'warm' in report:
+        print(f"\nIsınma batch'leri (son tur): {report['warm']['runs'][-1]['warmup_batches']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Sonuçlar kaydedildi: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Yaklaşık en yakın komşu (ANN) indeks modülü - Büyük galerilerde 1:N aday seçimi
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, n_iter: int = 10,
+                     seed: int = 0) -> np.ndarray:
+    """
+    Cosine benzerliği ile k-means (merkezler L2 normalize)
+
+    Args:
+        vectors: (N, D) L2 normalize vektörler
+        k: Küme sayısı (N'den büyükse N'e indirilir)
+        n_iter: İterasyon sayısı
+        seed: Rastgelelik tohumu
+
+    Returns:
+        (k, D) float32 küme merkezleri
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(n, k, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+
+        # Boş kümeleri rastgele bir vektörle yeniden başlat
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(n, int(empty.sum()))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+
+    return centroids.astype(np.float32)
+
+
+class ANNIndex:
+    """
+    ANN indeks arayüzü
+
+    Anahtar (username) bazında vektör ekleme/silme ve sorguya en yakın
+    anahtarların aday listesini döndürme işlemlerini tanımlar. Adaylar
+    galeri tarafından tam (exact) skorlama ile yeniden sıralanır.
+    """
+
+    min_train_size = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    def train(self, vectors: np.ndarray):
+        """İndeksi örnek vektörlerle eğitir (gerekmiyorsa no-op)"""
+
+    def needs_retrain(self, size: int) -> bool:
+        """Galeri `size` vektöre büyüdüğünde yeniden eğitim gerekli mi"""
+        return False
+
+    def untrained_copy(self) -> 'ANNIndex':
+        """Aynı ayarlarla boş, eğitilmemiş indeks (yeniden eğitim için)"""
+        raise NotImplementedError
+
+    def add(self, key: str, vectors: np.ndarray):
+        raise NotImplementedError
+
+    def remove(self, key: str):
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class _InvertedList:
+    """
+    Tek bir IVF hücresindeki vektörler ve anahtar kodları
+
+    (codes, matrix) çifti tek bir tuple olarak tutulur ve yazmada
+    bütünüyle değiştirilir; okuyan thread'ler her zaman tutarlı bir
+    çift görür.
+    """
+
+    def __init__(self, dim: int):
+        self.data = (np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32))
+
+    def append(self, code: int, vectors: np.ndarray):
+        codes, matrix = self.data
+        self.data = (
+            np.concatenate([codes, np.full(len(vectors), code, dtype=np.int64)]),
+            np.ascontiguousarray(np.concatenate([matrix, vectors], axis=0))
+        )
+
+    def remove(self, code: int):
+        codes, matrix = self.data
+        keep = codes != code
+        self.data = (codes[keep], np.ascontiguousarray(matrix[keep]))
+
+    def __len__(self) -> int:
+        return len(self.data[0])
+
+
+class IVFIndex(ANNIndex):
+    """
+    Inverted-file (IVF) indeks - saf NumPy
+
+    Vektörler spherical k-means ile eğitilmiş `nlist` merkeze atanır.
+    Arama sırasında sorguya en yakın `nprobe` hücre taranır; nprobe
+    recall/latency dengesini ayarlar (nprobe = nlist -> tam tarama).
+
+    Merkezler eğitim anındaki dağılımı yansıtır; galeri büyüdükçe hücreler
+    dengesizleşir ve sabit nprobe'da recall düşer. Vektör sayısı son
+    eğitimin `retrain_factor` katına ulaşınca needs_retrain() True döner.
+    """
+
+    def __init__(self, dim: int, nlist: int = 0, nprobe: int = 8,
+                 min_train_size: int = 10000, n_iter: int = 10, seed: int = 0,
+                 retrain_factor: float = 2.0):
+        """
+        Args:
+            dim: Embedding boyutu
+            nlist: Hücre sayısı (0 -> eğitimde ~sqrt(N) seçilir)
+            nprobe: Sorgu başına taranan hücre sayısı
+            min_train_size: Eğitim için gereken minimum vektör sayısı
+            n_iter: k-means iterasyon sayısı
+            seed: Rastgelelik tohumu (tekrarlanabilir eğitim)
+            retrain_factor: Son eğitimdeki vektör sayısının bu katında yeniden
+                            eğit (0 -> kapalı)
+        """
+        self.dim = dim
+        # 0 -> her eğitimde ~sqrt(N) (yeniden eğitimde hücre sayısı da büyür)
+        self._nlist_config = nlist
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.retrain_factor = retrain_factor
+        self.trained_size = 0
+
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[_InvertedList] = []
+        self._where: Dict[str, set] = {}
+        # Anahtar <-> tamsayı kod; kodlar yeniden kullanılmaz (eşzamanlı arama
+        # silinen anahtarın kodunu başka anahtara çözmesin), silmede ikisi de düşer
+        self._codes: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._next_code = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray):
+        """
+        Spherical k-means ile hücre merkezlerini öğrenir
+
+        Args:
+            vectors: (N, D) L2 normalize eğitim vektörleri
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("IVF eğitimi için vektör gerekli")
+
+        nlist = self._nlist_config or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        centroids = spherical_kmeans(vectors, nlist, n_iter=self.n_iter, seed=self.seed)
+
+        self._lists = [_InvertedList(self.dim) for _ in range(nlist)]
+        self._where = {}
+        self._codes = {}
+        self._keys = {}
+        self._next_code = 0
+        self.nlist = nlist
+        self.trained_size = n
+        self.centroids = centroids
+
+    def needs_retrain(self, size: int) -> bool:
+        return (self.is_trained and self.retrain_factor > 0
+                and size >= self.trained_size * self.retrain_factor)
+
+    def untrained_copy(self) -> 'IVFIndex':
+        return IVFIndex(self.dim, nlist=self._nlist_config, nprobe=self.nprobe,
+                        min_train_size=self.min_train_size, n_iter=self.n_iter,
+                        seed=self.seed, retrain_factor=self.retrain_factor)
+
+    def add(self, key: str, vectors: np.ndarray):
+        """
+        Bir anahtarın vektörlerini ekler (varsa öncekiler korunur)
+
+        Args:
+            key: Kullanıcı adı
+            vectors: (k, D) L2 normalize vektörler
+        """
+        if not self.is_trained:
+            raise RuntimeError("IVF indeksi eğitilmeden ekleme yapılamaz")
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) == 0:
+            return
+
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = self._next_code
+            self._next_code += 1
+            self._keys[code] = key
+
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        cells = self._where.setdefault(key, set())
+        for cell in np.unique(assign):
+            self._lists[cell].append(code, vectors[assign == cell])
+            cells.add(int(cell))
+
+    def remove(self, key: str):
+        """Bir anahtarın tüm vektörlerini ve kodunu siler"""
+        code = self._codes.pop(key, None)
+        if code is None:
+            return
+        for cell in self._where.pop(key, ()):
+            self._lists[cell].remove(code)
+        del self._keys[code]
+
+    def search(self, query: np.ndarray, k: int,
+               nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Sorguya en yakın k anahtarı bulur
+
+        Args:
+            query: (D,) L2 normalize sorgu
+            k: Döndürülecek anahtar sayısı
+            nprobe: Bu sorgu için taranacak hücre sayısı (varsayılan: self.nprobe)
+
+        Returns:
+            [(key, raw_cosine), ...] azalan sırada
+        """
+        if not self.is_trained or k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32)
+        keys = self._keys
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        scores, codes = [], []
+        for cell in cells:
+            cell_codes, cell_matrix = self._lists[cell].data
+            if len(cell_codes) == 0:
+                continue
+            scores.append(cell_matrix @ query)
+            codes.append(cell_codes)
+        if not scores:
+            return []
+
+        # Anahtar başına en yüksek skor: azalan sıralamada ilk görülen
+        scores = np.concatenate(scores)
+        codes = np.concatenate(codes)
+        order = np.argsort(-scores, kind='stable')
+        _, first = np.unique(codes[order], return_index=True)
+        results = []
+        for i in np.sort(first):
+            # Hücre okunduktan sonra silinen anahtar atlanır
+            key = keys.get(int(codes[order[i]]))
+            if key is not None:
+                results.append((key, float(scores[order[i]])))
+                if len(results) >= k:
+                    break
+        return results
+
+    def __len__(self) -> int:
+        return sum(len(inv) for inv in self._lists)
+
+
+def create_index(kind: Optional[str], dim: int, **kwargs) -> Optional[ANNIndex]:
+    """
+    Yapılandırmaya göre ANN indeksi oluşturur
+
+    Args:
+        kind: 'ivf' veya None/'none' (tam tarama)
+        dim: Embedding boyutu
+        **kwargs: İndeks parametreleri (nlist, nprobe, min_train_size, retrain_factor)
+
+    Returns:
+        ANNIndex veya None
+    """
+    if not kind or kind.lower() == 'none':
+        return None
+    if kind.lower() == 'ivf':
+        return IVFIndex(dim, **kwargs)
+    raise ValueError(f"Bilinmeyen ANN indeks tipi: {kind}")
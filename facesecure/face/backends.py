@@ -0,0 +1,194 @@
+"""
+FaceNet çıkarım backend'leri - Keras (referans), ONNX Runtime, TFLite
+
+Her backend keras_facenet.FaceNet ile aynı arayüzü sunar:
+    embeddings(images) -> (n, embedding_dim)
+images: 160x160 RGB uint8 yüz crop'ları, (n, 160, 160, 3).
+
+ONNX/TFLite modelleri face/export.py ile Keras ağırlıklarından üretilir (fp32
+ve dinamik kuantize int8). Bu backend'ler TensorFlow'u import etmez (TFLite
+için tflite-runtime kuruluysa); ön işleme (görüntü başına standardizasyon)
+keras_facenet ile birebir aynıdır.
+
+Backend dağıtım başına seçilir:
+    FS_INFER_BACKEND=keras|onnx|tflite   FS_MODEL_PATH=models/facenet.int8.onnx
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+
+FACENET_INPUT_SIZE = 160
+
+BACKENDS = ('keras', 'onnx', 'tflite')
+
+
+def standardize_batch(images: np.ndarray) -> np.ndarray:
+    """
+    Görüntü başına standardizasyon (keras_facenet / FaceNet prewhiten)
+
+    Args:
+        images: (n, h, w, 3) uint8 veya float
+
+    Returns:
+        (n, h, w, 3) float32, her görüntü sıfır ortalama ve birim varyanslı
+    """
+    images = images.astype(np.float32)
+    mean = images.mean(axis=(1, 2, 3), keepdims=True)
+    std = images.std(axis=(1, 2, 3), keepdims=True)
+    std_adj = np.maximum(std, np.float32(1.0 / np.sqrt(images[0].size)))
+    return (images - mean) / std_adj
+
+
+class KerasBackend:
+    """
+    keras_facenet.FaceNet (TensorFlow) - export ve doğruluk kontrolü için referans
+
+    compiled=True iken çıkarım sabit girdi imzalı bir tf.function'dan geçer:
+    graph bir kez kurulur, her çağrıda model.predict'in eager ek yükü ödenmez.
+    jit_compile=True XLA ile derler; XLA her batch boyutu için ayrı derlediğinden
+    processor batch'leri sabit boyutlara (bucket) tamamlar.
+    """
+
+    name = 'keras'
+    # Sabit batch boyutlarında tekrar derleme yapılmaz
+    bucketed = True
+
+    def __init__(self, compiled: bool = True, jit_compile: bool = False):
+        """
+        Args:
+            compiled: tf.function yolunu kullan (False -> keras_facenet.embeddings)
+            jit_compile: tf.function'ı XLA ile derle
+        """
+        from keras_facenet import FaceNet
+        self.facenet = FaceNet()
+        self.keras_model = self.facenet.model
+        self.embedding_dim = int(self.keras_model.output_shape[-1])
+        self._forward = self.compile(jit_compile) if compiled else None
+
+    def compile(self, jit_compile: bool = False):
+        """
+        Sabit imzalı (None, 160, 160, 3) float32 tf.function döndürür
+
+        Args:
+            jit_compile: XLA ile derle
+
+        Returns:
+            standardize edilmiş batch -> embedding tensörü
+        """
+        import tensorflow as tf
+
+        model = self.keras_model
+        signature = [tf.TensorSpec([None, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE, 3], tf.float32)]
+
+        @tf.function(input_signature=signature, jit_compile=jit_compile)
+        def forward(images):
+            return model(images, training=False)
+
+        return forward
+
+    def embeddings(self, images: np.ndarray) -> np.ndarray:
+        if self._forward is None:
+            return self.eager_embeddings(images)
+        return self._forward(standardize_batch(images)).numpy()
+
+    def eager_embeddings(self, images: np.ndarray) -> np.ndarray:
+        """keras_facenet'in kendi yolu (model.predict) - karşılaştırma için"""
+        return self.facenet.embeddings(images)
+
+
+class ONNXBackend:
+    """ONNX Runtime CPU oturumu (fp32 veya int8 kuantize model)"""
+
+    name = 'onnx'
+    # Dinamik batch boyutu; dolgu sadece boşa hesap olur
+    bucketed = False
+
+    def __init__(self, model_path: str, threads: int = 0):
+        """
+        Args:
+            model_path: face/export.py ile üretilmiş .onnx dosyası
+            threads: Operatör içi thread sayısı (0 -> ONNX Runtime varsayılanı)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.embedding_dim = int(self.session.get_outputs()[0].shape[-1])
+
+    def embeddings(self, images: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: standardize_batch(images)})[0]
+
+
+class TFLiteBackend:
+    """TFLite yorumlayıcısı (tflite-runtime, yoksa tf.lite)"""
+
+    name = 'tflite'
+    # Batch boyutu değişince tensörler yeniden ayrılır
+    bucketed = True
+
+    def __init__(self, model_path: str, threads: int = 0):
+        """
+        Args:
+            model_path: face/export.py ile üretilmiş .tflite dosyası
+            threads: Yorumlayıcı thread sayısı (0 -> varsayılan)
+        """
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path,
+                                       num_threads=threads if threads > 0 else None)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.embedding_dim = int(self.interpreter.get_output_details()[0]['shape'][-1])
+        self._batch_size = 0
+        # Yorumlayıcı thread-safe değil; tensör boyutu batch'e göre değişir
+        self._lock = threading.Lock()
+
+    def embeddings(self, images: np.ndarray) -> np.ndarray:
+        batch = standardize_batch(images)
+        with self._lock:
+            if len(batch) != self._batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, list(batch.shape))
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def create_backend(name: Optional[str], model_path: Optional[str] = None, threads: int = 0,
+                   compiled: bool = True, jit_compile: bool = False):
+    """
+    Dağıtım yapılandırmasından çıkarım backend'i oluşturur
+
+    Args:
+        name: 'keras' | 'onnx' | 'tflite' (None -> keras)
+        model_path: 'onnx' / 'tflite' için model dosyası
+        threads: CPU thread sayısı (0 -> backend varsayılanı)
+        compiled: keras için tf.function yolu
+        jit_compile: keras için XLA derlemesi
+
+    Returns:
+        embeddings(images) sağlayan backend
+
+    Raises:
+        ValueError: Bilinmeyen backend veya eksik model yolu
+    """
+    name = (name or 'keras').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Bilinmeyen çıkarım backend'i: {name} ({', '.join(BACKENDS)})")
+    if name == 'keras':
+        return KerasBackend(compiled=compiled, jit_compile=jit_compile)
+    if not model_path:
+        raise ValueError(f"{name} backend'i için model yolu (FS_MODEL_PATH) gerekli")
+    if name == 'onnx':
+        return ONNXBackend(model_path, threads=threads)
+    return TFLiteBackend(model_path, threads=threads)
@@ -0,0 +1,192 @@
+"""
+Mikro-batch çıkarım kuyruğu - eşzamanlı isteklerin yüzleri tek forward pass'te
+
+Her /api/verify isteği modeli tek görüntüyle çağırınca TensorFlow'un çağrı
+başına sabit maliyeti her istekte ödenir. BatchingEmbedder crop'ları sınırlı
+bir kuyruğa alır; tek bir çıkarım thread'i kuyruktan en fazla max_batch_size
+crop'u (ilk crop'tan sonra en fazla max_wait saniye bekleyerek) toplar,
+FaceEmbeddingProcessor.get_embeddings ile tek seferde işler ve her çağıranın
+Future'ını sonuçlandırır. Yük altında model çalışırken biriken istekler bir
+sonraki batch'e girer; tek istekte ek gecikme en fazla max_wait'tir.
+
+Kuyruk doluysa yeni crop'lar reddedilir (queue.Full) ve sayılır.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+_STOP = object()
+
+
+class BatchingEmbedder:
+    """FaceEmbeddingProcessor önünde sınırlı kuyruklu, mikro-batch'leyen çıkarım"""
+
+    def __init__(self, processor, max_batch_size: int = 32, max_wait: float = 0.005,
+                 queue_size: int = 256):
+        """
+        Args:
+            processor: get_embeddings(faces, normalize) sağlayan işlemci
+            max_batch_size: Tek forward pass'teki en fazla crop
+            max_wait: İlk crop'tan sonra batch'i doldurmak için bekleme (saniye)
+            queue_size: Bekleyen en fazla crop; doluysa submit queue.Full fırlatır
+        """
+        self.processor = processor
+        self.embedding_dim = processor.embedding_dim
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max(max_wait, 0.0)
+        self.queue_size = queue_size
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrikler
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.queue_peak = 0
+        self._queue_seconds = 0.0
+        self._inference_seconds = 0.0
+        self._batch_sizes: Dict[int, int] = {}
+
+    def submit(self, face_image: np.ndarray, normalize: bool = True) -> Future:
+        """
+        Crop'u kuyruğa atar (bloklamaz)
+
+        Returns:
+            Embedding vektörüyle sonuçlanacak Future
+
+        Raises:
+            queue.Full: Kuyruk dolu (istek reddedildi)
+        """
+        self._ensure_thread()
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((face_image, normalize, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+                if self.rejected == 1 or self.rejected % 1000 == 0:
+                    print(f"⚠️  Çıkarım kuyruğu dolu, {self.rejected} istek reddedildi")
+            raise
+        depth = self._queue.qsize()
+        if depth > self.queue_peak:
+            self.queue_peak = depth
+        return future
+
+    def get_embedding(self, face_image: np.ndarray, normalize: bool = True) -> np.ndarray:
+        """
+        Tek crop'un embedding'i (diğer isteklerle aynı batch'te işlenir)
+
+        Raises:
+            queue.Full: Kuyruk dolu
+        """
+        return self.submit(face_image, normalize).result()
+
+    def get_embeddings(self, face_images: List[np.ndarray], normalize: bool = True) -> np.ndarray:
+        """
+        Birden fazla crop'un embedding'leri, (n, embedding_dim) matris
+
+        Raises:
+            queue.Full: Kuyruk dolu
+        """
+        if not face_images:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        futures = [self.submit(face, normalize) for face in face_images]
+        return np.stack([future.result() for future in futures])
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='inference-batcher',
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            stop = batch[0] is _STOP
+            deadline = time.perf_counter() + self.max_wait
+            while not stop and len(batch) < self.max_batch_size:
+                try:
+                    # Model çalışırken biriken crop'lar beklemeden alınır
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                stop = item is _STOP
+                batch.append(item)
+
+            requests = [item for item in batch if item is not _STOP]
+            if requests:
+                self._process(requests)
+            if stop:
+                return
+
+    def _process(self, requests: List[tuple]):
+        """Tek forward pass, sonra her isteğin Future'ı"""
+        started = time.perf_counter()
+        faces = [face for face, _, _, _ in requests]
+        try:
+            embeddings = self.processor.get_embeddings(faces, normalize=False)
+        except Exception as e:
+            for _, _, future, _ in requests:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        # L2 normalizasyonu isteyen çağıranlar için satır bazında
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        normalized = embeddings / np.where(norms > 0, norms, 1).astype(embeddings.dtype)
+        for i, (_, normalize, future, _) in enumerate(requests):
+            future.set_result(normalized[i] if normalize else embeddings[i])
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(requests)
+            self._batch_sizes[len(requests)] = self._batch_sizes.get(len(requests), 0) + 1
+            self._queue_seconds += sum(started - queued for _, _, _, queued in requests)
+            self._inference_seconds += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Kuyruk ve batch metrikleri
+
+        Returns:
+            queue_depth / queue_peak / queue_capacity, batches, items,
+            mean_batch_size, batch_sizes ({boyut: adet}), rejected,
+            mean_queue_ms (crop başına kuyrukta bekleme), mean_inference_ms
+            (batch başına), max_batch_size, max_wait_ms
+        """
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_peak': self.queue_peak,
+                'queue_capacity': self.queue_size,
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'batch_sizes': dict(sorted(self._batch_sizes.items())),
+                'rejected': self.rejected,
+                'mean_queue_ms': 1000 * self._queue_seconds / self.items if self.items else 0.0,
+                'mean_inference_ms': (1000 * self._inference_seconds / self.batches
+                                      if self.batches else 0.0),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': 1000 * self.max_wait
+            }
+
+    def close(self, timeout: Optional[float] = None):
+        """Kuyruktaki crop'lar işlendikten sonra çıkarım thread'ini durdurur"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
@@ -0,0 +1,201 @@
+"""
+İçerik adresli embedding önbelleği - aynı görüntü için çıkarım tekrarlanmaz
+
+İstemciler zaman aşımında /api/verify'ı yeniden dener; admin paneli (fotoğraf
+galerisi, canlı test) kayıtlı fotoğrafları aynen tekrar gönderir. Her tekrar
+decode, Haar tespiti ve FaceNet çıkarımını baştan öder. EmbeddingCache
+normalize sorgu embedding'ini iki anahtarla tutar:
+
+    görüntü anahtarı : yüklenen dosya baytlarının özeti (isabette decode ve
+                       tespit de atlanır)
+    crop anahtarı    : tespit edilen yüz crop'unun özeti (aynı pikseller farklı
+                       kodlanmış dosyada geldiğinde çıkarım atlanır)
+
+Özetler süreç başına rastgele anahtarlı BLAKE2b'dir; anahtarlar görüntünün
+bilinen bir özetini ele vermez. Kayıtlar en fazla `capacity` adet ve
+`max_bytes` bellekle sınırlıdır (LRU), `ttl` saniye sonra düşer. encrypt=True
+iken embedding'ler bellekte süreç başına anahtarla AES-GCM ile şifreli durur
+(associated data: kayıt anahtarı) ve sadece isabette açılır.
+
+Önbellek sadece aynı modelin ürettiği embedding'leri döndürür; model süreç
+içinde değişmediğinden geçersiz kılma gerekmez.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+import numpy as np
+
+# Kayıt başına anahtar, OrderedDict düğümü ve tuple için yaklaşık ek bellek
+ENTRY_OVERHEAD_BYTES = 160
+
+_NONCE_SIZE = 12
+
+
+class _Entry(NamedTuple):
+    payload: bytes
+    expires_at: float
+
+
+class EmbeddingCache:
+    """Görüntü / crop özetiyle anahtarlanan sınırlı LRU + TTL embedding önbelleği"""
+
+    def __init__(self, capacity: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 ttl: float = 300.0, encrypt: bool = False):
+        """
+        Args:
+            capacity: En fazla kayıt (0 -> önbellek kapalı)
+            max_bytes: Kayıtların toplam yaklaşık bellek sınırı
+            ttl: Kaydın geçerlilik süresi (saniye, 0 -> süresiz)
+            encrypt: Embedding'leri bellekte AES-GCM ile şifreli tut
+        """
+        self.capacity = max(capacity, 0)
+        self.max_bytes = max(max_bytes, 0)
+        self.ttl = max(ttl, 0.0)
+        self.encrypt = encrypt
+
+        self._hash_key = os.urandom(32)
+        self._aead = None
+        if encrypt:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+            self._aead = AESGCM(AESGCM.generate_key(bit_length=256))
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self.bytes = 0
+
+        # Metrikler
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, data: Union[bytes, bytearray, memoryview, np.ndarray]) -> Optional[str]:
+        """
+        Dosya baytlarının veya crop dizisinin önbellek anahtarı
+
+        Crop'larda şekil ve dtype da özete girer (aynı baytlı farklı şekiller
+        çakışmaz).
+
+        Returns:
+            Hex özet, önbellek kapalıysa None
+        """
+        if not self.enabled:
+            return None
+        digest = hashlib.blake2b(key=self._hash_key, digest_size=16)
+        if isinstance(data, np.ndarray):
+            digest.update(f"crop:{data.shape}:{data.dtype.str}:".encode())
+            digest.update(np.ascontiguousarray(data).data)
+        else:
+            digest.update(b'image:')
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Önbellekteki embedding
+
+        Returns:
+            float32 embedding kopyası veya None (yok / süresi dolmuş / kapalı)
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            payload = entry.payload
+
+        # Deşifre kilit dışında
+        if self._aead is not None:
+            payload = self._aead.decrypt(payload[:_NONCE_SIZE], payload[_NONCE_SIZE:],
+                                         key.encode())
+        return np.frombuffer(payload, dtype=np.float32).copy()
+
+    def put(self, embedding: np.ndarray, *keys: Optional[str]):
+        """
+        Embedding'i verilen her anahtar altında saklar
+
+        Args:
+            embedding: Normalize sorgu embedding'i
+            keys: Görüntü ve/veya crop anahtarları (None olanlar atlanır)
+        """
+        keys = [key for key in keys if key is not None]
+        if not keys:
+            return
+        plaintext = np.asarray(embedding, dtype=np.float32).tobytes()
+        payloads = {}
+        for key in keys:
+            if self._aead is not None:
+                nonce = os.urandom(_NONCE_SIZE)
+                payloads[key] = nonce + self._aead.encrypt(nonce, plaintext, key.encode())
+            else:
+                payloads[key] = plaintext
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+
+        with self._lock:
+            for key, payload in payloads.items():
+                self._remove(key)
+                self._entries[key] = _Entry(payload, expires_at)
+                self.bytes += self._entry_bytes(key, payload)
+            while self._entries and (len(self._entries) > self.capacity
+                                     or self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Tüm kayıtları atar"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Önbellek metrikleri
+
+        Returns:
+            entries / capacity, bytes / max_bytes, hits, misses, hit_rate,
+            evictions (LRU / bellek sınırı), expirations (TTL), ttl_seconds, encrypted
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'capacity': self.capacity,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'ttl_seconds': self.ttl,
+                'encrypted': self.encrypt
+            }
+
+    def _remove(self, key: str):
+        # self._lock altında çağrılır
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= self._entry_bytes(key, entry.payload)
+
+    @staticmethod
+    def _entry_bytes(key: str, payload: bytes) -> int:
+        return len(key) + len(payload) + ENTRY_OVERHEAD_BYTES
@@ -0,0 +1,208 @@
+"""
+FaceNet ağırlıklarını ONNX / TFLite modellerine dönüştürür ve doğrular
+
+Keras referans modeli (keras_facenet) bir kez yüklenip şu dosyalar üretilir:
+    facenet.onnx         ONNX fp32 (tf2onnx)
+    facenet.int8.onnx    ONNX, ağırlıkları dinamik kuantize int8
+    facenet.tflite       TFLite fp32
+    facenet.int8.tflite  TFLite dinamik aralık kuantizasyonu (int8 ağırlık)
+
+Her model aynı yüz crop'larında Keras referansıyla karşılaştırılır; en düşük
+cosine benzerliği --min-cosine (varsayılan 0.99) altındaysa komut hata koduyla
+biter ve o model dağıtımda kullanılmamalıdır.
+
+Kullanım:
+    python -m face.export --out-dir models
+    python -m face.export --out-dir models --formats onnx --images dataset/faces
+    FS_INFER_BACKEND=onnx FS_MODEL_PATH=models/facenet.int8.onnx python api/app.py
+
+Gerekenler: tensorflow + keras-facenet (export), tf2onnx + onnxruntime (ONNX).
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from face.backends import FACENET_INPUT_SIZE, KerasBackend, create_backend
+
+FORMATS = ('onnx', 'tflite')
+
+
+def export_onnx(keras_model, path: str, opset: int = 13) -> str:
+    """Keras modelini dinamik batch boyutlu ONNX'e dönüştürür"""
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = [tf.TensorSpec((None, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE, 3), tf.float32,
+                          name='input')]
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=opset,
+                               output_path=path)
+    return path
+
+
+def quantize_onnx(source_path: str, path: str) -> str:
+    """ONNX ağırlıklarını dinamik int8 kuantizasyonla küçültür"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source_path, path, weight_type=QuantType.QInt8)
+    return path
+
+
+def export_tflite(keras_model, path: str, quantize: bool = False) -> str:
+    """Keras modelini TFLite'a dönüştürür (quantize: dinamik aralık int8)"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    return path
+
+
+def sample_faces(images_dir: Optional[str] = None, count: int = 64,
+                 seed: int = 0) -> np.ndarray:
+    """
+    Doğrulama için 160x160 RGB yüz crop'ları
+
+    Args:
+        images_dir: Yüz fotoğrafları dizini (None -> sentetik görüntüler)
+        count: En fazla crop sayısı
+        seed: Sentetik görüntüler için tohum
+
+    Returns:
+        (n, 160, 160, 3) uint8
+    """
+    import cv2
+
+    size = (FACENET_INPUT_SIZE, FACENET_INPUT_SIZE)
+    if images_dir:
+        from face.detector import FaceDetector
+
+        detector = FaceDetector()
+        faces = []
+        for path in sorted(Path(images_dir).rglob('*')):
+            if len(faces) >= count:
+                break
+            image = cv2.imread(str(path)) if path.is_file() else None
+            if image is None:
+                continue
+            try:
+                detected = detector.detect_faces(image)
+            except ValueError:
+                continue
+            if detected:
+                faces.append(cv2.cvtColor(cv2.resize(detected[0], size), cv2.COLOR_BGR2RGB))
+        if faces:
+            return np.stack(faces)
+        print(f"⚠️  {images_dir} içinde yüz bulunamadı, sentetik görüntüler kullanılıyor")
+
+    # Düşük frekanslı rastgele desenler (saf gürültüden daha görüntü benzeri)
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (count, 10, 10, 3), dtype=np.uint8)
+    return np.stack([cv2.resize(image, size, interpolation=cv2.INTER_CUBIC) for image in coarse])
+
+
+def embedding_agreement(reference, candidate, faces: np.ndarray,
+                        batch_size: int = 16) -> Dict[str, float]:
+    """
+    İki backend'in aynı crop'lardaki embedding'lerinin cosine benzerliği
+
+    Args:
+        reference: Referans backend (Keras)
+        candidate: Karşılaştırılan backend
+        faces: (n, 160, 160, 3) RGB crop'lar
+        batch_size: Çıkarım batch boyutu
+
+    Returns:
+        {'min': en düşük cosine, 'mean': ortalama cosine}
+    """
+    def embed(backend) -> np.ndarray:
+        embeddings = np.concatenate([
+            backend.embeddings(faces[start:start + batch_size])
+            for start in range(0, len(faces), batch_size)
+        ]).astype(np.float32)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    cosine = np.sum(embed(reference) * embed(candidate), axis=1)
+    return {'min': float(cosine.min()), 'mean': float(cosine.mean())}
+
+
+def export_all(out_dir: str, formats: List[str], int8: bool = True,
+               opset: int = 13, reference: Optional[KerasBackend] = None) -> Dict[str, str]:
+    """
+    Seçilen formatlarda tüm modelleri üretir
+
+    Returns:
+        {dosya yolu: backend adı}
+    """
+    reference = reference or KerasBackend(compiled=False)
+    os.makedirs(out_dir, exist_ok=True)
+    exported = {}
+
+    if 'onnx' in formats:
+        fp32 = export_onnx(reference.keras_model, os.path.join(out_dir, 'facenet.onnx'), opset)
+        exported[fp32] = 'onnx'
+        if int8:
+            exported[quantize_onnx(fp32, os.path.join(out_dir, 'facenet.int8.onnx'))] = 'onnx'
+
+    if 'tflite' in formats:
+        exported[export_tflite(reference.keras_model,
+                               os.path.join(out_dir, 'facenet.tflite'))] = 'tflite'
+        if int8:
+            exported[export_tflite(reference.keras_model,
+                                   os.path.join(out_dir, 'facenet.int8.tflite'),
+                                   quantize=True)] = 'tflite'
+    return exported
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='FaceNet ONNX / TFLite export ve doğrulama')
+    parser.add_argument('--out-dir', default='models', help='Çıktı dizini')
+    parser.add_argument('--formats', default='onnx,tflite',
+                        help=f"Virgülle ayrılmış formatlar ({', '.join(FORMATS)})")
+    parser.add_argument('--no-int8', action='store_true', help='Kuantize modelleri üretme')
+    parser.add_argument('--opset', type=int, default=13, help='ONNX opset sürümü')
+    parser.add_argument('--images', default=None,
+                        help='Doğrulama için yüz fotoğrafları dizini (yoksa sentetik)')
+    parser.add_argument('--samples', type=int, default=64, help='Doğrulama crop sayısı')
+    parser.add_argument('--min-cosine', type=float, default=0.99,
+                        help='Keras referansıyla kabul edilen en düşük cosine benzerliği')
+    args = parser.parse_args(argv)
+
+    formats = [name.strip().lower() for name in args.formats.split(',') if name.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"Bilinmeyen format: {', '.join(sorted(unknown))}")
+
+    print("🔄 Keras referans modeli yükleniyor...")
+    reference = KerasBackend(compiled=False)
+    exported = export_all(args.out_dir, formats, int8=not args.no_int8,
+                          opset=args.opset, reference=reference)
+
+    faces = sample_faces(args.images, args.samples)
+    print(f"🔍 {len(faces)} crop ile Keras referansına göre doğrulanıyor "
+          f"(en düşük cosine ≥ {args.min_cosine})")
+
+    failed = []
+    for path, backend in exported.items():
+        agreement = embedding_agreement(reference, create_backend(backend, path), faces)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        ok = agreement['min'] >= args.min_cosine
+        print(f"{'✅' if ok else '❌'} {path} ({size_mb:.1f} MB): "
+              f"min {agreement['min']:.4f}, ortalama {agreement['mean']:.4f}")
+        if not ok:
+            failed.append(path)
+
+    if failed:
+        print(f"❌ {len(failed)} model referansla uyuşmuyor, dağıtımda kullanmayın")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1001 @@
+"""
+Galeri modülü - Deşifre edilmiş embedding'leri bellekte tutar ve 1:N eşleştirme yapar
+
+Sadece 1:1 doğrulama yapılan dağıtımlarda tüm galeriyi deşifre etmek yerine
+TemplateCache kullanıcıları ilk doğrulamada yükler ve sınırlı LRU'da tutar.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from face.ann import ANNIndex, spherical_kmeans
+from face.quantization import EmbeddingCodec, get_codec
+from utils.crypto import user_associated_data
+from utils.storage import sealed_blob
+
+
+def compute_prototypes(embeddings: np.ndarray, n_clusters: int = 0) -> np.ndarray:
+    """
+    Bir kullanıcının embedding'lerinden prototip vektörleri üretir
+
+    İlk satır normalize edilmiş merkez (centroid); n_clusters > 1 ise
+    ardından spherical k-means ile bulunan küme prototipleri gelir.
+
+    Args:
+        embeddings: (k, D) L2 normalize embedding'ler
+        n_clusters: Ek küme prototipi sayısı (0 veya 1 -> sadece centroid)
+
+    Returns:
+        (1 + n_clusters, D) float32 L2 normalize prototipler
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(embeddings) == 0:
+        return np.empty((0, embeddings.shape[-1]), dtype=np.float32)
+
+    centroid = embeddings.mean(axis=0)
+    centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+    prototypes = [centroid[None, :]]
+
+    if n_clusters > 1 and len(embeddings) > n_clusters:
+        prototypes.append(spherical_kmeans(embeddings, n_clusters))
+
+    return np.ascontiguousarray(np.concatenate(prototypes, axis=0), dtype=np.float32)
+
+
+def _contiguous_ranges(labels: np.ndarray, count: int) -> np.ndarray:
+    """Bitişik etiketli satırlar için (count, 2) [başlangıç, bitiş) aralıkları"""
+    ranges = np.zeros((count, 2), dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=count), out=ranges[:, 1])
+    ranges[1:, 0] = ranges[:-1, 1]
+    return ranges
+
+
+def _dead_rows(labels: np.ndarray, ranges: np.ndarray) -> np.ndarray:
+    """Etiketinin canlı aralığı dışında kalan (tombstone) satırların indeksleri"""
+    if len(labels) == 0:
+        return np.empty(0, dtype=np.int64)
+    rows = np.arange(len(labels))
+    own = ranges[labels]
+    return np.flatnonzero((rows < own[:, 0]) | (rows >= own[:, 1]))
+
+
+class GallerySnapshot:
+    """
+    Galerinin değişmez (immutable) bir görüntüsü
+
+    Arama yapan thread'ler bu nesneye referans alır; galeri güncellenince
+    yeni bir snapshot yayınlanır, eskisi kullanımdaysa bozulmaz.
+
+    Matris, galerinin sadece sona eklenen tamponuna bir view olabilir: her
+    kullanıcının canlı satırları `ranges` ile verilen tek bitişik aralıktır,
+    güncellenen / silinen kullanıcıların eski satırları (tombstone) matriste
+    kalır ama skorlamada -inf sayılır. Silinen kullanıcının `usernames`
+    girdisi None'dır.
+    """
+
+    def __init__(self, matrix: np.ndarray, labels: np.ndarray, usernames: List[Optional[str]],
+                 prototypes: Optional[np.ndarray] = None,
+                 prototype_labels: Optional[np.ndarray] = None,
+                 codec: Optional[EmbeddingCodec] = None,
+                 ranges: Optional[np.ndarray] = None,
+                 prototype_ranges: Optional[np.ndarray] = None,
+                 user_index: Optional[Dict[str, int]] = None,
+                 segment=None):
+        """
+        Args:
+            matrix: (N, W) embedding matrisi - kodek formunda (float32 için (N, D))
+            labels: (N,) satır -> kullanıcı indeksi
+            usernames: Kullanıcı indeksi -> username (None -> silinmiş)
+            prototypes: (M, D) float32 kullanıcı prototipleri (centroid + kümeler)
+            prototype_labels: (M,) prototip -> kullanıcı indeksi
+            codec: Matrisin kodeği (None -> float32)
+            ranges: (U, 2) kullanıcı başına canlı satır aralığı
+                    (None -> etiketler bitişik, tombstone yok)
+            prototype_ranges: (U, 2) kullanıcı başına canlı prototip aralığı
+            user_index: username -> kullanıcı indeksi (None -> usernames'ten;
+                        galerinin sadece eklenen sözlüğü de verilebilir)
+            segment: Matris ve etiketler bir SharedGallerySegment'e view ise
+                     o segment (ShardedSearcher kopyalamadan yayınlar)
+        """
+        self.codec = codec or get_codec()
+        self.segment = segment
+        self.matrix = matrix
+        self.labels = labels
+        self.usernames = usernames
+        if user_index is None:
+            user_index = {name: i for i, name in enumerate(usernames) if name is not None}
+        self.user_index = user_index
+        self.ranges = ranges if ranges is not None else _contiguous_ranges(labels, len(usernames))
+        self.size = int((self.ranges[:, 1] - self.ranges[:, 0]).sum())
+
+        if prototypes is None:
+            prototypes = np.empty((0, 0), dtype=np.float32)
+            prototype_labels = np.empty(0, dtype=np.int32)
+        self.prototypes = prototypes
+        self.prototype_labels = prototype_labels
+        if prototype_ranges is None:
+            prototype_ranges = _contiguous_ranges(prototype_labels, len(usernames))
+        self.prototype_ranges = prototype_ranges
+
+        # Tombstone satırları ilk tam taramada bir kez hesaplanır
+        self._dead_rows: Optional[np.ndarray] = None
+        self._dead_prototypes: Optional[np.ndarray] = None
+
+    @property
+    def dead_rows(self) -> np.ndarray:
+        """Skorlanmayacak (tombstone) matris satırları"""
+        if self._dead_rows is None:
+            self._dead_rows = _dead_rows(self.labels, self.ranges)
+        return self._dead_rows
+
+    @property
+    def dead_prototypes(self) -> np.ndarray:
+        if self._dead_prototypes is None:
+            self._dead_prototypes = _dead_rows(self.prototype_labels, self.prototype_ranges)
+        return self._dead_prototypes
+
+    def live_matrix(self) -> np.ndarray:
+        """Sadece canlı satırlar (tombstone yoksa kopyasız)"""
+        if len(self.dead_rows) == 0:
+            return self.matrix
+        return np.delete(self.matrix, self.dead_rows, axis=0)
+
+    def user_rows(self, username: str) -> Optional[np.ndarray]:
+        """Bir kullanıcının (kodlanmış) embedding satırları (kopyasız view) veya None"""
+        i = self.user_index.get(username)
+        # Paylaşılan indeks bu snapshot'tan sonra eklenen kullanıcıları da içerebilir
+        if i is None or i >= len(self.usernames) or self.usernames[i] != username:
+            return None
+        start, end = self.ranges[i]
+        return self.matrix[start:end]
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Sorgu ile tüm galeri arasında benzerlik skorları (tek BLAS matmul)
+
+        Args:
+            query: (D,) veya (Q, D) sorgu embedding'i
+
+        Returns:
+            (N,) veya (Q, N) benzerlik skorları, [0, 1] skalasında
+            (tombstone satırlar -inf)
+        """
+        scores = self.row_scores(self.matrix, query)
+        if len(self.dead_rows):
+            scores[..., self.dead_rows] = -np.inf
+        return scores
+
+    def row_scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Kodlanmış satırlar için [0, 1] skalasında benzerlik skorları"""
+        raw = self.codec.dot(rows, query)
+        # compute_similarity ile aynı skala: [-1, 1] -> [0, 1]
+        return (raw + 1.0) / 2.0
+
+    def user_scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Kullanıcı başına en yüksek benzerlik skoru
+
+        Returns:
+            (U,) her kullanıcı için maksimum skor
+        """
+        scores = self.scores(query)
+        best = np.full(len(self.usernames), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.labels, scores)
+        return best
+
+    def aggregate_users(self, row_scores: np.ndarray,
+                        top_m: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Satır skorlarını kullanıcı bazında birleştirir
+
+        Args:
+            row_scores: (N,) galeri satırı başına skor
+            top_m: Ortalaması alınacak en iyi skor sayısı
+
+        Returns:
+            (max_scores, mean_top_m) - her biri (U,); embedding'i olmayan
+            kullanıcılar için -inf
+        """
+        n_users = len(self.usernames)
+        best = np.full(n_users, -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.labels, row_scores)
+
+        # Kullanıcı içinde azalan skor sırası; tombstone satırlar (-inf) sona düşer
+        offsets = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.labels, minlength=n_users), out=offsets[1:])
+        order = np.lexsort((-row_scores, self.labels))
+        sorted_labels = self.labels[order]
+        rank = np.arange(len(order)) - offsets[sorted_labels]
+        keep = (rank < top_m) & np.isfinite(row_scores[order])
+
+        sums = np.bincount(sorted_labels[keep], weights=row_scores[order][keep],
+                           minlength=n_users)
+        counts = np.bincount(sorted_labels[keep], minlength=n_users)
+        mean_top = np.full(n_users, -np.inf, dtype=np.float32)
+        has_rows = counts > 0
+        mean_top[has_rows] = sums[has_rows] / counts[has_rows]
+        return best, mean_top
+
+    def prototype_shortlist(self, query: np.ndarray, k: int) -> List[str]:
+        """
+        Kaba aşama: prototiplere göre en yakın k kullanıcı
+
+        Args:
+            query: (D,) L2 normalize sorgu
+            k: Seçilecek kullanıcı sayısı
+
+        Returns:
+            Kullanıcı adları (prototip skoruna göre azalan sırada)
+        """
+        if len(self.prototypes) == 0 or k <= 0:
+            return []
+
+        raw = self.prototypes @ np.asarray(query, dtype=np.float32)
+        raw[self.dead_prototypes] = -np.inf
+        best = np.full(len(self.usernames), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.prototype_labels, raw)
+
+        k = min(k, len(best))
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+        return [self.usernames[i] for i in top if np.isfinite(best[i])]
+
+
+class _RowBuffer:
+    """
+    Sadece sona eklenen, kapasitesi ikiye katlanarak büyüyen satır tamponu
+
+    Snapshot'lar tamponun [0, used) aralığına view tutar. Yeni satırlar bu
+    aralığın dışına yazılır, büyüme ise yeni dizi ayırır; bu yüzden
+    yayınlanmış snapshot'lar hiçbir zaman değişmez.
+
+    `allocate` verilirse diziler onun döndürdüğü shared memory segmentinde
+    ayrılır (ShardedSearcher.allocate); worker'lar aynı belleği okur.
+    """
+
+    def __init__(self, width: int, dtype, capacity: int = 0,
+                 allocate: Optional[Callable[[int], Any]] = None):
+        self.allocate = allocate
+        self.segment = None
+        self.rows = np.empty((0, width), dtype=dtype)
+        self.labels = np.empty(0, dtype=np.int32)
+        self.used = 0
+        if capacity:
+            self._grow(capacity)
+
+    def append(self, block: np.ndarray, label: int) -> Tuple[int, int]:
+        """Bloğu sona ekler, [başlangıç, bitiş) satır aralığını döndürür"""
+        start, end = self.used, self.used + len(block)
+        if end > len(self.rows):
+            self._grow(max(end, 2 * len(self.rows), 64))
+        self.rows[start:end] = block
+        self.labels[start:end] = label
+        self.used = end
+        return start, end
+
+    def _grow(self, capacity: int):
+        if self.allocate is not None:
+            segment = self.allocate(capacity)
+            rows, labels = segment.matrix, segment.labels
+        else:
+            segment = None
+            rows = np.empty((capacity, self.rows.shape[1]), dtype=self.rows.dtype)
+            labels = np.empty(capacity, dtype=np.int32)
+        rows[:self.used] = self.rows[:self.used]
+        labels[:self.used] = self.labels[:self.used]
+        self.rows, self.labels, self.segment = rows, labels, segment
+
+
+class EmbeddingGallery:
+    """
+    Süreç içinde yaşayan (resident) embedding galerisi
+
+    Tüm kullanıcıların deşifre edilmiş embedding'lerini tek bir bitişik
+    float32 (N x D) matriste ve satır -> kullanıcı indeksinde tutar; her
+    istekte sadece sorgu ile tek bir matris çarpımı yapılır.
+
+    Matris kapasitesi ikiye katlanan bir tampondur: eklenen / güncellenen
+    kullanıcının satırları sona yazılır, eski satırları tombstone olur ve
+    yeni snapshot tampona view olarak yayınlanır (değişiklik başına tüm
+    matris kopyalanmaz). Tombstone'lar canlı satırların dörtte birini
+    aşınca tampon sıkıştırılır.
+
+    1:N aramada aday seçimi için iki opsiyonel kaba aşama vardır:
+    bir ANN indeksi veya kullanıcı prototipleri (shortlist_k > 0).
+    Her iki durumda da adayların tüm embedding'leri tam skorlanır.
+    ANN indeksi arka plan thread'inde kurulur / yeniden eğitilir; ilk
+    kurulum bitene kadar 1:N arama indeks olmadan yapılır.
+    """
+
+    def __init__(self, crypto_manager, embedding_dim: int = 512,
+                 index: Optional[ANNIndex] = None, rerank_k: int = 10,
+                 shortlist_k: int = 0, codec: Optional[EmbeddingCodec] = None,
+                 searcher=None, store=None, decrypt_workers: int = 0):
+        """
+        Args:
+            crypto_manager: Embedding'leri deşifre etmek için CryptoManager
+            embedding_dim: Embedding vektör boyutu
+            index: Opsiyonel ANN indeksi (None -> tam tarama)
+            rerank_k: İndeksten alınıp tam skorlanacak aday kullanıcı sayısı
+            shortlist_k: Prototiplerle seçilecek aday kullanıcı sayısı (0 -> kapalı)
+            codec: Bellekteki matrisin kodeği (None -> float32)
+            searcher: Opsiyonel ShardedSearcher (tam taramayı worker'lara böler)
+            store: Opsiyonel EmbeddingStore (slot referanslı kayıtlar ve mühürlü blob'lar için)
+            decrypt_workers: Toplu deşifrede kullanılacak thread sayısı
+        """
+        self.crypto_manager = crypto_manager
+        self.embedding_dim = embedding_dim
+        self.codec = codec or get_codec()
+        self.code_width = (self.codec.code_size(embedding_dim)
+                           // np.dtype(self.codec.dtype).itemsize)
+        self.index = index
+        self.rerank_k = rerank_k
+        self.shortlist_k = shortlist_k
+        self.searcher = searcher
+        self.store = store
+        self.decrypt_workers = decrypt_workers
+
+        self._lock = threading.Lock()
+        self._versions: Dict[str, Tuple] = {}
+        # Kullanıcı -> tampon indeksi (slot); silinen kullanıcının slot'u
+        # sıkıştırmaya kadar kalır, yeniden eklenirse tekrar kullanılır
+        self._slots: Dict[str, int] = {}
+        self._names: List[Optional[str]] = []
+        self._ranges = np.zeros((0, 2), dtype=np.int64)
+        self._prototype_ranges = np.zeros((0, 2), dtype=np.int64)
+        # Paralel aramada kod matrisi doğrudan shared memory'de tutulur
+        self._allocate_rows = None
+        if searcher is not None:
+            self._allocate_rows = lambda capacity: searcher.allocate(
+                capacity, self.code_width, self.codec
+            )
+        self._rows = _RowBuffer(self.code_width, self.codec.dtype, allocate=self._allocate_rows)
+        self._protos = _RowBuffer(embedding_dim, np.float32)
+        self._live_rows = 0
+        # Her _put_user'da artan sayaç (arka plan indeks kurulumunun yetişmesi için)
+        self._put_seq: Dict[str, int] = {}
+        self._puts = 0
+        self._snapshot = self._empty_snapshot()
+        # Arka plan ANN indeks kurulumu (bkz. _index_build_loop)
+        self._index_thread: Optional[threading.Thread] = None
+        self._rebuild_requested = False
+
+    def _empty_snapshot(self) -> GallerySnapshot:
+        return GallerySnapshot(
+            np.empty((0, self.code_width), dtype=self.codec.dtype),
+            np.empty(0, dtype=np.int32),
+            [],
+            codec=self.codec
+        )
+
+    @staticmethod
+    def _user_version(user: Dict[str, Any]) -> Tuple:
+        """Kullanıcı dokümanının değişip değişmediğini anlamak için ucuz imza"""
+        return (
+            user.get('_id'),
+            user.get('updated_at'),
+            len(user.get('embeddings', [])),
+            len(user.get('prototypes', [])),
+            user.get('embedding_count')
+        )
+
+    def _record(self, emb_doc: Dict[str, Any]) -> Tuple:
+        """
+        Dokümanın (encrypted, hmac, key_id) üçlüsü - 'slot' kayıtları mmap
+        sayfalarını gösterir
+        """
+        if 'slot' in emb_doc:
+            if self.store is None:
+                raise ValueError("Slot referanslı embedding için EmbeddingStore gerekli")
+            encrypted, mac = self.store.record(emb_doc['slot'])
+            return encrypted, mac, emb_doc.get('kid')
+        return emb_doc['encrypted'], emb_doc['hmac'], emb_doc.get('kid')
+
+    def _plaintext(self, emb_doc: Dict[str, Any]) -> bytes:
+        """Tek dokümanın plaintext'i"""
+        encrypted, mac, key_id = self._record(emb_doc)
+        if isinstance(encrypted, str):
+            return self.crypto_manager.decrypt_bytes(encrypted, mac, key_id=key_id)
+        return self.crypto_manager.decrypt_record(encrypted, mac, key_id=key_id)
+
+    def _decrypt_docs(self, docs: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Şifreli embedding dokümanlarını galeri kodeğinde (k, W) matrise deşifre eder
+
+        Kayıt galeri ile aynı kodekle saklanmışsa plaintext çözülmeden
+        doğrudan satıra yazılır.
+        """
+        block = np.empty((len(docs), self.code_width), dtype=self.codec.dtype)
+        if all(get_codec(emb_doc.get('codec')) is self.codec for emb_doc in docs):
+            # Tek kodek: plaintext'ler doğrudan blok satırlarına yazılır
+            records = [self._record(emb_doc) for emb_doc in docs]
+            return self.crypto_manager.decrypt_into(records, block,
+                                                    workers=self.decrypt_workers)
+
+        for i, emb_doc in enumerate(docs):
+            plaintext = self._plaintext(emb_doc)
+            stored_codec = get_codec(emb_doc.get('codec'))
+            codes = stored_codec.from_bytes(plaintext, self.embedding_dim)
+            if stored_codec is self.codec:
+                block[i] = codes
+            else:
+                block[i] = self.codec.encode(stored_codec.decode(codes[None, :]))[0]
+        return block
+
+    def _open_sealed(self, user: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Mühürlü kullanıcı kaydını (galeri kodeğinde blok, float32 prototipler) olarak açar"""
+        record = self.crypto_manager.open_sealed(
+            sealed_blob(user, self.store), user_associated_data(user['_id'], user['username'])
+        )
+        if record.dim != self.embedding_dim:
+            raise ValueError(f"Embedding boyutu uyuşmuyor: {record.dim} != {self.embedding_dim}")
+
+        if len(record.codes) == 0:
+            return np.empty((0, self.code_width), dtype=self.codec.dtype), record.prototypes
+
+        stored_codec = get_codec(record.codec)
+        if record.codes.shape[1] != stored_codec.code_size(record.dim):
+            raise ValueError(f"Kod boyutu uyuşmuyor ({record.codec})")
+        codes = record.codes.view(stored_codec.dtype)
+        if stored_codec is not self.codec:
+            codes = self.codec.encode(stored_codec.decode(codes))
+        return codes, record.prototypes
+
+    def decode_user(self, user: Dict[str, Any]) -> np.ndarray:
+        """Tek kullanıcının kayıtlarını galeri kodeğinde (k, W) bloğa deşifre eder"""
+        if 'sealed' in user:
+            return self._open_sealed(user)[0]
+        return self._decrypt_docs(user.get('embeddings', []))
+
+    def _decrypt_vectors(self, docs: List[Dict[str, Any]]) -> np.ndarray:
+        """Şifreli dokümanları (k, D) float32 matrise deşifre eder (prototipler için)"""
+        codecs = {emb_doc.get('codec') for emb_doc in docs}
+        if len(codecs) == 1:
+            records = [self._record(emb_doc) for emb_doc in docs]
+            return self.crypto_manager.decrypt_many(
+                records, embedding_dim=self.embedding_dim,
+                codec=get_codec(codecs.pop()), workers=self.decrypt_workers
+            )
+
+        block = np.empty((len(docs), self.embedding_dim), dtype=np.float32)
+        for i, emb_doc in enumerate(docs):
+            stored_codec = get_codec(emb_doc.get('codec'))
+            codes = stored_codec.from_bytes(self._plaintext(emb_doc), self.embedding_dim)
+            block[i] = stored_codec.decode(codes[None, :])[0]
+        return block
+
+    def sync(self, users: List[Dict[str, Any]]) -> bool:
+        """
+        Galeriyi store ile eşitler
+
+        Sadece yeni eklenen veya değişen kullanıcılar deşifre edilir,
+        silinen kullanıcılar galeriden çıkarılır.
+
+        Args:
+            users: DBManager.get_all_users() çıktısı
+
+        Returns:
+            Galeri değiştiyse True
+        """
+        with self._lock:
+            seen = set()
+            stale = []
+
+            for user in users:
+                username = user['username']
+                seen.add(username)
+                if self._versions.get(username) != self._user_version(user):
+                    stale.append(user)
+
+            # Eski formattaki değişen kullanıcıların kayıtları tek toplu
+            # çağrıda deşifre edilir; mühürlü kayıtlar zaten tek blob
+            legacy = [user for user in stale if 'sealed' not in user]
+            docs = [user.get('embeddings', []) for user in legacy]
+            block = self._decrypt_docs([emb_doc for user_docs in docs for emb_doc in user_docs])
+            bounds = np.cumsum([0] + [len(user_docs) for user_docs in docs])
+            for user, start, end in zip(legacy, bounds[:-1], bounds[1:]):
+                self._put_user(user, block[start:end])
+
+            for user in stale:
+                if 'sealed' in user:
+                    self._put_user(user)
+            changed = bool(stale)
+
+            for username in list(self._versions):
+                if username not in seen:
+                    self._drop_user(username)
+                    changed = True
+
+            if changed:
+                self._publish()
+            return changed
+
+    def on_store_event(self, event: str, username: str,
+                       user_doc: Optional[Dict[str, Any]] = None):
+        """
+        DBManager değişiklik dinleyicisi - tek kullanıcıyı artımlı günceller
+
+        'update' olayında (ör. anahtar rotasyonu, başka süreçten yeniden
+        yükleme) embedding'ler değişmediyse yeniden deşifre edilmez.
+
+        Args:
+            event: 'create', 'update' veya 'delete'
+            username: Değişen kullanıcı
+            user_doc: 'create' / 'update' için kullanıcı dokümanı
+        """
+        with self._lock:
+            if event == 'create' and user_doc is not None:
+                self._put_user(user_doc)
+            elif event == 'update' and user_doc is not None:
+                if self._versions.get(username) == self._user_version(user_doc):
+                    return
+                self._put_user(user_doc)
+            elif event == 'delete' and username in self._versions:
+                self._drop_user(username)
+            else:
+                return
+            self._publish()
+
+    def _put_user(self, user: Dict[str, Any], block: Optional[np.ndarray] = None):
+        username = user['username']
+        prototypes = None
+        if 'sealed' in user:
+            block, prototypes = self._open_sealed(user)
+        elif block is None:
+            block = self._decrypt_docs(user.get('embeddings', []))
+
+        if prototypes is None and user.get('prototypes'):
+            prototypes = self._decrypt_vectors(user['prototypes'])
+        if prototypes is None or len(prototypes) == 0:
+            # Kayıtlı prototip yoksa (eski kayıtlar) centroid'i burada hesapla
+            prototypes = compute_prototypes(self.codec.decode(block))
+
+        self._store_rows(username, block, prototypes)
+        self._versions[username] = self._user_version(user)
+        self._puts += 1
+        self._put_seq[username] = self._puts
+        if self.index is not None and self.index.is_trained:
+            self.index.remove(username)
+            self.index.add(username, self.codec.decode(block))
+
+    def _drop_user(self, username: str):
+        slot = self._slots[username]
+        self._live_rows -= int(self._ranges[slot, 1] - self._ranges[slot, 0])
+        self._ranges[slot] = 0
+        self._prototype_ranges[slot] = 0
+        self._names[slot] = None
+        del self._versions[username]
+        del self._put_seq[username]
+        if self.index is not None and self.index.is_trained:
+            self.index.remove(username)
+
+    def _store_rows(self, username: str, block: np.ndarray, prototypes: np.ndarray):
+        """Kullanıcının satırlarını tampon sonuna yazar; eski satırları tombstone olur"""
+        slot = self._slots.get(username)
+        if slot is None:
+            slot = self._slots[username] = len(self._names)
+            self._names.append(username)
+            if slot >= len(self._ranges):
+                capacity = max(2 * len(self._ranges), 64)
+                self._ranges = np.resize(self._ranges, (capacity, 2))
+                self._prototype_ranges = np.resize(self._prototype_ranges, (capacity, 2))
+        else:
+            self._live_rows -= int(self._ranges[slot, 1] - self._ranges[slot, 0])
+            self._names[slot] = username
+
+        self._ranges[slot] = self._rows.append(block, slot)
+        self._prototype_ranges[slot] = self._protos.append(prototypes, slot)
+        self._live_rows += len(block)
+
+    def _user_block(self, username: str) -> np.ndarray:
+        """Kullanıcının güncel satırları (tampon view'ı)"""
+        start, end = self._ranges[self._slots[username]]
+        return self._rows.rows[start:end]
+
+    def _compaction_due(self) -> bool:
+        dead_rows = self._rows.used - self._live_rows
+        dead_slots = len(self._names) - len(self._versions)
+        return dead_rows > self._live_rows // 4 or dead_slots > len(self._versions)
+
+    def _compact(self):
+        """Canlı satırları yeni tampona taşır, tombstone'ları ve boş slot'ları atar"""
+        rows, protos = self._rows, self._protos
+        ranges, prototype_ranges = self._ranges, self._prototype_ranges
+        live = [(name, slot) for slot, name in enumerate(self._names) if name is not None]
+        live_protos = sum(int(prototype_ranges[slot, 1] - prototype_ranges[slot, 0])
+                          for _, slot in live)
+
+        # Sıkıştırmadan hemen sonra yeniden büyümemek için pay bırakılır
+        self._rows = _RowBuffer(self.code_width, self.codec.dtype,
+                                self._live_rows + self._live_rows // 2,
+                                allocate=self._allocate_rows)
+        self._protos = _RowBuffer(self.embedding_dim, np.float32,
+                                  live_protos + live_protos // 2)
+        self._slots, self._names = {}, []
+        self._ranges = np.zeros((0, 2), dtype=np.int64)
+        self._prototype_ranges = np.zeros((0, 2), dtype=np.int64)
+        self._live_rows = 0
+        for name, slot in live:
+            (start, end), (proto_start, proto_end) = ranges[slot], prototype_ranges[slot]
+            self._store_rows(name, rows.rows[start:end], protos.rows[proto_start:proto_end])
+
+    def _publish(self):
+        """Yeni snapshot'ı yayınlar; ANN indeksi eğitim gerektiriyorsa arka planda kurdurur"""
+        if self._compaction_due():
+            self._compact()
+        snapshot = self._build_snapshot()
+        if self.searcher is not None:
+            self.searcher.publish(snapshot)
+        self._snapshot = snapshot
+        if self._index_build_due(self.index, snapshot):
+            self._start_index_build()
+
+    @staticmethod
+    def _index_build_due(index: Optional[ANNIndex], snapshot: GallerySnapshot) -> bool:
+        """İlk eğitim eşiği aşıldı mı veya galeri son eğitimden beri yeterince büyüdü mü"""
+        if index is None:
+            return False
+        if not index.is_trained:
+            return snapshot.size >= max(index.min_train_size, 1)
+        return index.needs_retrain(snapshot.size)
+
+    def _start_index_build(self):
+        # self._lock altında çağrılır; çalışan kurulum bitince durumu yeniden kontrol eder
+        if self._index_thread is None:
+            self._index_thread = threading.Thread(target=self._index_build_loop,
+                                                  name='ann-index-build', daemon=True)
+            self._index_thread.start()
+
+    def _index_build_loop(self):
+        """
+        ANN indeksini yayınlanmış snapshot'tan kilit dışında kurar
+
+        k-means ve tüm galerinin deşifresi yazmaları ve kayıt isteklerini
+        bekletmez. Kurulum sürerken eski indeks artımlı güncellenmeye ve
+        aramalara hizmet etmeye devam eder; yeni indeks kilit altında, arada
+        değişen kullanıcılar eklenip çıkarıldıktan sonra tek atamayla geçer.
+        """
+        while True:
+            with self._lock:
+                index, snapshot = self.index, self._snapshot
+                if not (self._rebuild_requested or self._index_build_due(index, snapshot)) \
+                        or index is None or snapshot.size == 0:
+                    self._index_thread = None
+                    return
+                self._rebuild_requested = False
+                put_seq = dict(self._put_seq)
+
+            try:
+                fresh = index.untrained_copy()
+                fresh.train(self.codec.decode(snapshot.live_matrix()))
+                for username in put_seq:
+                    fresh.add(username, self.codec.decode(snapshot.user_rows(username)))
+            except Exception as e:
+                print(f"⚠️  ANN indeksi kurulamadı: {e}")
+                with self._lock:
+                    self._index_thread = None
+                return
+
+            with self._lock:
+                # Kurulum sırasında eklenen / güncellenen / silinen kullanıcılar
+                for username, seq in self._put_seq.items():
+                    if put_seq.get(username) != seq:
+                        fresh.remove(username)
+                        fresh.add(username, self.codec.decode(self._user_block(username)))
+                for username in put_seq:
+                    if username not in self._put_seq:
+                        fresh.remove(username)
+                self.index = fresh
+
+    def rebuild_index(self, wait: bool = False, timeout: Optional[float] = None) -> bool:
+        """
+        ANN indeksini mevcut galeriyle arka planda yeniden kurar (ör. toplu kayıt sonrası)
+
+        Args:
+            wait: Kurulumun bitmesini bekle
+            timeout: Bekleme süresi sınırı (saniye)
+
+        Returns:
+            Bekleme sonunda kurulum tamamlandıysa True
+        """
+        with self._lock:
+            if self.index is None:
+                return True
+            self._rebuild_requested = True
+            self._start_index_build()
+        return self.wait_for_index(timeout) if wait else False
+
+    def wait_for_index(self, timeout: Optional[float] = None) -> bool:
+        """
+        Süren ANN indeks kurulumunun bitmesini bekler
+
+        Returns:
+            Bekleyen kurulum kalmadıysa True
+        """
+        thread = self._index_thread
+        if thread is not None:
+            thread.join(timeout)
+        return self._index_thread is None
+
+    def _build_snapshot(self) -> GallerySnapshot:
+        """Tamponların dolu kısmına view'lardan snapshot oluşturur (matris kopyalanmaz)"""
+        if not self._names:
+            return self._empty_snapshot()
+
+        users = len(self._names)
+        rows, protos = self._rows, self._protos
+        return GallerySnapshot(
+            rows.rows[:rows.used], rows.labels[:rows.used], list(self._names),
+            protos.rows[:protos.used], protos.labels[:protos.used],
+            codec=self.codec,
+            ranges=self._ranges[:users].copy(),
+            prototype_ranges=self._prototype_ranges[:users].copy(),
+            user_index=self._slots,
+            segment=rows.segment
+        )
+
+    @property
+    def snapshot(self) -> GallerySnapshot:
+        """Güncel snapshot (lock gerektirmez, referans ataması atomiktir)"""
+        return self._snapshot
+
+    def __len__(self) -> int:
+        return self._snapshot.size
+
+    def best_match(self, query: np.ndarray,
+                   username: Optional[str] = None) -> Tuple[Optional[str], float]:
+        """
+        En yüksek benzerliğe sahip kullanıcıyı bulur
+
+        Args:
+            query: (D,) L2 normalize sorgu embedding'i
+            username: Verilirse sadece bu kullanıcıya karşı (1:1) arar
+
+        Returns:
+            (username, similarity) - galeri boşsa (None, 0.0)
+        """
+        snap = self._snapshot
+
+        if username is not None:
+            rows = snap.user_rows(username)
+            if rows is None or len(rows) == 0:
+                return None, 0.0
+            return username, float(snap.row_scores(rows, query).max())
+
+        if snap.size == 0:
+            return None, 0.0
+
+        candidates = self._candidates(snap, query, 1)
+        if candidates:
+            return candidates[0]
+
+        if self.searcher is not None and self.searcher.accepts(snap):
+            return self.searcher.search(snap, query, 1)[0]
+
+        scores = snap.scores(query)
+        idx = int(np.argmax(scores))
+        return snap.usernames[snap.labels[idx]], float(scores[idx])
+
+    def _candidate_users(self, snap: GallerySnapshot, query: np.ndarray,
+                         k: int) -> List[str]:
+        """Kaba aşama: ANN indeksi veya prototiplerden aday kullanıcılar"""
+        index = self.index
+        if index is not None and index.is_trained and len(index) > 0:
+            return [name for name, _ in index.search(query, max(k, self.rerank_k))]
+        if self.shortlist_k > 0:
+            return snap.prototype_shortlist(query, max(k, self.shortlist_k))
+        return []
+
+    def _candidates(self, snap: GallerySnapshot, query: np.ndarray,
+                    k: int) -> List[Tuple[str, float]]:
+        """
+        Aday kullanıcıları tüm embedding'leriyle tam skorlayıp sıralar
+
+        Returns:
+            [(username, similarity), ...] azalan sırada; kaba aşama yoksa []
+        """
+        query = np.asarray(query, dtype=np.float32)
+        results = []
+        for username in self._candidate_users(snap, query, k):
+            rows = snap.user_rows(username)
+            if rows is None or len(rows) == 0:
+                continue
+            results.append((username, float(snap.row_scores(rows, query).max())))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
+
+    def rank_users(self, queries: np.ndarray, k: int = 5, top_m: int = 3,
+                   rank_by: str = 'max') -> List[Dict[str, Any]]:
+        """
+        Bir veya birden fazla sorgu için sıralı top-k aday kullanıcı listesi
+
+        Tüm sorgular tek bir (Q x N) matris çarpımı ile skorlanır; her galeri
+        satırı için sorgular arasındaki en iyi skor alınır ve kullanıcı
+        bazında max ve en iyi m skorun ortalaması hesaplanır.
+
+        Args:
+            queries: (D,) veya (Q, D) L2 normalize sorgu embedding'leri
+            k: Döndürülecek kullanıcı sayısı
+            top_m: Ortalama skor için kullanılacak en iyi embedding sayısı
+            rank_by: Sıralama ölçütü - 'max' veya 'mean'
+
+        Returns:
+            [{'username', 'max_similarity', 'mean_similarity'}, ...] azalan sırada
+        """
+        if rank_by not in ('max', 'mean'):
+            raise ValueError(f"Geçersiz sıralama ölçütü: {rank_by}")
+
+        snap = self._snapshot
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if snap.size == 0 or k <= 0 or len(queries) == 0:
+            return []
+
+        # Kaba aşama varsa sadece aday kullanıcıların satırları skorlanır
+        candidates = set()
+        for query in queries:
+            candidates.update(self._candidate_users(snap, query, k))
+
+        if candidates:
+            names = sorted(candidates)
+            sub = GallerySnapshot(
+                np.concatenate([snap.user_rows(name) for name in names], axis=0),
+                np.repeat(np.arange(len(names), dtype=np.int32),
+                          [len(snap.user_rows(name)) for name in names]),
+                names,
+                codec=snap.codec
+            )
+        else:
+            sub = snap
+
+        row_scores = sub.scores(queries).max(axis=0)
+        best, mean_top = sub.aggregate_users(row_scores, top_m)
+
+        key = best if rank_by == 'max' else mean_top
+        k = min(k, len(key))
+        top = np.argpartition(-key, k - 1)[:k]
+        top = top[np.argsort(-key[top])]
+        return [
+            {
+                'username': sub.usernames[i],
+                'max_similarity': float(best[i]),
+                'mean_similarity': float(mean_top[i])
+            }
+            for i in top if np.isfinite(key[i])
+        ]
+
+    def top_k(self, query: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Kullanıcı bazında en yüksek k eşleşme
+
+        Args:
+            query: (D,) L2 normalize sorgu embedding'i
+            k: Döndürülecek kullanıcı sayısı
+
+        Returns:
+            [(username, similarity), ...] azalan sırada
+        """
+        snap = self._snapshot
+        if snap.size == 0 or k <= 0:
+            return []
+
+        candidates = self._candidates(snap, query, k)
+        if candidates:
+            return candidates[:k]
+
+        if self.searcher is not None and self.searcher.accepts(snap):
+            return self.searcher.search(snap, query, k)
+
+        best = snap.user_scores(query)
+        k = min(k, len(best))
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+        top = top[np.isfinite(best[top])]
+        return [(snap.usernames[i], float(best[i])) for i in top]
+
+
+class TemplateCache:
+    """
+    Kullanıcı başına deşifre edilmiş şablonların sınırlı LRU önbelleği
+
+    1:1 doğrulamada galerinin tamamı bellekte değilse sadece doğrulanan
+    kullanıcının kaydı store'dan yüklenip deşifre edilir. En uzun süredir
+    kullanılmayan kullanıcılar `capacity` aşılınca atılır; store değişiklik
+    olayları ilgili kaydı geçersiz kılar.
+    """
+
+    def __init__(self, gallery: EmbeddingGallery,
+                 loader: Callable[[str], Optional[Dict[str, Any]]],
+                 capacity: int = 1024):
+        """
+        Args:
+            gallery: Deşifre ve kodek ayarları için EmbeddingGallery
+                     (galerinin kendisi boş kalabilir)
+            loader: loader(username) -> user_doc veya None (ör. get_user_by_username)
+            capacity: Önbellekteki en fazla kullanıcı
+        """
+        self.gallery = gallery
+        self.loader = loader
+        self.capacity = max(capacity, 1)
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[Tuple, np.ndarray]]' = OrderedDict()
+        # Yükleme sırasında gelen geçersiz kılmaları fark etmek için sayaç
+        self._invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, username: str) -> Optional[np.ndarray]:
+        """
+        Kullanıcının galeri kodeğindeki şablon bloğu
+
+        Returns:
+            (k, W) blok veya None (kullanıcı yoksa)
+        """
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            invalidations = self._invalidations
+
+        # Yükleme ve deşifre kilit dışında (diğer kullanıcılar beklemez)
+        user = self.loader(username)
+        if user is None:
+            return None
+        block = self.gallery.decode_user(user)
+
+        with self._lock:
+            if invalidations == self._invalidations:
+                self._entries[username] = (EmbeddingGallery._user_version(user), block)
+                self._entries.move_to_end(username)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+        return block
+
+    def best_match(self, query: np.ndarray, username: str) -> Tuple[Optional[str], float]:
+        """
+        1:1 doğrulama - EmbeddingGallery.best_match(query, username) ile aynı sonuç
+
+        Returns:
+            (username, similarity) - kullanıcı yoksa veya embedding'i yoksa (None, 0.0)
+        """
+        block = self.get(username)
+        if block is None or len(block) == 0:
+            return None, 0.0
+        raw = self.gallery.codec.dot(block, np.asarray(query, dtype=np.float32))
+        # GallerySnapshot.row_scores ile aynı skala: [-1, 1] -> [0, 1]
+        return username, float(((raw + 1.0) / 2.0).max())
+
+    def clear(self):
+        """Tüm şablonları atar (ör. galerinin tamamı yüklendiğinde)"""
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def invalidate(self, username: str):
+        """Kullanıcının önbellekteki şablonunu atar"""
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(username, None)
+
+    def on_store_event(self, event: str, username: str,
+                       user_doc: Optional[Dict[str, Any]] = None):
+        """
+        Store değişiklik dinleyicisi
+
+        'update' olayında embedding'ler değişmediyse (ör. anahtar rotasyonu)
+        şablon korunur.
+        """
+        if event == 'update' and user_doc is not None:
+            with self._lock:
+                entry = self._entries.get(username)
+                if entry is not None and entry[0] == EmbeddingGallery._user_version(user_doc):
+                    return
+        self.invalidate(username)
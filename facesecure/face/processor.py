@@ -3,8 +3,9 @@ Embedding işleme modülü - Yüz embedding'lerini üretir ve normalize eder
 """
 import numpy as np
 import cv2
-from typing import Optional
-from keras_facenet import FaceNet
+from typing import List, Optional, Sequence
+
+from face.backends import FACENET_INPUT_SIZE, create_backend
 
 
 class FaceEmbeddingProcessor:
@@ -14,19 +15,33 @@ class FaceEmbeddingProcessor:
     FaceNet modelini kullanarak 512 boyutlu embedding vektörleri üretir.
     """
     
-    def __init__(self, model_path: Optional[str] = None, embedding_dim: int = 512):
+    def __init__(self, model_path: Optional[str] = None, embedding_dim: int = 512,
+                 backend: Optional[str] = None, threads: int = 0,
+                 compiled: bool = True, jit_compile: bool = False,
+                 buckets: Optional[Sequence[int]] = None):
         """
         Args:
-            model_path: Model dosyasının yolu (kullanılmıyor, keras-facenet otomatik indirir)
+            model_path: 'onnx' / 'tflite' backend'i için model dosyası
+                        (keras'ta kullanılmıyor, keras-facenet otomatik indirir)
             embedding_dim: Embedding vektör boyutu (FaceNet için 512)
+            backend: 'keras' | 'onnx' | 'tflite' (None -> keras)
+            threads: Backend CPU thread sayısı (0 -> varsayılan)
+            compiled: keras için sabit imzalı tf.function yolu
+            jit_compile: keras için XLA derlemesi
+            buckets: Batch'lerin tamamlanacağı boyutlar (ör. 1, 4, 8, 16, 32);
+                     sabit şekilli backend'lerde her forward pass hazır bir graph'a gider
         """
         self.model_path = model_path
         self.embedding_dim = embedding_dim
+        self.backend = (backend or 'keras').lower()
+        self.buckets = sorted(set(buckets)) if buckets else []
         
-        # Gerçek FaceNet modelini yükle
-        print("🔄 FaceNet modeli yükleniyor...")
+        # FaceNet modelini seçilen backend ile yükle
+        print(f"🔄 FaceNet modeli yükleniyor ({self.backend})...")
         try:
-            self.model = FaceNet()
+            self.model = create_backend(self.backend, model_path, threads=threads,
+                                        compiled=compiled, jit_compile=jit_compile)
+            self.embedding_dim = self.model.embedding_dim
             print("✅ FaceNet modeli başarıyla yüklendi!")
         except Exception as e:
             print(f"❌ FaceNet modeli yüklenemedi: {e}")
@@ -46,42 +61,93 @@ class FaceEmbeddingProcessor:
             Embedding vektörü (512,) shape'inde numpy array (FaceNet)
             veya (128,) shape (stub mode)
         """
+        return self.get_embeddings([face_image], normalize=normalize)[0]
+    
+    def get_embeddings(self, face_images: List[np.ndarray], normalize: bool = True,
+                       batch_size: int = 32) -> np.ndarray:
+        """
+        Birden fazla yüz crop'undan tek forward pass ile embedding üretir
+        
+        Crop'lar 160x160'a getirilip tek tensörde birleştirilir; model
+        görüntü başına değil batch_size'lık parçalar halinde çalışır. Bucket'lar
+        tanımlıysa her parça en yakın bucket boyutuna boş görüntülerle
+        tamamlanır (dolgu satırlarının çıktısı atılır).
+        
+        Args:
+            face_images: Aligned yüz crop'ları (BGR, boyutları farklı olabilir)
+            normalize: L2 normalizasyonu uygulansın mı?
+            batch_size: Tek forward pass'teki en fazla görüntü sayısı
+            
+        Returns:
+            (n, embedding_dim) float32 embedding matrisi
+        """
+        if not face_images:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        
+        embeddings = None
         if self.model is not None:
             # Gerçek FaceNet inference
             try:
                 # FaceNet için preprocessing
-                # 1. BGR -> RGB dönüşümü
-                face_rgb = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-                
-                # 2. 160x160 resize (FaceNet input size)
-                face_resized = cv2.resize(face_rgb, (160, 160))
-                
-                # 3. Expand dimensions (batch dimension)
-                face_batch = np.expand_dims(face_resized, axis=0)
+                # 1. 160x160 resize (FaceNet input size) ve tek tensörde birleştirme
+                size = (FACENET_INPUT_SIZE, FACENET_INPUT_SIZE)
+                faces = np.stack([cv2.resize(face, size) for face in face_images])
                 
-                # 4. Embedding üret
-                embedding = self.model.embeddings(face_batch)[0]
+                # 2. BGR -> RGB dönüşümü (tüm batch için tek seferde)
+                faces = np.ascontiguousarray(faces[..., ::-1])
                 
-                # 5. Normalize
-                if normalize:
-                    embedding = self._normalize(embedding)
-                
-                return embedding
+                # 3. Embedding üret (batch_size'lık, bucket'a tamamlanmış parçalar)
+                if self._bucketed():
+                    batch_size = min(batch_size, self.buckets[-1])
+                embeddings = np.concatenate([
+                    self._forward(faces[start:start + batch_size])
+                    for start in range(0, len(faces), batch_size)
+                ]).astype(np.float32)
             except Exception as e:
                 print(f"❌ FaceNet inference hatası: {e}")
                 print("⚠️  Stub embedding'e geri dönülüyor...")
                 # Hata durumunda stub'a düş
-                pass
+                embeddings = None
         
-        # Stub implementation: Deterministik rastgele embedding
-        seed = int(np.mean(face_image) * 1000) % 10000
-        np.random.seed(seed)
-        embedding = np.random.randn(self.embedding_dim).astype(np.float32)
+        if embeddings is None:
+            embeddings = np.stack([self._stub_embedding(face) for face in face_images])
         
+        # 4. Normalize (satır bazında)
         if normalize:
-            embedding = self._normalize(embedding)
+            embeddings = self._normalize_rows(embeddings)
         
-        return embedding
+        return embeddings
+    
+    def _bucketed(self) -> bool:
+        return bool(self.buckets) and getattr(self.model, 'bucketed', False)
+    
+    def bucket_size(self, count: int) -> int:
+        """
+        count görüntülük batch'in tamamlanacağı boyut
+        
+        Returns:
+            count'tan büyük/eşit en küçük bucket (bucket yoksa veya aşılırsa count)
+        """
+        if self._bucketed():
+            for size in self.buckets:
+                if size >= count:
+                    return size
+        return count
+    
+    def _forward(self, faces: np.ndarray) -> np.ndarray:
+        """Tek forward pass; batch bucket boyutuna sıfır görüntülerle tamamlanır"""
+        count = len(faces)
+        size = self.bucket_size(count)
+        if size > count:
+            padding = np.zeros((size - count,) + faces.shape[1:], dtype=faces.dtype)
+            faces = np.concatenate([faces, padding])
+        return self.model.embeddings(faces)[:count]
+    
+    def _stub_embedding(self, face_image: np.ndarray) -> np.ndarray:
+        """Stub implementation: Deterministik rastgele embedding"""
+        seed = int(np.mean(face_image) * 1000) % 10000
+        np.random.seed(seed)
+        return np.random.randn(self.embedding_dim).astype(np.float32)
     
     def _normalize(self, embedding: np.ndarray) -> np.ndarray:
         """
@@ -98,6 +164,19 @@ class FaceEmbeddingProcessor:
             return embedding / norm
         return embedding
     
+    def _normalize_rows(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Embedding matrisinin her satırına L2 normalizasyonu uygular
+        
+        Args:
+            embeddings: (n, d) ham embedding matrisi
+            
+        Returns:
+            Satırları normalize edilmiş matris (sıfır satırlar olduğu gibi kalır)
+        """
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms > 0, norms, 1).astype(embeddings.dtype)
+    
     def preprocess(self, face_image: np.ndarray) -> np.ndarray:
         """
         Model için görüntü ön işleme
@@ -0,0 +1,374 @@
+"""
+Embedding sıkıştırma modülü - float16 / int8 / product quantization kodekleri
+
+Her kodek (N, D) float32 embedding'leri (N, W) boyutlu tek bir numpy
+dizisine kodlar. Bir satırın byte'ları diskte şifrelenen plaintext ile
+aynıdır; böylece aynı kodek kullanılan kayıtlar deşifre edildikten sonra
+çözülmeden doğrudan galeri matrisine yazılabilir. Skorlama (`dot`)
+sıkıştırılmış form üzerinde çalışır.
+
+PQ kodekleri kod kitabının özetiyle adlandırılır (`pq:<sha8>`). Kayıtlı
+olmayan bir PQ adı istendiğinde kod kitabı FS_PQ_CODEBOOK'tan yüklenir;
+böylece migrate_sealed, key_rotation gibi araçlar API ile aynı ortamda
+PQ kayıtlarını açabilir.
+"""
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Skorlamada float32'ye açılacak satır bloğu (geçici bellek sınırı)
+SCORE_CHUNK_ROWS = 16384
+
+
+class EmbeddingCodec:
+    """Embedding kodek arayüzü"""
+
+    name = ''
+    dtype = np.float32
+
+    def code_size(self, dim: int) -> int:
+        """Bir vektörün kodlanmış boyutu (byte)"""
+        raise NotImplementedError
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """(N, D) float32 -> (N, W) kodlar"""
+        raise NotImplementedError
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """(N, W) kodlar -> (N, D) float32"""
+        raise NotImplementedError
+
+    def dot(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Sıkıştırılmış satırlar ile sorgu(lar) arasında iç çarpım
+
+        Args:
+            codes: (N, W) kodlar
+            queries: (D,) veya (Q, D) float32 sorgular
+
+        Returns:
+            (N,) veya (Q, N) ham cosine skorları
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start:start + SCORE_CHUNK_ROWS]
+            out[:, start:start + len(chunk)] = self._dot_chunk(chunk, queries)
+        return out[0] if single else out
+
+    def _dot_chunk(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        return queries @ self.decode(codes).T
+
+    def to_bytes(self, vector: np.ndarray) -> bytes:
+        """Tek vektörü saklanacak plaintext byte'lara çevirir"""
+        return self.encode(np.asarray(vector, dtype=np.float32)[None, :])[0].tobytes()
+
+    def from_bytes(self, data: bytes, dim: int) -> np.ndarray:
+        """
+        Plaintext byte'ları (W,) kod satırına çevirir
+
+        Raises:
+            ValueError: Boyut uyuşmuyorsa
+        """
+        expected = self.code_size(dim)
+        if len(data) != expected:
+            raise ValueError(f"Kod boyutu uyuşmuyor ({self.name}): {len(data)} != {expected}")
+        return np.frombuffer(data, dtype=self.dtype)
+
+
+class Float32Codec(EmbeddingCodec):
+    """Sıkıştırmasız (mevcut kayıt formatı)"""
+
+    name = 'float32'
+    dtype = np.float32
+
+    def code_size(self, dim: int) -> int:
+        return 4 * dim
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(codes, dtype=np.float32)
+
+    def dot(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # Tek BLAS çağrısı, parçalamaya gerek yok
+        queries = np.asarray(queries, dtype=np.float32)
+        return queries @ codes.T
+
+
+class Float16Codec(EmbeddingCodec):
+    """Yarım hassasiyet (2x küçülme)"""
+
+    name = 'float16'
+    dtype = np.float16
+
+    def code_size(self, dim: int) -> int:
+        return 2 * dim
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(vectors, dtype=np.float16)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(codes, dtype=np.float32)
+
+
+class Int8Codec(EmbeddingCodec):
+    """
+    Simetrik int8, vektör başına ölçek (~4x küçülme)
+
+    Satır düzeni: D adet int8 kod + 4 byte float32 ölçek.
+    """
+
+    name = 'int8'
+    dtype = np.int8
+
+    def code_size(self, dim: int) -> int:
+        return dim + 4
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.empty((len(vectors), vectors.shape[1] + 4), dtype=np.int8)
+        codes[:, :-4] = np.clip(np.rint(vectors / scales[:, None]), -127, 127)
+        codes[:, -4:] = scales.astype(np.float32).view(np.int8).reshape(-1, 4)
+        return codes
+
+    def _split(self, codes: np.ndarray):
+        scales = np.ascontiguousarray(codes[:, -4:]).view(np.float32).ravel()
+        return codes[:, :-4], scales
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        values, scales = self._split(codes)
+        return values.astype(np.float32) * scales[:, None]
+
+    def _dot_chunk(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # Ölçek skorla çarpılır; kodlar ölçeklenmeden float32'ye açılır
+        values, scales = self._split(codes)
+        return (queries @ values.astype(np.float32).T) * scales[None, :]
+
+
+class PQCodec(EmbeddingCodec):
+    """
+    Product quantization - D boyut m alt uzaya bölünür, her alt vektör
+    en fazla 256 merkezli bir kod kitabındaki en yakın merkezin indeksi
+    (uint8) olarak saklanır. 512d/m=64 için 32x küçülme.
+
+    Skorlama asimetrik mesafe (ADC) ile yapılır: sorgu başına (m, K)
+    tablo bir kez hesaplanır, her satır m tablo okuması ile skorlanır.
+    """
+
+    dtype = np.uint8
+
+    def __init__(self, codebooks: np.ndarray):
+        """
+        Args:
+            codebooks: (m, K, D/m) float32 kod kitapları (K <= 256)
+        """
+        self.codebooks = np.ascontiguousarray(codebooks, dtype=np.float32)
+        self.m, self.n_centroids, self.sub_dim = self.codebooks.shape
+        if not 1 <= self.n_centroids <= 256:
+            raise ValueError(f"Kod kitabı 1-256 merkez içermeli: {self.n_centroids}")
+        digest = hashlib.sha256(self.codebooks.tobytes()).hexdigest()[:8]
+        # Kod kitabı değişirse eski kayıtlar yanlış çözülmesin diye isme dahil
+        self.name = f'pq:{digest}'
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, m: int = 64, n_centroids: int = 256,
+              n_iter: int = 15, seed: int = 0) -> 'PQCodec':
+        """
+        Kod kitaplarını örnek embedding'lerden öğrenir
+
+        Args:
+            vectors: (N, D) eğitim vektörleri
+            m: Alt uzay sayısı (D'yi bölmeli)
+            n_centroids: Alt uzay başına en fazla merkez sayısı (<= 256);
+                         N daha küçükse N merkez eğitilir (boş merkez kalmaz)
+            n_iter: k-means iterasyon sayısı
+            seed: Rastgelelik tohumu
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if dim % m != 0:
+            raise ValueError(f"Boyut ({dim}) alt uzay sayısına ({m}) bölünmeli")
+        if not 1 <= n_centroids <= 256:
+            raise ValueError("n_centroids 1-256 arasında olmalı")
+
+        sub_dim = dim // m
+        rng = np.random.default_rng(seed)
+        if n == 0:
+            raise ValueError("PQ eğitimi için en az bir vektör gerekli")
+        k = min(n_centroids, n)
+        codebooks = np.zeros((m, k, sub_dim), dtype=np.float32)
+
+        for j in range(m):
+            sub = vectors[:, j * sub_dim:(j + 1) * sub_dim]
+            centroids = sub[rng.choice(n, k, replace=False)].copy()
+            for _ in range(n_iter):
+                assign = _nearest(sub, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sub)
+                counts = np.bincount(assign, minlength=k)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebooks[j] = centroids
+
+        return cls(codebooks)
+
+    def save(self, path: str):
+        """Kod kitabını .npy dosyasına kaydeder"""
+        np.save(path, self.codebooks)
+
+    @classmethod
+    def load(cls, path: str) -> 'PQCodec':
+        """Kaydedilmiş kod kitabını yükler"""
+        return cls(np.load(path))
+
+    def code_size(self, dim: int) -> int:
+        return self.m
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            codes[:, j] = _nearest(sub, self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def _dot_chunk(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # (Q, m, 256) arama tablosu
+        lut = np.einsum('qjd,jcd->qjc',
+                        queries.reshape(len(queries), self.m, self.sub_dim),
+                        self.codebooks)
+        subspaces = np.arange(self.m)
+        return np.stack([table[subspaces, codes].sum(axis=1) for table in lut])
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Öklid mesafesine göre en yakın merkez indeksleri"""
+    distances = (
+        (vectors ** 2).sum(axis=1, keepdims=True)
+        - 2.0 * vectors @ centroids.T
+        + (centroids ** 2).sum(axis=1)[None, :]
+    )
+    return np.argmin(distances, axis=1)
+
+
+_CODECS: Dict[str, EmbeddingCodec] = {
+    codec.name: codec for codec in (Float32Codec(), Float16Codec(), Int8Codec())
+}
+
+
+def register_codec(codec: EmbeddingCodec):
+    """Eğitilmiş bir kodeği (örn. PQ) isimle erişilebilir yapar"""
+    _CODECS[codec.name] = codec
+
+
+def registered_codecs() -> List[EmbeddingCodec]:
+    """Kayıtlı tüm kodekler (worker süreçlerine aktarmak için)"""
+    return list(_CODECS.values())
+
+
+def get_codec(name: Optional[str] = None) -> EmbeddingCodec:
+    """
+    İsimden kodek döndürür
+
+    Kayıtlı olmayan 'pq:<sha8>' adları FS_PQ_CODEBOOK kod kitabından yüklenir.
+
+    Args:
+        name: Kodek adı (None -> float32, eski kayıtlar)
+
+    Raises:
+        ValueError: Bilinmeyen veya kayıtlı olmayan kodek; PQ kod kitabı
+                    yoksa ya da kayıttaki kod kitabıyla uyuşmuyorsa
+    """
+    codec = _CODECS.get(name or 'float32')
+    if codec is None and name.startswith('pq:'):
+        codec = _load_env_codebook(name)
+    if codec is None:
+        raise ValueError(f"Bilinmeyen embedding kodeği: {name}")
+    return codec
+
+
+def _load_env_codebook(name: str) -> EmbeddingCodec:
+    """FS_PQ_CODEBOOK'taki kod kitabını kaydeder; kayıttaki adla uyuşmalı"""
+    path = os.getenv('FS_PQ_CODEBOOK')
+    if not path:
+        raise ValueError(f"PQ kayıtlarını ({name}) açmak için kod kitabı yolu "
+                         f"(FS_PQ_CODEBOOK) gerekli")
+    codec = PQCodec.load(path)
+    register_codec(codec)
+    if codec.name != name:
+        raise ValueError(f"FS_PQ_CODEBOOK ({path}, {codec.name}) kayıttaki "
+                         f"kod kitabıyla ({name}) uyuşmuyor")
+    return codec
+
+
+def create_codec(name: Optional[str], codebook_path: Optional[str] = None) -> EmbeddingCodec:
+    """
+    Dağıtım yapılandırmasından kodek oluşturur
+
+    Args:
+        name: 'float32' | 'float16' | 'int8' | 'pq' (None -> float32)
+        codebook_path: 'pq' için eğitilmiş kod kitabı (.npy)
+
+    Returns:
+        Kayıtlı EmbeddingCodec
+    """
+    if name and name.lower() == 'pq':
+        if not codebook_path:
+            raise ValueError("PQ kodeği için kod kitabı yolu (FS_PQ_CODEBOOK) gerekli")
+        codec = PQCodec.load(codebook_path)
+        register_codec(codec)
+        return codec
+    return get_codec(name.lower() if name else None)
+
+
+def evaluate_codec(codec: EmbeddingCodec, gallery: np.ndarray, queries: np.ndarray,
+                   k: int = 10) -> Dict[str, float]:
+    """
+    Kodeğin doğruluk/recall raporunu float32 tam aramaya göre çıkarır
+
+    Args:
+        codec: Değerlendirilecek kodek
+        gallery: (N, D) float32 galeri embedding'leri
+        queries: (Q, D) float32 sorgular
+        k: recall@k için k
+
+    Returns:
+        bytes_per_vector, compression, recall@1, recall@k, mean_abs_error
+    """
+    gallery = np.asarray(gallery, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(gallery))
+
+    exact = queries @ gallery.T
+    approx = codec.dot(codec.encode(gallery), queries)
+
+    exact_top = np.argsort(-exact, axis=1)[:, :k]
+    approx_top = np.argsort(-approx, axis=1)[:, :k]
+
+    recall_1 = float(np.mean(approx_top[:, 0] == exact_top[:, 0]))
+    recall_k = float(np.mean([
+        len(set(a) & set(e)) / k for a, e in zip(approx_top, exact_top)
+    ]))
+
+    dim = gallery.shape[1]
+    return {
+        'codec': codec.name,
+        'bytes_per_vector': codec.code_size(dim),
+        'compression': 4 * dim / codec.code_size(dim),
+        'recall@1': recall_1,
+        f'recall@{k}': recall_k,
+        'mean_abs_error': float(np.mean(np.abs(approx - exact)))
+    }
@@ -0,0 +1,399 @@
+"""
+Çok çekirdekli galeri araması - shared memory üzerinde parçalı (sharded) skorlama
+
+Galeri matrisi ve satır -> kullanıcı etiketleri tek bir
+`multiprocessing.shared_memory` segmentinde tutulur. Worker süreçleri
+segmente isimle bağlanır (kopyalamadan), kendi satır aralığını skorlar
+ve yerel top-k kullanıcıyı döndürür; sonuçlar ana süreçte birleştirilir.
+
+EmbeddingGallery satır tamponunu doğrudan ShardedSearcher.allocate ile
+shared memory'de ayırır: ana süreç matrisi ayrıca kopyalamaz, yayınlanan
+snapshot segmentin dolu kısmına bir view'dır.
+
+Segment düzeni: 64 byte başlık (satır kapasitesi) | kod matrisi | int32 etiketler
+
+Worker'lar varsayılan olarak 'forkserver' ile başlatılır: havuz ilk aramada,
+TensorFlow ve diğer arka plan thread'leri çalışırken kurulur; çok thread'li
+bir süreci fork etmek çocukta miras kalan kilitlerde kilitlenebilir.
+"""
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context, resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from face.quantization import (
+    EmbeddingCodec, get_codec, register_codec, registered_codecs
+)
+
+_HEADER = struct.Struct('<8sQQ32s')
+_HEADER_SIZE = 64
+_MAGIC = b'FSGAL01\x00'
+
+
+def _align(offset: int, alignment: int = 64) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _open_shm(name: str) -> shared_memory.SharedMemory:
+    """Var olan segmente resource tracker'a kaydetmeden bağlanır"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # <3.13: bağlanan süreçler segmenti kaydederse çıkışta silinir/uyarı verir
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class _SharedView:
+    """
+    Segment view'larının tabanı - view'lar yaşadıkça SharedMemory'yi canlı tutar
+
+    Son view bırakılınca önce buffer export'u, sonra SharedMemory serbest
+    kalır; böylece segment, snapshot'lar onu kullanırken kapanmaz.
+    """
+
+    def __init__(self, array: np.ndarray, shm: shared_memory.SharedMemory):
+        self.__array_interface__ = array.__array_interface__
+        self.array = array
+        self.shm = shm
+
+
+class SharedGallerySegment:
+    """Galeri matrisinin shared memory segmenti (oluşturan veya bağlanan taraf)"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+
+        magic, rows, width, codec_name = _HEADER.unpack_from(shm.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Geçersiz galeri segmenti: {shm.name}")
+
+        self.codec_name = codec_name.rstrip(b'\x00').decode('utf-8')
+        codec = get_codec(self.codec_name)
+        dtype = np.dtype(codec.dtype)
+        labels_offset = _align(_HEADER_SIZE + rows * width * dtype.itemsize)
+
+        matrix = np.ndarray((rows, width), dtype=dtype, buffer=shm.buf, offset=_HEADER_SIZE)
+        labels = np.ndarray((rows,), dtype=np.int32, buffer=shm.buf, offset=labels_offset)
+        if not owner:
+            matrix.flags.writeable = False
+            labels.flags.writeable = False
+        self.matrix = np.asarray(_SharedView(matrix, shm))
+        self.labels = np.asarray(_SharedView(labels, shm))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def allocate(cls, rows: int, width: int, codec: EmbeddingCodec) -> 'SharedGallerySegment':
+        """
+        Yazılabilir, boş bir segment ayırır
+
+        Args:
+            rows: Satır kapasitesi
+            width: Satır başına kod sayısı
+            codec: Matrisin kodeği
+        """
+        codec_name = codec.name.encode('utf-8')
+        if len(codec_name) > 32:
+            raise ValueError(f"Kodek adı çok uzun: {codec.name}")
+
+        labels_offset = _align(_HEADER_SIZE + rows * width * np.dtype(codec.dtype).itemsize)
+        size = max(labels_offset + rows * 4, _HEADER_SIZE + 1)
+
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, rows, width, codec_name)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def create(cls, matrix: np.ndarray, labels: np.ndarray,
+               codec: EmbeddingCodec) -> 'SharedGallerySegment':
+        """
+        Matrisi yeni bir shared memory segmentine kopyalar
+
+        Args:
+            matrix: (N, W) kodlanmış galeri matrisi
+            labels: (N,) satır -> kullanıcı indeksi
+            codec: Matrisin kodeği
+        """
+        segment = cls.allocate(matrix.shape[0], matrix.shape[1], codec)
+        segment.matrix[:] = matrix
+        segment.labels[:] = labels
+        return segment
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedGallerySegment':
+        """Başka bir süreçte oluşturulmuş segmente salt-okunur bağlanır"""
+        return cls(_open_shm(name), owner=False)
+
+    def close(self):
+        # numpy view'ları bırakılmadan buffer kapatılamaz
+        self.matrix = None
+        self.labels = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Snapshot'lar hâlâ view tutuyor; son view bırakılınca kapanır (_SharedView)
+            pass
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+# Worker süreci tarafında bağlı segmentler (her segmente bir kez bağlanılır)
+_worker_segments: Dict[str, SharedGallerySegment] = {}
+_WORKER_SEGMENT_LIMIT = 2
+
+
+def _init_worker(codecs: List[EmbeddingCodec]):
+    """Worker başlangıcı - ana süreçteki eğitilmiş kodekleri (PQ) kaydeder"""
+    for codec in codecs:
+        register_codec(codec)
+
+
+def _worker_segment(name: str) -> SharedGallerySegment:
+    segment = _worker_segments.get(name)
+    if segment is None:
+        # Eski segmentleri bırak (ana süreç yenisini yayınladı)
+        while len(_worker_segments) >= _WORKER_SEGMENT_LIMIT:
+            _worker_segments.pop(next(iter(_worker_segments))).close()
+        segment = _worker_segments[name] = SharedGallerySegment.attach(name)
+    return segment
+
+
+def score_shard(name: str, start: int, end: int, query: np.ndarray,
+                k: int, dead: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bir satır aralığını skorlar ve yerel top-k kullanıcıyı döndürür
+
+    Args:
+        name: Shared memory segment adı
+        start, end: Satır aralığı
+        query: (D,) L2 normalize sorgu
+        k: Döndürülecek kullanıcı sayısı
+        dead: Aralıktaki tombstone satırlar (mutlak indeks, skorlanmaz)
+
+    Returns:
+        (user_indices, raw_scores) - kullanıcı başına en iyi ham cosine
+    """
+    segment = _worker_segment(name)
+    if end <= start:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    codec = get_codec(segment.codec_name)
+    raw = codec.dot(segment.matrix[start:end], query)
+    labels = segment.labels[start:end]
+    if dead is not None and len(dead):
+        raw[dead - start] = -np.inf
+
+    # Canlı kullanıcı satırları bitişik: etiket değişim noktalarında reduceat
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    users = labels[starts]
+    best = np.maximum.reduceat(raw, starts)
+    # Sadece tombstone satırlardan oluşan gruplar
+    live = np.isfinite(best)
+    users, best = users[live], best[live]
+
+    if len(best) > k:
+        top = np.argpartition(-best, k - 1)[:k]
+        users, best = users[top], best[top]
+    return users.copy(), best.astype(np.float32)
+
+
+class ShardedSearcher:
+    """
+    Galeri snapshot'ını worker süreçleri arasında bölerek skorlar
+
+    Segmentleri galeri allocate ile ayırır ve yazar; publish kopyalamaz,
+    yalnızca snapshot'ın segmentini güncel kabul eder. Galeri tamponunu
+    büyüttüğünde veya sıkıştırdığında eski segment, onu kullanan uçuştaki
+    son arama bitene kadar silinmez (referans sayacı).
+    """
+
+    def __init__(self, workers: int, min_rows: int = 50000,
+                 start_method: Optional[str] = None):
+        """
+        Args:
+            workers: Worker süreç sayısı (0 -> os.cpu_count())
+            min_rows: Bu satır sayısının altında paralel arama kullanılmaz
+            start_method: multiprocessing başlatma yöntemi
+                          (None -> varsa 'forkserver', yoksa 'spawn')
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in get_all_start_methods() else 'spawn'
+        self._context = get_context(start_method)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._current: Optional[Tuple[SharedGallerySegment, object]] = None
+        # Son yayınlanan snapshot'ın segmenti (min_rows altında da galeri onu yazar)
+        self._latest: Optional[SharedGallerySegment] = None
+        # Silinmemiş segmentler; segment adı -> kullanan uçuştaki arama sayısı.
+        # Eski segmentler sayaç sıfırlanınca silinir
+        self._segments: Dict[str, SharedGallerySegment] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context,
+                    initializer=_init_worker,
+                    initargs=(registered_codecs(),)
+                )
+            return self._executor
+
+    def _acquire(self, snapshot) -> Optional[SharedGallerySegment]:
+        """Snapshot'ın segmentini arama süresince silinmeye karşı tutar"""
+        with self._lock:
+            current = self._current
+            if current is None or current[1] is not snapshot:
+                return None
+            segment = current[0]
+            self._in_flight[segment.name] = self._in_flight.get(segment.name, 0) + 1
+            return segment
+
+    def _release(self, segment: SharedGallerySegment):
+        with self._lock:
+            # close() sayaçları sıfırlamış olabilir
+            remaining = self._in_flight.get(segment.name, 0) - 1
+            if remaining > 0:
+                self._in_flight[segment.name] = remaining
+                return
+            self._in_flight.pop(segment.name, None)
+            stale = None
+            if segment is not self._latest:
+                stale = self._segments.pop(segment.name, None)
+        if stale is not None:
+            stale.unlink()
+
+    def allocate(self, rows: int, width: int, codec: EmbeddingCodec) -> SharedGallerySegment:
+        """
+        Galeri satır tamponu için yazılabilir bir segment ayırır
+
+        Args:
+            rows: Satır kapasitesi
+            width: Satır başına kod sayısı
+            codec: Matrisin kodeği
+
+        Returns:
+            SharedGallerySegment (matrix ve labels doğrudan tampon olarak kullanılır)
+        """
+        segment = SharedGallerySegment.allocate(rows, width, codec)
+        with self._lock:
+            self._segments[segment.name] = segment
+        return segment
+
+    def publish(self, snapshot):
+        """
+        Yeni galeri snapshot'ını yayınlar
+
+        Snapshot'ın matrisi bu searcher'ın ayırdığı bir segmentteyse
+        kopyalanmaz; değilse (ör. başka kaynaktan gelen snapshot) bir kez
+        yeni segmente kopyalanır. Artık kullanılmayan segmentler silinir.
+
+        Args:
+            snapshot: GallerySnapshot
+        """
+        segment = snapshot.segment
+        if segment is None or self._segments.get(segment.name) is not segment:
+            segment = None
+            if snapshot.size >= self.min_rows:
+                segment = SharedGallerySegment.create(snapshot.matrix, snapshot.labels,
+                                                      snapshot.codec)
+                with self._lock:
+                    self._segments[segment.name] = segment
+
+        with self._lock:
+            self._latest = segment
+            self._current = (
+                (segment, snapshot)
+                if segment is not None and snapshot.size >= self.min_rows else None
+            )
+            stale = [
+                other for name, other in self._segments.items()
+                if other is not segment and not self._in_flight.get(name)
+            ]
+            for other in stale:
+                del self._segments[other.name]
+        # Ana süreçteki eski snapshot view'ları haritayı GC'ye kadar tutar
+        for other in stale:
+            other.unlink()
+
+    def accepts(self, snapshot) -> bool:
+        """Bu snapshot paralel aranabilir mi (yayınlanmış ve yeterince büyük)"""
+        current = self._current
+        return current is not None and current[1] is snapshot
+
+    def search(self, snapshot, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """
+        Tüm shard'ları paralel skorlar ve sonuçları birleştirir
+
+        Args:
+            snapshot: Aranacak GallerySnapshot (yayınlanmış olmalı)
+            query: (D,) L2 normalize sorgu
+            k: Döndürülecek kullanıcı sayısı
+
+        Returns:
+            [(username, similarity), ...] azalan sırada; snapshot
+            yayınlanmamışsa []
+        """
+        if k <= 0:
+            return []
+        segment = self._acquire(snapshot)
+        if segment is None:
+            return []
+
+        try:
+            query = np.asarray(query, dtype=np.float32)
+            rows = len(snapshot.matrix)
+            bounds = np.linspace(0, rows, self.workers + 1).astype(int)
+            dead = snapshot.dead_rows
+            executor = self._get_executor()
+            futures = [
+                executor.submit(score_shard, segment.name, int(start), int(end), query, k,
+                                dead[np.searchsorted(dead, start):np.searchsorted(dead, end)])
+                for start, end in zip(bounds[:-1], bounds[1:])
+            ]
+
+            # Bir kullanıcı en fazla iki shard'a bölünür; birleştirmede max alınır
+            best: Dict[int, float] = {}
+            for future in futures:
+                users, scores = future.result()
+                for user, score in zip(users.tolist(), scores.tolist()):
+                    if score > best.get(user, -np.inf):
+                        best[user] = score
+        finally:
+            # Segment ancak tüm shard'lar bittikten sonra silinebilir
+            self._release(segment)
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(snapshot.usernames[user], (score + 1.0) / 2.0) for user, score in ranked]
+
+    def close(self):
+        """Worker'ları durdurur ve segmentleri siler"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            segments = list(self._segments.values())
+            self._current = None
+            self._latest = None
+            self._segments.clear()
+            self._in_flight.clear()
+        for segment in segments:
+            segment.unlink()
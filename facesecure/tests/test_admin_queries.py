@@ -0,0 +1,249 @@
+"""
+Sayfalı, filtreli yönetim sorguları testleri (query_users / query_failed_attempts)
+"""
+import importlib
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.attempt_log import AttemptLog, attempt_matches
+from utils.db import DBManager
+from utils.registry import ResourceRegistry
+from utils.sqlite_store import SQLiteStorage
+from utils.storage import decode_cursor, encode_cursor
+
+USERNAMES = [f'{prefix}{i:02d}' for prefix in ('alice', 'bob', 'carol') for i in range(9)]
+# Oluşturma sırası ad sırasından farklı olsun
+CREATION_ORDER = USERNAMES[1::2] + USERNAMES[::2]
+
+
+def _attempt(i):
+    return {'username': USERNAMES[i % 5],
+            'ip_address': f'10.0.0.{i % 3}',
+            'similarity_score': i / 100,
+            'reason': 'Yüz tespit edilemedi' if i % 4 == 0 else f'Benzerlik threshold\'un altında ({i})',
+            'timestamp': f'2026-01-{1 + i // 10:02d}T00:00:{i % 60:02d}'}
+
+
+def _collect(query, limit, **kwargs):
+    """Tüm sayfaları cursor ile gezer, (kayıtlar, sayfa sayısı) döndürür"""
+    items, cursor, pages = [], None, 0
+    while True:
+        page, cursor = query(limit=limit, cursor=cursor, **kwargs)
+        items.extend(page)
+        pages += 1
+        if cursor is None:
+            return items, pages
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+    if request.param == 'json':
+        storage = DBManager(json_path=str(tmp_path / 'fs.json'))
+    else:
+        storage = SQLiteStorage(str(tmp_path / 'fs.db'))
+    for username in CREATION_ORDER:
+        storage.create_sealed_user(username, lambda user_id: f'blob-{user_id}', 3)
+    yield storage
+    storage.close()
+
+
+class TestUserQueries:
+    """query_users: keyset sayfalama, filtreler, projeksiyon"""
+
+    def test_paginates_in_username_order(self, storage):
+        """Sayfalar kullanıcıları tekrarsız ve sıralı vermeli, metadata kayıt içermemeli"""
+        users, pages = _collect(storage.query_users, 10)
+        assert [user['username'] for user in users] == sorted(USERNAMES)
+        assert pages == 3
+        for user in users:
+            assert 'sealed' not in user and 'embeddings' not in user
+            assert user['embedding_count'] == 3
+
+        users, _ = _collect(storage.query_users, 4, descending=True)
+        assert [user['username'] for user in users] == sorted(USERNAMES, reverse=True)
+
+    def test_prefix_and_created_range(self, storage):
+        """Önek ve oluşturma zamanı aralığı backend'de uygulanmalı"""
+        users, _ = _collect(storage.query_users, 4, username_prefix='bob')
+        assert [user['username'] for user in users] == [f'bob{i:02d}' for i in range(9)]
+
+        by_created, _ = _collect(storage.query_users, 5, sort='created_at')
+        created = [user['created_at'] for user in by_created]
+        assert created == sorted(created)
+        since, until = created[5], created[20]
+        users, _ = _collect(storage.query_users, 3, sort='created_at',
+                            created_since=since, created_until=until)
+        expected = [user['username'] for user in by_created if since <= user['created_at'] < until]
+        assert [user['username'] for user in users] == expected
+
+    def test_cursor_survives_inserts(self, storage):
+        """Sayfalar arasında eklenen kullanıcı sonraki sayfayı kaydırmamalı"""
+        first, cursor = storage.query_users(limit=5)
+        storage.create_sealed_user('aaron', lambda user_id: 'blob', 1)
+        second, _ = storage.query_users(limit=5, cursor=cursor)
+        assert [user['username'] for user in first + second] == sorted(USERNAMES)[:10]
+
+    def test_records_and_stats(self, storage):
+        """metadata_only=False şifreli kaydı döndürmeli; user_stats kayıt yüklemeden saymalı"""
+        users, _ = storage.query_users(username_prefix='carol00', metadata_only=False)
+        assert users[0]['sealed'] == f"blob-{users[0]['_id']}"
+        assert storage.user_stats() == {'users': len(USERNAMES), 'embeddings': 3 * len(USERNAMES)}
+
+    def test_get_user_metadata(self, storage):
+        """Varlık kontrolü şifreli kayıtları döndürmemeli"""
+        meta = storage.get_user_metadata('bob03')
+        assert meta['username'] == 'bob03' and meta['embedding_count'] == 3
+        assert 'sealed' not in meta
+        assert storage.get_user_metadata('yok') is None
+
+    def test_metadata_reads_skip_sealed_column(self, tmp_path):
+        """SQLite: varlık kontrolü ve liste sorguları mühürlü blob kolonunu okumamalı"""
+        storage = SQLiteStorage(str(tmp_path / 'fs.db'))
+        storage.create_sealed_user('alice', lambda user_id: 'x' * 4096, 3)
+        statements = []
+        storage._connection().set_trace_callback(statements.append)
+
+        assert storage.get_user_metadata('alice')['embedding_count'] == 3
+        assert storage.query_users(limit=5)[0][0]['username'] == 'alice'
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+        assert len(selects) == 2
+        assert all('sealed' not in sql and '*' not in sql for sql in selects)
+
+        storage._connection().set_trace_callback(None)
+        storage.close()
+
+    def test_invalid_cursor(self, storage):
+        """Bozuk veya başka sıralamaya ait cursor reddedilmeli"""
+        _, cursor = storage.query_users(limit=2)
+        with pytest.raises(ValueError):
+            storage.query_users(cursor='bozuk!')
+        with pytest.raises(ValueError):
+            storage.query_users(sort='created_at', cursor=cursor)
+        with pytest.raises(ValueError):
+            storage.query_users(sort='password')
+
+
+class TestAttemptQueries:
+    """query_failed_attempts / count_failed_attempts"""
+
+    @pytest.fixture
+    def attempts(self, storage):
+        attempts = [_attempt(i) for i in range(60)]
+        for attempt in attempts:
+            storage._store_failed_attempt(attempt)
+        return attempts
+
+    @pytest.mark.parametrize('filters', [
+        {},
+        {'username': 'alice02'},
+        {'ip_address': '10.0.0.1'},
+        {'reason': 'threshold'},
+        {'since': '2026-01-02', 'until': '2026-01-05'},
+        {'username': 'alice01', 'ip_address': '10.0.0.0', 'since': '2026-01-03'},
+    ])
+    def test_filters_match_brute_force(self, storage, attempts, filters):
+        """Filtreli sayfalar tüm listenin filtrelenmiş, yeniden eskiye hali olmalı"""
+        expected = [a for a in reversed(attempts) if attempt_matches(a, **filters)]
+        found, _ = _collect(storage.query_failed_attempts, 7, **filters)
+        assert found == expected
+        assert storage.count_failed_attempts(**filters) == len(expected)
+
+    def test_cursor_survives_appends(self, storage, attempts):
+        """Yeni denemeler eklenince sonraki sayfa kaymamalı"""
+        first, cursor = storage.query_failed_attempts(limit=10)
+        storage._store_failed_attempt(_attempt(99))
+        second, _ = storage.query_failed_attempts(limit=10, cursor=cursor)
+        assert first + second == list(reversed(attempts))[:20]
+        assert storage.get_failed_attempts(1)[0] == _attempt(99)
+
+    def test_log_then_database(self, storage, attempts, tmp_path):
+        """attempt_log segmentleri önce, sonra veritabanındaki eski kayıtlar gelmeli"""
+        log = AttemptLog(str(tmp_path / 'attempts'), max_bytes=600, flush_interval=0)
+        storage.attempt_log = log
+        newer = [dict(_attempt(i), timestamp=f'2026-02-01T00:00:{i:02d}') for i in range(25)]
+        for attempt in newer:
+            log.submit(attempt)
+            log.flush()
+        assert len(log.segments()) > 1
+
+        found, _ = _collect(storage.query_failed_attempts, 6)
+        assert found == list(reversed(newer)) + list(reversed(attempts))
+        assert storage.count_failed_attempts() == len(found)
+
+        found, _ = _collect(storage.query_failed_attempts, 4, username='alice01')
+        assert len(found) == storage.count_failed_attempts(username='alice01') == 5 + 12
+        log.close()
+
+
+class TestAttemptLogQuery:
+    """AttemptLog.query konumları"""
+
+    def test_since_skips_old_segments(self, tmp_path):
+        """Son yazması aralıktan eski segmentlere bakılmamalı"""
+        log = AttemptLog(str(tmp_path / 'attempts'))
+        log.submit(_attempt(0))
+        log.flush()
+        assert log.query(since='2999-01-01T00:00:00') == ([], None)
+        records, position = log.query(limit=1)
+        assert records == [_attempt(0)] and position == (1, 0)
+        assert log.query(limit=1, position=position) == ([], None)
+        log.close()
+
+    def test_cursor_roundtrip(self):
+        assert decode_cursor(encode_cursor({'log': [3, 120]})) == {'log': [3, 120]}
+        assert decode_cursor(None) == {}
+
+
+class TestAdminRoutes:
+    """/api/admin endpoint'leri"""
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        flask = pytest.importorskip('flask')
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+        admin = importlib.import_module('api.routes.admin')
+
+        storage = SQLiteStorage(str(tmp_path / 'admin.db'))
+        for username in USERNAMES[:5]:
+            storage.create_sealed_user(username, lambda user_id: 'blob', 2)
+        for i in range(12):
+            storage._store_failed_attempt(_attempt(i))
+        monkeypatch.setattr(admin, 'ADMIN_TOKEN', 'gizli')
+
+        app = flask.Flask(__name__)
+        app.extensions['facesecure'] = ResourceRegistry({'storage': lambda registry: storage})
+        app.register_blueprint(admin.bp)
+        yield app.test_client()
+        storage.close()
+
+    def test_requires_token(self, client):
+        assert client.get('/api/admin/stats').status_code == 401
+        assert client.get('/api/admin/stats', headers={'X-Admin-Token': 'yanlis'}).status_code == 401
+
+    def test_pagination_and_filters(self, client):
+        headers = {'Authorization': 'Bearer gizli'}
+        response = client.get('/api/admin/stats', headers=headers)
+        assert response.get_json() == {'total_users': 5, 'total_embeddings': 10,
+                                       'failed_attempts': 12}
+
+        body = client.get('/api/admin/users?limit=3&order=desc', headers=headers).get_json()
+        assert [u['username'] for u in body['users']] == sorted(USERNAMES[:5], reverse=True)[:3]
+        body = client.get(f"/api/admin/users?limit=3&order=desc&cursor={body['next_cursor']}",
+                          headers=headers).get_json()
+        assert len(body['users']) == 2 and body['next_cursor'] is None
+
+        body = client.get('/api/admin/failed-attempts?ip=10.0.0.1&since=2026-01-01T00:00:05',
+                          headers=headers).get_json()
+        assert [a['similarity_score'] for a in body['attempts']] == [0.10, 0.07]
+
+        assert client.get('/api/admin/failed-attempts?since=dun', headers=headers).status_code == 400
+        assert client.get('/api/admin/users?limit=0', headers=headers).status_code == 400
+        assert client.get('/api/admin/users?cursor=xx', headers=headers).status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,273 @@
+"""
+Asenkron başarısız deneme log'u testleri
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.attempt_log import AttemptLog
+from utils.db import DBManager
+from utils.sqlite_store import SQLiteStorage
+
+fork = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                          reason="fork start method gerekli")
+
+
+def _attempt(i):
+    return {'username': f'user{i}', 'ip_address': '10.0.0.1',
+            'similarity_score': 0.1, 'reason': 'low_similarity', 'timestamp': str(i)}
+
+
+def _segment_writer(prefix, worker, count):
+    log = AttemptLog(prefix, max_bytes=300, batch_size=1)
+    for i in range(count):
+        log.submit(_attempt(f'{worker}_{i}'))
+        log.flush()
+    log.close()
+
+
+def _idle_writer(prefix, written, release):
+    """Tek kayıt yazıp segmentini açık tutar (canlı süreç)"""
+    log = AttemptLog(prefix, batch_size=1)
+    log.submit(_attempt('idle'))
+    log.flush()
+    written.set()
+    release.wait(30)
+    log.close()
+
+
+class TestAttemptLog:
+    """AttemptLog ve backend entegrasyonu testleri"""
+
+    @pytest.fixture
+    def make_log(self, tmp_path):
+        logs = []
+
+        def make(**kwargs):
+            log = AttemptLog(str(tmp_path / 'logs' / 'attempts'), **kwargs)
+            logs.append(log)
+            return log
+        yield make
+        for log in logs:
+            log.close()
+
+    def _lines(self, log):
+        lines = []
+        for _, path in log.segments():
+            with open(path, encoding='utf-8') as f:
+                lines.extend(json.loads(line) for line in f)
+        return lines
+
+    def test_batched_write(self, make_log):
+        """Kayıtlar arka planda tek segmente toplu yazılmalı"""
+        log = make_log(flush_interval=0.05)
+        for i in range(50):
+            assert log.submit(_attempt(i))
+        assert log.flush(timeout=5)
+        assert [r['username'] for r in self._lines(log)] == [f'user{i}' for i in range(50)]
+        assert log.written == 50
+        assert len(log.segments()) == 1
+
+    def test_recent_newest_first(self, make_log):
+        """recent() bekleyenleri yazıp yeniden eskiye döndürmeli"""
+        log = make_log(max_bytes=512)
+        for i in range(20):
+            log.submit(_attempt(i))
+        recent = log.recent(limit=5)
+        assert [r['username'] for r in recent] == [f'user{i}' for i in range(19, 14, -1)]
+
+    def test_size_rotation_and_retention(self, make_log):
+        """Boyut aşılınca yeni segmente geçilmeli, fazla segmentler silinmeli"""
+        log = make_log(max_bytes=400, max_segments=3, batch_size=1)
+        for i in range(30):
+            log.submit(_attempt(i))
+        log.flush()
+        segments = log.segments()
+        assert len(segments) == 3
+        assert all(os.path.getsize(path) <= 400 for _, path in segments)
+        # Silinen en eski kayıtlar, son kayıt korunmalı
+        assert self._lines(log)[-1]['username'] == 'user29'
+
+    def test_time_rotation_and_age_retention(self, make_log):
+        """Süre dolunca segment dönmeli, eski segmentler silinmeli"""
+        log = make_log(rotate_interval=0.05, retention_days=1)
+        log.submit(_attempt(0))
+        log.flush()
+        (_, first_path), = log.segments()
+        old = time.time() - 2 * 86400
+        os.utime(first_path, (old, old))
+
+        time.sleep(0.1)
+        log.submit(_attempt(1))
+        log.flush()
+        assert [path for _, path in log.segments()] != [first_path]
+        assert not os.path.exists(first_path)
+
+    @fork
+    def test_processes_rotate_into_separate_segments(self, tmp_path):
+        """Aynı prefix'e yazan süreçler aynı segmente dönmemeli, kayıt kaybolmamalı"""
+        prefix = str(tmp_path / 'logs' / 'attempts')
+        ctx = multiprocessing.get_context('fork')
+        procs = [ctx.Process(target=_segment_writer, args=(prefix, w, 20)) for w in range(3)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(60)
+            assert p.exitcode == 0
+
+        log = AttemptLog(prefix)
+        try:
+            segments = log.segments()
+            seqs = [seq for seq, _ in segments]
+            assert len(seqs) == len(set(seqs))
+            assert all(os.path.getsize(path) <= 300 for _, path in segments)
+            names = [r['username'] for r in self._lines(log)]
+            assert sorted(names) == sorted(f'user{w}_{i}' for w in range(3) for i in range(20))
+        finally:
+            log.close()
+
+    @fork
+    def test_retention_keeps_live_process_segment(self, make_log, tmp_path):
+        """max_segments, başka canlı sürecin aktif segmentini silmemeli"""
+        ctx = multiprocessing.get_context('fork')
+        written, release = ctx.Event(), ctx.Event()
+        prefix = str(tmp_path / 'logs' / 'attempts')
+        idle = ctx.Process(target=_idle_writer, args=(prefix, written, release))
+        idle.start()
+        try:
+            assert written.wait(30)
+            (_, idle_path), = make_log().segments()
+
+            log = make_log(max_bytes=300, max_segments=2, batch_size=1)
+            for i in range(20):
+                log.submit(_attempt(i))
+            log.flush()
+            assert os.path.exists(idle_path)
+            assert len(log.segments()) == 2
+        finally:
+            release.set()
+            idle.join(30)
+        assert 'useridle' in [r['username'] for r in self._lines(log)]
+
+    def test_full_queue_drops(self, make_log):
+        """Kuyruk doluyken submit bloklamamalı, atılan kayıtlar sayılmalı"""
+        log = make_log(queue_size=2)
+        gate = threading.Event()
+        original_write = log._write
+        log._write = lambda records: (gate.wait(), original_write(records))
+
+        results = [log.submit(_attempt(i)) for i in range(10)]
+        assert not all(results)
+        assert log.dropped == results.count(False)
+        gate.set()
+        log.flush()
+        assert log.written == results.count(True)
+
+    def test_reads_do_not_wait_for_a_busy_writer(self, make_log):
+        """Yazıcı takılıyken sorgu ve sayım read_wait sonrası diskteki durumu dönmeli"""
+        log = make_log(read_wait=0.2)
+        gate = threading.Event()
+        original_write = log._write
+        log._write = lambda records: (gate.wait(), original_write(records))
+        for i in range(5):
+            log.submit(_attempt(i))
+
+        started = time.monotonic()
+        assert log.query(limit=10) == ([], None)
+        assert log.count() == 0 and log.count(username='user1') == 0
+        assert time.monotonic() - started < 2
+        gate.set()
+        assert log.flush(timeout=5) and log.count() == 5
+
+    def test_reads_see_earlier_records_under_traffic(self, make_log):
+        """Sürekli trafik varken sorgu kendinden önce atılan kaydı görmeli, beklemede kalmamalı"""
+        log = make_log(flush_interval=0.01, read_wait=5)
+        stop = threading.Event()
+
+        def flood():
+            i = 0
+            while not stop.is_set():
+                log.submit(_attempt(i))
+                i += 1
+                time.sleep(0.0005)
+
+        flooder = threading.Thread(target=flood)
+        flooder.start()
+        try:
+            time.sleep(0.05)
+            assert log.submit({**_attempt(0), 'username': 'marker'})
+            started = time.monotonic()
+            assert [r['username'] for r in log.query(limit=1, username='marker')[0]] == ['marker']
+            assert log.count(username='marker') == 1
+            assert time.monotonic() - started < 5
+        finally:
+            stop.set()
+            flooder.join()
+
+    def test_close_drains_queue(self, make_log):
+        """Kapanış kuyruktaki tüm kayıtları yazmalı"""
+        log = make_log(flush_interval=1.0)
+        for i in range(10):
+            log.submit(_attempt(i))
+        log.close()
+        assert len(self._lines(log)) == 10
+
+    @pytest.mark.parametrize('backend', ['json', 'sqlite'])
+    def test_log_enabled_by_default(self, tmp_path, monkeypatch, backend):
+        """Ayar yoksa denemeler veritabanı dosyasının yanındaki log'a yazılmalı"""
+        monkeypatch.delenv('FS_ATTEMPT_LOG', raising=False)
+        if backend == 'json':
+            path = str(tmp_path / 'data.json')
+            open_db = lambda: DBManager(json_path=path)
+        else:
+            path = str(tmp_path / 'data.db')
+            open_db = lambda: SQLiteStorage(path)
+
+        db = open_db()
+        assert db.attempt_log.prefix == str(tmp_path / 'data_attempts')
+        size_before = os.path.getsize(path)
+        db.log_failed_attempt('alice', '10.0.0.1', 0.1, 'low_similarity')
+        assert [a['username'] for a in db.get_failed_attempts()] == ['alice']
+        assert os.path.getsize(path) == size_before
+        db.close()
+
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+        db = open_db()
+        assert db.attempt_log is None
+        db.close()
+
+    @pytest.mark.parametrize('backend', ['json', 'sqlite'])
+    def test_backend_integration(self, tmp_path, monkeypatch, make_log, backend):
+        """Backend denemeleri log'a yazmalı, eski kayıtlar sonra gelmeli"""
+        # Eski kayıtlar senkron veritabanı yoluyla yazılır
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+        if backend == 'json':
+            path = str(tmp_path / 'data.json')
+            open_db = lambda log: DBManager(json_path=path, attempt_log=log)
+        else:
+            path = str(tmp_path / 'data.db')
+            open_db = lambda log: SQLiteStorage(path, attempt_log=log)
+
+        db = open_db(None)
+        db.log_failed_attempt('old', '10.0.0.1', 0.1, 'low_similarity')
+        db.close()
+
+        log = make_log()
+        db = open_db(log)
+        size_before = os.path.getsize(path)
+        db.log_failed_attempt('new', '10.0.0.2', 0.2, 'low_similarity')
+        attempts = db.get_failed_attempts()
+        assert [a['username'] for a in attempts] == ['new', 'old']
+        assert os.path.getsize(path) == size_before
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
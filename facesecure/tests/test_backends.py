@@ -0,0 +1,113 @@
+"""
+Çıkarım backend'leri ve export doğrulama testleri
+"""
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from face.backends import create_backend, standardize_batch
+from face.export import embedding_agreement, sample_faces
+from face.processor import FaceEmbeddingProcessor
+
+
+class FakeBackend:
+    """Sabit projeksiyonlu sahte model"""
+
+    def __init__(self, noise=0.0, scale=1.0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((160 * 160 * 3, 16)).astype(np.float32)
+        self.noise = noise
+        self.scale = scale
+        self.rng = np.random.default_rng(seed + 1)
+
+    def embeddings(self, images):
+        flat = standardize_batch(images).reshape(len(images), -1)
+        out = self.scale * flat @ self.projection
+        return out + self.noise * self.rng.standard_normal(out.shape) * np.abs(out).mean()
+
+
+class TestStandardize:
+    """keras_facenet ile aynı görüntü başına standardizasyon"""
+
+    def test_matches_per_image_prewhiten(self):
+        images = np.random.default_rng(0).integers(0, 256, (4, 160, 160, 3), dtype=np.uint8)
+        batch = standardize_batch(images)
+        for image, standardized in zip(images, batch):
+            image = image.astype(np.float32)
+            expected = (image - image.mean()) / max(image.std(), 1 / np.sqrt(image.size))
+            assert np.allclose(standardized, expected, atol=1e-4)
+        assert batch.dtype == np.float32
+
+    def test_constant_image_is_finite(self):
+        batch = standardize_batch(np.full((1, 160, 160, 3), 128, dtype=np.uint8))
+        assert np.isfinite(batch).all() and np.allclose(batch, 0)
+
+
+class TestBackendSelection:
+    """create_backend ve processor'ın backend kullanımı"""
+
+    def test_invalid_configuration(self):
+        with pytest.raises(ValueError):
+            create_backend('caffe')
+        with pytest.raises(ValueError):
+            create_backend('onnx')
+        with pytest.raises(ValueError):
+            create_backend('tflite', None)
+
+    def test_processor_falls_back_to_stub(self, tmp_path):
+        """Model yüklenemezse processor stub embedding'e dönmeli"""
+        processor = FaceEmbeddingProcessor(backend='onnx', model_path=str(tmp_path / 'yok.onnx'))
+        assert processor.model is None and processor.embedding_dim == 128
+        assert processor.get_embedding(np.zeros((100, 100, 3), dtype=np.uint8)).shape == (128,)
+
+    def test_onnx_backend(self, tmp_path):
+        """ONNX modeli standardize edilmiş girdiyle çalışmalı"""
+        onnx = pytest.importorskip('onnx')
+        pytest.importorskip('onnxruntime')
+        from onnx import TensorProto, helper
+
+        # Kanal başına ortalama: (n, 160, 160, 3) -> (n, 3)
+        graph = helper.make_graph(
+            [helper.make_node('ReduceMean', ['input'], ['output'], axes=[1, 2], keepdims=0)],
+            'kanal_ortalamasi',
+            [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['n', 160, 160, 3])],
+            [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['n', 3])]
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+        path = str(tmp_path / 'mean.onnx')
+        onnx.save(model, path)
+
+        processor = FaceEmbeddingProcessor(backend='onnx', model_path=path)
+        assert processor.embedding_dim == 3
+
+        images = np.random.default_rng(1).integers(0, 256, (5, 160, 160, 3), dtype=np.uint8)
+        expected = standardize_batch(images).mean(axis=(1, 2))
+        assert np.allclose(processor.model.embeddings(images), expected, atol=1e-5)
+
+
+class TestEmbeddingAgreement:
+    """Export sonrası Keras referansıyla karşılaştırma"""
+
+    def test_identical_and_scaled_models_agree(self):
+        faces = sample_faces(count=8)
+        assert faces.shape == (8, 160, 160, 3) and faces.dtype == np.uint8
+
+        reference = FakeBackend()
+        assert embedding_agreement(reference, FakeBackend(), faces)['min'] > 0.9999
+        # Embedding ölçeği önemsiz (cosine)
+        assert embedding_agreement(reference, FakeBackend(scale=3.0), faces,
+                                   batch_size=3)['min'] > 0.9999
+
+    def test_divergent_model_is_detected(self):
+        faces = sample_faces(count=8)
+        agreement = embedding_agreement(FakeBackend(), FakeBackend(noise=0.5), faces)
+        assert agreement['min'] < 0.99
+        assert agreement['min'] <= agreement['mean'] < 1.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+"""
+Mikro-batch çıkarım kuyruğu (BatchingEmbedder) testleri
+"""
+import queue
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from face.batcher import BatchingEmbedder
+
+
+class FakeProcessor:
+    """Çağrı başına sabit maliyeti olan sahte model; gelen batch boyutlarını kaydeder"""
+
+    embedding_dim = 4
+
+    def __init__(self, delay=0.02, release=None):
+        self.delay = delay
+        self.release = release
+        self.batch_sizes = []
+
+    def get_embeddings(self, faces, normalize=True):
+        if self.release is not None:
+            self.release.wait(5)
+        time.sleep(self.delay)
+        self.batch_sizes.append(len(faces))
+        # Her crop'un ilk pikseli embedding'inin ilk elemanı olur (eşleşme kontrolü için)
+        return np.array([[float(face.flat[0]) + 1, 1.0, 0.0, 0.0] for face in faces],
+                        dtype=np.float32)
+
+
+def _face(value):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+
+class TestBatchingEmbedder:
+    """Eşzamanlı isteklerin birleştirilmesi ve sonuçların doğru çağırana dönmesi"""
+
+    def test_concurrent_requests_are_coalesced(self):
+        processor = FakeProcessor()
+        embedder = BatchingEmbedder(processor, max_batch_size=8, max_wait=0.05)
+        results = {}
+
+        def request(value):
+            results[value] = embedder.get_embedding(_face(value), normalize=False)
+
+        threads = [threading.Thread(target=request, args=(value,)) for value in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        embedder.close()
+
+        for value, embedding in results.items():
+            assert embedding[0] == value + 1
+        assert sum(processor.batch_sizes) == 20
+        assert max(processor.batch_sizes) <= 8
+        assert len(processor.batch_sizes) < 20
+
+        stats = embedder.stats()
+        assert stats['items'] == 20 and stats['batches'] == len(processor.batch_sizes)
+        assert stats['mean_batch_size'] > 1 and stats['queue_depth'] == 0
+
+    def test_get_embeddings_and_normalize(self):
+        embedder = BatchingEmbedder(FakeProcessor(delay=0), max_batch_size=4, max_wait=0)
+        embeddings = embedder.get_embeddings([_face(v) for v in (3, 0, 7)])
+        assert embeddings.shape == (3, 4)
+        assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+        assert np.allclose(embeddings[0], np.array([4, 1, 0, 0]) / np.sqrt(17))
+        assert embedder.get_embeddings([]).shape == (0, 4)
+        embedder.close()
+
+    def test_full_queue_rejects(self):
+        """Kuyruk doluyken yeni istekler reddedilip sayılmalı"""
+        release = threading.Event()
+        embedder = BatchingEmbedder(FakeProcessor(delay=0, release=release),
+                                    max_batch_size=1, max_wait=0, queue_size=2)
+        futures = [embedder.submit(_face(0))]
+        # İlk crop modele girene kadar bekle, sonra kuyruğu doldur
+        while embedder.stats()['queue_depth']:
+            time.sleep(0.001)
+        futures += [embedder.submit(_face(1)), embedder.submit(_face(2))]
+        with pytest.raises(queue.Full):
+            embedder.submit(_face(3))
+
+        stats = embedder.stats()
+        assert stats['rejected'] == 1 and stats['queue_peak'] == 2
+        release.set()
+        assert all(future.result(5)[0] > 0 for future in futures)
+        embedder.close()
+
+    def test_model_error_reaches_callers(self):
+        class BrokenProcessor(FakeProcessor):
+            def get_embeddings(self, faces, normalize=True):
+                raise RuntimeError('çıkarım hatası')
+
+        embedder = BatchingEmbedder(BrokenProcessor(), max_wait=0)
+        with pytest.raises(RuntimeError, match='çıkarım hatası'):
+            embedder.get_embedding(_face(1))
+        # Thread hatadan sonra çalışmaya devam etmeli
+        assert embedder._thread.is_alive()
+        embedder.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
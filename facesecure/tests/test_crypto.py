@@ -4,6 +4,7 @@ Sprint 2 unit testleri - Crypto ve DB testleri
 import pytest
 import numpy as np
 import sys
+import threading
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -66,6 +67,64 @@ class TestCryptoManager:
         with pytest.raises(ValueError, match="HMAC doğrulama başarısız"):
             crypto_manager.decrypt_embedding(encrypted_b64, fake_hmac)
     
+    def test_decrypt_many(self, crypto_manager):
+        """Toplu deşifre, verilen buffer'a tek tek deşifre ile aynı sonucu yazmalı"""
+        embeddings = np.random.randn(100, 128).astype(np.float32)
+        records = crypto_manager.encrypt_many(embeddings, workers=4)
+        
+        out = np.empty((100, 128), dtype=np.float32)
+        result = crypto_manager.decrypt_many(records, out=out, embedding_dim=128, workers=4)
+        assert result is out
+        assert np.array_equal(out, embeddings)
+        
+        single = crypto_manager.decrypt_embedding(*records[7], embedding_dim=128)
+        assert np.array_equal(single, embeddings[7])
+        crypto_manager.close()
+    
+    def test_concurrent_calls_with_growing_workers(self, crypto_manager):
+        """Farklı workers değerli eşzamanlı çağrılar paylaşılan pool'u kapatmamalı"""
+        embeddings = np.random.randn(256, 128).astype(np.float32)
+        records = crypto_manager.encrypt_many(embeddings, workers=2)
+        errors = []
+        
+        def work(workers):
+            try:
+                for _ in range(5):
+                    out = crypto_manager.decrypt_many(records, embedding_dim=128,
+                                                      workers=workers)
+                    assert np.array_equal(out, embeddings)
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=work, args=(workers,))
+                   for workers in (2, 4, 8, 16, 32, 64, 3, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert errors == []
+        executor = crypto_manager._executor
+        crypto_manager.decrypt_many(records, embedding_dim=128, workers=128)
+        # Pool değiştirilmez; büyük workers sadece daha çok parçaya bölünür
+        assert crypto_manager._executor is executor
+        crypto_manager.close()
+    
+    def test_decrypt_many_validation(self, crypto_manager, sample_embedding):
+        """Yanlış boyutlu buffer ve bozuk HMAC reddedilmeli"""
+        records = crypto_manager.encrypt_many(sample_embedding[None, :])
+        
+        with pytest.raises(ValueError):
+            crypto_manager.decrypt_many(records, out=np.empty((2, 128), dtype=np.float32),
+                                        embedding_dim=128)
+        with pytest.raises(ValueError):
+            crypto_manager.decrypt_many(records, embedding_dim=64)
+        
+        encrypted_b64, hmac_b64 = records[0]
+        with pytest.raises(ValueError, match="HMAC doğrulama başarısız"):
+            crypto_manager.decrypt_many([(encrypted_b64, hmac_b64[:-4] + "FAKE")],
+                                        embedding_dim=128)
+    
     def test_generate_keys(self):
         """Anahtar üretme testi"""
         aes_key_b64, hmac_key_b64 = generate_keys()
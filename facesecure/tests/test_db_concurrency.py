@@ -0,0 +1,152 @@
+"""
+DBManager okuyucu/yazıcı eşzamanlılık testleri (threaded sunucu senaryosu)
+"""
+import base64
+import os
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.db import DBManager
+
+USERS = 20
+ROUNDS = 40
+READERS = 2
+REQUIRED_KEYS = ('_id', 'username', 'created_at', 'updated_at')
+
+
+def _docs(round_no=0):
+    return [{'encrypted': base64.b64encode(os.urandom(64)).decode(),
+             'hmac': base64.b64encode(os.urandom(32)).decode(),
+             'pose_index': i,
+             'round': round_no} for i in range(2)]
+
+
+@pytest.fixture(autouse=True)
+def fast_switching():
+    """Thread'ler arası geçişi sıklaştırarak yarışları görünür yapar"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _run_readers(target, stop):
+    errors = []
+
+    def loop():
+        try:
+            while not stop.is_set():
+                target()
+        except Exception as e:  # noqa: BLE001 - test hatası olarak raporlanır
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=loop) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    return threads, errors
+
+
+class TestReaderWriterConcurrency:
+    """Kilitsiz okuyucular yarım uygulanmış değişiklik görmemeli"""
+
+    @pytest.mark.parametrize('wal', [False, True])
+    def test_rotation_batch_is_atomic(self, tmp_path, wal):
+        """Toplu güncellemenin ya tamamı ya hiçbiri görünmeli"""
+        db = DBManager(json_path=str(tmp_path / 'fs.json'), wal=wal)
+        for i in range(USERS):
+            db.create_user(f'user{i}', _docs())
+        seen = []
+
+        def read():
+            rounds = {user['embeddings'][0]['round'] for user in db.get_all_users()}
+            assert len(rounds) == 1, f"Karışık turlar görüldü: {sorted(rounds)}"
+            seen.append(rounds.pop())
+
+        store_docs = db._store_docs
+
+        def store_docs_and_read(docs):
+            # Toplu güncellemenin ortasında okuyan bir istek thread'i
+            read()
+            return store_docs(docs)
+
+        db._store_docs = store_docs_and_read
+        try:
+            for n in range(1, 4):
+                updates = {user['username']: (user, {'embeddings': _docs(n)})
+                           for user in db.get_all_users()}
+                assert len(db.update_user_records(updates)) == USERS
+            read()
+        finally:
+            db.close()
+        assert seen[-1] == 3
+        assert seen == sorted(seen)
+
+    @pytest.mark.parametrize('wal', [False, True])
+    def test_create_delete_and_reload(self, tmp_path, wal):
+        """Kayıt/silme ve başka instance'tan yeniden yükleme sırasında okumalar tutarlı"""
+        json_path = str(tmp_path / 'fs.json')
+        db = DBManager(json_path=json_path, wal=wal)
+        other = DBManager(json_path=json_path, wal=wal)
+        for i in range(USERS):
+            db.create_user(f'base{i}', _docs())
+
+        stop = threading.Event()
+
+        def read():
+            for user in db.get_all_users():
+                assert all(key in user for key in REQUIRED_KEYS)
+                assert len(user['embeddings']) == 2
+            # Diğer instance'ın yazmaları yüklenirken sabit kullanıcılar kaybolmamalı
+            for i in range(USERS):
+                assert db.get_user_by_username(f'base{i}') is not None
+            assert len(db.get_failed_attempts(5)) <= 5
+
+        threads, errors = _run_readers(read, stop)
+        try:
+            for n in range(ROUNDS):
+                if stop.is_set():
+                    break
+                db.create_user(f'tmp{n}', _docs())
+                other.create_user(f'other{n}', _docs())
+                db.refresh()
+                db.log_failed_attempt(f'tmp{n}', '10.0.0.1', 0.1, 'low_similarity')
+                if n % 2 == 0:
+                    db.delete_user(f'tmp{n}')
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        try:
+            assert not errors, errors[0]
+            db.refresh()
+            usernames = {user['username'] for user in db.get_all_users()}
+            assert {f'other{n}' for n in range(ROUNDS)} <= usernames
+            assert {f'tmp{n}' for n in range(1, ROUNDS, 2)} <= usernames
+            assert not {f'tmp{n}' for n in range(0, ROUNDS, 2)} & usernames
+        finally:
+            other.close()
+            db.close()
+
+    def test_published_dict_is_never_mutated(self, tmp_path):
+        """Okuyucunun elindeki snapshot sonraki yazmalardan etkilenmemeli"""
+        db = DBManager(json_path=str(tmp_path / 'fs.json'))
+        db.create_user('alice', _docs())
+        snapshot = db.users_storage
+
+        db.create_user('bob', _docs())
+        db.delete_user('alice')
+        db.update_user_records({})
+
+        assert set(snapshot) == {'alice'}
+        assert set(db.users_storage) == {'bob'}
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -118,6 +118,81 @@ class TestFaceEmbeddingProcessor:
         assert processed.min() >= -1.0
         assert processed.max() <= 1.0
 
+    def test_get_embeddings_matches_single(self, processor):
+        """Batch embedding'ler tek tek üretilenlerle aynı olmalı"""
+        faces = [np.random.randint(0, 255, (120 + 10 * i, 110, 3), dtype=np.uint8)
+                 for i in range(5)]
+        embeddings = processor.get_embeddings(faces)
+        assert embeddings.shape == (5, 128)
+        assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-6)
+        for face, embedding in zip(faces, embeddings):
+            assert np.allclose(processor.get_embedding(face), embedding)
+        assert processor.get_embeddings([]).shape == (0, 128)
+
+    def test_get_embeddings_single_forward_pass(self, processor):
+        """Crop'lar batch_size'lık parçalarla modele tek tensör olarak gitmeli"""
+        batches = []
+
+        class FakeModel:
+            def embeddings(self, images):
+                batches.append(images.shape)
+                return images.reshape(len(images), -1)[:, :128].astype(np.float32) + 1
+
+        processor.model = FakeModel()
+        faces = [np.random.randint(0, 255, (100, 100, 3), dtype=np.uint8) for _ in range(12)]
+        embeddings = processor.get_embeddings(faces, batch_size=8)
+
+        assert batches == [(8, 160, 160, 3), (4, 160, 160, 3)]
+        assert embeddings.shape == (12, 128)
+        # BGR -> RGB: ilk piksel kanalları ters sırada olmalı
+        expected = cv2.cvtColor(cv2.resize(faces[0], (160, 160)), cv2.COLOR_BGR2RGB)
+        assert np.allclose(embeddings[0] * np.linalg.norm(expected.reshape(-1)[:128] + 1.0),
+                           expected.reshape(-1)[:128] + 1.0, atol=1e-3)
+
+    def test_get_embeddings_pads_to_buckets(self):
+        """Sabit şekilli backend'de batch'ler bucket boyutuna tamamlanmalı, dolgu atılmalı"""
+        batches = []
+
+        class FakeModel:
+            bucketed = True
+
+            def embeddings(self, images):
+                batches.append(images.shape[0])
+                return images.reshape(len(images), -1)[:, :128].astype(np.float32) + 1
+
+        processor = FaceEmbeddingProcessor(embedding_dim=128, buckets=[8, 1, 4])
+        processor.model = FakeModel()
+        faces = [np.random.randint(0, 255, (100, 100, 3), dtype=np.uint8) for _ in range(13)]
+
+        # 32'lik istek en büyük bucket'la (8) sınırlanır: 8 + 5 -> 8 + 8
+        embeddings = processor.get_embeddings(faces)
+        assert batches == [8, 8]
+        assert embeddings.shape == (13, 128)
+        assert np.allclose(embeddings, processor.get_embeddings(faces, batch_size=1), atol=1e-6)
+
+        batches.clear()
+        processor.get_embeddings(faces[:3])
+        processor.get_embeddings(faces[:1])
+        assert batches == [4, 1]
+        assert processor.bucket_size(2) == 4 and processor.bucket_size(9) == 9
+
+    def test_dynamic_backend_is_not_padded(self):
+        """bucketed=False backend'e (ONNX) batch olduğu gibi gitmeli"""
+        batches = []
+
+        class FakeModel:
+            bucketed = False
+
+            def embeddings(self, images):
+                batches.append(images.shape[0])
+                return images.reshape(len(images), -1)[:, :128].astype(np.float32) + 1
+
+        processor = FaceEmbeddingProcessor(embedding_dim=128, buckets=[1, 4, 8])
+        processor.model = FakeModel()
+        faces = [np.random.randint(0, 255, (100, 100, 3), dtype=np.uint8) for _ in range(3)]
+        processor.get_embeddings(faces)
+        assert batches == [3] and processor.bucket_size(3) == 3
+
 
 class TestIntegration:
     """Entegrasyon testleri - Detector + Processor pipeline"""
@@ -0,0 +1,185 @@
+"""
+İçerik adresli embedding önbelleği testleri
+"""
+import importlib
+import pytest
+import sys
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# api/app.py route'ları 'routes.*' olarak import eder
+sys.path.insert(0, str(Path(__file__).parent.parent / 'api'))
+
+from face import embedding_cache as cache_module
+from face.embedding_cache import ENTRY_OVERHEAD_BYTES, EmbeddingCache
+from utils.registry import ResourceRegistry
+
+
+def unit(seed, dim=128):
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestEmbeddingCache:
+    """LRU, bellek sınırı, TTL ve şifreleme"""
+
+    def test_hit_and_miss(self):
+        cache = EmbeddingCache(capacity=4)
+        key = cache.key(b'jpeg baytlari')
+        assert key == cache.key(b'jpeg baytlari') and key != cache.key(b'baska')
+        assert cache.get(key) is None
+
+        cache.put(unit(0), key)
+        cached = cache.get(key)
+        assert cached.dtype == np.float32 and np.array_equal(cached, unit(0))
+        # Döndürülen dizi kopya olmalı
+        cached[:] = 0
+        assert np.array_equal(cache.get(key), unit(0))
+
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+
+    def test_crop_keys_include_shape(self):
+        cache = EmbeddingCache()
+        crop = np.zeros((10, 12, 3), dtype=np.uint8)
+        assert cache.key(crop) != cache.key(crop.reshape(12, 10, 3))
+        assert cache.key(crop) != cache.key(crop.tobytes())
+        # Süreçler arası sabit olmayan, anahtarlı özet
+        assert cache.key(b'x') != EmbeddingCache().key(b'x')
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(capacity=2)
+        keys = [cache.key(bytes([i])) for i in range(3)]
+        cache.put(unit(0), keys[0])
+        cache.put(unit(1), keys[1])
+        cache.get(keys[0])
+        cache.put(unit(2), keys[2])
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_memory_cap(self):
+        entry = 32 + 128 * 4 + ENTRY_OVERHEAD_BYTES
+        cache = EmbeddingCache(capacity=100, max_bytes=3 * entry)
+        keys = [cache.key(bytes([i])) for i in range(5)]
+        for i, key in enumerate(keys):
+            cache.put(unit(i), key)
+
+        stats = cache.stats()
+        assert stats['entries'] == 3 and stats['bytes'] == 3 * entry
+        assert stats['evictions'] == 2
+        assert cache.get(keys[0]) is None and cache.get(keys[4]) is not None
+
+    def test_ttl(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+        cache = EmbeddingCache(ttl=10)
+        key = cache.key(b'foto')
+        cache.put(unit(0), key)
+
+        now[0] += 9
+        assert cache.get(key) is not None
+        now[0] += 2
+        assert cache.get(key) is None
+        stats = cache.stats()
+        assert stats['expirations'] == 1 and stats['entries'] == 0 and stats['bytes'] == 0
+
+    def test_encrypted_at_rest(self):
+        cache = EmbeddingCache(encrypt=True)
+        image_key, crop_key = cache.key(b'foto'), cache.key(np.ones((4, 4, 3), np.uint8))
+        cache.put(unit(0), image_key, crop_key)
+
+        payloads = [entry.payload for entry in cache._entries.values()]
+        plaintext = unit(0).tobytes()
+        assert all(plaintext not in payload for payload in payloads)
+        # Her kayıt ayrı nonce ile
+        assert payloads[0] != payloads[1]
+        assert np.array_equal(cache.get(image_key), unit(0))
+        assert np.array_equal(cache.get(crop_key), unit(0))
+        assert cache.stats()['encrypted'] is True
+
+    def test_disabled(self):
+        cache = EmbeddingCache(capacity=0)
+        assert cache.key(b'foto') is None and cache.get(None) is None
+        cache.put(unit(0), None)
+        assert len(cache) == 0 and cache.stats()['misses'] == 0
+
+
+class FakeDetector:
+    def __init__(self):
+        self.calls = 0
+
+    def detect_faces(self, image):
+        self.calls += 1
+        return [image[:100, :100]]
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def get_embedding(self, face, normalize=True):
+        self.calls += 1
+        return unit(int(face.sum()) % 1000)
+
+    def stats(self):
+        return {'items': self.calls}
+
+
+class TestVerifyRoute:
+    """Tekrarlanan /api/verify istekleri"""
+
+    @pytest.fixture
+    def client_and_fakes(self, tmp_path, monkeypatch):
+        pytest.importorskip('flask')
+        cv2 = pytest.importorskip('cv2')
+        monkeypatch.setenv('FS_WARM_ON_START', '0')
+        monkeypatch.setenv('MONGO_URI', f"sqlite:///{tmp_path / 'fs.db'}")
+        app_module = importlib.import_module('api.app')
+
+        storage = SimpleNamespace(refresh=lambda: None,
+                                  log_failed_attempt=lambda *args: None,
+                                  get_user_metadata=lambda username: {'username': username})
+        gallery = SimpleNamespace(snapshot=SimpleNamespace(usernames=['ali']),
+                                  best_match=lambda query, username=None: ('ali', 0.9))
+        detector, embedder, cache = FakeDetector(), FakeEmbedder(), EmbeddingCache()
+        registry = ResourceRegistry({
+            'storage': lambda registry: storage,
+            'gallery': lambda registry: gallery,
+            'detector': lambda registry: detector,
+            'embedder': lambda registry: embedder,
+            'embedding_cache': lambda registry: cache,
+        })
+        image = np.random.default_rng(0).integers(0, 256, (120, 120, 3), dtype=np.uint8)
+        png = cv2.imencode('.png', image)[1].tobytes()
+        return app_module.create_app(registry).test_client(), detector, embedder, cache, png
+
+    def post(self, client, data):
+        return client.post('/api/verify', data={'image': (BytesIO(data), 'yuz.png')},
+                           content_type='multipart/form-data')
+
+    def test_retry_skips_detection_and_inference(self, client_and_fakes):
+        client, detector, embedder, cache, png = client_and_fakes
+        first = self.post(client, png).get_json()
+        second = self.post(client, png).get_json()
+
+        assert first == second and first['verified'] is True
+        assert detector.calls == 1 and embedder.calls == 1
+        assert client.get('/metrics').get_json()['embedding_cache']['hits'] == 1
+
+    def test_same_crop_skips_inference(self, client_and_fakes):
+        """Farklı kodlanmış ama aynı pikselli dosya: tespit var, çıkarım yok"""
+        client, detector, embedder, cache, png = client_and_fakes
+        self.post(client, png)
+        self.post(client, png + b'\x00')
+
+        assert detector.calls == 2 and embedder.calls == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,291 @@
+"""
+Binary (mmap) embedding deposu testleri
+"""
+import base64
+import json
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys, user_associated_data
+from utils.db import DBManager
+from utils.embedding_store import EmbeddingStore
+from face.gallery import EmbeddingGallery
+
+
+DIM = 64
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def crypto_manager():
+    aes_key_b64, hmac_key_b64 = generate_keys()
+    return CryptoManager(aes_key_b64, hmac_key_b64)
+
+
+def _encrypted_docs(crypto_manager, seed, count=3):
+    docs = []
+    for i, emb in enumerate(_random_embeddings(count, DIM, seed)):
+        encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(emb)
+        docs.append({'encrypted': encrypted_b64, 'hmac': hmac_b64, 'pose_index': i})
+    return docs
+
+
+class TestEmbeddingStore:
+    """Sabit adımlı kayıt dosyası testleri"""
+
+    def test_write_and_read_record(self, tmp_path, crypto_manager):
+        """Kayıt mmap üzerinden kopyasız okunup deşifre edilebilmeli"""
+        store = EmbeddingStore(str(tmp_path / 'emb.bin'))
+        embedding = _random_embeddings(1, DIM, seed=0)[0]
+        plaintext = embedding.tobytes()
+        encrypted_b64, hmac_b64 = crypto_manager.encrypt_bytes(plaintext)
+        doc = {'encrypted': encrypted_b64, 'hmac': hmac_b64}
+
+        slot = store.write(base64.b64decode(doc['encrypted']), base64.b64decode(doc['hmac']))
+        assert slot == 0
+        assert len(store) == 1
+
+        encrypted, mac = store.record(slot)
+        assert isinstance(encrypted, memoryview)
+        assert crypto_manager.decrypt_record(encrypted, mac) == plaintext
+        store.close()
+
+    def test_reopen_keeps_stride(self, tmp_path):
+        """Var olan dosyanın stride'ı başlıktan okunmalı"""
+        path = str(tmp_path / 'emb.bin')
+        EmbeddingStore(path, stride=128).close()
+        store = EmbeddingStore(path)
+        assert store.stride == 128
+        with pytest.raises(ValueError):
+            store.write(bytes(store.max_encrypted_size + 1), bytes(32))
+        store.close()
+
+    def test_cleared_slot(self, tmp_path):
+        """Silinen slot okunamamalı, dosya dışındaki slot IndexError vermeli"""
+        store = EmbeddingStore(str(tmp_path / 'emb.bin'))
+        slot = store.write(b'x' * 40, bytes(32))
+        store.clear(slot)
+        with pytest.raises(ValueError):
+            store.record(slot)
+        with pytest.raises(IndexError):
+            store.record(5)
+        store.close()
+
+    def test_blob_spans_slots(self, tmp_path):
+        """Slot'a sığmayan kayıt slot zinciri olarak yazılıp okunabilmeli"""
+        store = EmbeddingStore(str(tmp_path / 'emb.bin'), stride=128)
+        blob = bytes(range(256)) * 2
+        free_slots = [7, 2]
+        store.write(b'x', bytes(32), slot=7)
+        slots = store.write_blob(blob, free_slots)
+
+        # 512 bayt / 92 bayt'lık parça -> 6 slot; önce boş slot'lar kullanılır
+        assert slots[:2] == [2, 7] and len(slots) == 6 and free_slots == []
+        assert store.read_blob(slots) == blob
+        with pytest.raises(ValueError):
+            store.write_blob(b'', [])
+        store.close()
+
+    def test_invalid_file(self, tmp_path):
+        """Magic uyuşmayan dosya reddedilmeli"""
+        path = tmp_path / 'emb.bin'
+        path.write_bytes(b'\x00' * 64)
+        with pytest.raises(ValueError):
+            EmbeddingStore(str(path))
+
+
+class TestBinaryDBManager:
+    """Binary formatta DBManager ve galeri entegrasyonu"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        db = DBManager(json_path=str(tmp_path / 'users.json'), storage_format='binary')
+        yield db
+        db.close()
+
+    def test_metadata_has_no_ciphertext(self, db, crypto_manager):
+        """Metadata JSON sadece slot referansı tutmalı"""
+        db.create_user('alice', _encrypted_docs(crypto_manager, seed=1))
+        user = db.get_user_by_username('alice')
+        assert [doc['slot'] for doc in user['embeddings']] == [0, 1, 2]
+        assert all('encrypted' not in doc for doc in user['embeddings'])
+        assert user['embeddings'][2]['pose_index'] == 2
+
+        reloaded = DBManager(json_path=db.json_path, storage_format='binary')
+        assert reloaded.get_user_by_username('alice') == user
+        reloaded.close()
+
+    def test_sealed_metadata_has_no_ciphertext(self, db, crypto_manager):
+        """Mühürlü (varsayılan) kayıtta da metadata sadece slot referansı tutmalı"""
+        embeddings = _random_embeddings(12, DIM, seed=1)
+        sealed = {}
+
+        def seal(user_id):
+            sealed['blob'] = crypto_manager.seal_embeddings(
+                embeddings, user_associated_data(user_id, 'alice'))
+            return sealed['blob']
+
+        db.create_sealed_user('alice', seal, embedding_count=12)
+        user = db.get_user_by_username('alice')
+        assert set(user['sealed']) == {'slots'} and user['embedding_count'] == 12
+        assert len(user['sealed']['slots']) > 1
+        with open(db.json_path, 'r', encoding='utf-8') as f:
+            assert sealed['blob'][:64] not in f.read()
+
+        reloaded = DBManager(json_path=db.json_path, storage_format='binary')
+        assert reloaded.get_user_by_username('alice') == user
+        reloaded.close()
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM, store=db.embedding_store)
+        gallery.sync(db.get_all_users())
+        username, similarity = gallery.best_match(embeddings[4])
+        assert username == 'alice' and similarity == pytest.approx(1.0, abs=1e-5)
+
+        # Rotasyon yeni blob'u ayrı slot'lara yazar, eskileri boşaltır; silme hepsini
+        old_slots = user['sealed']['slots']
+        assert db.update_user_records({'alice': (user, {'sealed': seal(user['_id'])})}) == ['alice']
+        new_slots = db.get_user_by_username('alice')['sealed']['slots']
+        assert not set(new_slots) & set(old_slots)
+        assert sorted(db.free_slots) == sorted(old_slots)
+        assert db.delete_user('alice')
+        assert sorted(db.free_slots) == sorted(old_slots + new_slots)
+
+    def test_load_and_metadata_do_not_read_records(self, db, crypto_manager, monkeypatch):
+        """Açılış, varlık kontrolü ve listeler .bin dosyasındaki kayıtlara dokunmamalı"""
+        embeddings = _random_embeddings(12, DIM, seed=1)
+        for name in ('alice', 'bob'):
+            db.create_sealed_user(name, lambda user_id, name=name: crypto_manager.seal_embeddings(
+                embeddings, user_associated_data(user_id, name)), embedding_count=12)
+        db.create_user('carol', _encrypted_docs(crypto_manager, seed=3))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("kayıt okundu")
+
+        monkeypatch.setattr(EmbeddingStore, 'record', fail)
+        reopened = DBManager(json_path=db.json_path, storage_format='binary')
+        assert reopened.get_user_metadata('alice')['embedding_count'] == 12
+        assert [user['username'] for user in reopened.query_users()[0]] == ['alice', 'bob', 'carol']
+        assert reopened.user_stats() == {'users': 3, 'embeddings': 27}
+        assert set(reopened.get_user_by_username('bob')['sealed']) == {'slots'}
+        reopened.close()
+
+    def test_gallery_decrypts_from_store(self, db, crypto_manager):
+        """Galeri slot kayıtlarını store üzerinden deşifre etmeli"""
+        for i in range(3):
+            db.create_user(f'user{i}', _encrypted_docs(crypto_manager, seed=i))
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM,
+                                   store=db.embedding_store)
+        gallery.sync(db.get_all_users())
+        query = _random_embeddings(3, DIM, seed=1)[1]
+        username, similarity = gallery.best_match(query)
+        assert username == 'user1'
+        assert similarity == pytest.approx(1.0, abs=1e-5)
+
+    def test_delete_reuses_slots(self, db, crypto_manager):
+        """Silinen kullanıcının slot'ları yeniden kullanılmalı"""
+        db.create_user('alice', _encrypted_docs(crypto_manager, seed=1))
+        db.create_user('bob', _encrypted_docs(crypto_manager, seed=2))
+        assert db.delete_user('alice')
+        assert sorted(db.free_slots) == [0, 1, 2]
+
+        db.create_user('carol', _encrypted_docs(crypto_manager, seed=3))
+        assert sorted(doc['slot'] for doc in db.get_user_by_username('carol')['embeddings']) == [0, 1, 2]
+        assert len(db.embedding_store) == 6
+
+    @pytest.mark.parametrize('wal', [False, True])
+    def test_freed_slots_survive_restart(self, tmp_path, crypto_manager, wal):
+        """Silme/rotasyonla boşalan slot'lar yeniden açılışta da kullanılabilmeli"""
+        json_path = str(tmp_path / 'users.json')
+        db = DBManager(json_path=json_path, storage_format='binary', wal=wal)
+        db.create_user('alice', _encrypted_docs(crypto_manager, seed=1))
+        db.create_user('bob', _encrypted_docs(crypto_manager, seed=2))
+        bob = db.get_user_by_username('bob')
+        assert db.delete_user('alice')
+        # Rotasyon bob'un eski slot'larını (3, 4, 5) boşaltır, yenilerini 0-2'ye yazar
+        assert db.update_user_records({
+            'bob': (bob, {'embeddings': _encrypted_docs(crypto_manager, seed=4)})
+        }) == ['bob']
+        # Sonraki bir kayıt olmadan süreç kapanır (close çağrılmaz)
+
+        reopened = DBManager(json_path=json_path, storage_format='binary', wal=wal)
+        assert sorted(reopened.free_slots) == [3, 4, 5]
+        reopened.create_user('carol', _encrypted_docs(crypto_manager, seed=3))
+        slots = sorted(doc['slot'] for doc in reopened.get_user_by_username('carol')['embeddings'])
+        assert slots == [3, 4, 5] and len(reopened.embedding_store) == 6
+        reopened.close()
+        db.close()
+
+    def test_import_json(self, db, tmp_path, monkeypatch, crypto_manager):
+        """Eski JSON veritabanı binary formata aktarılabilmeli"""
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+        legacy = DBManager(json_path=str(tmp_path / 'legacy.json'), storage_format='json')
+        legacy.create_user('alice', _encrypted_docs(crypto_manager, seed=1))
+        legacy.log_failed_attempt('alice', '127.0.0.1', 0.3, 'low_similarity')
+
+        assert db.import_json(legacy.json_path) == 1
+        assert db.user_id_counter == 1
+        assert len(db.get_failed_attempts()) == 1
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM,
+                                   store=db.embedding_store)
+        gallery.sync(db.get_all_users())
+        query = _random_embeddings(3, DIM, seed=1)[0]
+        assert gallery.best_match(query)[0] == 'alice'
+
+    def test_import_sealed_json(self, db, tmp_path, crypto_manager):
+        """İçe aktarılan mühürlü blob'lar metadata yerine binary dosyaya yazılmalı"""
+        legacy = DBManager(json_path=str(tmp_path / 'legacy.json'), storage_format='json')
+        embeddings = _random_embeddings(2, DIM, seed=5)
+        legacy.create_sealed_user('bob', lambda user_id: crypto_manager.seal_embeddings(
+            embeddings, user_associated_data(user_id, 'bob')), embedding_count=2)
+        legacy.close()
+
+        assert db.import_json(legacy.json_path) == 1
+        assert isinstance(db.get_user_by_username('bob')['sealed'], dict)
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM, store=db.embedding_store)
+        gallery.sync(db.get_all_users())
+        assert gallery.best_match(embeddings[1])[0] == 'bob'
+
+    def test_import_rejects_id_clash(self, db, tmp_path, crypto_manager):
+        """Mevcut kullanıcının ID'sini taşıyan içe aktarma reddedilmeli"""
+        db.create_user('alice', _encrypted_docs(crypto_manager, seed=1))
+        legacy = DBManager(json_path=str(tmp_path / 'legacy.json'), storage_format='json')
+        legacy.create_user('bob', _encrypted_docs(crypto_manager, seed=2))
+        legacy.close()
+
+        with pytest.raises(ValueError):
+            db.import_json(legacy.json_path)
+        assert db.get_user_by_username('bob') is None
+        assert len(db.embedding_store) == 3
+
+    def test_import_advances_id_counter(self, db, tmp_path, crypto_manager):
+        """Sayaç en büyük içe aktarılan ID'nin altında kalmamalı"""
+        legacy_path = str(tmp_path / 'legacy.json')
+        legacy = DBManager(json_path=legacy_path, storage_format='json')
+        for name in ('a', 'b', 'c'):
+            legacy.create_user(name, _encrypted_docs(crypto_manager, seed=3))
+        legacy.close()
+        # Sayaç alanı eksik / geride kalmış eski dosya
+        with open(legacy_path, encoding='utf-8') as f:
+            data = json.load(f)
+        data['user_id_counter'] = 0
+        with open(legacy_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        assert db.import_json(legacy_path) == 3
+        assert db.user_id_counter == 3
+        assert db.create_user('d', _encrypted_docs(crypto_manager, seed=4)) == '4'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
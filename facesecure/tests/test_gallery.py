@@ -0,0 +1,509 @@
+"""
+Galeri (1:N eşleştirme) testleri
+"""
+import pytest
+import numpy as np
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys
+from face.gallery import EmbeddingGallery, TemplateCache, compute_prototypes
+from face.ann import IVFIndex, create_index
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+class TestEmbeddingGallery:
+    """EmbeddingGallery sınıfı için testler"""
+
+    DIM = 128
+
+    @pytest.fixture
+    def crypto_manager(self):
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        return CryptoManager(aes_key_b64, hmac_key_b64)
+
+    @pytest.fixture
+    def users(self, crypto_manager):
+        """3 kullanıcı, her biri 4 şifrelenmiş embedding"""
+        users = []
+        for i, name in enumerate(['ali', 'ayse', 'mehmet']):
+            docs = []
+            for emb in _random_embeddings(4, self.DIM, seed=i):
+                encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(emb)
+                docs.append({'encrypted': encrypted_b64, 'hmac': hmac_b64})
+            users.append({
+                '_id': str(i + 1),
+                'username': name,
+                'embeddings': docs,
+                'updated_at': '2025-01-01T00:00:00'
+            })
+        return users
+
+    @pytest.fixture
+    def gallery(self, crypto_manager, users):
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM)
+        gallery.sync(users)
+        return gallery
+
+    def test_sync_builds_matrix(self, gallery):
+        """Galeri tüm embedding'leri tek matriste tutmalı"""
+        snap = gallery.snapshot
+        assert snap.matrix.shape == (12, self.DIM)
+        assert snap.matrix.dtype == np.float32
+        assert snap.matrix.flags['C_CONTIGUOUS']
+        assert len(gallery) == 12
+
+    def test_sync_without_changes(self, gallery, users):
+        """Değişiklik yoksa galeri yeniden kurulmamalı"""
+        snap = gallery.snapshot
+        assert gallery.sync(users) is False
+        assert gallery.snapshot is snap
+
+    def test_sync_removes_deleted_user(self, gallery, users):
+        """Silinen kullanıcı galeriden çıkmalı"""
+        assert gallery.sync(users[:2]) is True
+        assert 'mehmet' not in gallery.snapshot.usernames
+        assert len(gallery) == 8
+
+    def _user(self, crypto_manager, name, seed, updated_at='2025-01-01T00:00:00'):
+        docs = [{'encrypted': e, 'hmac': h}
+                for e, h in crypto_manager.encrypt_many(_random_embeddings(4, self.DIM, seed))]
+        return {'_id': name, 'username': name, 'embeddings': docs, 'updated_at': updated_at}
+
+    def test_events_append_without_rebuilding(self, crypto_manager):
+        """Olaylar matrisi yeniden kurmamalı; eski snapshot değişmemeli"""
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM)
+        gallery.sync([self._user(crypto_manager, f'user{i}', seed=i) for i in range(10)])
+        old = gallery.snapshot
+        old_rows = old.user_rows('user3').copy()
+
+        gallery.on_store_event('create', 'new', self._user(crypto_manager, 'new', seed=50))
+        gallery.on_store_event('update', 'user3', self._user(
+            crypto_manager, 'user3', seed=60, updated_at='2025-02-01T00:00:00'))
+        snap = gallery.snapshot
+        # Yeni satırlar aynı tampona eklenir; güncellenen kullanıcının eskileri tombstone
+        assert np.shares_memory(snap.matrix, old.matrix)
+        assert snap.size == 44 and len(snap.matrix) == 48
+        assert list(snap.dead_rows) == list(range(12, 16))
+        assert np.array_equal(old.user_rows('user3'), old_rows)
+        assert old.user_rows('new') is None and old.size == 40
+
+        # Tombstone satırlar hiçbir aramada dönmemeli
+        assert gallery.best_match(old_rows[0])[0] != 'user3'
+        query = _random_embeddings(4, self.DIM, seed=60)[1]
+        assert gallery.best_match(query)[0] == 'user3'
+        names = [name for name, _ in gallery.top_k(query, k=11)]
+        assert len(names) == len(set(names)) == 11
+        ranked = gallery.rank_users(query, k=11, top_m=4)
+        assert ranked[0]['username'] == 'user3'
+        assert np.isclose(ranked[0]['mean_similarity'],
+                          np.sort((snap.user_rows('user3') @ query + 1) / 2)[::-1].mean())
+
+    def test_tombstones_compacted(self, crypto_manager):
+        """Tombstone'lar canlı satırların dörtte birini aşınca tampon sıkıştırılmalı"""
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM, shortlist_k=2)
+        users = [self._user(crypto_manager, f'user{i}', seed=i) for i in range(10)]
+        gallery.sync(users)
+        gallery.on_store_event('delete', 'user0')
+        gallery.on_store_event('delete', 'user1')
+        assert len(gallery.snapshot.matrix) == 40 and gallery.snapshot.usernames[:2] == [None, None]
+
+        gallery.on_store_event('delete', 'user2')
+        snap = gallery.snapshot
+        assert len(snap.matrix) == snap.size == 28
+        assert snap.usernames == [f'user{i}' for i in range(3, 10)]
+        assert len(snap.prototypes) == 7 and len(snap.dead_prototypes) == 0
+
+        # Silinen kullanıcı yeniden eklenebilmeli
+        gallery.on_store_event('create', 'user0', users[0])
+        query = _random_embeddings(4, self.DIM, seed=0)[2]
+        assert gallery.best_match(query)[0] == 'user0'
+        assert gallery.snapshot.prototype_shortlist(query, 1) == ['user0']
+
+    def test_best_match_exact_embedding(self, gallery):
+        """Kayıtlı bir embedding ile sorgu kendi kullanıcısını bulmalı"""
+        query = _random_embeddings(4, self.DIM, seed=1)[2]
+        username, similarity = gallery.best_match(query)
+        assert username == 'ayse'
+        assert np.isclose(similarity, 1.0, atol=1e-5)
+
+    def test_best_match_with_username(self, gallery):
+        """username verilirse sadece o kullanıcıya karşı skor dönmeli"""
+        query = _random_embeddings(4, self.DIM, seed=1)[2]
+        username, similarity = gallery.best_match(query, username='ali')
+        assert username == 'ali'
+        assert similarity < 1.0
+
+    def test_best_match_matches_loop(self, gallery, crypto_manager, users):
+        """Matris skoru, tek tek deşifre + karşılaştırma ile aynı olmalı"""
+        query = _random_embeddings(1, self.DIM, seed=99)[0]
+        expected = max(
+            (np.dot(query, crypto_manager.decrypt_embedding(
+                doc['encrypted'], doc['hmac'], embedding_dim=self.DIM)) + 1) / 2
+            for user in users for doc in user['embeddings']
+        )
+        _, similarity = gallery.best_match(query)
+        assert np.isclose(similarity, expected, atol=1e-6)
+
+    def test_top_k_ordering(self, gallery):
+        """top_k kullanıcı bazında azalan sırada dönmeli"""
+        query = _random_embeddings(4, self.DIM, seed=2)[0]
+        results = gallery.top_k(query, k=3)
+        assert len(results) == 3
+        assert results[0][0] == 'mehmet'
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_empty_gallery(self, crypto_manager):
+        """Boş galeri (None, 0.0) döndürmeli"""
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM)
+        assert gallery.best_match(np.ones(self.DIM, dtype=np.float32)) == (None, 0.0)
+        assert gallery.top_k(np.ones(self.DIM, dtype=np.float32)) == []
+
+    def test_rank_users_aggregates(self, gallery):
+        """rank_users max ve en iyi m ortalamasını doğru hesaplamalı"""
+        query = _random_embeddings(4, self.DIM, seed=0)[3]
+        ranked = gallery.rank_users(query, k=3, top_m=2)
+        assert [c['username'] for c in ranked][0] == 'ali'
+
+        rows = gallery.snapshot.user_rows('ali')
+        scores = np.sort((rows @ query + 1) / 2)[::-1]
+        assert np.isclose(ranked[0]['max_similarity'], scores[0], atol=1e-6)
+        assert np.isclose(ranked[0]['mean_similarity'], scores[:2].mean(), atol=1e-6)
+
+    def test_rank_users_batched_queries(self, gallery):
+        """Birden fazla sorgu tek çağrıda skorlanmalı (satır başına en iyi sorgu)"""
+        queries = np.stack([
+            _random_embeddings(4, self.DIM, seed=2)[0],
+            _random_embeddings(1, self.DIM, seed=77)[0]
+        ])
+        ranked = gallery.rank_users(queries, k=2, rank_by='mean')
+        assert len(ranked) == 2
+        assert ranked[0]['username'] == 'mehmet'
+        assert np.isclose(ranked[0]['max_similarity'], 1.0, atol=1e-5)
+        with pytest.raises(ValueError):
+            gallery.rank_users(queries, rank_by='median')
+
+    def test_compute_prototypes(self):
+        """Prototipler centroid + küme merkezleri olmalı ve normalize olmalı"""
+        embeddings = _random_embeddings(12, self.DIM, seed=5)
+        prototypes = compute_prototypes(embeddings, n_clusters=3)
+        assert prototypes.shape == (4, self.DIM)
+        assert np.allclose(np.linalg.norm(prototypes, axis=1), 1.0, atol=1e-5)
+
+        centroid = embeddings.mean(axis=0)
+        assert np.allclose(prototypes[0], centroid / np.linalg.norm(centroid), atol=1e-6)
+        assert compute_prototypes(embeddings).shape == (1, self.DIM)
+
+    def test_two_stage_search(self, crypto_manager, users):
+        """Prototip shortlist'i ile iki aşamalı arama doğru kullanıcıyı bulmalı"""
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM, shortlist_k=1)
+        gallery.sync(users)
+        assert gallery.snapshot.prototypes.shape == (3, self.DIM)
+
+        # Sorgu bir kullanıcının embedding'lerine yakın (gürültülü centroid)
+        target = _random_embeddings(4, self.DIM, seed=1)
+        query = target.mean(axis=0)
+        query /= np.linalg.norm(query)
+        username, similarity = gallery.best_match(query)
+        assert username == 'ayse'
+        assert np.isclose(similarity, (float((target @ query).max()) + 1) / 2, atol=1e-6)
+
+    def test_stored_prototypes_used(self, crypto_manager, users):
+        """Kayıtlı şifreli prototipler deşifre edilip kullanılmalı"""
+        proto = _random_embeddings(1, self.DIM, seed=42)[0]
+        encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(proto)
+        users[0]['prototypes'] = [{'encrypted': encrypted_b64, 'hmac': hmac_b64}]
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM, shortlist_k=1)
+        gallery.sync(users)
+        assert np.allclose(gallery.snapshot.prototypes[0], proto)
+        assert gallery.snapshot.prototype_shortlist(proto, 1) == ['ali']
+
+
+class TestIVFIndex:
+    """IVF ANN indeksi için testler"""
+
+    DIM = 64
+
+    @pytest.fixture
+    def vectors(self):
+        return _random_embeddings(400, self.DIM, seed=7)
+
+    @pytest.fixture
+    def index(self, vectors):
+        index = IVFIndex(self.DIM, nlist=16, nprobe=4, seed=0)
+        index.train(vectors)
+        for i in range(0, len(vectors), 4):
+            index.add(f'user{i // 4}', vectors[i:i + 4])
+        return index
+
+    def test_untrained_index(self):
+        """Eğitilmemiş indeks boş sonuç dönmeli ve eklemeyi reddetmeli"""
+        index = IVFIndex(self.DIM)
+        assert not index.is_trained
+        assert index.search(np.ones(self.DIM, dtype=np.float32), 5) == []
+        with pytest.raises(RuntimeError):
+            index.add('x', np.ones((1, self.DIM), dtype=np.float32))
+
+    def test_search_finds_stored_vector(self, index, vectors):
+        """Kayıtlı bir vektör kendi anahtarını ilk sırada bulmalı"""
+        results = index.search(vectors[41], k=3)
+        assert results[0][0] == 'user10'
+        assert np.isclose(results[0][1], 1.0, atol=1e-5)
+
+    def test_full_probe_equals_exact(self, index, vectors):
+        """nprobe = nlist olduğunda sonuç tam tarama ile aynı olmalı"""
+        query = _random_embeddings(1, self.DIM, seed=123)[0]
+        results = index.search(query, k=5, nprobe=index.nlist)
+        per_user = (vectors @ query).reshape(-1, 4).max(axis=1)
+        expected = [f'user{i}' for i in np.argsort(-per_user)[:5]]
+        assert [key for key, _ in results] == expected
+
+    def test_remove(self, index, vectors):
+        """Silinen anahtar artık sonuçlarda çıkmamalı"""
+        index.remove('user10')
+        results = index.search(vectors[41], k=5, nprobe=index.nlist)
+        assert 'user10' not in [key for key, _ in results]
+        assert len(index) == len(vectors) - 4
+
+    def test_remove_releases_key(self, index, vectors):
+        """Silinip yeniden eklenen anahtar kod tablosunda birikmemeli"""
+        for _ in range(3):
+            index.remove('user10')
+            assert 'user10' not in index._codes and len(index._keys) == 99
+            index.add('user10', vectors[40:44])
+        assert len(index._codes) == len(index._keys) == 100
+        assert index.search(vectors[41], k=1)[0][0] == 'user10'
+        index.remove('missing')
+
+    def test_create_index(self):
+        """Fabrika fonksiyonu yapılandırmaya göre indeks üretmeli"""
+        assert create_index(None, self.DIM) is None
+        assert create_index('none', self.DIM) is None
+        assert isinstance(create_index('ivf', self.DIM, nprobe=2), IVFIndex)
+        with pytest.raises(ValueError):
+            create_index('hnsw2', self.DIM)
+
+    def test_gallery_with_index(self):
+        """Galeri indeks ile aday seçip tam skorla yeniden sıralamalı"""
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        crypto_manager = CryptoManager(aes_key_b64, hmac_key_b64)
+        index = IVFIndex(self.DIM, nlist=4, nprobe=4, min_train_size=1)
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM, index=index)
+
+        users = []
+        for i in range(6):
+            docs = []
+            for emb in _random_embeddings(3, self.DIM, seed=100 + i):
+                encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(emb)
+                docs.append({'encrypted': encrypted_b64, 'hmac': hmac_b64})
+            users.append({'_id': str(i), 'username': f'u{i}', 'embeddings': docs})
+        gallery.sync(users)
+        assert gallery.wait_for_index(timeout=10)
+        assert gallery.index.is_trained and not index.is_trained
+
+        query = _random_embeddings(3, self.DIM, seed=104)[1]
+        assert gallery.best_match(query)[0] == 'u4'
+
+        # Silme olayı indeksten de kaldırmalı
+        gallery.on_store_event('delete', 'u4')
+        assert gallery.best_match(query)[0] != 'u4'
+
+    def test_index_builds_off_the_write_path(self, monkeypatch):
+        """Eşiği aşan kayıt k-means'i beklememeli; indeks hazır olunca yerine geçmeli"""
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        crypto_manager = CryptoManager(aes_key_b64, hmac_key_b64)
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM,
+                                   index=IVFIndex(self.DIM, nlist=2, min_train_size=4))
+
+        release = threading.Event()
+        train = IVFIndex.train
+        monkeypatch.setattr(IVFIndex, 'train',
+                            lambda index, vectors: (release.wait(10), train(index, vectors)))
+
+        def user(i):
+            encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(
+                _random_embeddings(1, self.DIM, seed=300 + i)[0])
+            return {'_id': str(i), 'username': f'u{i}',
+                    'embeddings': [{'encrypted': encrypted_b64, 'hmac': hmac_b64}]}
+
+        for i in range(4):
+            gallery.on_store_event('create', f'u{i}', user(i))
+        # Eğitim sürerken yazmalar ve tam tarama araması devam eder
+        gallery.on_store_event('create', 'u4', user(4))
+        gallery.on_store_event('delete', 'u0')
+        assert not gallery.index.is_trained
+        query = _random_embeddings(1, self.DIM, seed=303)[0]
+        assert gallery.best_match(query)[0] == 'u3'
+
+        release.set()
+        assert gallery.wait_for_index(timeout=10)
+        assert gallery.index.is_trained
+        # Kurulum sırasında eklenen / silinen kullanıcılar yeni indekse yansımalı
+        assert sorted(gallery.index._codes) == ['u1', 'u2', 'u3', 'u4']
+        assert gallery.best_match(query)[0] == 'u3'
+
+    def test_needs_retrain(self, vectors):
+        """Vektör sayısı son eğitimin retrain_factor katına ulaşınca yeniden eğitim istenmeli"""
+        index = IVFIndex(self.DIM, nprobe=4, retrain_factor=2.0)
+        assert not index.needs_retrain(10 ** 6)
+        index.train(vectors[:100])
+        assert index.trained_size == 100 and index.nlist == 10
+        assert not index.needs_retrain(199) and index.needs_retrain(200)
+
+        # Kopya aynı ayarlarla eğitilmemiş başlar; otomatik nlist yeniden büyür
+        fresh = index.untrained_copy()
+        assert not fresh.is_trained and fresh.nprobe == 4 and fresh.retrain_factor == 2.0
+        fresh.train(vectors)
+        assert fresh.nlist == 20
+        disabled = IVFIndex(self.DIM, retrain_factor=0)
+        disabled.train(vectors[:100])
+        assert not disabled.needs_retrain(10 ** 6)
+
+    def _growth_recall(self, retrain_factor: float):
+        """
+        Galeri 40 kullanıcıyla (2 küme) eğitilir, sonra 600 kullanıcı (38 yeni
+        küme) tek tek eklenir; gürültülü sorgularda sabit nprobe ile recall@1
+        """
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((40, self.DIM))
+        centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+        def clustered(count, group):
+            rows = group[rng.integers(0, len(group), count)]
+            rows = rows + 0.15 * rng.standard_normal((count, self.DIM))
+            return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        crypto_manager = CryptoManager(aes_key_b64, hmac_key_b64)
+
+        def user(username, embedding):
+            encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(embedding)
+            return {'_id': username, 'username': username,
+                    'embeddings': [{'encrypted': encrypted_b64, 'hmac': hmac_b64}]}
+
+        initial, later = clustered(40, centers[:2]), clustered(600, centers[2:])
+        index = IVFIndex(self.DIM, nprobe=2, min_train_size=40, retrain_factor=retrain_factor)
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM, index=index)
+        gallery.sync([user(f'a{i}', e) for i, e in enumerate(initial)])
+        assert gallery.wait_for_index(timeout=10) and gallery.index.trained_size == 40
+        for i, embedding in enumerate(later):
+            gallery.on_store_event('create', f'b{i}', user(f'b{i}', embedding))
+            # Tekrarlanabilir sonuç için her arka plan kurulumu eşikte biter
+            assert gallery.wait_for_index(timeout=10)
+
+        stored = np.vstack([initial, later])
+        queries = stored + 0.05 * rng.standard_normal(stored.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        keys = [f'a{i}' for i in range(40)] + [f'b{i}' for i in range(600)]
+        expected = [keys[j] for j in np.argmax(queries @ stored.T, axis=1)]
+        hits = sum(1 for query, key in zip(queries, expected)
+                   if gallery.index.search(query, 1)[0][0] == key)
+        return gallery, hits / len(queries)
+
+    def test_recall_after_growth(self):
+        """Galeri büyüdükçe merkezler yeniden eğitilmeli; sabit nprobe'da recall korunmalı"""
+        gallery, recall = self._growth_recall(retrain_factor=2.0)
+        assert gallery.index.trained_size == 640 and gallery.index.nlist == 25
+        assert len(gallery.index) == 640
+        stale_gallery, stale_recall = self._growth_recall(retrain_factor=0)
+        assert stale_gallery.index.trained_size == 40
+        assert recall >= 0.98 and recall > stale_recall
+
+    def test_rebuild_index(self):
+        """rebuild_index() indeksi güncel galeriyle hemen yeniden kurmalı"""
+        gallery, _ = self._growth_recall(retrain_factor=0)
+        old_index = gallery.index
+        assert gallery.rebuild_index(wait=True, timeout=30)
+        assert gallery.index is not old_index and gallery.index.trained_size == 640
+        assert len(gallery.index) == 640 and len(old_index) == 640
+
+
+
+class TestTemplateCache:
+    """Lazy 1:1 doğrulama şablon önbelleği testleri"""
+
+    DIM = 64
+
+    @pytest.fixture
+    def crypto_manager(self):
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        return CryptoManager(aes_key_b64, hmac_key_b64)
+
+    @pytest.fixture
+    def store(self, crypto_manager):
+        """username -> user_doc; yüklemeler loads listesine yazılır"""
+        users = {}
+        for i in range(5):
+            docs = []
+            for emb in _random_embeddings(3, self.DIM, seed=200 + i):
+                encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(emb)
+                docs.append({'encrypted': encrypted_b64, 'hmac': hmac_b64})
+            users[f'u{i}'] = {'_id': str(i), 'username': f'u{i}', 'embeddings': docs,
+                              'updated_at': '2025-01-01T00:00:00'}
+        return users
+
+    @pytest.fixture
+    def cache(self, crypto_manager, store):
+        self.loads = []
+
+        def loader(username):
+            self.loads.append(username)
+            return store.get(username)
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM)
+        return TemplateCache(gallery, loader, capacity=2)
+
+    def test_matches_resident_gallery(self, cache, crypto_manager, store):
+        """Önbellekten 1:1 skor tam galeriyle aynı olmalı; galeri boş kalmalı"""
+        resident = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM)
+        resident.sync(list(store.values()))
+        query = _random_embeddings(3, self.DIM, seed=203)[0]
+        for username in store:
+            expected = resident.best_match(query, username=username)
+            username_found, similarity = cache.best_match(query, username)
+            assert username_found == expected[0]
+            assert np.isclose(similarity, expected[1], atol=1e-6)
+        assert len(cache.gallery) == 0
+        assert cache.best_match(query, 'yok') == (None, 0.0)
+
+    def test_lru_eviction(self, cache):
+        """Sadece kullanılan kullanıcılar yüklenmeli, kapasite aşılınca en eskisi atılmalı"""
+        cache.get('u0')
+        cache.get('u1')
+        cache.get('u0')
+        cache.get('u2')
+        assert self.loads == ['u0', 'u1', 'u2']
+        assert len(cache) == 2
+        cache.get('u1')
+        assert self.loads[-1] == 'u1'
+        assert (cache.hits, cache.misses) == (1, 4)
+
+    def test_store_events(self, cache, store):
+        """Değişen kullanıcı yeniden yüklenmeli, kayıtları aynı 'update' korunmalı"""
+        cache.get('u0')
+        cache.on_store_event('update', 'u0', dict(store['u0']))
+        cache.get('u0')
+        assert self.loads == ['u0']
+
+        store['u0'] = dict(store['u0'], embeddings=store['u0']['embeddings'][:1],
+                           updated_at='2025-02-01T00:00:00')
+        cache.on_store_event('update', 'u0', store['u0'])
+        assert len(cache.get('u0')) == 1
+
+        cache.on_store_event('delete', 'u0')
+        del store['u0']
+        assert cache.get('u0') is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
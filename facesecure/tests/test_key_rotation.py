@@ -0,0 +1,180 @@
+"""
+Anahtarlık ve çevrimiçi anahtar rotasyonu testleri
+"""
+import pytest
+import numpy as np
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys, user_associated_data
+from utils.db import DBManager
+from utils import key_rotation
+from utils.key_rotation import KeyRotationJob
+from face.gallery import EmbeddingGallery
+
+
+DIM = 32
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+class TestKeyRotation:
+    """Anahtar ID etiketleme ve rotasyon işi testleri"""
+
+    @pytest.fixture
+    def old_keys(self):
+        return generate_keys()
+
+    @pytest.fixture
+    def new_keys(self):
+        return generate_keys()
+
+    @pytest.fixture
+    def rotated_crypto(self, old_keys, new_keys):
+        """Yeni anahtar '1' aktif, eski anahtar '0' sadece deşifre için"""
+        return CryptoManager(*new_keys, key_id='1', retired_keys={'0': old_keys})
+
+    @pytest.fixture
+    def populate(self, tmp_path, old_keys):
+        """Eski anahtarla 5 eski formatlı + 5 mühürlü kullanıcı (binary store)"""
+        def make(storage_format):
+            old_crypto = CryptoManager(*old_keys)
+            json_path = str(tmp_path / f'{storage_format}.json')
+            db = DBManager(json_path=json_path, storage_format=storage_format)
+            for i in range(5):
+                docs = [{'encrypted': e, 'hmac': h}
+                        for e, h in old_crypto.encrypt_many(_random_embeddings(4, DIM, seed=i))]
+                db.create_user(f'legacy{i}', docs)
+            for i in range(5, 10):
+                embeddings = _random_embeddings(4, DIM, seed=i)
+                db.create_sealed_user(
+                    f'sealed{i}',
+                    lambda user_id, name=f'sealed{i}', emb=embeddings: old_crypto.seal_embeddings(
+                        emb, user_associated_data(user_id, name)),
+                    embedding_count=4
+                )
+            db.close()
+            return lambda: DBManager(json_path=json_path, storage_format=storage_format)
+        return make
+
+    def test_keyring_decrypts_old_records(self, old_keys, rotated_crypto):
+        """Eski anahtarla şifrelenen kayıt key_id ile çözülmeli"""
+        old_crypto = CryptoManager(*old_keys)
+        embedding = _random_embeddings(1, DIM, seed=0)[0]
+        encrypted_b64, hmac_b64 = old_crypto.encrypt_embedding(embedding)
+
+        decrypted = rotated_crypto.decrypt_embedding(encrypted_b64, hmac_b64, embedding_dim=DIM)
+        assert np.array_equal(decrypted, embedding)
+        with pytest.raises(ValueError):
+            rotated_crypto.decrypt_embedding(encrypted_b64, hmac_b64, embedding_dim=DIM, key_id='1')
+        with pytest.raises(ValueError, match="Bilinmeyen anahtar"):
+            rotated_crypto.decrypt_bytes(encrypted_b64, hmac_b64, key_id='9')
+
+    def test_from_env(self, monkeypatch, old_keys):
+        """FS_RETIRED_KEYS eski anahtarları anahtarlığa eklemeli"""
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        monkeypatch.setenv('FS_AES_KEY_B64', aes_key_b64)
+        monkeypatch.setenv('FS_HMAC_KEY_B64', hmac_key_b64)
+        monkeypatch.setenv('FS_KEY_ID', '2')
+        monkeypatch.setenv('FS_RETIRED_KEYS', f'0:{old_keys[0]}:{old_keys[1]}')
+
+        crypto_manager = CryptoManager.from_env()
+        assert crypto_manager.key_id == '2'
+        assert sorted(crypto_manager.key_ids) == ['0', '2']
+
+    @pytest.mark.parametrize('storage_format', ['json', 'binary'])
+    def test_rotation_job(self, tmp_path, populate, rotated_crypto, new_keys, storage_format):
+        """Rotasyondan sonra tüm kayıtlar yeni anahtarla çözülmeli, sonuçlar değişmemeli"""
+        db_factory = populate(storage_format)
+        db = db_factory()
+        job = KeyRotationJob(rotated_crypto, storage=db,
+                             checkpoint_path=str(tmp_path / 'rotation.json'),
+                             chunk_size=3, workers=2)
+        state = job.run()
+        assert state['rotated'] == 10
+        assert state['completed_at'] is not None
+
+        # Paylaşılan depo açık kalmalı ve diskteki sonuçla aynı olmalı
+        reopened = db_factory()
+        assert not any(job.needs_rotation(user, store=reopened.embedding_store)
+                       for user in reopened.get_all_users())
+        reopened.close()
+        assert not any(job.needs_rotation(user, store=db.embedding_store)
+                       for user in db.get_all_users())
+
+        # Eski anahtar olmadan da galeri yüklenebilmeli
+        new_only = CryptoManager(*new_keys, key_id='1')
+        gallery = EmbeddingGallery(new_only, embedding_dim=DIM, store=db.embedding_store)
+        gallery.sync(db.get_all_users())
+        for i in (2, 7):
+            query = _random_embeddings(4, DIM, seed=i)[1]
+            username, similarity = gallery.best_match(query)
+            assert username.endswith(str(i))
+            assert similarity == pytest.approx(1.0, abs=1e-5)
+        db.close()
+
+    def test_resume_from_checkpoint(self, tmp_path, populate, rotated_crypto):
+        """Durdurulan rotasyon checkpoint'ten devam etmeli"""
+        db_factory = populate('json')
+        checkpoint = str(tmp_path / 'rotation.json')
+
+        db = db_factory()
+        job = KeyRotationJob(rotated_crypto, storage=db,
+                             checkpoint_path=checkpoint, chunk_size=4)
+        usernames = sorted(user['username'] for user in db.get_all_users())
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first_chunk = job._rotate_chunk(db, usernames[:4], executor)
+        job.state = job._load_checkpoint()
+        job.state.update(last_username='legacy3', rotated=first_chunk)
+        job._save_checkpoint()
+
+        resumed = KeyRotationJob(rotated_crypto, storage=db_factory(),
+                                 checkpoint_path=checkpoint, chunk_size=4).run()
+        assert resumed['rotated'] == 10
+        assert resumed['completed_at'] is not None
+
+    def test_single_storage_handle(self, tmp_path, populate, rotated_crypto, monkeypatch):
+        """Depo verilmezse run() boyunca tek kez açılmalı, parça başına açılmamalı"""
+        db_factory = populate('json')
+        opened = []
+
+        def open_storage(uri):
+            opened.append(uri)
+            return db_factory()
+
+        monkeypatch.setattr(key_rotation, 'open_storage', open_storage)
+        state = KeyRotationJob(rotated_crypto, checkpoint_path=str(tmp_path / 'rotation.json'),
+                               chunk_size=2).run()
+        assert state['rotated'] == 10 and len(opened) == 1
+
+    def test_concurrent_change_is_not_overwritten(self, tmp_path, populate, rotated_crypto,
+                                                  old_keys):
+        """Başka süreçte güncellenen kullanıcı eski okumayla üzerine yazılmamalı"""
+        db_factory = populate('json')
+        db = db_factory()
+        other = db_factory()
+        job = KeyRotationJob(rotated_crypto, storage=db,
+                             checkpoint_path=str(tmp_path / 'rotation.json'))
+
+        # Paylaşılan depo bu değişikliği henüz görmedi; parça başında refresh() yüklemeli
+        old_crypto = CryptoManager(*old_keys)
+        docs = [{'encrypted': e, 'hmac': h}
+                for e, h in old_crypto.encrypt_many(_random_embeddings(2, DIM, seed=42))]
+        other.delete_user('legacy0')
+        other.create_user('legacy0', docs)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert job._rotate_chunk(db, ['legacy0'], executor) == 1
+        user = db_factory().get_user_by_username('legacy0')
+        assert len(user['embeddings']) == 2 and not job.needs_rotation(user)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,138 @@
+"""
+Birden fazla sürecin aynı JSON veritabanına yazması testleri
+"""
+import base64
+import json
+import multiprocessing
+import os
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.db import DBManager
+from utils.filelock import FileLock
+
+fork = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                          reason="fork start method gerekli")
+
+WORKERS = 4
+USERS_PER_WORKER = 15
+
+
+def _docs(seed):
+    return [{'encrypted': base64.b64encode(os.urandom(64)).decode(),
+             'hmac': base64.b64encode(os.urandom(32)).decode(),
+             'pose_index': i} for i in range(2)]
+
+
+def _writer(json_path, storage_format, wal, worker):
+    db = DBManager(json_path=json_path, storage_format=storage_format, wal=wal)
+    for i in range(USERS_PER_WORKER):
+        db.create_user(f'w{worker}_u{i}', _docs(i))
+        if i % 5 == 0:
+            db.delete_user(f'w{worker}_u{i}')
+        db.log_failed_attempt(f'w{worker}', '10.0.0.1', 0.1, 'low_similarity')
+    db.close()
+
+
+def _reader(json_path, rounds, result):
+    """Snapshot'ı sürekli okur: her okuma geçerli JSON ve artan nesil olmalı"""
+    last = -1
+    for _ in range(rounds):
+        try:
+            with open(json_path, encoding='utf-8') as f:
+                generation = json.load(f)['generation']
+        except FileNotFoundError:
+            continue
+        except json.JSONDecodeError:
+            result.value = -1
+            return
+        if generation < last:
+            result.value = -2
+            return
+        last = generation
+    result.value = last
+
+
+class TestMultiProcessStore:
+    """Dosya kilidi + atomik yazma ile çoklu süreç güvenliği"""
+
+    @fork
+    @pytest.mark.parametrize('storage_format,wal', [
+        ('json', False), ('binary', False), ('json', True)
+    ])
+    def test_concurrent_writers(self, tmp_path, storage_format, wal):
+        """Eşzamanlı yazan süreçlerin hiçbir değişikliği kaybolmamalı"""
+        json_path = str(tmp_path / 'facesecure.json')
+        DBManager(json_path=json_path, storage_format=storage_format, wal=wal).close()
+
+        ctx = multiprocessing.get_context('fork')
+        result = ctx.Value('i', 0)
+        reader = ctx.Process(target=_reader, args=(json_path, 2000, result))
+        writers = [ctx.Process(target=_writer, args=(json_path, storage_format, wal, w))
+                   for w in range(WORKERS)]
+        reader.start()
+        for process in writers:
+            process.start()
+        for process in writers + [reader]:
+            process.join(60)
+            assert process.exitcode == 0
+        assert result.value >= 0
+
+        db = DBManager(json_path=json_path, storage_format=storage_format, wal=wal)
+        expected = {f'w{w}_u{i}' for w in range(WORKERS)
+                    for i in range(USERS_PER_WORKER) if i % 5 != 0}
+        users = db.get_all_users()
+        assert {user['username'] for user in users} == expected
+        assert len({user['_id'] for user in users}) == len(users)
+        assert db.user_id_counter == WORKERS * USERS_PER_WORKER
+        assert len(db.get_failed_attempts(limit=1000)) == WORKERS * USERS_PER_WORKER
+
+        if storage_format == 'binary':
+            # Her slot tek bir kullanıcıya ait olmalı, kayıtlar okunabilmeli
+            slots = [doc['slot'] for user in users for doc in user['embeddings']]
+            assert len(slots) == len(set(slots))
+            for slot in slots:
+                db.embedding_store.record(slot)
+            assert not set(slots) & set(db.free_slots)
+        db.close()
+
+    def test_generation_increases(self, tmp_path):
+        """Her snapshot yazımı nesil numarasını artırmalı ve başa yazmalı"""
+        json_path = str(tmp_path / 'facesecure.json')
+        db = DBManager(json_path=json_path)
+        start = db.generation
+        db.create_user('alice', _docs(0))
+        db.delete_user('alice')
+        assert db.generation == start + 2
+        with open(json_path, encoding='utf-8') as f:
+            assert f.read(40).lstrip('{ \n').startswith(f'"generation": {start + 2}')
+
+    def test_stale_instance_does_not_overwrite(self, tmp_path):
+        """Eski kopyası olan instance başkasının yazmasını silmemeli"""
+        json_path = str(tmp_path / 'facesecure.json')
+        first = DBManager(json_path=json_path)
+        second = DBManager(json_path=json_path)
+        first.create_user('alice', _docs(0))
+        second.create_user('bob', _docs(1))
+
+        with pytest.raises(ValueError, match='zaten mevcut'):
+            second.create_user('alice', _docs(2))
+        assert {u['username'] for u in DBManager(json_path=json_path).get_all_users()} == {
+            'alice', 'bob'
+        }
+        assert second.get_user_by_username('bob')['_id'] == '2'
+
+    def test_file_lock_reentrant(self, tmp_path):
+        """Kilit aynı thread'de yeniden alınabilmeli"""
+        lock = FileLock(str(tmp_path / 'x.lock'))
+        with lock:
+            with lock:
+                pass
+        lock.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,190 @@
+"""
+Embedding kodekleri (float16 / int8 / PQ) testleri
+"""
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys
+from face import quantization
+from face.gallery import EmbeddingGallery
+from face.quantization import (
+    PQCodec, create_codec, evaluate_codec, get_codec, register_codec
+)
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+class TestCodecs:
+    """Kodek kodlama/çözme ve skorlama testleri"""
+
+    DIM = 128
+
+    @pytest.fixture
+    def vectors(self):
+        return _random_embeddings(300, self.DIM, seed=3)
+
+    @pytest.fixture
+    def pq_codec(self, vectors):
+        return PQCodec.train(vectors, m=16, n_centroids=32, n_iter=5)
+
+    @pytest.mark.parametrize('name,atol', [('float32', 0.0), ('float16', 1e-3), ('int8', 1e-2)])
+    def test_round_trip(self, vectors, name, atol):
+        """Kodla-çöz sonucu orijinale yakın olmalı"""
+        codec = get_codec(name)
+        codes = codec.encode(vectors)
+        assert codes.nbytes == codec.code_size(self.DIM) * len(vectors)
+        assert np.allclose(codec.decode(codes), vectors, atol=atol)
+
+    @pytest.mark.parametrize('name', ['float32', 'float16', 'int8'])
+    def test_dot_matches_decoded(self, vectors, name):
+        """Sıkıştırılmış skorlama, çözülmüş vektörlerle aynı sonucu vermeli"""
+        codec = get_codec(name)
+        codes = codec.encode(vectors)
+        queries = _random_embeddings(3, self.DIM, seed=9)
+        expected = queries @ codec.decode(codes).T
+        assert np.allclose(codec.dot(codes, queries), expected, atol=1e-5)
+        assert np.allclose(codec.dot(codes, queries[0]), expected[0], atol=1e-5)
+
+    def test_pq_dot_matches_decoded(self, vectors, pq_codec):
+        """PQ ADC skorlaması, çözülmüş vektörlerle iç çarpıma eşit olmalı"""
+        codes = pq_codec.encode(vectors)
+        assert codes.shape == (len(vectors), 16)
+        assert codes.dtype == np.uint8
+
+        query = _random_embeddings(1, self.DIM, seed=4)[0]
+        expected = pq_codec.decode(codes) @ query
+        assert np.allclose(pq_codec.dot(codes, query), expected, atol=1e-5)
+
+    def test_pq_save_load(self, pq_codec, tmp_path):
+        """Kaydedilen kod kitabı aynı isimle geri yüklenmeli"""
+        path = tmp_path / 'pq.npy'
+        pq_codec.save(str(path))
+        loaded = create_codec('pq', str(path))
+        assert loaded.name == pq_codec.name
+        assert get_codec(pq_codec.name) is loaded
+
+    def test_pq_small_training_set(self):
+        """Merkez sayısından az vektörle eğitimde boş (sıfır) merkez kalmamalı"""
+        vectors = _random_embeddings(20, self.DIM, seed=5)
+        codec = PQCodec.train(vectors, m=16, n_centroids=256, n_iter=5)
+        assert codec.n_centroids == 20 and codec.codebooks.shape == (16, 20, 8)
+        assert np.all(np.abs(codec.codebooks).sum(axis=2) > 0)
+
+        # Küçük normlu alt vektörler sıfır merkeze değil gerçek merkezlere kodlanmalı
+        codes = codec.encode(vectors * 0.01)
+        assert codes.max() < 20
+        assert np.allclose(codec.decode(codec.encode(vectors)), vectors, atol=1e-5)
+
+    def test_unknown_codec(self):
+        """Bilinmeyen kodek ValueError fırlatmalı"""
+        with pytest.raises(ValueError):
+            get_codec('int4')
+        with pytest.raises(ValueError):
+            create_codec('pq')
+
+    def test_evaluate_codec(self, vectors):
+        """Rapor sıkıştırma oranı ve recall değerlerini içermeli"""
+        report = evaluate_codec(get_codec('int8'), vectors[20:], vectors[:20], k=5)
+        assert report['compression'] == pytest.approx(4 * self.DIM / (self.DIM + 4))
+        assert 0.0 <= report['recall@1'] <= 1.0
+        assert report['recall@5'] > 0.8
+
+
+class TestCodecStorage:
+    """Kodekli şifreleme ve galeri entegrasyonu"""
+
+    DIM = 128
+
+    @pytest.fixture
+    def crypto_manager(self):
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        return CryptoManager(aes_key_b64, hmac_key_b64)
+
+    def test_encrypt_with_codec(self, crypto_manager):
+        """Kodekle şifrelenen embedding aynı kodekle çözülebilmeli"""
+        embedding = _random_embeddings(1, self.DIM, seed=1)[0]
+        codec = get_codec('float16')
+        encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(embedding, codec=codec)
+        decrypted = crypto_manager.decrypt_embedding(
+            encrypted_b64, hmac_b64, embedding_dim=self.DIM, codec=codec
+        )
+        assert decrypted.dtype == np.float32
+        assert np.allclose(decrypted, embedding, atol=1e-3)
+
+        # Yanlış kodekle çözme boyut hatası vermeli
+        with pytest.raises(ValueError):
+            crypto_manager.decrypt_embedding(
+                encrypted_b64, hmac_b64, embedding_dim=self.DIM, codec=get_codec('int8')
+            )
+
+    def test_gallery_mixed_codecs(self, crypto_manager):
+        """int8 galeri, float32 ve int8 saklanmış kayıtları birlikte yüklemeli"""
+        int8 = get_codec('int8')
+        users = []
+        for i, stored in enumerate([None, int8]):
+            docs = []
+            for emb in _random_embeddings(4, self.DIM, seed=i):
+                encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(emb, codec=stored)
+                doc = {'encrypted': encrypted_b64, 'hmac': hmac_b64}
+                if stored is not None:
+                    doc['codec'] = stored.name
+                docs.append(doc)
+            users.append({'_id': str(i), 'username': f'u{i}', 'embeddings': docs})
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM, codec=int8)
+        gallery.sync(users)
+        assert gallery.snapshot.matrix.dtype == np.int8
+        assert gallery.snapshot.matrix.shape == (8, self.DIM + 4)
+
+        for i in range(2):
+            query = _random_embeddings(4, self.DIM, seed=i)[2]
+            username, similarity = gallery.best_match(query)
+            assert username == f'u{i}'
+            assert similarity == pytest.approx(1.0, abs=5e-3)
+
+    def test_pq_record_in_fresh_registry(self, crypto_manager, tmp_path, monkeypatch):
+        """create_codec çağrılmamış süreçte PQ kaydı FS_PQ_CODEBOOK ile açılmalı"""
+        vectors = _random_embeddings(64, self.DIM, seed=11)
+        codec = PQCodec.train(vectors, m=16, n_centroids=16, n_iter=5)
+        path = tmp_path / 'pq.npy'
+        codec.save(str(path))
+        sealed = crypto_manager.seal_embeddings(vectors[:4], b'u1', codec=codec)
+
+        # Yeni süreç: sadece yerleşik kodekler kayıtlı
+        monkeypatch.setattr(quantization, '_CODECS', {
+            name: builtin for name, builtin in quantization._CODECS.items()
+            if not name.startswith('pq:')
+        })
+        record = crypto_manager.open_sealed(sealed, b'u1')
+        monkeypatch.delenv('FS_PQ_CODEBOOK', raising=False)
+        with pytest.raises(ValueError, match='FS_PQ_CODEBOOK'):
+            get_codec(record.codec)
+
+        monkeypatch.setenv('FS_PQ_CODEBOOK', str(path))
+        decoded = get_codec(record.codec).decode(record.codes)
+        assert np.allclose(decoded, codec.decode(codec.encode(vectors[:4])))
+
+        # Farklı kod kitabı sessizce yanlış çözmemeli
+        other = PQCodec.train(vectors, m=16, n_centroids=16, n_iter=5, seed=1)
+        other.save(str(path))
+        monkeypatch.setattr(quantization, '_CODECS', {})
+        with pytest.raises(ValueError, match='uyuşmuyor'):
+            get_codec(codec.name)
+
+    def test_register_codec(self):
+        """Kayıtlı kodek isimle bulunabilmeli"""
+        codec = PQCodec(np.zeros((4, 2, 8), dtype=np.float32))
+        register_codec(codec)
+        assert get_codec(codec.name) is codec
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
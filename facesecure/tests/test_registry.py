@@ -0,0 +1,189 @@
+"""
+Paylaşılan kaynak registry'si ve /ready endpoint testleri
+"""
+import importlib
+import os
+import pytest
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# api/app.py route'ları 'routes.*' olarak import eder
+sys.path.insert(0, str(Path(__file__).parent.parent / 'api'))
+
+from utils.registry import (
+    DEFAULT_FACTORIES, ResourceRegistry, create_registry, current_registry,
+    inference_buckets, warm_batch_sizes
+)
+
+
+class FakeProcessor:
+    """Yükleme süresi olan sahte model"""
+
+    def __init__(self, load_event=None):
+        if load_event is not None:
+            load_event.wait(5)
+        self.batch_sizes = []
+
+    def get_embeddings(self, faces, normalize=True):
+        self.batch_sizes.append(len(faces))
+        return np.stack([face.reshape(-1)[:128].astype('float32') for face in faces])
+
+
+class TestResourceRegistry:
+    """Tembel, tek seferlik kaynak oluşturma"""
+
+    def test_created_once_under_concurrency(self):
+        """Aynı anda gelen istekler tek bir model yüklemesini paylaşmalı"""
+        created = []
+        release = threading.Event()
+
+        def factory(registry):
+            created.append(1)
+            return FakeProcessor(release)
+
+        registry = ResourceRegistry({'processor': factory})
+        assert not registry.is_loaded('processor')
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('processor')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(created) == 1
+        assert len(results) == 8 and all(r is results[0] for r in results)
+
+    def test_dependencies_and_unknown(self):
+        """Fabrikalar diğer kaynakları registry'den almalı"""
+        registry = ResourceRegistry({
+            'storage': lambda registry: object(),
+            'gallery': lambda registry: ('gallery', registry.get('storage')),
+        })
+        assert registry.get('gallery')[1] is registry.get('storage')
+        with pytest.raises(KeyError):
+            registry.get('yok')
+        with pytest.raises(ValueError):
+            registry.register('storage', lambda registry: None)
+
+    def test_warm_and_status(self):
+        """warm() kaynakları yüklemeli ve her batch boyutuyla deneme çıkarımı yapmalı"""
+        registry = ResourceRegistry({'processor': lambda registry: FakeProcessor(),
+                                     'gallery': lambda registry: object()},
+                                    warm_resources=['processor'], warm_batch_sizes=[8, 1, 8])
+        assert registry.status()['ready'] is False
+
+        durations = registry.warm()
+        assert set(durations) == {'processor'}
+        # Her batch boyutu bir kez modelden geçmeli
+        assert registry.get('processor').batch_sizes == [1, 8]
+
+        status = registry.status()
+        assert status['ready'] is True and status['error'] is None
+        assert set(status['warmup_batches']) == {1, 8} and status['ready_seconds'] >= 0
+        assert status['resources']['processor']['loaded'] is True
+        assert status['resources']['gallery'] == {'loaded': False, 'seconds': None}
+
+    def test_warm_error_is_reported(self):
+        def broken(registry):
+            raise RuntimeError('model bulunamadı')
+
+        registry = ResourceRegistry({'processor': broken}, warm_resources=['processor'])
+        registry.warm_async().join()
+        status = registry.status()
+        assert status['ready'] is False and 'model bulunamadı' in status['error']
+
+    def test_lazy_gallery_is_not_warmed(self, monkeypatch):
+        monkeypatch.setenv('FS_LAZY_GALLERY', '1')
+        assert 'gallery' not in create_registry().warm_resources
+        monkeypatch.delenv('FS_LAZY_GALLERY')
+        assert 'gallery' in create_registry().warm_resources
+        assert set(create_registry()._factories) == set(DEFAULT_FACTORIES)
+
+    def test_warm_batch_sizes_follow_buckets(self, monkeypatch):
+        """Isınma varsayılan olarak her bucket'ı derlemeli"""
+        monkeypatch.delenv('FS_WARM_BATCH_SIZES', raising=False)
+        monkeypatch.delenv('FS_INFER_BUCKETS', raising=False)
+        assert inference_buckets() == [1, 4, 8, 16, 32] == warm_batch_sizes()
+        monkeypatch.setenv('FS_INFER_BUCKETS', '16,2,2')
+        assert warm_batch_sizes() == [2, 16]
+        monkeypatch.setenv('FS_INFER_BUCKETS', '')
+        monkeypatch.setenv('FS_INFER_MAX_BATCH', '8')
+        assert inference_buckets() == [] and warm_batch_sizes() == [1, 8]
+        monkeypatch.setenv('FS_WARM_BATCH_SIZES', '4')
+        assert warm_batch_sizes() == [4]
+
+
+class TestAppFactory:
+    """create_app ve /ready"""
+
+    @pytest.fixture
+    def app_module(self, tmp_path, monkeypatch):
+        pytest.importorskip('flask')
+        pytest.importorskip('cv2')
+        # Modül seviyesindeki app arka planda model yüklemesin
+        monkeypatch.setenv('FS_WARM_ON_START', '0')
+        monkeypatch.setenv('MONGO_URI', f"sqlite:///{tmp_path / 'fs.db'}")
+        return importlib.import_module('api.app')
+
+    def test_ready_after_warm(self, app_module, monkeypatch):
+        """Model ısınana kadar /ready 503, sonra 200 dönmeli"""
+        release = threading.Event()
+        registry = ResourceRegistry({'processor': lambda registry: FakeProcessor(release)},
+                                    warm_resources=['processor'])
+        monkeypatch.setenv('FS_WARM_ON_START', '1')
+        app = app_module.create_app(registry)
+        client = app.test_client()
+
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['ready'] is False
+
+        release.set()
+        registry._warm_thread.join()
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.get_json()['resources']['processor']['loaded'] is True
+
+    def test_routes_share_app_registry(self, app_module):
+        """Blueprint'ler kaynakları uygulamanın registry'sinden almalı"""
+        from routes import enroll, verify
+
+        registry = ResourceRegistry({'storage': lambda registry: object()})
+        app = app_module.create_app(registry)
+        assert app.extensions['facesecure'] is registry
+        # Route modülleri import edilince model/depo oluşturulmaz
+        assert not hasattr(verify, 'processor') and not hasattr(enroll, 'db_manager')
+
+        with app.app_context():
+            assert current_registry() is registry
+
+    def test_import_does_not_load_model(self, tmp_path):
+        """api/app.py import'u TensorFlow'u ve modeli yüklememeli (yeni süreçte)"""
+        pytest.importorskip('flask')
+        root = Path(__file__).parent.parent
+        code = (
+            "import sys; sys.path[:0] = [sys.argv[1], sys.argv[1] + '/api']\n"
+            "import api.app\n"
+            "heavy = {'tensorflow', 'keras_facenet', 'onnxruntime', 'face.processor'}\n"
+            "print(sorted(heavy & set(sys.modules)))\n"
+        )
+        env = dict(os.environ, FS_WARM_ON_START='0',
+                   MONGO_URI=f"sqlite:///{tmp_path / 'fs.db'}")
+        completed = subprocess.run([sys.executable, '-c', code, str(root)], env=env,
+                                   capture_output=True, text=True, timeout=120)
+        assert completed.returncode == 0, completed.stderr
+        assert completed.stdout.strip().splitlines()[-1] == '[]'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,168 @@
+"""
+Mühürlü (kullanıcı başına tek AEAD blob) kayıt formatı ve migrasyon testleri
+"""
+import base64
+import json
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys, user_associated_data
+from utils.db import DBManager, embedding_count
+from utils.migrate_sealed import JSONStreamReader, migrate
+from face.gallery import EmbeddingGallery, compute_prototypes
+from face.quantization import get_codec
+
+
+DIM = 64
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def crypto_manager():
+    aes_key_b64, hmac_key_b64 = generate_keys()
+    return CryptoManager(aes_key_b64, hmac_key_b64)
+
+
+class TestSealedFormat:
+    """seal_embeddings / open_sealed testleri"""
+
+    def test_round_trip(self, crypto_manager):
+        """Embedding'ler ve prototipler aynen geri açılmalı"""
+        embeddings = _random_embeddings(10, DIM, seed=0)
+        prototypes = compute_prototypes(embeddings)
+        aad = user_associated_data('1', 'alice')
+
+        sealed = crypto_manager.seal_embeddings(embeddings, aad, prototypes=prototypes)
+        record = crypto_manager.open_sealed(sealed, aad)
+
+        assert record.codec == 'float32'
+        assert record.dim == DIM
+        assert np.array_equal(record.codes.view(np.float32), embeddings)
+        assert np.array_equal(record.prototypes, prototypes)
+
+    def test_codec_round_trip(self, crypto_manager):
+        """Kodekle mühürlenen kayıt kodek formunda açılmalı"""
+        embeddings = _random_embeddings(10, DIM, seed=1)
+        int8 = get_codec('int8')
+        aad = user_associated_data('1', 'alice')
+
+        record = crypto_manager.open_sealed(
+            crypto_manager.seal_embeddings(embeddings, aad, codec=int8), aad
+        )
+        assert record.codec == 'int8'
+        assert np.allclose(int8.decode(record.codes.view(np.int8)), embeddings, atol=1e-2)
+
+    def test_bound_to_user(self, crypto_manager):
+        """Blob başka bir kullanıcıya taşınırsa açılmamalı"""
+        embeddings = _random_embeddings(3, DIM, seed=2)
+        sealed = crypto_manager.seal_embeddings(embeddings, user_associated_data('1', 'alice'))
+
+        with pytest.raises(ValueError, match="doğrulama başarısız"):
+            crypto_manager.open_sealed(sealed, user_associated_data('2', 'alice'))
+        with pytest.raises(ValueError, match="doğrulama başarısız"):
+            crypto_manager.open_sealed(sealed, user_associated_data('1', 'bob'))
+
+    def test_unknown_version(self, crypto_manager):
+        """Bilinmeyen format sürümü reddedilmeli"""
+        aad = user_associated_data('1', 'alice')
+        blob = bytearray(base64.b64decode(
+            crypto_manager.seal_embeddings(_random_embeddings(1, DIM, seed=3), aad)
+        ))
+        blob[0] = 99
+        with pytest.raises(ValueError, match="sürümü"):
+            crypto_manager.open_sealed(base64.b64encode(bytes(blob)).decode(), aad)
+
+
+class TestSealedStorage:
+    """DBManager, galeri ve migrasyon entegrasyonu"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        return DBManager(json_path=str(tmp_path / 'data.json'), storage_format='json')
+
+    def _seal(self, crypto_manager, username, embeddings):
+        return lambda user_id: crypto_manager.seal_embeddings(
+            embeddings, user_associated_data(user_id, username),
+            prototypes=compute_prototypes(embeddings)
+        )
+
+    def test_gallery_loads_sealed_users(self, db, crypto_manager):
+        """Galeri mühürlü kullanıcıları açıp eşleştirebilmeli"""
+        for i in range(3):
+            embeddings = _random_embeddings(5, DIM, seed=i)
+            db.create_sealed_user(f'user{i}', self._seal(crypto_manager, f'user{i}', embeddings),
+                                  embedding_count=5)
+
+        user = db.get_user_by_username('user1')
+        assert 'embeddings' not in user
+        assert embedding_count(user) == 5
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM)
+        gallery.sync(db.get_all_users())
+        assert len(gallery) == 15
+
+        query = _random_embeddings(5, DIM, seed=1)[3]
+        username, similarity = gallery.best_match(query)
+        assert username == 'user1'
+        assert similarity == pytest.approx(1.0, abs=1e-5)
+
+    def test_stream_reader_small_chunks(self, tmp_path):
+        """Akış okuyucu parça sınırlarına düşen değerleri doğru birleştirmeli"""
+        data = {'users': {f'u{i}': {'n': i * 12345, 's': 'x' * i} for i in range(20)},
+                'failed_attempts': [{'score': 0.5}, 1, 'a'],
+                'user_id_counter': 123456789}
+        path = tmp_path / 'data.json'
+        path.write_text(json.dumps(data, indent=2))
+
+        with open(path, encoding='utf-8') as f:
+            reader = JSONStreamReader(f, chunk_size=7)
+            result = {}
+            for key in reader.members():
+                if key == 'users':
+                    result[key] = {name: reader.value() for name in reader.members()}
+                elif key == 'failed_attempts':
+                    result[key] = list(reader.items())
+                else:
+                    result[key] = reader.value()
+        assert result == data
+
+    def test_migrate_legacy_store(self, crypto_manager, tmp_path, monkeypatch):
+        """Eski format taşındıktan sonra galeri aynı sonuçları vermeli"""
+        # Denemeler veritabanında olmalı ki taşınsın
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+        db = DBManager(json_path=str(tmp_path / 'data.json'), storage_format='json')
+        for i in range(4):
+            docs = []
+            for j, (encrypted_b64, hmac_b64) in enumerate(
+                    crypto_manager.encrypt_many(_random_embeddings(5, DIM, seed=i))):
+                docs.append({'encrypted': encrypted_b64, 'hmac': hmac_b64, 'pose_index': j})
+            db.create_user(f'user{i}', docs)
+        db.log_failed_attempt('user0', '127.0.0.1', 0.4, 'low_similarity')
+
+        output = str(tmp_path / 'sealed.json')
+        assert migrate(db.json_path, output, crypto_manager, embedding_dim=DIM) == 4
+
+        migrated = DBManager(json_path=output, storage_format='json')
+        user = migrated.get_user_by_username('user2')
+        assert 'sealed' in user and 'embeddings' not in user
+        assert user['pose_indices'] == [0, 1, 2, 3, 4]
+        assert migrated.user_id_counter == 4
+        assert len(migrated.get_failed_attempts()) == 1
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM)
+        gallery.sync(migrated.get_all_users())
+        query = _random_embeddings(5, DIM, seed=2)[4]
+        assert gallery.best_match(query)[0] == 'user2'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
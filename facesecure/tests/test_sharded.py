@@ -0,0 +1,158 @@
+"""
+Shared memory üzerinde parçalı (sharded) galeri araması testleri
+"""
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys
+from face.gallery import EmbeddingGallery
+from face.quantization import get_codec
+from face.sharded import SharedGallerySegment, ShardedSearcher, score_shard
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+class TestShardedSearch:
+    """ShardedSearcher ve segment testleri"""
+
+    DIM = 64
+
+    @pytest.fixture
+    def gallery(self):
+        """20 kullanıcı x 5 embedding, 2 worker ile paralel arama"""
+        aes_key_b64, hmac_key_b64 = generate_keys()
+        crypto_manager = CryptoManager(aes_key_b64, hmac_key_b64)
+        searcher = ShardedSearcher(workers=2, min_rows=1)
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=self.DIM,
+                                   searcher=searcher)
+
+        users = []
+        for i in range(20):
+            docs = []
+            for emb in _random_embeddings(5, self.DIM, seed=i):
+                encrypted_b64, hmac_b64 = crypto_manager.encrypt_embedding(emb)
+                docs.append({'encrypted': encrypted_b64, 'hmac': hmac_b64})
+            users.append({'_id': str(i), 'username': f'user{i:02d}', 'embeddings': docs})
+        gallery.sync(users)
+
+        yield gallery
+        searcher.close()
+
+    def test_segment_round_trip(self):
+        """Bağlanan taraf aynı matrisi ve etiketleri kopyasız görmeli"""
+        matrix = _random_embeddings(10, self.DIM, seed=0)
+        labels = np.repeat(np.arange(5, dtype=np.int32), 2)
+        segment = SharedGallerySegment.create(matrix, labels, get_codec('float32'))
+        try:
+            attached = SharedGallerySegment.attach(segment.name)
+            assert np.array_equal(attached.matrix, matrix)
+            assert np.array_equal(attached.labels, labels)
+            assert not attached.matrix.flags.writeable
+            attached.close()
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def test_score_shard_local_top_k(self):
+        """Shard skorlaması kullanıcı başına en iyi skoru döndürmeli"""
+        matrix = _random_embeddings(12, self.DIM, seed=1)
+        labels = np.repeat(np.arange(4, dtype=np.int32), 3)
+        segment = SharedGallerySegment.create(matrix, labels, get_codec('float32'))
+        try:
+            users, scores = score_shard(segment.name, 2, 12, matrix[7], k=2)
+            assert len(users) == 2
+            assert users[np.argmax(scores)] == 2
+            assert np.isclose(scores.max(), 1.0, atol=1e-5)
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def test_parallel_matches_exact(self, gallery):
+        """Paralel arama tek süreçli tam arama ile aynı sonucu vermeli"""
+        snap = gallery.snapshot
+        assert gallery.searcher.accepts(snap)
+
+        query = _random_embeddings(1, self.DIM, seed=500)[0]
+        best = snap.user_scores(query)
+        expected = [snap.usernames[i] for i in np.argsort(-best)[:5]]
+
+        results = gallery.top_k(query, k=5)
+        assert [name for name, _ in results] == expected
+        assert np.isclose(results[0][1], best.max(), atol=1e-6)
+
+        query = _random_embeddings(5, self.DIM, seed=7)[3]
+        assert gallery.best_match(query)[0] == 'user07'
+
+    def test_snapshot_lives_in_segment(self, gallery):
+        """Ana süreç matrisi ayrıca kopyalamamalı: snapshot segmentin view'ı olmalı"""
+        snap = gallery.snapshot
+        segment = gallery.searcher._current[0]
+        assert snap.segment is segment
+        assert np.shares_memory(snap.matrix, segment.matrix)
+        assert np.shares_memory(snap.labels, segment.labels)
+
+    def test_republish_after_change(self, gallery):
+        """Galeri değişince yeni snapshot aynı segmentten yayınlanmalı"""
+        old = gallery.snapshot
+        gallery.on_store_event('delete', 'user07')
+        assert not gallery.searcher.accepts(old)
+        assert gallery.searcher.accepts(gallery.snapshot)
+        assert gallery.snapshot.segment is old.segment
+
+        query = _random_embeddings(5, self.DIM, seed=7)[3]
+        assert gallery.best_match(query)[0] != 'user07'
+
+    def test_tombstones_skipped(self, gallery):
+        """Güncellenen kullanıcının eski (tombstone) satırları shard'larda skorlanmamalı"""
+        crypto_manager = gallery.crypto_manager
+        docs = [{'encrypted': e, 'hmac': h}
+                for e, h in crypto_manager.encrypt_many(_random_embeddings(5, self.DIM, seed=99))]
+        gallery.on_store_event('update', 'user07', {'_id': '7', 'username': 'user07',
+                                                    'embeddings': docs, 'updated_at': 'x'})
+        snap = gallery.snapshot
+        assert len(snap.dead_rows) == 5 and gallery.searcher.accepts(snap)
+
+        old_query = _random_embeddings(5, self.DIM, seed=7)[3]
+        results = gallery.top_k(old_query, k=20)
+        best = snap.user_scores(old_query)
+        assert [name for name, _ in results] == [snap.usernames[i] for i in np.argsort(-best)[:20]]
+        assert results[0][0] != 'user07'
+        assert gallery.best_match(_random_embeddings(5, self.DIM, seed=99)[2])[0] == 'user07'
+
+    def test_default_start_method_does_not_fork(self):
+        """Çok thread'li API sürecinde worker'lar fork ile başlatılmamalı"""
+        searcher = ShardedSearcher(workers=1)
+        assert searcher._context.get_start_method() in ('forkserver', 'spawn')
+
+    def test_segment_kept_while_search_in_flight(self, gallery):
+        """Sıkıştırma yeni segmente taşısa da uçuştaki aramanın segmenti silinmemeli"""
+        searcher = gallery.searcher
+        segment = searcher._acquire(gallery.snapshot)
+        name = segment.name
+
+        # Tombstone'lar canlı satırların dörtte birini aşınca tampon sıkıştırılır
+        for i in range(6):
+            gallery.on_store_event('delete', f'user{i:02d}')
+        assert gallery.snapshot.segment is not segment
+        attached = SharedGallerySegment.attach(name)
+        attached.close()
+
+        searcher._release(segment)
+        with pytest.raises(FileNotFoundError):
+            SharedGallerySegment.attach(name)
+        # Sadece güncel segment kalmalı
+        assert list(searcher._segments) == [gallery.snapshot.segment.name]
+        assert not searcher._in_flight
+
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,234 @@
+"""
+SQLite depolama backend'i testleri
+"""
+import sqlite3
+import pytest
+import numpy as np
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys, user_associated_data
+from utils.db import DBManager
+from utils.sqlite_store import SQLiteStorage
+from utils.storage import StorageBackend, open_storage, sqlite_path
+from face.gallery import EmbeddingGallery
+
+
+DIM = 16
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+class TestSQLiteStorage:
+    """SQLiteStorage testleri"""
+
+    @pytest.fixture
+    def crypto_manager(self):
+        return CryptoManager(*generate_keys())
+
+    @pytest.fixture
+    def storage(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / 'facesecure.db'))
+        yield storage
+        storage.close()
+
+    def _docs(self, crypto_manager, seed, count=3):
+        return [{'encrypted': e, 'hmac': h, 'pose_index': i}
+                for i, (e, h) in enumerate(crypto_manager.encrypt_many(
+                    _random_embeddings(count, DIM, seed)))]
+
+    def test_open_storage_dispatch(self, tmp_path):
+        """sqlite:// URI'si SQLite backend'ini, boş URI JSON backend'ini açmalı"""
+        assert sqlite_path('sqlite:///facesecure.db') == 'facesecure.db'
+        assert sqlite_path('sqlite:////var/lib/fs.db') == '/var/lib/fs.db'
+
+        storage = open_storage(f"sqlite:///{tmp_path / 'a.db'}")
+        assert isinstance(storage, SQLiteStorage)
+        storage.close()
+
+        db = open_storage(None, json_path=str(tmp_path / 'a.json'))
+        assert isinstance(db, DBManager) and isinstance(db, StorageBackend)
+
+    def test_schema(self, storage):
+        """WAL journal modu ve indeksler oluşturulmalı"""
+        conn = sqlite3.connect(storage.db_path)
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        indexes = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_users_username', 'idx_failed_attempts_timestamp',
+                'idx_failed_attempts_username', 'idx_failed_attempts_ip'} <= indexes
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM failed_attempts WHERE ip_address = ?', ('1.2.3.4',)))
+        assert 'idx_failed_attempts_ip' in plan
+        conn.close()
+
+    def test_user_round_trip(self, storage, crypto_manager):
+        """Eski formatlı kullanıcı JSON backend'iyle aynı dokümanı döndürmeli"""
+        docs = self._docs(crypto_manager, seed=0)
+        prototypes = [{'encrypted': e, 'hmac': h}
+                      for e, h in crypto_manager.encrypt_many(_random_embeddings(1, DIM, 9))]
+        user_id = storage.create_user('alice', docs, prototypes=prototypes)
+
+        user = storage.get_user_by_username('alice')
+        assert user['_id'] == user_id
+        assert user['embeddings'] == docs
+        assert user['prototypes'] == prototypes
+        assert storage.get_user_by_username('nobody') is None
+
+        with pytest.raises(ValueError, match='zaten mevcut'):
+            storage.create_user('alice', docs)
+
+    def test_sealed_user(self, storage, crypto_manager):
+        """Mühürlü blob satır ID'sine bağlanmalı ve galeri tarafından açılmalı"""
+        embeddings = _random_embeddings(4, DIM, seed=1)
+        storage.create_user('first', self._docs(crypto_manager, seed=0))
+        user_id = storage.create_sealed_user(
+            'bob',
+            lambda uid: crypto_manager.seal_embeddings(embeddings, user_associated_data(uid, 'bob')),
+            embedding_count=4, pose_indices=[0, 1, 2, 3]
+        )
+        assert user_id == '2'
+
+        user = storage.get_user_by_username('bob')
+        assert user['embedding_count'] == 4
+        assert user['pose_indices'] == [0, 1, 2, 3]
+        assert 'embeddings' not in user
+
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM)
+        gallery.sync(storage.get_all_users())
+        assert gallery.best_match(embeddings[2])[0] == 'bob'
+
+    def test_failed_seal_rolls_back(self, storage):
+        """Mühürleme hatasında kullanıcı satırı kalmamalı"""
+        def seal(user_id):
+            raise RuntimeError('seal failed')
+
+        with pytest.raises(RuntimeError):
+            storage.create_sealed_user('carol', seal, embedding_count=1)
+        assert storage.get_user_by_username('carol') is None
+
+    def test_delete_cascades(self, storage, crypto_manager):
+        """Kullanıcı silinince embedding satırları da silinmeli, ID yeniden kullanılmamalı"""
+        storage.create_user('alice', self._docs(crypto_manager, seed=0))
+        assert storage.delete_user('alice')
+        assert not storage.delete_user('alice')
+
+        conn = sqlite3.connect(storage.db_path)
+        assert conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0] == 0
+        conn.close()
+        assert storage.create_user('alice', self._docs(crypto_manager, seed=0)) == '2'
+
+    def test_failed_attempts(self, storage):
+        """Son denemeler yeniden eskiye ve limitli dönmeli"""
+        for i in range(5):
+            storage.log_failed_attempt(f'user{i}', f'10.0.0.{i}', 0.1 * i, 'low_similarity')
+        attempts = storage.get_failed_attempts(limit=3)
+        assert [a['username'] for a in attempts] == ['user4', 'user3', 'user2']
+        assert set(attempts[0]) == {'username', 'ip_address', 'similarity_score',
+                                    'reason', 'timestamp'}
+
+    def test_update_user_records(self, storage, crypto_manager):
+        """Okunduktan sonra değişmeyen kullanıcı güncellenmeli, updated_at korunmalı"""
+        storage.create_user('alice', self._docs(crypto_manager, seed=0))
+        storage.create_user('bob', self._docs(crypto_manager, seed=1))
+        alice = storage.get_user_by_username('alice')
+        bob = storage.get_user_by_username('bob')
+
+        # bob okunduktan sonra silinip yeniden oluşturuldu
+        storage.delete_user('bob')
+        storage.create_user('bob', self._docs(crypto_manager, seed=2))
+
+        new_docs = self._docs(crypto_manager, seed=3)
+        applied = storage.update_user_records({
+            'alice': (alice, {'embeddings': new_docs}),
+            'bob': (bob, {'embeddings': new_docs})
+        })
+        assert applied == ['alice']
+        updated = storage.get_user_by_username('alice')
+        assert updated['embeddings'] == new_docs
+        assert updated['updated_at'] == alice['updated_at']
+
+    def test_listeners(self, tmp_path, storage, crypto_manager):
+        """Oluşturma ve silme dinleyicilere bildirilmeli"""
+        events = []
+        listener = lambda event, username, user_doc: events.append((event, username))
+        storage.add_listener(listener)
+        other = SQLiteStorage(str(tmp_path / 'other.db'))
+        try:
+            storage.create_user('alice', self._docs(crypto_manager, seed=0))
+            # Başka bir handle'ın olayları bu dinleyiciye gelmemeli
+            other.create_user('bob', self._docs(crypto_manager, seed=1))
+            storage.delete_user('alice')
+        finally:
+            storage.remove_listener(listener)
+            other.close()
+        assert events == [('create', 'alice'), ('delete', 'alice')]
+
+    def test_import_json(self, tmp_path, monkeypatch, storage, crypto_manager):
+        """JSON veritabanı ID'ler ve denemelerle birlikte aktarılmalı"""
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+        json_path = str(tmp_path / 'facesecure_data.json')
+        db = DBManager(json_path=json_path)
+        db.create_user('alice', self._docs(crypto_manager, seed=0))
+        embeddings = _random_embeddings(3, DIM, seed=1)
+        db.create_sealed_user(
+            'bob',
+            lambda uid: crypto_manager.seal_embeddings(embeddings, user_associated_data(uid, 'bob')),
+            embedding_count=3
+        )
+        db.create_user('deleted', self._docs(crypto_manager, seed=2))
+        db.delete_user('deleted')
+        db.log_failed_attempt('alice', '10.0.0.1', 0.2, 'low_similarity')
+
+        assert storage.import_json(json_path, batch_size=1) == 2
+        for user in db.get_all_users():
+            assert storage.get_user_by_username(user['username']) == user
+        assert storage.get_failed_attempts() == db.get_failed_attempts()
+
+        # Tekrar aktarım var olanları atlamalı; silinen kullanıcının ID'si yeniden verilmemeli
+        assert storage.import_json(json_path) == 0
+        assert storage.create_user('carol', self._docs(crypto_manager, seed=3)) == '4'
+
+    def test_concurrent_access(self, storage, crypto_manager):
+        """Thread'ler kendi bağlantılarıyla aynı anda okuyup yazabilmeli"""
+        def work(i):
+            storage.create_user(f'user{i}', self._docs(crypto_manager, seed=i, count=1))
+            storage.log_failed_attempt(f'user{i}', '10.0.0.1', 0.0, 'low_similarity')
+            return len(storage.get_all_users())
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(work, range(16)))
+        assert len(storage.get_all_users()) == 16
+        assert len(storage.get_failed_attempts()) == 16
+
+    def test_thread_connections_are_closed(self, storage, crypto_manager):
+        """İstek başına thread açan sunucuda bağlantı sayısı sınırlı kalmalı"""
+        storage.create_user('ali', self._docs(crypto_manager, seed=0))
+        baseline = storage.open_connections
+        found = []
+
+        def request():
+            found.append(storage.get_user_metadata('ali') is not None)
+
+        for _ in range(200):
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+
+        assert len(found) == 200 and all(found)
+        assert storage.open_connections <= baseline + 1
+        # close() sonrası kapanan thread'lerin finalizer'ları hata vermemeli
+        storage.close()
+        assert storage.open_connections == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,145 @@
+"""
+Paylaşılan depo handle'ı ve dış değişikliklerin artımlı yüklenmesi testleri
+"""
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys, user_associated_data
+from utils.db import DBManager
+from utils.sqlite_store import SQLiteStorage
+from utils.storage import diff_users, shared_storage
+from face.gallery import EmbeddingGallery
+
+
+DIM = 16
+
+
+def _random_embeddings(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((count, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+
+class TestStoreRefresh:
+    """refresh() değişiklik tespiti ve galeri bildirimleri"""
+
+    @pytest.fixture
+    def crypto_manager(self):
+        return CryptoManager(*generate_keys())
+
+    @pytest.fixture(params=['json', 'json-wal', 'binary', 'sqlite'])
+    def open_db(self, request, tmp_path):
+        """Aynı veritabanına bağlanan bağımsız instance'lar üretir"""
+        opened = []
+
+        def make():
+            if request.param == 'sqlite':
+                db = SQLiteStorage(str(tmp_path / 'facesecure.db'))
+            else:
+                db = DBManager(json_path=str(tmp_path / 'facesecure.json'),
+                               storage_format='binary' if request.param == 'binary' else 'json',
+                               wal=request.param == 'json-wal')
+            opened.append(db)
+            return db
+        yield make
+        for db in opened:
+            db.close()
+
+    def _docs(self, crypto_manager, seed):
+        return [{'encrypted': e, 'hmac': h}
+                for e, h in crypto_manager.encrypt_many(_random_embeddings(3, DIM, seed))]
+
+    def test_no_change_is_cheap(self, open_db, crypto_manager, monkeypatch):
+        """Değişiklik yoksa veya değişiklik kendi yazmasıysa yeniden yükleme olmamalı"""
+        reader = open_db()
+        reader.create_user('alice', self._docs(crypto_manager, seed=0))
+        reader.delete_user('alice')
+        reader.create_user('bob', self._docs(crypto_manager, seed=1))
+
+        if isinstance(reader, DBManager):
+            monkeypatch.setattr(reader, '_load_data', lambda: pytest.fail('gereksiz yükleme'))
+        assert reader.refresh() == []
+        assert reader.refresh() == []
+
+    def test_external_changes(self, open_db, crypto_manager):
+        """Başka instance'ın oluşturma, güncelleme ve silmeleri fark olarak gelmeli"""
+        writer, reader = open_db(), open_db()
+        writer.create_user('alice', self._docs(crypto_manager, seed=0))
+        writer.create_user('bob', self._docs(crypto_manager, seed=1))
+        bob = writer.get_user_by_username('bob')
+
+        changes = reader.refresh()
+        assert sorted((event, name) for event, name, _ in changes) == [
+            ('create', 'alice'), ('create', 'bob')
+        ]
+        assert reader.get_user_by_username('alice') is not None
+
+        writer.delete_user('alice')
+        writer.update_user_records({'bob': (bob, {'embeddings': self._docs(crypto_manager, seed=2)})})
+        changes = {name: (event, doc) for event, name, doc in reader.refresh()}
+        assert changes['alice'] == ('delete', None)
+        assert changes['bob'][0] == 'update'
+        assert changes['bob'][1] == writer.get_user_by_username('bob')
+        assert reader.get_user_by_username('alice') is None
+        assert reader.refresh() == []
+
+    def test_gallery_follows_refresh(self, open_db, crypto_manager):
+        """Dış değişiklikler galeriye artımlı yansımalı; rotasyon yeniden deşifre etmemeli"""
+        writer, reader = open_db(), open_db()
+        gallery = EmbeddingGallery(crypto_manager, embedding_dim=DIM,
+                                   store=reader.embedding_store)
+        gallery.sync(reader.get_all_users())
+
+        embeddings = _random_embeddings(3, DIM, seed=5)
+        writer.create_sealed_user(
+            'carol',
+            lambda uid: crypto_manager.seal_embeddings(embeddings, user_associated_data(uid, 'carol')),
+            embedding_count=3
+        )
+        carol = writer.get_user_by_username('carol')
+
+        reader.add_listener(gallery.on_store_event)
+        try:
+            reader.refresh()
+            assert gallery.best_match(embeddings[1])[0] == 'carol'
+
+            # Aynı plaintext yeniden mühürlenir -> galeri versiyonu aynı kalır
+            resealed = crypto_manager.seal_embeddings(
+                embeddings, user_associated_data(carol['_id'], 'carol'))
+            writer.update_user_records({'carol': (carol, {'sealed': resealed})})
+            put_calls = []
+            original_put = gallery._put_user
+            gallery._put_user = lambda user, block=None: (put_calls.append(user['username']),
+                                                           original_put(user, block))
+            assert [event for event, _, _ in reader.refresh()] == ['update']
+            assert put_calls == []
+
+            writer.delete_user('carol')
+            reader.refresh()
+            assert gallery.snapshot.usernames == []
+        finally:
+            reader.remove_listener(gallery.on_store_event)
+
+    def test_diff_users(self):
+        """Aynı adla yeniden oluşturulan kullanıcı 'create' olmalı"""
+        old = {'a': {'_id': '1', 'x': 1}, 'b': {'_id': '2'}, 'c': {'_id': '3'}}
+        new = {'a': {'_id': '1', 'x': 2}, 'b': {'_id': '4'}, 'd': {'_id': '5'}}
+        assert sorted(diff_users(old, new)) == sorted([
+            ('update', 'a', new['a']), ('create', 'b', new['b']),
+            ('create', 'd', new['d']), ('delete', 'c', None)
+        ])
+
+    def test_shared_storage(self, tmp_path):
+        """Aynı URI için süreç içinde tek handle dönmeli"""
+        uri = f"sqlite:///{tmp_path / 'shared.db'}"
+        first = shared_storage(uri)
+        assert shared_storage(uri) is first
+        first.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
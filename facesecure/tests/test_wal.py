@@ -0,0 +1,197 @@
+"""
+DBManager write-ahead log (WAL) modu testleri
+"""
+import json
+import os
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import CryptoManager, generate_keys
+from utils.db import DBManager
+from utils.wal import WriteAheadLog
+
+
+def _docs(crypto_manager, count=2):
+    embeddings = np.random.default_rng(0).standard_normal((count, 16)).astype(np.float32)
+    return [{'encrypted': e, 'hmac': h} for e, h in crypto_manager.encrypt_many(embeddings)]
+
+
+class TestWriteAheadLog:
+    """DBManager WAL modu testleri"""
+
+    @pytest.fixture
+    def crypto_manager(self):
+        return CryptoManager(*generate_keys())
+
+    @pytest.fixture
+    def open_db(self, tmp_path, monkeypatch):
+        # Denemeler de WAL'a kayıt olarak yazılsın
+        monkeypatch.setenv('FS_ATTEMPT_LOG', '0')
+
+        def make(storage_format='json'):
+            return DBManager(json_path=str(tmp_path / 'data.json'),
+                             storage_format=storage_format, wal=True)
+        return make
+
+    def test_mutation_appends_instead_of_rewrite(self, open_db, crypto_manager):
+        """Değişiklikler snapshot'ı yeniden yazmadan log'a eklenmeli"""
+        db = open_db()
+        snapshot_mtime = os.stat(db.json_path).st_mtime_ns
+        snapshot_size = os.path.getsize(db.json_path)
+
+        db.create_user('alice', _docs(crypto_manager))
+        for i in range(5):
+            db.log_failed_attempt('alice', '10.0.0.1', 0.1 * i, 'low_similarity')
+
+        assert os.stat(db.json_path).st_mtime_ns == snapshot_mtime
+        assert os.path.getsize(db.json_path) == snapshot_size
+        with open(db.wal.segment_path(db.wal.generation), encoding='utf-8') as f:
+            ops = [json.loads(line)['op'] for line in f]
+        assert ops == ['put_user'] + ['failed_attempt'] * 5
+        db.close()
+
+    def test_replay_on_startup(self, open_db, crypto_manager):
+        """Yeniden açılışta log snapshot üzerine uygulanmalı"""
+        db = open_db()
+        db.create_user('alice', _docs(crypto_manager))
+        db.create_user('bob', _docs(crypto_manager))
+        db.delete_user('alice')
+        db.log_failed_attempt('bob', '10.0.0.2', 0.3, 'low_similarity')
+        db.close()
+
+        reopened = open_db()
+        assert [u['username'] for u in reopened.get_all_users()] == ['bob']
+        assert reopened.user_id_counter == 2
+        assert reopened.get_failed_attempts()[0]['ip_address'] == '10.0.0.2'
+        reopened.close()
+
+    def test_torn_tail_is_discarded(self, open_db, crypto_manager):
+        """Yarım yazılmış son kayıt atılmalı, sonraki yazmalar okunabilmeli"""
+        db = open_db()
+        db.create_user('alice', _docs(crypto_manager))
+        segment = db.wal.segment_path(db.wal.generation)
+        db.close()
+        with open(segment, 'ab') as f:
+            f.write(b'{"op": "failed_attempt", "attem')
+
+        reopened = open_db()
+        assert reopened.get_user_by_username('alice') is not None
+        assert reopened.get_failed_attempts() == []
+        reopened.log_failed_attempt('alice', '10.0.0.3', 0.2, 'low_similarity')
+        reopened.close()
+
+        again = open_db()
+        assert len(again.get_failed_attempts()) == 1
+        again.close()
+
+    def test_compaction(self, open_db, crypto_manager):
+        """Sıkıştırma log'u snapshot'a katlamalı ve eski segmentleri silmeli"""
+        db = open_db()
+        db.create_user('alice', _docs(crypto_manager))
+        db.log_failed_attempt('alice', '10.0.0.1', 0.1, 'low_similarity')
+        old_generation = db.wal.generation
+
+        db.compact()
+        assert db.wal.generation == old_generation + 1
+        assert [g for g, _ in db.wal.segments()] == [db.wal.generation]
+        with open(db.json_path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        assert 'alice' in snapshot['users']
+        assert snapshot['wal_generation'] == db.wal.generation
+
+        db.log_failed_attempt('alice', '10.0.0.1', 0.2, 'low_similarity')
+        db.close()
+        reopened = open_db()
+        assert len(reopened.get_failed_attempts()) == 2
+        reopened.close()
+
+    def test_background_compaction(self, open_db, crypto_manager):
+        """Log eşiği aşınca arka planda sıkıştırma başlamalı"""
+        db = open_db()
+        db.compact_bytes = 512
+        for i in range(10):
+            db.log_failed_attempt('alice', '10.0.0.1', 0.01 * i, 'low_similarity')
+        db._compactor.join()
+        assert db.wal.generation > 1
+        db.close()
+
+        reopened = open_db()
+        assert len(reopened.get_failed_attempts()) == 10
+        reopened.close()
+
+    def test_binary_slots_replay(self, open_db, crypto_manager):
+        """Binary formatta boş slot listesi replay ile yeniden kurulmalı"""
+        db = open_db('binary')
+        db.create_user('alice', _docs(crypto_manager))
+        db.create_user('bob', _docs(crypto_manager))
+        db.delete_user('alice')
+        free_slots = sorted(db.free_slots)
+        db.close()
+
+        reopened = open_db('binary')
+        assert sorted(reopened.free_slots) == free_slots == [0, 1]
+        reopened.create_user('carol', _docs(crypto_manager))
+        assert sorted(d['slot'] for d in reopened.get_user_by_username('carol')['embeddings']) == [0, 1]
+        reopened.close()
+
+    def test_refresh_tails_new_records(self, open_db, crypto_manager, monkeypatch):
+        """Diğer instance'ın eklediği kayıtlar tam yükleme olmadan uygulanmalı"""
+        writer, reader = open_db(), open_db()
+        writer.create_user('alice', _docs(crypto_manager))
+        writer.create_user('bob', _docs(crypto_manager))
+        assert sorted(name for _, name, _ in reader.refresh()) == ['alice', 'bob']
+
+        loads = []
+        original_load = reader._load_data
+        monkeypatch.setattr(reader, '_load_data', lambda: (loads.append(1), original_load()))
+        writer.delete_user('alice')
+        writer.create_user('carol', _docs(crypto_manager))
+        writer.log_failed_attempt('bob', '10.0.0.1', 0.1, 'low_similarity')
+
+        changes = reader.refresh()
+        assert sorted((event, name) for event, name, _ in changes) == [
+            ('create', 'carol'), ('delete', 'alice')
+        ]
+        assert loads == []
+        assert sorted(u['username'] for u in reader.get_all_users()) == ['bob', 'carol']
+        assert len(reader.get_failed_attempts()) == 1
+        assert reader.user_id_counter == writer.user_id_counter == 3
+
+        # Kendi yazması tail konumunu ilerletmeli, tekrar uygulanmamalı
+        reader.create_user('dave', _docs(crypto_manager))
+        writer.create_user('erin', _docs(crypto_manager))
+        assert [(e, n) for e, n, _ in reader.refresh()] == [('create', 'erin')]
+        assert loads == []
+
+        # Sıkıştırma yeni nesil snapshot'ı yazar: tam yüklemeye düşülmeli
+        writer.compact()
+        writer.delete_user('bob')
+        assert [(e, n) for e, n, _ in reader.refresh()] == [('delete', 'bob')]
+        assert loads == [1]
+        assert reader.wal.generation == writer.wal.generation
+        reader.create_user('frank', _docs(crypto_manager))
+        reopened = open_db()
+        assert 'frank' in [u['username'] for u in reopened.get_all_users()]
+        for db in (writer, reader, reopened):
+            db.close()
+
+    def test_group_commit(self, tmp_path):
+        """group_size dolana kadar fsync ertelenmeli"""
+        synced = []
+        wal = WriteAheadLog(str(tmp_path / 'log.wal'), group_size=3,
+                            before_sync=lambda: synced.append(True))
+        list(wal.replay(0))
+        wal.append({'op': 'x'})
+        wal.append({'op': 'x'})
+        assert synced == []
+        wal.append({'op': 'x'})
+        assert synced == [True]
+        wal.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
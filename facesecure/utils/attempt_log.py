@@ -0,0 +1,435 @@
+"""
+Başarısız deneme log'u - request yolunun dışında, grup halinde yazılır
+
+Kayıtlar sınırlı bir kuyruğa atılır; arka plan thread'i kuyruğu toplu
+(batch) olarak boşaltıp ayrı, sadece eklenen JSONL segmentlerine yazar ve
+her batch'te bir kez fsync yapar:
+    <prefix>.<seq>-<pid>.jsonl    ör. facesecure_attempts.000003-4121.jsonl
+
+Segment boyut (max_bytes) veya yaş (rotate_interval) sınırını aşınca yenisine
+geçilir; retention_days'ten eski ve max_segments'i aşan segmentler silinir.
+Süreç kapanırken (atexit) kuyruktaki kayıtlar diske yazılır.
+
+Log varsayılan olarak açıktır: prefix verilmezse veritabanı dosyasının
+yanına <db>_attempts yazılır; FS_ATTEMPT_LOG=0 denemeleri eskisi gibi
+veritabanına senkron yazar.
+
+API worker'ları, admin paneli ve araçlar aynı prefix'e kendi log'larıyla
+yazar: her süreç kendi segmentine ekler (adında pid), yeni sıra numarası ve
+saklama politikası <prefix>.lock dosya kilidi altında uygulanır. Canlı bir
+sürecin en yeni (aktif) segmenti hiçbir süreç tarafından silinmez.
+
+Sorgular segmentleri yeniden eskiye tarar; sayfa konumu (segment, bayt
+ofseti) olarak döner, sonraki eklemeler konumu kaydırmaz. Zaman aralığı
+filtresinde son yazma zamanı aralıktan eski olan segmentlere hiç bakılmaz.
+Okumadan önce sadece o ana kadar kuyruğa atılmış kayıtlar en fazla
+`read_wait` saniye beklenir; saldırı trafiği kuyruğu sürekli doldururken
+yönetim sorguları bloklanmaz, o an diskte olanı okur.
+"""
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.filelock import FileLock
+
+_STOP = object()
+
+# Filtresiz sayımda segmentler bu boyutta parçalarla okunur
+_COUNT_CHUNK = 1024 * 1024
+
+# FS_ATTEMPT_LOG bu değerlerden biriyse log kapalı (senkron veritabanı yolu)
+_DISABLED = ('0', 'off', 'false', 'none', 'db')
+
+# Aynı prefix'e yazan DBManager instance'ları tek writer thread'i paylaşır
+_shared_logs: Dict[str, 'AttemptLog'] = {}
+_shared_lock = threading.Lock()
+
+
+def attempt_matches(record: Dict[str, Any], username: Optional[str] = None,
+                    ip_address: Optional[str] = None, reason: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None) -> bool:
+    """
+    Deneme kaydı filtreye uyuyor mu
+
+    Args:
+        record: {'username', 'ip_address', 'similarity_score', 'reason', 'timestamp'}
+        username: Tam eşleşme
+        ip_address: Tam eşleşme
+        reason: Alt dize (nedenler skor/threshold içerebilir)
+        since: Bu ISO zamandan itibaren (dahil)
+        until: Bu ISO zamandan önce (hariç)
+    """
+    if username is not None and record.get('username') != username:
+        return False
+    if ip_address is not None and record.get('ip_address') != ip_address:
+        return False
+    if reason is not None and reason not in (record.get('reason') or ''):
+        return False
+    timestamp = record.get('timestamp') or ''
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp >= until:
+        return False
+    return True
+
+
+def _pid_alive(pid: int) -> bool:
+    """Süreç yaşıyor mu (belirsizse yaşıyor kabul edilir - segmenti silinmez)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError, ValueError):
+        return True
+    return True
+
+
+def _utc_epoch(iso_time: str) -> float:
+    """Kayıtlardaki naive UTC ISO zamanı -> epoch saniye"""
+    return datetime.fromisoformat(iso_time).replace(tzinfo=timezone.utc).timestamp()
+
+
+class AttemptLog:
+    """Sınırlı kuyruklu, grup halinde yazan, dönen (rotating) JSONL log"""
+
+    def __init__(self, prefix: str = "facesecure_attempts",
+                 max_bytes: int = 16 * 1024 * 1024,
+                 rotate_interval: float = 24 * 3600,
+                 retention_days: float = 30,
+                 max_segments: int = 0,
+                 queue_size: int = 10000,
+                 batch_size: int = 256,
+                 flush_interval: float = 0.2,
+                 read_wait: float = 1.0):
+        """
+        Args:
+            prefix: Segment dosyalarının ortak öneki
+            max_bytes: Segment başına en fazla boyut
+            rotate_interval: Segment başına en fazla süre (saniye, 0 -> sadece boyut)
+            retention_days: Bu yaştan eski segmentler silinir (0 -> süresiz)
+            max_segments: En fazla segment sayısı (0 -> sınırsız)
+            queue_size: Kuyruk kapasitesi; doluysa kayıt atılır ve sayılır
+            batch_size: Bir yazmadaki en fazla kayıt
+            flush_interval: İlk kayıttan sonra batch'i doldurmak için bekleme (saniye)
+            read_wait: Sorgudan önce bekleyen kayıtların yazılması için en fazla
+                       bekleme (saniye, 0 -> sadece diskteki kayıtlar)
+        """
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.read_wait = read_wait
+
+        self.dropped = 0
+        self.written = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._atexit_registered = False
+        self._file = None
+        self._file_lock: Optional[FileLock] = None
+        self._opened_at = 0.0
+        # Kuyruğa atılan / işlenen kayıt sayıları (okuyucular kendi anlarına kadar bekler)
+        self._progress = threading.Condition(threading.Lock())
+        self._enqueued = 0
+        self._processed = 0
+
+    @classmethod
+    def from_env(cls, default_prefix: Optional[str] = None) -> Optional['AttemptLog']:
+        """
+        Prefix için süreç içinde paylaşılan log (varsayılan olarak açık)
+
+        Args:
+            default_prefix: FS_ATTEMPT_LOG ayarlı değilse kullanılacak prefix
+                            (genelde veritabanı dosyasının yanında)
+
+        Returns:
+            AttemptLog veya None (FS_ATTEMPT_LOG=0 -> denemeler veritabanına
+            senkron yazılır)
+        """
+        prefix = os.getenv('FS_ATTEMPT_LOG') or default_prefix
+        if not prefix or prefix.lower() in _DISABLED:
+            return None
+        with _shared_lock:
+            if prefix not in _shared_logs:
+                _shared_logs[prefix] = cls(
+                    prefix,
+                    max_bytes=int(os.getenv('FS_ATTEMPT_LOG_MAX_BYTES', str(16 * 1024 * 1024))),
+                    rotate_interval=float(os.getenv('FS_ATTEMPT_LOG_ROTATE_HOURS', '24')) * 3600,
+                    retention_days=float(os.getenv('FS_ATTEMPT_LOG_RETENTION_DAYS', '30')),
+                    max_segments=int(os.getenv('FS_ATTEMPT_LOG_MAX_SEGMENTS', '0')),
+                    queue_size=int(os.getenv('FS_ATTEMPT_QUEUE_SIZE', '10000'))
+                )
+            return _shared_logs[prefix]
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """Diskteki segmentler (tüm süreçlerin), sıra numarasıyla [(seq, path), ...]"""
+        return [(seq, path) for seq, _, path in self._segment_owners()]
+
+    def _segment_owners(self) -> List[Tuple[int, Optional[int], str]]:
+        """[(seq, yazan pid - eski adlarda None, path), ...] sıra numarasına göre"""
+        found = []
+        for path in glob.glob(glob.escape(self.prefix) + '.*.jsonl'):
+            seq, _, pid = path[len(self.prefix) + 1:-len('.jsonl')].partition('-')
+            if seq.isdigit() and (not pid or pid.isdigit()):
+                found.append((int(seq), int(pid) if pid else None, path))
+        return sorted(found)
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        Kaydı yazılmak üzere kuyruğa atar (bloklamaz)
+
+        Returns:
+            False: kuyruk dolu, kayıt atıldı (dropped sayacı artar)
+        """
+        self._ensure_thread()
+        try:
+            with self._progress:
+                self._queue.put_nowait(record)
+                self._enqueued += 1
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    print(f"⚠️  Deneme log kuyruğu dolu, {self.dropped} kayıt atıldı")
+            return False
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='attempt-log',
+                                                    daemon=True)
+                    self._thread.start()
+                    if not self._atexit_registered:
+                        atexit.register(self.close)
+                        self._atexit_registered = True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            stop = batch[0] is _STOP
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                stop = item is _STOP
+                batch.append(item)
+
+            records = [item for item in batch if item is not _STOP]
+            try:
+                if records:
+                    self._write(records)
+            except Exception as e:
+                print(f"⚠️  Deneme log'u yazılamadı ({len(records)} kayıt): {e}")
+            finally:
+                with self._progress:
+                    self._processed += len(records)
+                    self._progress.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records: List[Dict[str, Any]]):
+        """Batch'i tek yazma + tek fsync ile aktif segmente ekler"""
+        data = b''.join(
+            json.dumps(record, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+            for record in records
+        )
+        with self._lock:
+            if self._file is None or self._should_rotate(len(data)):
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.written += len(records)
+
+    def _should_rotate(self, incoming: int) -> bool:
+        size = self._file.tell()
+        if size > 0 and size + incoming > self.max_bytes:
+            return True
+        return self.rotate_interval > 0 and time.time() - self._opened_at >= self.rotate_interval
+
+    def _rotate(self):
+        """Yeni segment açar ve saklama politikasını uygular (süreçler arası kilit altında)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._file_lock is None:
+            directory = os.path.dirname(self.prefix)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file_lock = FileLock(self.prefix + '.lock')
+        with self._file_lock:
+            existing = self.segments()
+            seq = existing[-1][0] + 1 if existing else 1
+            path = f"{self.prefix}.{seq:06d}-{os.getpid()}.jsonl"
+            self._file = open(path, 'ab')
+            self._opened_at = time.time()
+            self._apply_retention(path)
+
+    def _apply_retention(self, current_path: str):
+        """Süresi dolan / fazla segmentleri siler; canlı süreçlerin aktif segmentleri korunur"""
+        owners = self._segment_owners()
+        active = {}
+        for _, pid, path in owners:
+            if pid is not None:
+                active[pid] = path
+        protected = {path for pid, path in active.items()
+                     if pid != os.getpid() and _pid_alive(pid)}
+        protected.add(current_path)
+
+        old = [path for _, _, path in owners if path not in protected]
+        expired = set()
+        if self.max_segments > 0:
+            excess = len(owners) - self.max_segments
+            expired.update(old[:max(excess, 0)])
+        if self.retention_days > 0:
+            cutoff = time.time() - self.retention_days * 86400
+            expired.update(path for path in old if os.path.getmtime(path) < cutoff)
+        for path in expired:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Kuyruktaki tüm kayıtlar yazılana kadar bekler
+
+        Returns:
+            False: timeout doldu
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.unfinished_tasks == 0
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _await_submitted(self):
+        """
+        Bu çağrıdan önce kuyruğa atılan kayıtların yazılmasını en fazla
+        read_wait saniye bekler; sonradan gelenler beklenmez
+        """
+        if self.read_wait <= 0:
+            return
+        with self._progress:
+            target = self._enqueued
+            self._progress.wait_for(
+                lambda: (self._processed >= target or self._thread is None
+                         or not self._thread.is_alive()),
+                self.read_wait
+            )
+
+    def _scan(self, position: Optional[Tuple[int, int]] = None,
+              since: Optional[str] = None) -> Iterator[Tuple[Dict[str, Any], Tuple[int, int]]]:
+        """
+        Kayıtları yeniden eskiye verir: (kayıt, kaydın (seq, ofset) konumu)
+
+        Args:
+            position: Sadece bu konumdan önceki kayıtlar (None -> en yeni)
+            since: Son yazması bu zamandan eski segmentlerde durulur
+        """
+        self._await_submitted()
+        since_epoch = _utc_epoch(since) if since else None
+        for seq, path in reversed(self.segments()):
+            if position is not None and seq > position[0]:
+                continue
+            try:
+                if since_epoch is not None and os.path.getmtime(path) < since_epoch:
+                    # Bu ve daha eski segmentlerdeki tüm kayıtlar aralığın dışında
+                    return
+                with open(path, 'rb') as f:
+                    data = f.read() if position is None or seq != position[0] else f.read(position[1])
+            except OSError:
+                continue
+            # Yazılmakta olan yarım satır atlanır
+            end = data.rfind(b'\n') + 1
+            while end > 0:
+                start = data.rfind(b'\n', 0, end - 1) + 1
+                line = data[start:end - 1]
+                end = start
+                try:
+                    yield json.loads(line), (seq, start)
+                except json.JSONDecodeError:
+                    continue
+
+    def query(self, limit: int = 100, position: Optional[Tuple[int, int]] = None,
+              **filters) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """
+        Filtreye uyan kayıtlar, yeniden eskiye, sayfa sayfa
+
+        Args:
+            limit: Sayfa boyutu
+            position: Önceki sayfanın döndürdüğü konum (None -> ilk sayfa)
+            **filters: attempt_matches filtreleri
+
+        Returns:
+            (kayıtlar, sonraki sayfa konumu - log bittiyse None)
+        """
+        result: List[Dict[str, Any]] = []
+        if limit <= 0:
+            return result, position
+        for record, record_position in self._scan(position, filters.get('since')):
+            if attempt_matches(record, **filters):
+                result.append(record)
+                if len(result) >= limit:
+                    return result, record_position
+        return result, None
+
+    def count(self, **filters) -> int:
+        """
+        Filtreye uyan kayıt sayısı
+
+        Filtre yoksa kayıtlar ayrıştırılmaz, segmentler parça parça okunup
+        sadece satır sonları sayılır.
+        """
+        if not any(value is not None for value in filters.values()):
+            self._await_submitted()
+            total = 0
+            for _, path in self.segments():
+                try:
+                    with open(path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(_COUNT_CHUNK), b''):
+                            total += chunk.count(b'\n')
+                except OSError:
+                    continue
+            return total
+        return sum(1 for record, _ in self._scan(since=filters.get('since'))
+                   if attempt_matches(record, **filters))
+
+    def recent(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Son kayıtlar, yeniden eskiye (bekleyenler en fazla read_wait kadar beklenir)"""
+        return self.query(limit)[0]
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Kuyruğu boşaltıp writer thread'ini durdurur (kapanış kancası)"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._file_lock is not None:
+                self._file_lock.close()
@@ -5,48 +5,159 @@ import os
 import base64
 import hmac
 import hashlib
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from typing import Tuple
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 import numpy as np
 
+# Bu sayının altındaki partiler thread pool'a dağıtılmaz
+PARALLEL_MIN_RECORDS = 64
+
+# 'kid' alanı olmayan (anahtar rotasyonundan önceki) kayıtların anahtar ID'si
+DEFAULT_KEY_ID = '0'
+
+# Mühürlü (sealed) kullanıcı kaydı formatı:
+#   v1: version (u8) | codec adı uzunluğu (u8) | codec adı | nonce (12) | ciphertext + tag
+#   v2: v1 başlığı + anahtar ID uzunluğu (u8) | anahtar ID | nonce (12) | ciphertext + tag
+# Başlık ve kullanıcı kimliği associated data olarak doğrulanır.
+# Plaintext: n_embeddings (u32) | n_prototypes (u32) | dim (u32) | kodlar | float32 prototipler
+SEALED_FORMAT_VERSION = 2
+_SEALED_HEADER = struct.Struct('<BB')
+_SEALED_COUNTS = struct.Struct('<III')
+
+
+class SealedEmbeddings(NamedTuple):
+    """Açılmış mühürlü kullanıcı kaydı"""
+    codec: str                # Kodların kodek adı
+    dim: int                  # Embedding boyutu
+    codes: np.ndarray         # (k, row_bytes) uint8 - kodek formunda satırlar
+    prototypes: np.ndarray    # (p, dim) float32
+
+
+def user_associated_data(user_id: str, username: str) -> bytes:
+    """Mühürlü kaydı kullanıcıya bağlayan associated data"""
+    return f"{user_id}\x00{username}".encode('utf-8')
+
+
+def _decode_keys(aes_key_b64: str, hmac_key_b64: str) -> Tuple[bytes, bytes]:
+    aes_key = base64.b64decode(aes_key_b64)
+    hmac_key = base64.b64decode(hmac_key_b64)
+    
+    if len(aes_key) != 32:
+        raise ValueError("AES key 32 byte olmalı")
+    if len(hmac_key) != 32:
+        raise ValueError("HMAC key 32 byte olmalı")
+    return aes_key, hmac_key
+
 
 class CryptoManager:
     """AES-GCM şifreleme ve HMAC doğrulama yöneticisi"""
     
-    def __init__(self, aes_key_b64: str, hmac_key_b64: str):
+    def __init__(self, aes_key_b64: str, hmac_key_b64: str,
+                 key_id: str = DEFAULT_KEY_ID,
+                 retired_keys: Optional[Dict[str, Tuple[str, str]]] = None):
         """
         Args:
-            aes_key_b64: Base64 encoded AES-256 key (32 bytes)
-            hmac_key_b64: Base64 encoded HMAC key (32 bytes)
+            aes_key_b64: Base64 encoded AES-256 key (32 bytes) - aktif anahtar
+            hmac_key_b64: Base64 encoded HMAC key (32 bytes) - aktif anahtar
+            key_id: Aktif anahtarın ID'si (yeni kayıtlar bununla etiketlenir)
+            retired_keys: Sadece deşifre için tutulan eski anahtarlar
+                          {key_id: (aes_key_b64, hmac_key_b64)}
         """
-        self.aes_key = base64.b64decode(aes_key_b64)
-        self.hmac_key = base64.b64decode(hmac_key_b64)
+        self.aes_key, self.hmac_key = _decode_keys(aes_key_b64, hmac_key_b64)
+        self.aesgcm = AESGCM(self.aes_key)
+        self.key_id = key_id
         
-        if len(self.aes_key) != 32:
-            raise ValueError("AES key 32 byte olmalı")
-        if len(self.hmac_key) != 32:
-            raise ValueError("HMAC key 32 byte olmalı")
+        # Anahtarlık: key_id -> (AESGCM, hmac_key)
+        self._keys: Dict[str, Tuple[AESGCM, bytes]] = {}
+        for retired_id, (retired_aes_b64, retired_hmac_b64) in (retired_keys or {}).items():
+            self.add_key(retired_id, retired_aes_b64, retired_hmac_b64)
+        self._keys[key_id] = (self.aesgcm, self.hmac_key)
         
-        self.aesgcm = AESGCM(self.aes_key)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_workers = 0
+        self._executor_lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls) -> 'CryptoManager':
+        """
+        Anahtarlığı ortam değişkenlerinden kurar
+        
+        FS_AES_KEY_B64 / FS_HMAC_KEY_B64: aktif anahtar
+        FS_KEY_ID: aktif anahtar ID'si (varsayılan '0')
+        FS_RETIRED_KEYS: eski anahtarlar - "kid:aes_b64:hmac_b64,kid:aes_b64:hmac_b64"
+        """
+        retired_keys = {}
+        for entry in filter(None, os.getenv('FS_RETIRED_KEYS', '').split(',')):
+            try:
+                key_id, aes_key_b64, hmac_key_b64 = entry.strip().split(':')
+            except ValueError:
+                raise ValueError("FS_RETIRED_KEYS formatı 'kid:aes_b64:hmac_b64' olmalı")
+            retired_keys[key_id] = (aes_key_b64, hmac_key_b64)
+        
+        return cls(
+            os.getenv('FS_AES_KEY_B64'),
+            os.getenv('FS_HMAC_KEY_B64'),
+            key_id=os.getenv('FS_KEY_ID', DEFAULT_KEY_ID),
+            retired_keys=retired_keys
+        )
     
-    def encrypt_embedding(self, embedding: np.ndarray) -> Tuple[str, str]:
+    def add_key(self, key_id: str, aes_key_b64: str, hmac_key_b64: str):
+        """Sadece deşifre için kullanılacak (eski) bir anahtar ekler"""
+        if key_id == self.key_id:
+            raise ValueError(f"Aktif anahtar ID'si eski anahtar olarak eklenemez: {key_id}")
+        aes_key, hmac_key = _decode_keys(aes_key_b64, hmac_key_b64)
+        self._keys[key_id] = (AESGCM(aes_key), hmac_key)
+    
+    @property
+    def key_ids(self) -> List[str]:
+        """Anahtarlıktaki tüm anahtar ID'leri"""
+        return list(self._keys)
+    
+    def _key(self, key_id: Optional[str]) -> Tuple[AESGCM, bytes]:
+        """Kaydın anahtar ID'sine göre (AESGCM, hmac_key) - None -> eski kayıt"""
+        try:
+            return self._keys[DEFAULT_KEY_ID if key_id is None else key_id]
+        except KeyError:
+            raise ValueError(f"Bilinmeyen anahtar ID'si: {key_id}")
+    
+    def encrypt_embedding(self, embedding: np.ndarray, codec=None) -> Tuple[str, str]:
         """
         Embedding'i AES-GCM ile şifreler
         
         Args:
             embedding: 512-boyutlu numpy array (FaceNet)
+            codec: Opsiyonel EmbeddingCodec (None -> ham float32)
             
         Returns:
             (encrypted_b64, hmac_b64) tuple
         """
-        # Numpy array'i bytes'a çevir
-        embedding_bytes = embedding.tobytes()
+        # Numpy array'i bytes'a çevir (kodek varsa sıkıştırılmış form)
+        if codec is not None:
+            embedding_bytes = codec.to_bytes(embedding)
+        else:
+            embedding_bytes = embedding.tobytes()
         
+        return self.encrypt_bytes(embedding_bytes)
+    
+    def encrypt_bytes(self, plaintext: bytes) -> Tuple[str, str]:
+        """
+        Ham byte'ları AES-GCM ile şifreler ve HMAC üretir
+        
+        Args:
+            plaintext: Şifrelenecek veri
+            
+        Returns:
+            (encrypted_b64, hmac_b64) tuple
+        """
         # 96-bit nonce (GCM standardı)
         nonce = os.urandom(12)
         
         # AES-GCM şifreleme (authenticated encryption)
-        ciphertext = self.aesgcm.encrypt(nonce, embedding_bytes, None)
+        ciphertext = self.aesgcm.encrypt(nonce, plaintext, None)
         
         # Nonce + ciphertext birleştir
         encrypted = nonce + ciphertext
@@ -62,28 +173,49 @@ class CryptoManager:
         
         return encrypted_b64, hmac_b64
     
-    def decrypt_embedding(self, encrypted_b64: str, hmac_b64: str, 
-                         embedding_dim: int = 512) -> np.ndarray:
+    def decrypt_bytes(self, encrypted_b64: str, hmac_b64: str,
+                      key_id: Optional[str] = None) -> bytes:
         """
-        Şifrelenmiş embedding'i çözer
+        HMAC doğrular ve AES-GCM ile deşifre eder
         
         Args:
             encrypted_b64: Base64 encoded encrypted data
             hmac_b64: Base64 encoded HMAC
-            embedding_dim: Embedding boyutu (FaceNet: 512)
+            key_id: Kaydın 'kid' alanı (None -> eski kayıt, DEFAULT_KEY_ID)
             
         Returns:
-            Decrypted embedding (numpy array)
+            Plaintext byte'lar
             
         Raises:
             ValueError: HMAC doğrulama başarısız
         """
         encrypted = base64.b64decode(encrypted_b64)
         stored_hmac = base64.b64decode(hmac_b64)
+        return self.decrypt_record(encrypted, stored_hmac, key_id=key_id)
+    
+    def decrypt_record(self, encrypted, stored_hmac, key_id: Optional[str] = None) -> bytes:
+        """
+        Ham (base64 olmayan) kaydı doğrular ve deşifre eder
+        
+        bytes-like kabul eder; mmap üzerindeki memoryview'lar kopyalanmadan
+        HMAC ve AES-GCM'e verilir.
+        
+        Args:
+            encrypted: nonce (12) + ciphertext + tag
+            stored_hmac: 32 byte HMAC
+            key_id: Kaydın 'kid' alanı (None -> eski kayıt, DEFAULT_KEY_ID)
+            
+        Returns:
+            Plaintext byte'lar
+            
+        Raises:
+            ValueError: HMAC doğrulama başarısız
+        """
+        aesgcm, hmac_key = self._key(key_id)
         
         # HMAC doğrulama
         computed_hmac = hmac.new(
-            self.hmac_key,
+            hmac_key,
             encrypted,
             hashlib.sha256
         ).digest()
@@ -96,7 +228,32 @@ class CryptoManager:
         ciphertext = encrypted[12:]
         
         # Deşifreleme
-        plaintext = self.aesgcm.decrypt(nonce, ciphertext, None)
+        return aesgcm.decrypt(nonce, ciphertext, None)
+    
+    def decrypt_embedding(self, encrypted_b64: str, hmac_b64: str, 
+                         embedding_dim: int = 512, codec=None,
+                         key_id: Optional[str] = None) -> np.ndarray:
+        """
+        Şifrelenmiş embedding'i çözer
+        
+        Args:
+            encrypted_b64: Base64 encoded encrypted data
+            hmac_b64: Base64 encoded HMAC
+            embedding_dim: Embedding boyutu (FaceNet: 512)
+            codec: Kayıt sıkıştırılmışsa EmbeddingCodec (None -> ham float32)
+            key_id: Kaydın 'kid' alanı (None -> eski kayıt)
+            
+        Returns:
+            Decrypted embedding (numpy array, float32)
+            
+        Raises:
+            ValueError: HMAC doğrulama başarısız
+        """
+        plaintext = self.decrypt_bytes(encrypted_b64, hmac_b64, key_id=key_id)
+        
+        if codec is not None:
+            codes = codec.from_bytes(plaintext, embedding_dim)
+            return codec.decode(codes[None, :])[0]
         
         # Bytes'ı numpy array'e çevir
         embedding = np.frombuffer(plaintext, dtype=np.float32)
@@ -105,6 +262,267 @@ class CryptoManager:
             raise ValueError(f"Embedding boyutu uyuşmuyor: {len(embedding)} != {embedding_dim}")
         
         return embedding
+    
+    def seal_embeddings(self, embeddings: np.ndarray, associated_data: bytes,
+                        prototypes: Optional[np.ndarray] = None, codec=None) -> str:
+        """
+        Kullanıcının tüm embedding'lerini ve prototiplerini tek AEAD blob'a mühürler
+        
+        Tek nonce, tek GCM tag; HMAC gerekmez (GCM zaten doğrular).
+        
+        Args:
+            embeddings: (k, D) embedding matrisi
+            associated_data: user_associated_data(user_id, username)
+            prototypes: Opsiyonel (p, D) prototipler (float32 saklanır)
+            codec: Embedding kodeği (None -> ham float32)
+            
+        Returns:
+            Base64 encoded blob
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            raise ValueError(f"Embedding matrisi (k, D) olmalı: {embeddings.shape}")
+        
+        if codec is not None:
+            return self.seal_codes(codec.encode(embeddings), codec.name, embeddings.shape[1],
+                                   associated_data, prototypes=prototypes)
+        return self.seal_codes(embeddings, 'float32', embeddings.shape[1],
+                               associated_data, prototypes=prototypes)
+    
+    def seal_codes(self, codes: np.ndarray, codec_name: str, dim: int,
+                   associated_data: bytes, prototypes: Optional[np.ndarray] = None) -> str:
+        """
+        Önceden kodlanmış (k, W) satırları mühürler (migrasyonda kayıpsız kopya için)
+        
+        Args:
+            codes: (k, W) kodek formunda satırlar
+            codec_name: Kodek adı
+            dim: Embedding boyutu
+            associated_data: user_associated_data(user_id, username)
+            prototypes: Opsiyonel (p, D) prototipler
+            
+        Returns:
+            Base64 encoded blob
+        """
+        if prototypes is None:
+            prototypes = np.empty((0, dim), dtype=np.float32)
+        prototypes = np.ascontiguousarray(prototypes, dtype=np.float32)
+        if prototypes.shape[1:] != (dim,):
+            raise ValueError(f"Prototip boyutu uyuşmuyor: {prototypes.shape}")
+        
+        codec_bytes = codec_name.encode('utf-8')
+        key_id_bytes = self.key_id.encode('utf-8')
+        header = b''.join([
+            _SEALED_HEADER.pack(SEALED_FORMAT_VERSION, len(codec_bytes)), codec_bytes,
+            bytes([len(key_id_bytes)]), key_id_bytes
+        ])
+        plaintext = b''.join([
+            _SEALED_COUNTS.pack(len(codes), len(prototypes), dim),
+            np.ascontiguousarray(codes).tobytes(),
+            prototypes.tobytes()
+        ])
+        
+        nonce = os.urandom(12)
+        ciphertext = self.aesgcm.encrypt(nonce, plaintext, header + associated_data)
+        return base64.b64encode(header + nonce + ciphertext).decode('utf-8')
+    
+    def open_sealed(self, sealed_b64: Union[str, bytes], associated_data: bytes) -> SealedEmbeddings:
+        """
+        Mühürlü kullanıcı kaydını doğrular ve açar
+        
+        Args:
+            sealed_b64: seal_embeddings çıktısı (veya çözülmüş ham baytları)
+            associated_data: Mühürlerken kullanılan associated data
+            
+        Returns:
+            SealedEmbeddings (kodlar ve prototipler plaintext üzerinde view)
+            
+        Raises:
+            ValueError: Bilinmeyen sürüm, bozuk kayıt veya kimlik uyuşmazlığı
+        """
+        blob = self._sealed_bytes(sealed_b64)
+        codec_name, key_id, header_end = self._sealed_header(blob)
+        aesgcm, _ = self._key(key_id)
+        nonce = blob[header_end:header_end + 12]
+        
+        try:
+            plaintext = aesgcm.decrypt(nonce, blob[header_end + 12:],
+                                       blob[:header_end] + associated_data)
+        except InvalidTag:
+            raise ValueError("Mühürlü kayıt doğrulama başarısız - veri bütünlüğü ihlali!")
+        
+        count, n_prototypes, dim = _SEALED_COUNTS.unpack_from(plaintext, 0)
+        proto_bytes = n_prototypes * dim * 4
+        codes_bytes = len(plaintext) - _SEALED_COUNTS.size - proto_bytes
+        if codes_bytes < 0 or (count and codes_bytes % count):
+            raise ValueError("Mühürlü kayıt boyutu uyuşmuyor")
+        
+        codes = np.frombuffer(plaintext, dtype=np.uint8, count=codes_bytes,
+                              offset=_SEALED_COUNTS.size).reshape(count, -1 if count else 0)
+        prototypes = np.frombuffer(plaintext, dtype=np.float32, count=n_prototypes * dim,
+                                   offset=_SEALED_COUNTS.size + codes_bytes).reshape(n_prototypes, dim)
+        return SealedEmbeddings(codec_name, dim, codes, prototypes)
+    
+    @staticmethod
+    def _sealed_header(blob: bytes) -> Tuple[str, str, int]:
+        """Mühürlü kayıt başlığını çözer: (codec adı, anahtar ID, başlık sonu)"""
+        if len(blob) < _SEALED_HEADER.size:
+            raise ValueError("Mühürlü kayıt çok kısa")
+        version, codec_len = _SEALED_HEADER.unpack_from(blob, 0)
+        if version not in (1, SEALED_FORMAT_VERSION):
+            raise ValueError(f"Desteklenmeyen mühürlü kayıt sürümü: {version}")
+        
+        offset = _SEALED_HEADER.size + codec_len
+        codec_name = blob[_SEALED_HEADER.size:offset].decode('utf-8')
+        if version == 1:
+            return codec_name, DEFAULT_KEY_ID, offset
+        
+        key_id_len = blob[offset]
+        key_id = blob[offset + 1:offset + 1 + key_id_len].decode('utf-8')
+        return codec_name, key_id, offset + 1 + key_id_len
+    
+    def sealed_key_id(self, sealed_b64: Union[str, bytes]) -> str:
+        """Mühürlü kaydın anahtar ID'si (deşifre etmeden)"""
+        return self._sealed_header(self._sealed_bytes(sealed_b64))[1]
+    
+    @staticmethod
+    def _sealed_bytes(sealed: Union[str, bytes]) -> bytes:
+        """base64 dize (JSON/SQLite) veya EmbeddingStore'dan okunan ham blob -> bytes"""
+        return base64.b64decode(sealed) if isinstance(sealed, str) else bytes(sealed)
+    
+    def _map_chunks(self, func, count: int, workers: int):
+        """
+        func(start, end) çağrılarını satır aralıklarına bölüp çalıştırır
+        
+        AES-GCM ve HMAC çağrıları GIL'i bıraktığı için thread'ler gerçekten
+        paralel çalışır. Paylaşılan pool bir kez (en az çekirdek sayısı kadar
+        thread'le) kurulur ve değiştirilmez; başka bir thread'in gönderdiği
+        işler kapatılmış bir pool'a düşmez. Pool'dan büyük `workers` değerleri
+        sadece daha fazla parçaya bölünür.
+        """
+        if workers <= 1 or count < PARALLEL_MIN_RECORDS:
+            return [func(0, count)]
+        
+        bounds = np.linspace(0, count, workers + 1).astype(int)
+        with self._executor_lock:
+            if self._executor is None:
+                # Thread'ler ihtiyaç oldukça açılır; büyük üst sınır ucuzdur
+                self._executor_workers = max(workers, os.cpu_count() or 1)
+                self._executor = ThreadPoolExecutor(max_workers=self._executor_workers,
+                                                    thread_name_prefix='crypto')
+            # close() ile yarışmasın diye işler kilit altında gönderilir
+            futures = [self._executor.submit(func, int(start), int(end))
+                       for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+        return [future.result() for future in futures]
+    
+    def decrypt_into(self, records: Sequence[Tuple], out: np.ndarray,
+                     workers: int = 0) -> np.ndarray:
+        """
+        Kayıtların plaintext byte'larını doğrudan `out` satırlarına yazar
+        
+        Args:
+            records: [(encrypted, hmac), ...] veya [(encrypted, hmac, key_id), ...]
+                     - base64 str veya ham bytes-like (ör. EmbeddingStore.record
+                     memoryview'ları)
+            out: (N, W) C-contiguous buffer; her satır bir plaintext kadar
+            workers: Thread sayısı (0/1 -> çağıran thread'de)
+            
+        Returns:
+            out
+            
+        Raises:
+            ValueError: Buffer şekli veya plaintext boyutu uyuşmazsa, HMAC hatası
+        """
+        if out.ndim != 2 or out.shape[0] != len(records) or not out.flags.c_contiguous:
+            raise ValueError(f"Çıktı buffer'ı ({len(records)}, W) C-contiguous olmalı: {out.shape}")
+        
+        rows = out.view(np.uint8)
+        row_size = rows.shape[1]
+        
+        def decrypt_range(start: int, end: int):
+            for i in range(start, end):
+                encrypted, stored_hmac, *key_id = records[i]
+                key_id = key_id[0] if key_id else None
+                if isinstance(encrypted, str):
+                    plaintext = self.decrypt_bytes(encrypted, stored_hmac, key_id=key_id)
+                else:
+                    plaintext = self.decrypt_record(encrypted, stored_hmac, key_id=key_id)
+                if len(plaintext) != row_size:
+                    raise ValueError(f"Plaintext boyutu uyuşmuyor (kayıt {i}): "
+                                     f"{len(plaintext)} != {row_size}")
+                rows[i] = np.frombuffer(plaintext, dtype=np.uint8)
+        
+        self._map_chunks(decrypt_range, len(records), workers)
+        return out
+    
+    def decrypt_many(self, records: Sequence[Tuple], out: Optional[np.ndarray] = None,
+                     embedding_dim: int = 512, codec=None, workers: int = 0) -> np.ndarray:
+        """
+        Birden çok embedding'i tek (N, D) float32 buffer'a deşifre eder
+        
+        Args:
+            records: [(encrypted, hmac[, key_id]), ...] - base64 str veya ham bytes-like
+            out: Opsiyonel (N, D) float32 buffer (None -> yeni ayrılır)
+            embedding_dim: Embedding boyutu
+            codec: Kayıtlar sıkıştırılmışsa EmbeddingCodec (None -> ham float32)
+            workers: Thread sayısı (0/1 -> çağıran thread'de)
+            
+        Returns:
+            (N, D) float32 embedding matrisi
+            
+        Raises:
+            ValueError: Buffer/plaintext boyutu uyuşmazsa veya HMAC hatası
+        """
+        shape = (len(records), embedding_dim)
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        elif out.shape != shape or out.dtype != np.float32:
+            raise ValueError(f"Çıktı buffer'ı {shape} float32 olmalı: {out.shape} {out.dtype}")
+        
+        if codec is None or codec.name == 'float32':
+            return self.decrypt_into(records, out, workers=workers)
+        
+        code_width = codec.code_size(embedding_dim) // np.dtype(codec.dtype).itemsize
+        codes = np.empty((len(records), code_width), dtype=codec.dtype)
+        self.decrypt_into(records, codes, workers=workers)
+        out[:] = codec.decode(codes)
+        return out
+    
+    def encrypt_many(self, embeddings: np.ndarray, codec=None,
+                     workers: int = 0) -> List[Tuple[str, str]]:
+        """
+        Birden çok embedding'i şifreler
+        
+        Args:
+            embeddings: (N, D) embedding matrisi
+            codec: Opsiyonel EmbeddingCodec (None -> ham float32)
+            workers: Thread sayısı (0/1 -> çağıran thread'de)
+            
+        Returns:
+            [(encrypted_b64, hmac_b64), ...] - giriş sırasında
+        """
+        embeddings = np.asarray(embeddings)
+        if codec is not None:
+            codes = codec.encode(embeddings)
+        else:
+            codes = np.ascontiguousarray(embeddings, dtype=np.float32)
+        
+        results: List[Tuple[str, str]] = [None] * len(codes)
+        
+        def encrypt_range(start: int, end: int):
+            for i in range(start, end):
+                results[i] = self.encrypt_bytes(codes[i].tobytes())
+        
+        self._map_chunks(encrypt_range, len(codes), workers)
+        return results
+    
+    def close(self):
+        """Thread pool'u kapatır"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+                self._executor_workers = 0
 
 
 def generate_keys() -> Tuple[str, str]:
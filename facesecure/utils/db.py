@@ -1,23 +1,105 @@
 """
 Veritabanı bağlantı ve yardımcı fonksiyonları (JSON dosya tabanlı)
+
+Birden fazla süreç (API worker'ları, admin paneli) aynı dosyaya yazabilir:
+her değişiklik süreçler arası dosya kilidi altında yapılır, kilit alındıktan
+sonra dosya başka süreç tarafından değiştirildiyse önce yeniden yüklenir.
+Snapshot geçici dosya + rename ile yazılır (okuyucular yarım dosya görmez)
+ve her yazmada artan `generation` numarasını taşır.
+
+Süreç içinde kullanıcı sözlüğü kopyala-yaz (copy-on-write) ile tutulur:
+yazan thread yeni bir kopya hazırlayıp tek referans atamasıyla yayınlar,
+yayınlanmış sözlük ve içindeki dokümanlar bir daha değiştirilmez. Threaded
+sunucudaki okuyucular (verify/identify) kilit almadan her zaman tutarlı
+bir durum görür.
 """
-from typing import Optional, List, Dict, Any
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
 from datetime import datetime
+import base64
 import json
 import os
+import threading
 
+from utils.embedding_store import EmbeddingStore
+from utils.attempt_log import AttemptLog, attempt_matches
+from utils.filelock import FileLock
+from utils.storage import (
+    USER_SORT_KEYS, Page, StoreEvent, StorageBackend, decode_cursor, diff_users,
+    embedding_count, encode_cursor, prefix_end, user_cursor_key, user_metadata
+)
+from utils.wal import WriteAheadLog, write_json_atomic
 
-class DBManager:
+
+class DBManager(StorageBackend):
     """JSON dosya tabanlı veritabanı yöneticisi"""
     
-    def __init__(self, mongo_uri: str = None):
+    def __init__(self, mongo_uri: str = None, json_path: Optional[str] = None,
+                 storage_format: Optional[str] = None,
+                 embedding_path: Optional[str] = None,
+                 wal: Optional[bool] = None,
+                 attempt_log: Optional[AttemptLog] = None):
         """
         Args:
-            mongo_uri: Kullanılmıyor (uyumluluk için)
+            mongo_uri: Kullanılmıyor (SQLite için utils.storage.open_storage)
+            json_path: JSON dosya yolu (binary formatta sadece metadata)
+            storage_format: 'json' (embedding'ler base64) veya 'binary'
+                            (embedding'ler ve mühürlü blob'lar ayrı mmap dosyasında)
+                            (None -> FS_STORAGE_FORMAT, varsayılan 'json')
+            embedding_path: Binary embedding dosyası (None -> json_path + '.bin')
+            wal: Write-ahead log modu - her değişiklik tüm dosyayı yazmak yerine
+                 log'a tek kayıt ekler (None -> FS_DB_WAL=1)
+            attempt_log: Başarısız denemeler için asenkron log
+                         (None -> FS_ATTEMPT_LOG veya dosyanın yanında
+                         <ad>_attempts; FS_ATTEMPT_LOG=0 -> senkron veritabanı)
         """
-        self.json_path = "facesecure_data.json"
-        self._load_data()
-        print(f"✅ JSON veritabanı: {self.json_path}")
+        super().__init__()
+        self.storage_format = (storage_format or os.getenv('FS_STORAGE_FORMAT') or 'json').lower()
+        if self.storage_format not in ('json', 'binary'):
+            raise ValueError(f"Bilinmeyen depolama formatı: {self.storage_format}")
+        
+        self.embedding_store: Optional[EmbeddingStore] = None
+        if self.storage_format == 'binary':
+            self.json_path = json_path or "facesecure_users.json"
+            self.embedding_store = EmbeddingStore(
+                embedding_path or os.path.splitext(self.json_path)[0] + '.bin'
+            )
+        else:
+            self.json_path = json_path or "facesecure_data.json"
+        
+        # Süreçler arası kilit: oku-değiştir-yaz ve sıkıştırma seri yapılır
+        self._file_lock = FileLock(self.json_path + '.lock')
+        # Değişiklik + log kaydı atomik olsun (sıkıştırma ile yarışmaması için)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.RLock()
+        self._compactor: Optional[threading.Thread] = None
+        self.generation = 0
+        self._stamp: Tuple = ()
+        # WAL'da uygulanmış son konum (nesil, bayt ofseti) - sonraki kayıtlar tail edilir
+        self._wal_position: Tuple[int, int] = (0, 0)
+        # Sıralama anahtarı -> (kullanıcı sözlüğü, sıralı (değer, username) listesi)
+        self._sorted_keys: Dict[str, Tuple[Dict[str, Any], List[Tuple[str, str]]]] = {}
+        
+        self.wal: Optional[WriteAheadLog] = None
+        if wal if wal is not None else os.getenv('FS_DB_WAL') == '1':
+            self.wal = WriteAheadLog(
+                self.json_path + '.wal',
+                group_size=int(os.getenv('FS_WAL_GROUP_SIZE', '1')),
+                group_interval=int(os.getenv('FS_WAL_GROUP_MS', '0')) / 1000.0,
+                before_sync=self.embedding_store.sync if self.embedding_store else None
+            )
+            self.compact_bytes = int(os.getenv('FS_WAL_COMPACT_BYTES', str(8 * 1024 * 1024)))
+        
+        self.attempt_log = attempt_log or AttemptLog.from_env(
+            os.path.splitext(self.json_path)[0] + '_attempts')
+        
+        with self._file_lock:
+            self._load_data()
+        if self.embedding_store is not None:
+            print(f"✅ Binary veritabanı: {self.json_path} + {self.embedding_store.path}")
+        else:
+            print(f"✅ JSON veritabanı: {self.json_path}")
     
     def _load_data(self):
         """JSON dosyasından veri yükle"""
@@ -25,32 +107,336 @@ class DBManager:
             try:
                 with open(self.json_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.users_storage = data.get('users', {})
-                    self.failed_attempts_storage = data.get('failed_attempts', [])
+                    users = data.get('users', {})
+                    failed_attempts = data.get('failed_attempts', [])
                     self.user_id_counter = data.get('user_id_counter', 0)
+                    self.free_slots = data.get('free_slots', [])
+                    self.generation = data.get('generation', 0)
+                    wal_generation = data.get('wal_generation', 0)
             except (json.JSONDecodeError, IOError):
                 # Dosya bozuksa yeni başlat
                 self.users_storage = {}
                 self.failed_attempts_storage = []
                 self.user_id_counter = 0
+                self.free_slots = []
                 self._save_data()
+                return
         else:
             self.users_storage = {}
             self.failed_attempts_storage = []
             self.user_id_counter = 0
+            self.free_slots = []
             self._save_data()
+            return
+        
+        if self.wal is not None:
+            # Snapshot'tan sonraki değişiklikleri yayınlanmamış kopyaya uygula
+            replayed = 0
+            for record in self.wal.replay(wal_generation):
+                self._replay(record, users, failed_attempts)
+                replayed += 1
+            if replayed:
+                print(f"🔁 WAL: {replayed} kayıt uygulandı")
+            self._wal_position = (self.wal.generation, self.wal.size)
+        # Okuyucular yarım uygulanmış durumu görmesin: tek atamayla yayınla
+        self.failed_attempts_storage = failed_attempts
+        self.users_storage = users
+        self._stamp = self._file_stamp()
     
-    def _save_data(self):
-        """Veriyi JSON dosyasına kaydet"""
+    def _file_stamp(self) -> Tuple:
+        """
+        Dosyaların ucuz değişiklik imzası (inode, mtime, boyut)
+        
+        Snapshot atomik rename ile yazıldığı için her kayıtta inode değişir;
+        WAL modunda log segmentleri de imzaya dahildir. İlk eleman her zaman
+        snapshot dosyasınındır.
+        """
+        paths = [self.json_path]
+        if self.wal is not None:
+            paths.extend(path for _, path in self.wal.segments())
+        stamp = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp.append((path, st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+    
+    def _reload_if_changed(self) -> List[StoreEvent]:
+        """
+        Dosya değiştiyse yeni durumu yükler (dosya kilidi tutulurken çağrılır)
+        
+        WAL modunda snapshot aynı kaldıysa sadece son konumdan sonra eklenen
+        kayıtlar okunur; tam yükleme sadece sıkıştırma snapshot'ı
+        değiştirdiğinde (yeni nesil) yapılır.
+        """
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return []
+        changes = self._tail_wal(stamp)
+        if changes is None:
+            old_users = self.users_storage
+            self._load_data()
+            changes = diff_users(old_users, self.users_storage)
+        if changes:
+            print(f"🔄 Veritabanı yeniden yüklendi (nesil {self.generation}): "
+                  f"{len(changes)} kullanıcı değişti")
+        return changes
+    
+    def _tail_wal(self, stamp: Tuple) -> Optional[List[StoreEvent]]:
+        """
+        Başka süreçlerin WAL'a eklediği kayıtları uygular
+        
+        Returns:
+            Değişen kullanıcılar veya None (tam yükleme gerekir)
+        """
+        if self.wal is None or stamp[:1] != self._stamp[:1]:
+            return None
+        tailed = self.wal.tail(*self._wal_position)
+        if tailed is None:
+            return None
+        records, self._wal_position = tailed
+        
+        touched = {record['user']['username'] if record.get('op') == 'put_user'
+                   else record['username']
+                   for record in records if record.get('op') in ('put_user', 'delete_user')}
+        old_users = self.users_storage
+        # Sadece deneme kayıtları varsa kullanıcı sözlüğü kopyalanmaz
+        users = dict(old_users) if touched else old_users
+        for record in records:
+            self._replay(record, users, self.failed_attempts_storage)
+        self.users_storage = users
+        self._stamp = self._file_stamp()
+        return diff_users({name: old_users[name] for name in touched if name in old_users},
+                          {name: users[name] for name in touched if name in users})
+    
+    def refresh(self) -> List[StoreEvent]:
+        """
+        Dosya başka bir süreç/instance tarafından değiştirildiyse yeniden yükler
+        
+        Değişiklik kontrolü sadece stat çağrısıdır; yeniden yüklemeden sonra
+        yalnızca değişen kullanıcılar dinleyicilere bildirilir.
+        
+        Returns:
+            [(event, username, user_doc), ...]
+        """
+        if self._file_stamp() == self._stamp:
+            return []
+        with self._file_lock, self._compact_lock, self._lock:
+            changes = self._reload_if_changed()
+        self._notify_changes(changes)
+        return changes
+    
+    @contextmanager
+    def _mutation(self) -> Iterator[None]:
+        """
+        Değişiklik bloğu - süreçler arası kilit altında, güncel veri üzerinde
+        
+        Başka süreçlerin kilit alınmadan önceki yazmaları önce yüklenir; böylece
+        eski bellek kopyası onların değişikliklerinin üzerine yazılmaz.
+        """
+        with self._file_lock, self._lock:
+            changes = self._reload_if_changed()
+            yield
+        self._notify_changes(changes)
+    
+    def _snapshot(self, wal_generation: int = 0) -> Dict[str, Any]:
+        """Kaydedilecek durum (kullanıcı sözlüğü değişmez olduğu için kopyalanmaz)"""
         data = {
+            'generation': self.generation,
             'users': self.users_storage,
-            'failed_attempts': self.failed_attempts_storage,
+            'failed_attempts': list(self.failed_attempts_storage),
             'user_id_counter': self.user_id_counter
         }
-        with open(self.json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        if self.embedding_store is not None:
+            data['free_slots'] = list(self.free_slots)
+        if self.wal is not None:
+            data['wal_generation'] = wal_generation
+        return data
+    
+    def _save_data(self):
+        """Veriyi JSON dosyasına kaydet (WAL modunda log snapshot'a katlanır)"""
+        with self._file_lock:
+            if self.wal is not None:
+                self._compact_locked()
+                return
+            with self._lock:
+                self.generation += 1
+                data = self._snapshot()
+            if self.embedding_store is not None:
+                # Metadata kaydedilmeden önce referans verdiği kayıtlar diskte olmalı
+                self.embedding_store.sync()
+            write_json_atomic(self.json_path, data)
+            self._stamp = self._file_stamp()
+    
+    def _publish_users(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        """
+        Kullanıcı değişikliklerini kopyala-yaz ile yayınlar
+        
+        Yayınlanmış sözlük yerinde değiştirilmez; yeni kopya tek referans
+        atamasıyla yerine geçer (GIL altında atomik). Okuyucular değişikliğin
+        ya tamamını ya hiçbirini görür. Kopya O(kullanıcı) maliyetlidir ama
+        sadece yazmalarda (kayıt, silme, rotasyon) ödenir.
+        
+        Args:
+            changes: {username: yeni user_doc veya None (silme)}
+        """
+        users = dict(self.users_storage)
+        for username, user_doc in changes.items():
+            if user_doc is None:
+                users.pop(username, None)
+            else:
+                users[username] = user_doc
+        self.users_storage = users
+    
+    def _commit(self, records: List[Dict[str, Any]], durable: bool = False):
+        """
+        Değişiklikleri kalıcı yapar
+        
+        WAL modunda her değişiklik log'a tek kayıt olarak eklenir (grup
+        halinde fsync); aksi halde tüm dosya bir kez yeniden yazılır.
+        
+        Args:
+            records: [{'op': 'put_user' | 'delete_user' | 'failed_attempt', ...}, ...]
+            durable: True ise grup beklenmeden fsync yapılır (ör. slot'lar
+                     sıfırlanmadan önce)
+        """
+        if self.wal is None:
+            self._save_data()
+            return
+        
+        for record in records:
+            self.wal.append(record)
+        if durable:
+            self.wal.sync()
+        self._wal_position = (self.wal.generation, self.wal.size)
+        self._stamp = self._file_stamp()
+        if self.wal.size >= self.compact_bytes:
+            self._start_compactor()
+    
+    def _replay(self, record: Dict[str, Any], users: Dict[str, Dict[str, Any]],
+                failed_attempts: List[Dict[str, Any]]):
+        """Tek WAL kaydını henüz yayınlanmamış yükleme kopyasına uygular"""
+        op = record.get('op')
+        if op == 'put_user':
+            user_doc = record['user']
+            old_doc = users.get(user_doc['username'])
+            users[user_doc['username']] = user_doc
+            self.user_id_counter = max(self.user_id_counter, record.get('counter', 0))
+            if self.embedding_store is not None:
+                used = set(self._slots(user_doc))
+                freed = [slot for slot in self._slots(old_doc) if slot not in used]
+                self.free_slots = [slot for slot in self.free_slots if slot not in used] + freed
+        elif op == 'delete_user':
+            old_doc = users.pop(record['username'], None)
+            if self.embedding_store is not None:
+                self.free_slots.extend(self._slots(old_doc))
+        elif op == 'failed_attempt':
+            failed_attempts.append(record['attempt'])
+        else:
+            print(f"⚠️  Bilinmeyen WAL kaydı atlandı: {op}")
+    
+    @staticmethod
+    def _slots(user_doc: Optional[Dict[str, Any]]) -> List[int]:
+        if not user_doc:
+            return []
+        docs = user_doc.get('embeddings', []) + user_doc.get('prototypes', [])
+        slots = [doc['slot'] for doc in docs if 'slot' in doc]
+        sealed = user_doc.get('sealed')
+        if isinstance(sealed, dict):
+            slots.extend(sealed['slots'])
+        return slots
+    
+    def compact(self):
+        """
+        WAL'ı yeni snapshot'a katlar
+        
+        Yeni segmente geçilir, snapshot geçici dosya + rename ile yazılır,
+        sonra eski segmentler silinir. Bu sırada yazmalar yeni segmente devam eder.
+        """
+        if self.wal is None:
+            self._save_data()
+            return
+        
+        # Diğer süreçlerin log'a eklediği kayıtlar da snapshot'a girmeli
+        with self._file_lock, self._compact_lock:
+            with self._lock:
+                changes = self._reload_if_changed()
+            self._compact_locked()
+        self._notify_changes(changes)
+    
+    def _compact_locked(self):
+        """Sıkıştırma adımları (dosya kilidi tutulurken, güncel durumla)"""
+        with self._compact_lock:
+            with self._lock:
+                wal_generation = self.wal.rotate()
+                self.generation += 1
+                data = self._snapshot(wal_generation)
+            if self.embedding_store is not None:
+                self.embedding_store.sync()
+            write_json_atomic(self.json_path, data)
+            self.wal.remove_before(wal_generation)
+            with self._lock:
+                self._wal_position = (self.wal.generation, self.wal.size)
+                self._stamp = self._file_stamp()
+    
+    def _start_compactor(self):
+        """Sıkıştırmayı arka plan thread'inde başlatır (zaten çalışıyorsa atlar)"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name='db-compactor', daemon=True)
+        self._compactor.start()
+    
+    def _store_docs(self, docs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Base64 dokümanları binary dosyaya yazar, slot referanslarına çevirir
+        
+        JSON formatında dokümanlar olduğu gibi döner.
+        """
+        if self.embedding_store is None:
+            return docs
+        
+        stored = []
+        for doc in docs:
+            ref = {key: value for key, value in doc.items() if key not in ('encrypted', 'hmac')}
+            if 'slot' not in ref:
+                ref['slot'] = self.embedding_store.write(
+                    base64.b64decode(doc['encrypted']),
+                    base64.b64decode(doc['hmac']),
+                    slot=self.free_slots.pop() if self.free_slots else None
+                )
+            stored.append(ref)
+        return stored
+    
+    def _store_sealed(self, sealed: Any) -> Any:
+        """
+        Mühürlü base64 blob'u binary dosyaya slot zinciri olarak yazar
+        
+        Metadata'da sadece {'slots': [...]} kalır; JSON formatında veya zaten
+        slot referanslı kayıtta değer olduğu gibi döner.
+        """
+        if self.embedding_store is None or not isinstance(sealed, str):
+            return sealed
+        return {'slots': self.embedding_store.write_blob(base64.b64decode(sealed), self.free_slots)}
+    
+    def _free_slots(self, slots: List[int]):
+        """
+        Slot'ları boş listesine ekler - metadata'yı kalıcı yapan kayıttan önce
+        
+        Böylece WAL'sız modda aynı dosya yazımı boş slot'ları da içerir; süreç
+        sonraki bir kayıttan önce kapansa bile slot'lar kaybolmaz. Mutasyon
+        kilidi tutulduğu için kayıt bitmeden yeniden kullanılamazlar.
+        """
+        self.free_slots.extend(slots)
     
-    def create_user(self, username: str, embeddings: List[Dict[str, str]]) -> str:
+    def _clear_slots(self, slots: List[int]):
+        """Serbest slot'lardaki eski şifreli kayıtları sıfırlar (metadata kalıcı olduktan sonra)"""
+        for slot in slots:
+            self.embedding_store.clear(slot)
+    
+    def create_user(self, username: str, embeddings: List[Dict[str, str]],
+                    prototypes: Optional[List[Dict[str, str]]] = None) -> str:
         """
         Yeni kullanıcı oluştur
         
@@ -58,71 +444,312 @@ class DBManager:
             username: Kullanıcı adı
             embeddings: Şifrelenmiş embedding listesi 
                         [{'encrypted': str, 'hmac': str}, ...]
+            prototypes: Şifrelenmiş prototip listesi (centroid + kümeler, opsiyonel)
         
         Returns:
             User ID
         """
-        if username in self.users_storage:
-            raise ValueError(f"Kullanıcı '{username}' zaten mevcut")
+        with self._mutation():
+            if username in self.users_storage:
+                raise ValueError(f"Kullanıcı '{username}' zaten mevcut")
+            
+            self.user_id_counter += 1
+            user_id = str(self.user_id_counter)
+            
+            user_doc = {
+                '_id': user_id,
+                'username': username,
+                'embeddings': self._store_docs(embeddings),
+                'created_at': datetime.utcnow().isoformat(),
+                'updated_at': datetime.utcnow().isoformat()
+            }
+            if prototypes:
+                user_doc['prototypes'] = self._store_docs(prototypes)
+            
+            self._publish_users({username: user_doc})
+            self._commit([{'op': 'put_user', 'user': user_doc, 'counter': self.user_id_counter}])
+        self._notify('create', username, user_doc)
+        return user_id
+    
+    def create_sealed_user(self, username: str, seal: Callable[[str], str],
+                           embedding_count: int,
+                           pose_indices: Optional[List[int]] = None) -> str:
+        """
+        Embedding'leri tek mühürlü blob olarak saklanan kullanıcı oluştur
         
-        self.user_id_counter += 1
-        user_id = str(self.user_id_counter)
+        Blob kullanıcı ID'sine bağlandığı için ID burada atanır ve
+        `seal` ile mühürleme çağırana bırakılır.
         
-        user_doc = {
-            '_id': user_id,
-            'username': username,
-            'embeddings': embeddings,
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
+        Args:
+            username: Kullanıcı adı
+            seal: seal(user_id) -> base64 blob (CryptoManager.seal_embeddings)
+            embedding_count: Blob'daki embedding sayısı
+            pose_indices: Embedding'lerin kaynak görüntü indeksleri (opsiyonel)
         
-        self.users_storage[username] = user_doc
-        self._save_data()
+        Returns:
+            User ID
+        """
+        with self._mutation():
+            if username in self.users_storage:
+                raise ValueError(f"Kullanıcı '{username}' zaten mevcut")
+            
+            user_id = str(self.user_id_counter + 1)
+            sealed = seal(user_id)
+            self.user_id_counter += 1
+            
+            user_doc = {
+                '_id': user_id,
+                'username': username,
+                'sealed': self._store_sealed(sealed),
+                'embedding_count': embedding_count,
+                'created_at': datetime.utcnow().isoformat(),
+                'updated_at': datetime.utcnow().isoformat()
+            }
+            if pose_indices is not None:
+                user_doc['pose_indices'] = pose_indices
+            
+            self._publish_users({username: user_doc})
+            self._commit([{'op': 'put_user', 'user': user_doc, 'counter': self.user_id_counter}])
+        self._notify('create', username, user_doc)
         return user_id
     
+    def update_user_records(self, updates: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[str]:
+        """
+        Kullanıcıların şifreli kayıt alanlarını toplu günceller (anahtar rotasyonu)
+        
+        Plaintext değişmediği için updated_at korunur ve dinleyiciler
+        bilgilendirilmez. Kullanıcı okunduktan sonra değiştiyse (silindi,
+        yeniden oluşturuldu, güncellendi) atlanır.
+        
+        Args:
+            updates: {username: (okunan user_doc, {'embeddings' | 'prototypes' | 'sealed': ...})}
+        
+        Returns:
+            Güncellenen kullanıcı adları
+        """
+        with self._mutation():
+            applied = []
+            released: List[int] = []
+            for username, (expected, fields) in updates.items():
+                user_doc = self.users_storage.get(username)
+                if user_doc is None or any(
+                    user_doc.get(key) != expected.get(key)
+                    for key in ('_id', 'updated_at', 'sealed', 'embeddings', 'prototypes')
+                ):
+                    continue
+                
+                new_doc = dict(user_doc)
+                for key in ('embeddings', 'prototypes'):
+                    if key in fields:
+                        released.extend(doc['slot'] for doc in user_doc.get(key, []) if 'slot' in doc)
+                        new_doc[key] = self._store_docs(fields[key])
+                if 'sealed' in fields:
+                    old_sealed = user_doc.get('sealed')
+                    if isinstance(old_sealed, dict):
+                        released.extend(old_sealed['slots'])
+                    new_doc['sealed'] = self._store_sealed(fields['sealed'])
+                applied.append(new_doc)
+            
+            if applied:
+                # Tüm rotasyon grubu tek seferde görünür olur; eski slot'lar
+                # aynı yazımla boş listesine girer
+                self._publish_users({user_doc['username']: user_doc for user_doc in applied})
+                self._free_slots(released)
+                self._commit([{'op': 'put_user', 'user': user_doc, 'counter': self.user_id_counter}
+                              for user_doc in applied], durable=bool(released))
+            
+            # Eski kayıtlar ancak yeni metadata diske yazıldıktan sonra sıfırlanır
+            self._clear_slots(released)
+            return [user_doc['username'] for user_doc in applied]
+    
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Kullanıcıyı username ile bul"""
         return self.users_storage.get(username)
     
     def get_all_users(self) -> List[Dict[str, Any]]:
-        """Tüm kullanıcıları getir"""
+        """Tüm kullanıcıları getir (kilitsiz; tek yayınlanmış snapshot'tan)"""
         return list(self.users_storage.values())
     
+    def _user_index(self, sort: str) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, str]]]:
+        """
+        Yayınlanmış kullanıcı sözlüğü ve ona ait sıralı (değer, username) listesi
+        
+        Sözlük değişmez olduğundan sıralı liste her snapshot için bir kez kurulur.
+        """
+        users = self.users_storage
+        cached = self._sorted_keys.get(sort)
+        if cached is None or cached[0] is not users:
+            keys = sorted((user_doc.get(sort) or '', username)
+                          for username, user_doc in users.items())
+            cached = self._sorted_keys[sort] = (users, keys)
+        return cached
+    
+    def query_users(self, username_prefix: Optional[str] = None,
+                    created_since: Optional[str] = None,
+                    created_until: Optional[str] = None,
+                    sort: str = 'username', descending: bool = False,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    metadata_only: bool = True) -> Page:
+        """
+        Filtrelenmiş, sıralı kullanıcı sayfası (bkz. StorageBackend.query_users)
+        
+        Sıralama alanındaki aralık filtreleri (önek, oluşturma zamanı) sıralı
+        listede ikili arama ile uygulanır; diğerleri sadece aralık içinde denenir.
+        """
+        if sort not in USER_SORT_KEYS:
+            raise ValueError(f"Bilinmeyen sıralama: {sort}")
+        after = user_cursor_key(decode_cursor(cursor), sort, descending)
+        users, keys = self._user_index(sort)
+        
+        low, high = 0, len(keys)
+        if sort == 'username' and username_prefix:
+            low = bisect_left(keys, (username_prefix,))
+            high = bisect_left(keys, (prefix_end(username_prefix),))
+        elif sort == 'created_at':
+            if created_since:
+                low = bisect_left(keys, (created_since,))
+            if created_until:
+                high = bisect_left(keys, (created_until,))
+        if after is not None:
+            if descending:
+                high = min(high, bisect_left(keys, after))
+            else:
+                low = max(low, bisect_right(keys, after))
+        
+        page = []
+        indices = range(high - 1, low - 1, -1) if descending else range(low, high)
+        for i in indices:
+            user_doc = users[keys[i][1]]
+            created_at = user_doc.get('created_at') or ''
+            if username_prefix and not user_doc['username'].startswith(username_prefix):
+                continue
+            if created_since and created_at < created_since:
+                continue
+            if created_until and created_at >= created_until:
+                continue
+            page.append(user_metadata(user_doc) if metadata_only else user_doc)
+            if len(page) >= limit:
+                if i != indices[-1]:
+                    return page, encode_cursor({'sort': sort, 'desc': descending,
+                                                'key': list(keys[i])})
+                break
+        return page, None
+    
+    def user_stats(self) -> Dict[str, int]:
+        """Kullanıcı ve embedding sayısı (şifreli kayıtlar çözülmeden)"""
+        users = self.users_storage
+        return {
+            'users': len(users),
+            'embeddings': sum(embedding_count(user_doc) for user_doc in users.values())
+        }
+    
     def delete_user(self, username: str) -> bool:
         """Kullanıcıyı sil"""
-        if username in self.users_storage:
-            del self.users_storage[username]
-            self._save_data()
-            return True
-        return False
+        with self._mutation():
+            if username not in self.users_storage:
+                return False
+            slots = self._slots(self.users_storage[username])
+            self._publish_users({username: None})
+            self._free_slots(slots)
+            self._commit([{'op': 'delete_user', 'username': username}],
+                         durable=self.embedding_store is not None)
+            # Slot'lar silme kalıcı olduktan sonra sıfırlanır
+            self._clear_slots(slots)
+        self._notify('delete', username)
+        return True
     
-    def log_failed_attempt(self, username: Optional[str], ip_address: str, 
-                          similarity_score: float, reason: str):
+    def import_json(self, json_path: str) -> int:
         """
-        Başarısız doğrulama denemesini logla
+        Eski (base64 embedding'li) JSON veritabanını içe aktarır
+        
+        Binary formatta embedding'ler mmap dosyasına yazılır; var olan
+        kullanıcılar atlanır. Mühürlü blob'lar kullanıcı ID'sine bağlı olduğu
+        için ID'ler korunur; sayaç en büyük içe aktarılan ID'ye çekilir.
         
         Args:
-            username: Denenen kullanıcı adı (varsa)
-            ip_address: İstemci IP adresi
-            similarity_score: Benzerlik skoru
-            reason: Başarısızlık nedeni
-        """
-        log_doc = {
-            'username': username,
-            'ip_address': ip_address,
-            'similarity_score': similarity_score,
-            'reason': reason,
-            'timestamp': datetime.utcnow().isoformat()
-        }
+            json_path: Kaynak facesecure_data.json yolu
+        
+        Returns:
+            İçe aktarılan kullanıcı sayısı
         
-        self.failed_attempts_storage.append(log_doc)
-        self._save_data()
+        Raises:
+            ValueError: İçe aktarılan bir kullanıcının ID'si mevcut başka bir
+                        kullanıcıda varsa (hiçbir kayıt yazılmaz)
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        with self._mutation():
+            incoming = {username: user_doc for username, user_doc in data.get('users', {}).items()
+                        if username not in self.users_storage}
+            owners = {str(user_doc['_id']): username
+                      for username, user_doc in self.users_storage.items()}
+            for username, user_doc in incoming.items():
+                owner = owners.get(str(user_doc['_id']))
+                if owner is not None:
+                    raise ValueError(f"Kullanıcı ID'si çakışıyor: {username} ve mevcut "
+                                     f"{owner} (ID {user_doc['_id']})")
+            
+            new_users = {}
+            for username, user_doc in incoming.items():
+                user_doc = dict(user_doc)
+                if 'sealed' in user_doc:
+                    user_doc['sealed'] = self._store_sealed(user_doc['sealed'])
+                else:
+                    user_doc['embeddings'] = self._store_docs(user_doc.get('embeddings', []))
+                if user_doc.get('prototypes'):
+                    user_doc['prototypes'] = self._store_docs(user_doc['prototypes'])
+                new_users[username] = user_doc
+            imported = len(new_users)
+            self._publish_users(new_users)
+            
+            self.failed_attempts_storage.extend(data.get('failed_attempts', []))
+            # Yeni kullanıcılar içe aktarılan ID'leri yeniden almasın
+            imported_ids = [int(user_doc['_id']) for user_doc in new_users.values()
+                            if str(user_doc['_id']).isdigit()]
+            self.user_id_counter = max(self.user_id_counter, data.get('user_id_counter', 0),
+                                       *imported_ids)
+            # Toplu içe aktarma log yerine doğrudan snapshot'a yazılır
+            self._save_data()
+        return imported
+    
+    def _store_failed_attempt(self, log_doc: Dict[str, Any]):
+        """Deneme kaydını JSON store'a ekler (WAL modunda tek log kaydı)"""
+        with self._mutation():
+            self.failed_attempts_storage.append(log_doc)
+            self._commit([{'op': 'failed_attempt', 'attempt': log_doc}])
+    
+    def _query_stored_attempts(self, filters: Dict[str, Any], limit: int,
+                               position: Any) -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        Filtreye uyan kayıtlar, yeniden eskiye
+        
+        Liste sadece sona eklendiği için konum (hariç üst sınır indeksi)
+        sonraki eklemelerden etkilenmez; dilimsiz okuma kilit gerektirmez.
+        """
+        attempts = self.failed_attempts_storage
+        index = len(attempts) if position is None else min(int(position), len(attempts))
+        page = []
+        while index > 0 and len(page) < limit:
+            index -= 1
+            if attempt_matches(attempts[index], **filters):
+                page.append(attempts[index])
+        return page, index if index > 0 and len(page) >= limit else None
     
-    def get_failed_attempts(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Son başarısız denemeleri getir"""
-        # Son N kaydı getir (reversed)
-        return list(reversed(self.failed_attempts_storage[-limit:]))
+    def _count_stored_attempts(self, filters: Dict[str, Any]) -> int:
+        attempts = self.failed_attempts_storage
+        if not any(value is not None for value in filters.values()):
+            return len(attempts)
+        return sum(1 for attempt in attempts if attempt_matches(attempt, **filters))
     
     def close(self):
-        """JSON - kapatma gerekmez"""
-        pass
+        """WAL'ı ve bekleyen denemeleri diske yazar, binary formatta embedding dosyasını kapatır"""
+        if self.attempt_log is not None:
+            self.attempt_log.flush()
+        if self.wal is not None:
+            if self._compactor is not None:
+                self._compactor.join()
+            self.wal.close()
+        if self.embedding_store is not None:
+            self.embedding_store.close()
+        self._file_lock.close()
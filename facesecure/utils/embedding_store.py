@@ -0,0 +1,192 @@
+"""
+Sabit adımlı (fixed-stride) ikili embedding dosyası - mmap ile okunur
+
+Dosya düzeni:
+    64 byte başlık: magic (8) | stride (u32) | rezerve
+    Kayıt i, 64 + i * stride ofsetinde:
+        length (u32) | hmac (32) | nonce (12) + ciphertext + GCM tag (length) | dolgu
+
+Kullanıcı metadata'sı ayrı JSON dosyasında tutulur ve embedding'lere slot
+numarasıyla referans verir. Dosya açılırken hiçbir kayıt okunmaz; matcher
+kayıtları mmap sayfalarından kopyasız memoryview olarak deşifre eder.
+
+Slot'a sığmayan değişken uzunluklu kayıtlar (mühürlü kullanıcı blob'u) slot
+zinciri olarak yazılır: her parça normal kayıt düzenindedir, HMAC alanı boş
+kalır (blob kendi AEAD etiketini taşır); metadata slot listesini tutar.
+"""
+import mmap
+import os
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+_MAGIC = b'FSEMB01\x00'
+_HEADER = struct.Struct('<8sI')
+_HEADER_SIZE = 64
+_LENGTH = struct.Struct('<I')
+_HMAC_SIZE = 32
+
+# 512d float32 + nonce + GCM tag + length + HMAC (en büyük kodek için yeterli)
+DEFAULT_STRIDE = 4 + _HMAC_SIZE + 12 + 512 * 4 + 16
+
+
+class EmbeddingStore:
+    """Şifreli embedding kayıtları için sabit adımlı, mmap tabanlı dosya"""
+
+    def __init__(self, path: str, stride: int = DEFAULT_STRIDE):
+        """
+        Args:
+            path: İkili dosya yolu (yoksa oluşturulur)
+            stride: Yeni dosya için kayıt boyutu (var olan dosyada başlıktan okunur)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+
+        if not os.path.exists(path) or os.path.getsize(path) < _HEADER_SIZE:
+            header = bytearray(_HEADER_SIZE)
+            _HEADER.pack_into(header, 0, _MAGIC, stride)
+            with open(path, 'wb') as f:
+                f.write(header)
+
+        with open(path, 'rb') as f:
+            magic, self.stride = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Geçersiz embedding dosyası: {path}")
+
+        self._file = open(path, 'r+b')
+
+    @property
+    def max_encrypted_size(self) -> int:
+        """Bir kayda sığabilecek en büyük nonce+ciphertext+tag boyutu"""
+        return self.stride - _LENGTH.size - _HMAC_SIZE
+
+    def __len__(self) -> int:
+        return (os.path.getsize(self.path) - _HEADER_SIZE) // self.stride
+
+    def _offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self.stride
+
+    def _mapping(self, end: int) -> mmap.mmap:
+        """En az `end` byte'ı kapsayan mmap (dosya büyüdüyse yeniden eşler)"""
+        if self._map is None or end > self._mapped_size:
+            with self._lock:
+                if self._map is None or end > self._mapped_size:
+                    size = os.path.getsize(self.path)
+                    if end > size:
+                        raise IndexError(f"Embedding kaydı yok (ofset {end} > {size})")
+                    # Eski eşlemeye ait memoryview'lar yaşıyor olabilir; kapatmak
+                    # yerine referansı bırakıp GC'ye devrediyoruz
+                    self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+                    self._mapped_size = size
+        return self._map
+
+    def record(self, slot: int) -> Tuple[memoryview, memoryview]:
+        """
+        Kaydı mmap sayfalarından kopyasız döndürür
+
+        Args:
+            slot: Kayıt numarası
+
+        Returns:
+            (encrypted, hmac) memoryview çifti - encrypted = nonce + ciphertext + tag
+
+        Raises:
+            IndexError: Slot dosyada yoksa
+            ValueError: Slot boş (silinmiş) ise
+        """
+        offset = self._offset(slot)
+        view = memoryview(self._mapping(offset + self.stride))
+        (length,) = _LENGTH.unpack_from(view, offset)
+        if length == 0:
+            raise ValueError(f"Embedding kaydı boş (slot {slot})")
+
+        start = offset + _LENGTH.size
+        mac = view[start:start + _HMAC_SIZE]
+        encrypted = view[start + _HMAC_SIZE:start + _HMAC_SIZE + length]
+        return encrypted, mac
+
+    def write(self, encrypted: bytes, mac: bytes, slot: Optional[int] = None) -> int:
+        """
+        Kaydı yazar
+
+        Args:
+            encrypted: nonce + ciphertext + tag
+            mac: 32 byte HMAC
+            slot: Yeniden kullanılacak boş slot (None -> dosya sonuna ekle)
+
+        Returns:
+            Kaydın slot numarası
+        """
+        if len(encrypted) > self.max_encrypted_size:
+            raise ValueError(
+                f"Kayıt boyutu slot'a sığmıyor: {len(encrypted)} > {self.max_encrypted_size}"
+            )
+        if len(mac) != _HMAC_SIZE:
+            raise ValueError("HMAC 32 byte olmalı")
+
+        record = bytearray(self.stride)
+        _LENGTH.pack_into(record, 0, len(encrypted))
+        record[_LENGTH.size:_LENGTH.size + _HMAC_SIZE] = mac
+        start = _LENGTH.size + _HMAC_SIZE
+        record[start:start + len(encrypted)] = encrypted
+
+        with self._lock:
+            if slot is None:
+                slot = len(self)
+            self._file.seek(self._offset(slot))
+            self._file.write(record)
+            self._file.flush()
+        return slot
+
+    def write_blob(self, data: bytes, free_slots: List[int]) -> List[int]:
+        """
+        Değişken uzunluklu kaydı slot zinciri olarak yazar
+
+        Args:
+            data: Kayıt baytları (ör. mühürlü blob)
+            free_slots: Boş slot listesi - kullanılanlar listeden çıkarılır,
+                        tükenince dosya sonuna eklenir
+
+        Returns:
+            Parçaların sıralı slot numaraları (read_blob'a verilir)
+
+        Raises:
+            ValueError: data boşsa
+        """
+        if not data:
+            raise ValueError("Boş kayıt yazılamaz")
+        size = self.max_encrypted_size
+        no_mac = bytes(_HMAC_SIZE)
+        return [self.write(data[start:start + size], no_mac,
+                           slot=free_slots.pop() if free_slots else None)
+                for start in range(0, len(data), size)]
+
+    def read_blob(self, slots: List[int]) -> bytes:
+        """
+        write_blob ile yazılan kaydı birleştirir
+
+        Raises:
+            IndexError / ValueError: Slot yok veya boş ise
+        """
+        return b''.join(self.record(slot)[0] for slot in slots)
+
+    def clear(self, slot: int):
+        """Kaydı sıfırlar (silinen kullanıcının ciphertext'i dosyada kalmaz)"""
+        with self._lock:
+            self._file.seek(self._offset(slot))
+            self._file.write(bytes(self.stride))
+            self._file.flush()
+
+    def sync(self):
+        """Yazılanları diske zorla (fsync)"""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._map = None
+            self._mapped_size = 0
+            self._file.close()
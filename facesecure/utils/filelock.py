@@ -0,0 +1,84 @@
+"""
+Süreçler arası dosya kilidi (POSIX: fcntl.flock, Windows: msvcrt.locking)
+
+Aynı veritabanına birden fazla API worker'ı / admin paneli yazarken
+oku-değiştir-yaz adımlarını seri hale getirir. Kilit aynı süreç içinde
+yeniden girilebilir (reentrant) ve thread'ler arasında da dışlayıcıdır.
+"""
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK ~10 saniye dener, sonra OSError verir
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Süreçler ve thread'ler arası, yeniden girilebilir özel (exclusive) kilit"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Kilit dosyası (yoksa oluşturulur, içeriği kullanılmaz)
+        """
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a+b')
+                _lock_file(self._file)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                _unlock_file(self._file)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        """Kilit dosyasının tanıtıcısını kapatır (kilit tutulmuyorsa)"""
+        with self._thread_lock:
+            if self._depth == 0 and self._file is not None:
+                self._file.close()
+                self._file = None
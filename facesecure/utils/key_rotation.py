@@ -0,0 +1,228 @@
+"""
+Çevrimiçi anahtar rotasyonu - eski anahtarla şifrelenmiş kayıtları parça parça
+yeni (aktif) anahtarla yeniden şifreler
+
+İş kullanıcıları sıralı parçalar (chunk) halinde işler; her parçadan sonra
+ilerleme checkpoint dosyasına yazılır, yarıda kalan rotasyon kaldığı yerden
+devam eder. Anahtarlık eski anahtarları da içerdiği için /api/verify rotasyon
+boyunca hem eski hem yeni kayıtları çözebilir. API içinde çalışırken
+registry'nin paylaşılan deposunu kullanır (depo her parçada yeniden açılmaz).
+
+Kullanım (FS_KEY_ID yeni anahtar, FS_RETIRED_KEYS eski anahtarlar):
+    python -m utils.key_rotation --chunk-size 256 --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.crypto import DEFAULT_KEY_ID, CryptoManager, user_associated_data
+from utils.storage import StorageBackend, open_storage, sealed_blob
+
+
+class KeyRotationJob:
+    """Arka planda çalışabilen, checkpoint'li yeniden şifreleme işi"""
+
+    def __init__(self, crypto_manager: CryptoManager,
+                 storage: Optional[StorageBackend] = None,
+                 checkpoint_path: str = "facesecure_rotation.json",
+                 chunk_size: int = 256, workers: int = 4):
+        """
+        Args:
+            crypto_manager: Aktif + eski anahtarları içeren CryptoManager
+            storage: Depo (ör. API registry'sinin paylaşılan deposu);
+                     None -> run() boyunca open_storage(MONGO_URI) açılır
+            checkpoint_path: İlerleme dosyası
+            chunk_size: Bir parçadaki kullanıcı sayısı (tek kayıt işlemi)
+            workers: Yeniden şifreleme thread sayısı
+        """
+        self.crypto_manager = crypto_manager
+        self.storage = storage
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.state: Dict[str, Any] = {}
+
+    @property
+    def target_key_id(self) -> str:
+        return self.crypto_manager.key_id
+
+    def needs_rotation(self, user_doc: Dict[str, Any], store=None) -> bool:
+        """
+        Kullanıcının kayıtlarından biri aktif anahtardan farklı anahtarla mı şifreli
+
+        Args:
+            user_doc: Kullanıcı dokümanı
+            store: Binary formatta EmbeddingStore (slot referanslı mühürlü blob için)
+        """
+        if 'sealed' in user_doc:
+            sealed = sealed_blob(user_doc, store)
+            return self.crypto_manager.sealed_key_id(sealed) != self.target_key_id
+        docs = user_doc.get('embeddings', []) + user_doc.get('prototypes', [])
+        return any(doc.get('kid', DEFAULT_KEY_ID) != self.target_key_id for doc in docs)
+
+    def rotate_user(self, user_doc: Dict[str, Any], store=None) -> Dict[str, Any]:
+        """
+        Kullanıcının kayıtlarını aktif anahtarla yeniden şifreler
+
+        Args:
+            user_doc: Kullanıcı dokümanı
+            store: Binary formatta EmbeddingStore ('slot' kayıtları ve mühürlü blob'lar için)
+
+        Returns:
+            StorageBackend.update_user_records için değişen alanlar
+        """
+        if 'sealed' in user_doc:
+            associated_data = user_associated_data(user_doc['_id'], user_doc['username'])
+            record = self.crypto_manager.open_sealed(sealed_blob(user_doc, store), associated_data)
+            return {'sealed': self.crypto_manager.seal_codes(
+                record.codes, record.codec, record.dim, associated_data,
+                prototypes=record.prototypes
+            )}
+
+        fields = {}
+        for key in ('embeddings', 'prototypes'):
+            if key not in user_doc:
+                continue
+            rotated = []
+            for doc in user_doc[key]:
+                if 'slot' in doc:
+                    encrypted, mac = store.record(doc['slot'])
+                    plaintext = self.crypto_manager.decrypt_record(encrypted, mac,
+                                                                   key_id=doc.get('kid'))
+                else:
+                    plaintext = self.crypto_manager.decrypt_bytes(doc['encrypted'], doc['hmac'],
+                                                                  key_id=doc.get('kid'))
+                encrypted_b64, hmac_b64 = self.crypto_manager.encrypt_bytes(plaintext)
+
+                new_doc = {name: value for name, value in doc.items()
+                           if name not in ('encrypted', 'hmac', 'slot', 'kid')}
+                new_doc['encrypted'] = encrypted_b64
+                new_doc['hmac'] = hmac_b64
+                if self.target_key_id != DEFAULT_KEY_ID:
+                    new_doc['kid'] = self.target_key_id
+                rotated.append(new_doc)
+            fields[key] = rotated
+        return fields
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('key_id') == self.target_key_id:
+                return state
+        return {
+            'key_id': self.target_key_id,
+            'last_username': '',
+            'rotated': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'completed_at': None
+        }
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Rotasyonu checkpoint'ten devam ederek çalıştırır (stop() ile durdurulabilir)
+
+        Returns:
+            Son durum (rotated, last_username, completed_at, ...)
+        """
+        self._stop.clear()
+        self.state = self._load_checkpoint()
+        if self.state.get('completed_at'):
+            return self.state
+
+        # Tüm çalışma boyunca tek depo örneği
+        db = self.storage or open_storage(os.getenv('MONGO_URI'))
+        try:
+            db.refresh()
+            pending = sorted(name for name in (user['username'] for user in db.get_all_users())
+                             if name > self.state['last_username'])
+
+            with ThreadPoolExecutor(max_workers=max(self.workers, 1),
+                                    thread_name_prefix='key-rotation') as executor:
+                for start in range(0, len(pending), self.chunk_size):
+                    if self._stop.is_set():
+                        print(f"⏸️  Anahtar rotasyonu durduruldu: {self.state['rotated']} kullanıcı")
+                        return self.state
+                    chunk = pending[start:start + self.chunk_size]
+                    self.state['rotated'] += self._rotate_chunk(db, chunk, executor)
+                    self.state['last_username'] = chunk[-1]
+                    self._save_checkpoint()
+                    print(f"🔑 Anahtar rotasyonu: {start + len(chunk)}/{len(pending)} kullanıcı işlendi")
+        finally:
+            if db is not self.storage:
+                db.close()
+
+        self.state['completed_at'] = datetime.utcnow().isoformat()
+        self._save_checkpoint()
+        print(f"✅ Anahtar rotasyonu tamamlandı ({self.target_key_id}): "
+              f"{self.state['rotated']} kullanıcı yeniden şifrelendi")
+        return self.state
+
+    def _rotate_chunk(self, db: StorageBackend, usernames: List[str],
+                      executor: ThreadPoolExecutor) -> int:
+        """Bir parçayı yeniden şifreler ve tek kayıt işlemiyle uygular"""
+        # Diğer süreçlerin (admin paneli, diğer worker'lar) yazmaları önce yüklenir
+        db.refresh()
+        docs = [db.get_user_by_username(name) for name in usernames]
+        docs = [doc for doc in docs
+                if doc is not None and self.needs_rotation(doc, store=db.embedding_store)]
+        if not docs:
+            return 0
+        fields = list(executor.map(
+            lambda doc: self.rotate_user(doc, store=db.embedding_store), docs
+        ))
+
+        # update_user_records okunan dokümanı güncel kayıtla karşılaştırır;
+        # şifreleme sürerken değişen kullanıcılar atlanır
+        return len(db.update_user_records({
+            doc['username']: (doc, changes) for doc, changes in zip(docs, fields)
+        }))
+
+    def start(self) -> threading.Thread:
+        """Rotasyonu daemon thread'de başlatır"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, name='key-rotation', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        """Mevcut parçadan sonra durdurur (checkpoint korunur)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main(argv: Optional[list] = None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='FaceSecure çevrimiçi anahtar rotasyonu')
+    parser.add_argument('--chunk-size', type=int, default=256, help='Parça başına kullanıcı')
+    parser.add_argument('--workers', type=int, default=4, help='Yeniden şifreleme thread sayısı')
+    parser.add_argument('--checkpoint', default='facesecure_rotation.json', help='İlerleme dosyası')
+    args = parser.parse_args(argv)
+
+    job = KeyRotationJob(CryptoManager.from_env(), checkpoint_path=args.checkpoint,
+                         chunk_size=args.chunk_size, workers=args.workers)
+    job.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Eski (embedding başına kayıt) veritabanını mühürlü kullanıcı formatına taşır
+
+facesecure_data.json kullanıcı kullanıcı okunup yazılır; dosyanın tamamı
+belleğe alınmaz. Çıktı önce geçici dosyaya yazılır, bitince yerine taşınır.
+
+Kullanım:
+    python -m utils.migrate_sealed facesecure_data.json
+    python -m utils.migrate_sealed facesecure_data.json --replace
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from face.gallery import compute_prototypes
+from face.quantization import get_codec
+from utils.crypto import CryptoManager, user_associated_data
+
+
+class JSONStreamReader:
+    """Büyük bir JSON dosyasında nesne/dizi elemanlarını tek tek okur"""
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Tüketilmiş kısmı atıp buffer'a yeni parça ekler"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Boşlukları atlayıp sıradaki karakteri döndürür"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Beklenmeyen dosya sonu")
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"'{char}' bekleniyordu, '{found}' bulundu (ofset {self.pos})")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Sıradaki JSON değerini tamamen okur"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Buffer sonunda biten sayı yarım okunmuş olabilir
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self) -> Iterator[str]:
+        """
+        Nesne anahtarlarını sırayla döndürür
+
+        Her anahtardan sonra çağıran değeri value() / members() / items()
+        ile tüketmelidir.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key
+            char = self._peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"',' veya '}}' bekleniyordu, '{char}' bulundu")
+
+    def items(self) -> Iterator[Any]:
+        """Dizi elemanlarını sırayla döndürür"""
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self._peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"',' veya ']' bekleniyordu, '{char}' bulundu")
+
+
+def seal_user(crypto_manager: CryptoManager, user_doc: Dict[str, Any],
+              embedding_dim: int = 512) -> Dict[str, Any]:
+    """
+    Eski formattaki kullanıcı dokümanını mühürlü forma çevirir
+
+    Tüm kayıtlar aynı kodekle saklanmışsa kodlar olduğu gibi (kayıpsız)
+    mühürlenir; karışık kodeklerde float32'ye çözülür.
+
+    Args:
+        crypto_manager: Anahtarları yüklü CryptoManager
+        user_doc: Kullanıcı dokümanı
+        embedding_dim: Embedding boyutu
+
+    Returns:
+        Yeni doküman (zaten mühürlüyse aynı doküman)
+
+    Raises:
+        ValueError: HMAC hatası veya binary (slot) formatındaki kayıt
+    """
+    if 'sealed' in user_doc:
+        return user_doc
+
+    docs = user_doc.get('embeddings', [])
+    if any('slot' in emb_doc for emb_doc in docs):
+        raise ValueError(f"Binary formattaki kullanıcı taşınamaz: {user_doc['username']}")
+
+    records = [(emb_doc['encrypted'], emb_doc['hmac'], emb_doc.get('kid')) for emb_doc in docs]
+    codec_names = {emb_doc.get('codec') for emb_doc in docs}
+    if len(codec_names) == 1:
+        codec = get_codec(codec_names.pop())
+        width = codec.code_size(embedding_dim) // np.dtype(codec.dtype).itemsize
+        codes = crypto_manager.decrypt_into(records, np.empty((len(docs), width), dtype=codec.dtype))
+    else:
+        codec = get_codec()
+        codes = np.stack([
+            crypto_manager.decrypt_embedding(emb_doc['encrypted'], emb_doc['hmac'],
+                                             embedding_dim=embedding_dim,
+                                             codec=get_codec(emb_doc.get('codec')),
+                                             key_id=emb_doc.get('kid'))
+            for emb_doc in docs
+        ]) if docs else np.empty((0, embedding_dim), dtype=np.float32)
+
+    if user_doc.get('prototypes'):
+        prototypes = np.stack([
+            crypto_manager.decrypt_embedding(proto_doc['encrypted'], proto_doc['hmac'],
+                                             embedding_dim=embedding_dim,
+                                             codec=get_codec(proto_doc.get('codec')),
+                                             key_id=proto_doc.get('kid'))
+            for proto_doc in user_doc['prototypes']
+        ])
+    else:
+        prototypes = compute_prototypes(codec.decode(codes))
+
+    sealed_doc = {key: value for key, value in user_doc.items()
+                  if key not in ('embeddings', 'prototypes')}
+    sealed_doc['sealed'] = crypto_manager.seal_codes(
+        codes, codec.name, embedding_dim,
+        user_associated_data(user_doc['_id'], user_doc['username']),
+        prototypes=prototypes
+    )
+    sealed_doc['embedding_count'] = len(docs)
+    if docs and all('pose_index' in emb_doc for emb_doc in docs):
+        sealed_doc['pose_indices'] = [emb_doc['pose_index'] for emb_doc in docs]
+    return sealed_doc
+
+
+def migrate(input_path: str, output_path: str, crypto_manager: CryptoManager,
+            embedding_dim: int = 512, progress_every: int = 1000) -> int:
+    """
+    JSON veritabanını akış halinde okuyup mühürlü formatta yazar
+
+    Args:
+        input_path: Kaynak facesecure_data.json
+        output_path: Hedef dosya (geçici dosyaya yazılıp yerine taşınır)
+        crypto_manager: Anahtarları yüklü CryptoManager
+        embedding_dim: Embedding boyutu
+        progress_every: Kaç kullanıcıda bir ilerleme yazdırılacağı
+
+    Returns:
+        Taşınan kullanıcı sayısı
+    """
+    tmp_path = output_path + '.tmp'
+    migrated = 0
+
+    with open(input_path, 'r', encoding='utf-8') as src, \
+            open(tmp_path, 'w', encoding='utf-8') as dst:
+        reader = JSONStreamReader(src)
+        dst.write('{')
+        for i, key in enumerate(reader.members()):
+            dst.write(',\n' if i else '\n')
+            dst.write(f'  {json.dumps(key)}: ')
+
+            if key == 'users':
+                dst.write('{')
+                for j, username in enumerate(reader.members()):
+                    user_doc = seal_user(crypto_manager, reader.value(), embedding_dim)
+                    dst.write(',\n' if j else '\n')
+                    dst.write(f'    {json.dumps(username, ensure_ascii=False)}: ')
+                    dst.write(json.dumps(user_doc, ensure_ascii=False, default=str))
+                    migrated += 1
+                    if progress_every and migrated % progress_every == 0:
+                        print(f"🔄 {migrated} kullanıcı taşındı...")
+                dst.write('\n  }')
+            elif key == 'failed_attempts':
+                dst.write('[')
+                for j, item in enumerate(reader.items()):
+                    dst.write(',\n' if j else '\n')
+                    dst.write('    ' + json.dumps(item, ensure_ascii=False, default=str))
+                dst.write('\n  ]')
+            else:
+                dst.write(json.dumps(reader.value(), ensure_ascii=False, default=str))
+        dst.write('\n}\n')
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    os.replace(tmp_path, output_path)
+    return migrated
+
+
+def main(argv: Optional[list] = None):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='FaceSecure mühürlü kayıt formatına migrasyon')
+    parser.add_argument('input', nargs='?', default='facesecure_data.json',
+                        help='Kaynak JSON veritabanı')
+    parser.add_argument('--output', help='Hedef dosya (varsayılan: <input>.sealed.json)')
+    parser.add_argument('--replace', action='store_true',
+                        help='Kaynağı .bak olarak saklayıp yerine yaz')
+    parser.add_argument('--dim', type=int, default=512, help='Embedding boyutu')
+    args = parser.parse_args(argv)
+
+    crypto_manager = CryptoManager.from_env()
+    output = args.output or os.path.splitext(args.input)[0] + '.sealed.json'
+
+    count = migrate(args.input, output, crypto_manager, embedding_dim=args.dim)
+    print(f"✅ {count} kullanıcı mühürlü formata taşındı: {output}")
+
+    if args.replace:
+        backup = args.input + '.bak'
+        os.replace(args.input, backup)
+        os.replace(output, args.input)
+        print(f"📦 Eski veritabanı yedeklendi: {backup}")
+
+
+if __name__ == '__main__':
+    main()
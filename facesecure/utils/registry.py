@@ -0,0 +1,353 @@
+"""
+Süreç başına paylaşılan kaynaklar (model, dedektör, anahtarlar, depo, galeri)
+
+Route'lar kaynakları modül yüklenirken değil, ilk kullanımda registry'den
+alır; her kaynak süreç içinde bir kez oluşturulur ve tüm blueprint'ler aynı
+örneği kullanır (FaceNet tek kez yüklenir). Ağır modüller (TensorFlow,
+OpenCV) de fabrikaların içinde import edilir; api/app.py'nin import'u modeli
+yüklemez. warm() kaynakları önceden yükleyip yapılandırılmış her batch
+boyutuyla (FS_WARM_BATCH_SIZES) deneme çıkarımı yapar; /ready bunun
+durumunu raporlar.
+
+Kaynaklar:
+    storage       - shared_storage(MONGO_URI)
+    crypto        - CryptoManager.from_env()
+    codec         - FS_EMBEDDING_CODEC (+ FS_PQ_CODEBOOK)
+    detector      - FaceDetector
+    processor     - FaceEmbeddingProcessor (FaceNet; FS_INFER_BACKEND, FS_MODEL_PATH,
+                    FS_INFER_BUCKETS, FS_INFER_COMPILED, FS_INFER_XLA)
+    embedder      - processor önünde mikro-batch çıkarım kuyruğu (FS_INFER_*)
+    embedding_cache - görüntü / crop özetiyle sorgu embedding önbelleği (FS_EMBED_CACHE*)
+    gallery       - store ile eşitlenmiş, dinleyiciyle güncel 1:N galerisi
+    templates     - FS_LAZY_GALLERY=1 iken 1:1 doğrulama şablon önbelleği
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+_registry: Optional['ResourceRegistry'] = None
+_registry_lock = threading.Lock()
+
+
+class ResourceRegistry:
+    """Adlandırılmış kaynakları ilk kullanımda bir kez oluşturan, thread-safe kayıt"""
+
+    def __init__(self, factories: Optional[Dict[str, Callable[['ResourceRegistry'], Any]]] = None,
+                 warm_resources: Iterable[str] = (), warm_batch_sizes: Iterable[int] = (1,)):
+        """
+        Args:
+            factories: {ad: factory(registry) -> kaynak}
+            warm_resources: warm() çağrısında yüklenecek kaynaklar
+            warm_batch_sizes: warm() sırasında modelden geçirilecek batch boyutları
+        """
+        self._factories: Dict[str, Callable[['ResourceRegistry'], Any]] = dict(factories or {})
+        self._resources: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.warm_resources: List[str] = list(warm_resources)
+        self.warm_batch_sizes: List[int] = sorted(set(warm_batch_sizes))
+        self._warmup_seconds: Dict[int, float] = {}
+
+        self.ready = False
+        self.ready_seconds: Optional[float] = None
+        self.warm_error: Optional[str] = None
+        self._warm_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory: Callable[['ResourceRegistry'], Any]):
+        """Kaynak fabrikası ekler veya (henüz yüklenmediyse) değiştirir"""
+        with self._lock:
+            if name in self._resources:
+                raise ValueError(f"Kaynak zaten yüklü: {name}")
+            self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """
+        Kaynağı döndürür; ilk çağrıda oluşturulur
+
+        Aynı anda gelen çağrılar tek yüklemeyi bekler (model iki kez yüklenmez).
+
+        Raises:
+            KeyError: Bilinmeyen kaynak
+        """
+        resource = self._resources.get(name)
+        if resource is not None or name in self._resources:
+            return resource
+
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Bilinmeyen kaynak: {name}")
+            lock = self._locks.setdefault(name, threading.Lock())
+
+        with lock:
+            if name not in self._resources:
+                started = time.perf_counter()
+                resource = self._factories[name](self)
+                self._load_seconds[name] = time.perf_counter() - started
+                self._resources[name] = resource
+        return self._resources[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._resources
+
+    def warm(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Kaynakları yükler ve yapılandırılmış her batch boyutuyla deneme çıkarımı yapar
+
+        İlk gerçek istekteki graph kurulumu / bellek ayırma maliyeti burada
+        ödenir; ready ancak bundan sonra True olur.
+
+        Args:
+            names: Yüklenecek kaynaklar (None -> warm_resources)
+
+        Returns:
+            {kaynak: yükleme süresi (saniye)}
+        """
+        names = list(self.warm_resources if names is None else names)
+        started = time.perf_counter()
+        try:
+            for name in names:
+                self.get(name)
+            if 'detector' in names:
+                self.get('detector').detect_faces(np.zeros((240, 320, 3), dtype=np.uint8))
+            if 'processor' in names:
+                face = np.zeros((160, 160, 3), dtype=np.uint8)
+                for size in self.warm_batch_sizes:
+                    batch_started = time.perf_counter()
+                    self.get('processor').get_embeddings([face] * size)
+                    self._warmup_seconds[size] = time.perf_counter() - batch_started
+        except Exception as e:
+            self.warm_error = f"{type(e).__name__}: {e}"
+            print(f"❌ Kaynaklar hazırlanamadı: {self.warm_error}")
+            raise
+        self.ready_seconds = time.perf_counter() - started
+        self.ready = True
+        return {name: self._load_seconds.get(name, 0.0) for name in names}
+
+    def warm_async(self) -> threading.Thread:
+        """warm() işlemini arka plan thread'inde başlatır (bir kez)"""
+        with self._lock:
+            if self._warm_thread is None:
+                def run():
+                    try:
+                        durations = self.warm()
+                    except Exception:
+                        return
+                    print(f"✅ Kaynaklar hazır ({self.ready_seconds:.1f} sn): "
+                          + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in durations.items()))
+
+                self._warm_thread = threading.Thread(target=run, name='resource-warmup',
+                                                     daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
+
+    def status(self) -> Dict[str, Any]:
+        """Hazırlık durumu (readiness endpoint'i için)"""
+        return {
+            'ready': self.ready,
+            'error': self.warm_error,
+            'ready_seconds': round(self.ready_seconds, 3) if self.ready_seconds is not None else None,
+            'warmup_batches': {size: round(seconds, 3)
+                               for size, seconds in sorted(self._warmup_seconds.items())},
+            'resources': {
+                name: {
+                    'loaded': name in self._resources,
+                    'seconds': round(self._load_seconds[name], 3) if name in self._load_seconds else None
+                }
+                for name in self._factories
+            }
+        }
+
+
+def _storage(registry: ResourceRegistry):
+    from utils.storage import shared_storage
+    return shared_storage(os.getenv('MONGO_URI'))
+
+
+def _crypto(registry: ResourceRegistry):
+    from utils.crypto import CryptoManager
+    return CryptoManager.from_env()
+
+
+def _codec(registry: ResourceRegistry):
+    # Kayıt ve galeri aynı dağıtım yapılandırmasını kullanır
+    from face.quantization import create_codec
+    return create_codec(os.getenv('FS_EMBEDDING_CODEC'), os.getenv('FS_PQ_CODEBOOK'))
+
+
+def _detector(registry: ResourceRegistry):
+    from face.detector import FaceDetector
+    return FaceDetector()
+
+
+def _processor(registry: ResourceRegistry):
+    # FS_INFER_BACKEND=onnx|tflite ile TensorFlow yüklenmeden çalışır (face/export.py)
+    from face.processor import FaceEmbeddingProcessor
+    return FaceEmbeddingProcessor(
+        model_path=os.getenv('FS_MODEL_PATH'),
+        backend=os.getenv('FS_INFER_BACKEND'),
+        threads=int(os.getenv('FS_INFER_THREADS', '0')),
+        # keras: sabit imzalı tf.function (+ opsiyonel XLA), batch'ler bucket'lara tamamlanır
+        compiled=os.getenv('FS_INFER_COMPILED', '1') != '0',
+        jit_compile=os.getenv('FS_INFER_XLA') == '1',
+        buckets=inference_buckets()
+    )
+
+
+def _embedder(registry: ResourceRegistry):
+    """Eşzamanlı isteklerin crop'larını tek forward pass'te birleştirir"""
+    from face.batcher import BatchingEmbedder
+    return BatchingEmbedder(
+        registry.get('processor'),
+        max_batch_size=int(os.getenv('FS_INFER_MAX_BATCH', '32')),
+        max_wait=float(os.getenv('FS_INFER_MAX_WAIT_MS', '5')) / 1000,
+        queue_size=int(os.getenv('FS_INFER_QUEUE', '256'))
+    )
+
+
+def _embedding_cache(registry: ResourceRegistry):
+    """Tekrar gönderilen görüntülerde decode, tespit ve çıkarımı atlar"""
+    from face.embedding_cache import EmbeddingCache
+    return EmbeddingCache(
+        capacity=int(os.getenv('FS_EMBED_CACHE', '1024')),
+        max_bytes=int(float(os.getenv('FS_EMBED_CACHE_MB', '16')) * 1024 * 1024),
+        ttl=float(os.getenv('FS_EMBED_CACHE_TTL', '300')),
+        encrypt=os.getenv('FS_EMBED_CACHE_ENCRYPT') == '1'
+    )
+
+
+def _gallery(registry: ResourceRegistry):
+    """Deşifre edilmiş, store ile eşitlenmiş galeri"""
+    from face.ann import create_index
+    from face.gallery import EmbeddingGallery
+    from face.sharded import ShardedSearcher
+
+    storage = registry.get('storage')
+    embedding_dim = registry.get('processor').embedding_dim
+
+    # Opsiyonel ANN indeksi (FS_ANN_INDEX=ivf) - büyük galeriler için
+    ann_index = create_index(
+        os.getenv('FS_ANN_INDEX'),
+        embedding_dim,
+        nlist=int(os.getenv('FS_ANN_NLIST', '0')),
+        nprobe=int(os.getenv('FS_ANN_NPROBE', '8')),
+        min_train_size=int(os.getenv('FS_ANN_MIN_TRAIN', '10000')),
+        retrain_factor=float(os.getenv('FS_ANN_RETRAIN_FACTOR', '2'))
+    )
+
+    # Opsiyonel çok çekirdekli tam tarama (FS_SEARCH_WORKERS > 0)
+    search_workers = int(os.getenv('FS_SEARCH_WORKERS', '0'))
+    sharded_searcher = ShardedSearcher(
+        search_workers,
+        min_rows=int(os.getenv('FS_SEARCH_MIN_ROWS', '50000'))
+    ) if search_workers > 0 else None
+
+    gallery = EmbeddingGallery(
+        registry.get('crypto'),
+        embedding_dim=embedding_dim,
+        index=ann_index,
+        rerank_k=int(os.getenv('FS_ANN_RERANK', '10')),
+        shortlist_k=int(os.getenv('FS_SHORTLIST_K', '0')),
+        codec=registry.get('codec'),
+        searcher=sharded_searcher,
+        store=storage.embedding_store,
+        decrypt_workers=int(os.getenv('FS_DECRYPT_WORKERS', '0'))
+    )
+
+    # Kayıt/silme işlemleri (ve refresh() ile yüklenen dış değişiklikler)
+    # galeriye anında yansısın
+    storage.add_listener(gallery.on_store_event)
+    gallery.sync(storage.get_all_users())
+
+    if registry.is_loaded('templates'):
+        # 1:1 doğrulama artık galeriden yapılır
+        registry.get('templates').clear()
+    return gallery
+
+
+def _templates(registry: ResourceRegistry):
+    """
+    Lazy 1:1 doğrulama için şablon önbelleği (FS_TEMPLATE_CACHE kullanıcı)
+
+    İçindeki galeri sadece deşifre için kullanılır, hiç eşitlenmez.
+    """
+    from face.gallery import EmbeddingGallery, TemplateCache
+
+    storage = registry.get('storage')
+    decoder = EmbeddingGallery(
+        registry.get('crypto'),
+        embedding_dim=registry.get('processor').embedding_dim,
+        codec=registry.get('codec'),
+        store=storage.embedding_store,
+        decrypt_workers=int(os.getenv('FS_DECRYPT_WORKERS', '0'))
+    )
+    templates = TemplateCache(
+        decoder,
+        storage.get_user_by_username,
+        capacity=int(os.getenv('FS_TEMPLATE_CACHE', '1024'))
+    )
+    storage.add_listener(templates.on_store_event)
+    return templates
+
+
+DEFAULT_FACTORIES: Dict[str, Callable[[ResourceRegistry], Any]] = {
+    'storage': _storage,
+    'crypto': _crypto,
+    'codec': _codec,
+    'detector': _detector,
+    'processor': _processor,
+    'embedder': _embedder,
+    'embedding_cache': _embedding_cache,
+    'gallery': _gallery,
+    'templates': _templates,
+}
+
+
+def lazy_gallery() -> bool:
+    """FS_LAZY_GALLERY=1: galeri ilk 1:N isteğinde kurulur, 1:1 şablon önbelleğinden"""
+    return os.getenv('FS_LAZY_GALLERY') == '1'
+
+
+def inference_buckets() -> List[int]:
+    """FS_INFER_BUCKETS (varsayılan '1,4,8,16,32'); boş değer bucket'ları kapatır"""
+    configured = os.getenv('FS_INFER_BUCKETS', '1,4,8,16,32')
+    return sorted({int(size) for size in configured.split(',') if size.strip()})
+
+
+def warm_batch_sizes() -> List[int]:
+    """FS_WARM_BATCH_SIZES (ör. '1,8,32'); yoksa her bucket, o da yoksa 1 ve FS_INFER_MAX_BATCH"""
+    configured = os.getenv('FS_WARM_BATCH_SIZES')
+    if configured:
+        return [int(size) for size in configured.split(',') if size.strip()]
+    return inference_buckets() or sorted({1, max(int(os.getenv('FS_INFER_MAX_BATCH', '32')), 1)})
+
+
+def create_registry() -> ResourceRegistry:
+    """Varsayılan fabrikalarla yeni registry (warm: lazy modda galeri hariç)"""
+    warm_resources = ['storage', 'crypto', 'codec', 'detector', 'processor', 'embedder']
+    if not lazy_gallery():
+        warm_resources.append('gallery')
+    return ResourceRegistry(DEFAULT_FACTORIES, warm_resources=warm_resources,
+                            warm_batch_sizes=warm_batch_sizes())
+
+
+def get_registry() -> ResourceRegistry:
+    """Süreç içinde paylaşılan registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = create_registry()
+        return _registry
+
+
+def current_registry() -> ResourceRegistry:
+    """İstek içinde uygulamanın registry'si (app dışında süreç registry'si)"""
+    from flask import current_app, has_app_context
+    if has_app_context():
+        registry = current_app.extensions.get('facesecure')
+        if registry is not None:
+            return registry
+    return get_registry()
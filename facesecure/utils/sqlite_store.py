@@ -0,0 +1,689 @@
+"""
+SQLite depolama backend'i - DBManager ile aynı arayüz, indeksli sorgular
+
+Şema:
+    users            (id, username UNIQUE, sealed, embedding_count, zaman damgaları,
+                      extra, version - her kayıt güncellemesinde artar)
+    embeddings       (user_id, kind, position) -> ham nonce+ct+tag ve HMAC byte'ları
+    failed_attempts  timestamp / username / ip_address indeksli
+
+Yönetim sorguları (query_users, query_failed_attempts) filtre ve sıralamayı
+SQL'e taşır; sayfalar (sıralama değeri, id) üzerinden keyset ile ilerler ve
+metadata projeksiyonunda embeddings tablosuna hiç dokunulmaz.
+
+Veritabanı WAL journal modunda açılır: okuyucular yazıcıyı beklemez, tek
+satırlık yazmalar tüm dosyayı yeniden yazmaz. Her thread kendi bağlantısını
+kullanır (sqlite3 bağlantıları thread'ler arasında paylaşılamaz); bağlantı
+thread bitince kapanır (Flask'ın geliştirme sunucusu her istek için yeni
+thread açar, bağlantılar birikmez).
+
+Başka bağlantıların değişiklikleri `PRAGMA data_version` ile fark edilir;
+refresh() sadece (id, version) listesini okuyup değişen kullanıcıları yükler.
+
+Kullanım (MONGO_URI=sqlite:///facesecure.db):
+    python -m utils.sqlite_store facesecure_data.json facesecure.db
+"""
+import argparse
+import base64
+import json
+import sqlite3
+import sys
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.attempt_log import AttemptLog
+from utils.storage import (
+    USER_SORT_KEYS, Page, StoreEvent, StorageBackend, decode_cursor, encode_cursor,
+    prefix_end, user_cursor_key
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    sealed TEXT,
+    embedding_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    extra TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username);
+CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, username);
+
+CREATE TABLE IF NOT EXISTS embeddings (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    encrypted BLOB NOT NULL,
+    hmac BLOB NOT NULL,
+    meta TEXT,
+    PRIMARY KEY (user_id, kind, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS failed_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT,
+    ip_address TEXT,
+    similarity_score REAL,
+    reason TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_failed_attempts_timestamp ON failed_attempts (timestamp);
+CREATE INDEX IF NOT EXISTS idx_failed_attempts_username ON failed_attempts (username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_failed_attempts_ip ON failed_attempts (ip_address, timestamp);
+"""
+
+# Kayıt listeleri - embeddings tablosundaki `kind` değerleri
+_RECORD_KINDS = ('embeddings', 'prototypes')
+
+# users tablosunda kolonu olan alanlar (geri kalanı `extra` JSON'unda)
+_USER_COLUMNS = ('_id', 'username', 'sealed', 'embedding_count', 'created_at', 'updated_at')
+
+# Metadata sorgularının okuduğu kolonlar - mühürlü blob (sealed) okunmaz
+_METADATA_SELECT = 'id, username, embedding_count, created_at, updated_at, extra'
+
+_ATTEMPT_COLUMNS = ('username', 'ip_address', 'similarity_score', 'reason', 'timestamp')
+
+
+class _ThreadConnection:
+    """threading.local içinde tutulan bağlantı; toplandığında bağlantı kapanır"""
+
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+def _close_connection(conn: sqlite3.Connection, connections: Set[sqlite3.Connection],
+                      lock: threading.Lock):
+    with lock:
+        if conn not in connections:
+            # close() zaten kapattı
+            return
+        connections.discard(conn)
+    conn.close()
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite tabanlı veritabanı yöneticisi"""
+
+    def __init__(self, db_path: str = "facesecure.db", timeout: float = 30.0,
+                 attempt_log: Optional[AttemptLog] = None):
+        """
+        Args:
+            db_path: SQLite dosya yolu (yoksa oluşturulur)
+            timeout: Kilitli veritabanında bekleme süresi (saniye)
+            attempt_log: Başarısız denemeler için asenkron log
+                         (None -> FS_ATTEMPT_LOG veya dosyanın yanında
+                         <ad>_attempts; FS_ATTEMPT_LOG=0 -> senkron veritabanı)
+        """
+        super().__init__()
+        self.db_path = db_path
+        self.timeout = timeout
+        self.attempt_log = attempt_log or AttemptLog.from_env(
+            str(Path(db_path).with_suffix('')) + '_attempts')
+        self._local = threading.local()
+        self._connections: Set[sqlite3.Connection] = set()
+        self._connections_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(users)')}
+        if 'version' not in columns:
+            conn.execute('ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+        # Değişiklik takibi: ayrı bağlantının data_version'ı ve bilinen (id, version)'lar
+        self._watch_lock = threading.Lock()
+        self._watch_conn = self._open_connection()
+        self._data_version = self._watch_conn.execute('PRAGMA data_version').fetchone()[0]
+        self._known = self._user_versions(self._watch_conn)
+        print(f"✅ SQLite veritabanı: {self.db_path}")
+
+    def _open_connection(self) -> sqlite3.Connection:
+        # isolation_level=None: işlemler _transaction() ile açıkça yönetilir
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with self._connections_lock:
+            self._connections.add(conn)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        """Thread'e ait bağlantı (ilk kullanımda açılır, thread bitince kapanır)"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            holder = self._local.holder = _ThreadConnection(self._open_connection())
+            # threading.local thread bitince değerlerini bırakır -> bağlantı kapanır
+            weakref.finalize(holder, _close_connection, holder.conn,
+                             self._connections, self._connections_lock)
+        return holder.conn
+
+    @property
+    def open_connections(self) -> int:
+        """Açık bağlantı sayısı (değişiklik takibi bağlantısı dahil)"""
+        with self._connections_lock:
+            return len(self._connections)
+
+    @staticmethod
+    def _user_versions(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+        """{username: (id, version)} - sadece users indeksinden okunur, blob yüklenmez"""
+        return {row['username']: (row['id'], row['version'])
+                for row in conn.execute('SELECT username, id, version FROM users')}
+
+    def _remember(self, username: str, version: Optional[Tuple[int, int]]):
+        """Bu instance'ın kendi yazmasını refresh() tekrar bildirmesin"""
+        with self._watch_lock:
+            if version is None:
+                self._known.pop(username, None)
+            else:
+                self._known[username] = version
+
+    def refresh(self) -> List[StoreEvent]:
+        """
+        Başka bağlantıların (süreçlerin) değişikliklerini yükler
+
+        data_version değişmediyse tek PRAGMA ile döner; değiştiyse sadece
+        (id, version)'ı farklı kullanıcıların kayıtları okunur.
+
+        Returns:
+            [(event, username, user_doc), ...]
+        """
+        with self._watch_lock:
+            conn = self._watch_conn
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+
+            current = self._user_versions(conn)
+            changes: List[StoreEvent] = []
+            for username, version in current.items():
+                previous = self._known.get(username)
+                if previous == version:
+                    continue
+                user_doc = self._load_user(conn, username)
+                if user_doc is None:
+                    continue
+                event = 'create' if previous is None or previous[0] != version[0] else 'update'
+                changes.append((event, username, user_doc))
+            changes.extend(('delete', username, None)
+                           for username in self._known if username not in current)
+            self._known = current
+
+        self._notify_changes(changes)
+        return changes
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yazma işlemi - baştan yazma kilidi alınır, hata olursa geri alınır"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @staticmethod
+    def _record_rows(user_id: int, kind: str,
+                     docs: List[Dict[str, Any]]) -> List[Tuple[Any, ...]]:
+        rows = []
+        for position, doc in enumerate(docs):
+            if 'slot' in doc:
+                raise ValueError("Binary (slot) formatındaki kayıtlar SQLite'a aktarılamaz")
+            meta = {key: value for key, value in doc.items() if key not in ('encrypted', 'hmac')}
+            rows.append((
+                user_id, kind, position,
+                base64.b64decode(doc['encrypted']),
+                base64.b64decode(doc['hmac']),
+                json.dumps(meta) if meta else None
+            ))
+        return rows
+
+    def _insert_records(self, conn: sqlite3.Connection, user_id: int, kind: str,
+                        docs: List[Dict[str, Any]]):
+        conn.executemany(
+            'INSERT INTO embeddings (user_id, kind, position, encrypted, hmac, meta) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            self._record_rows(user_id, kind, docs)
+        )
+
+    def _insert_user(self, conn: sqlite3.Connection, user_doc: Dict[str, Any]) -> int:
+        """Kullanıcı satırını ve kayıtlarını ekler (_id varsa korunur)"""
+        extra = {key: value for key, value in user_doc.items()
+                 if key not in _USER_COLUMNS and key not in _RECORD_KINDS}
+        sealed = 'sealed' in user_doc
+        try:
+            cursor = conn.execute(
+                'INSERT INTO users (id, username, sealed, embedding_count, created_at, '
+                'updated_at, extra) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (int(user_doc['_id']) if user_doc.get('_id') else None,
+                 user_doc['username'],
+                 user_doc.get('sealed'),
+                 user_doc.get('embedding_count', 0) if sealed
+                 else len(user_doc.get('embeddings', [])),
+                 user_doc['created_at'],
+                 user_doc['updated_at'],
+                 json.dumps(extra, default=str) if extra else None)
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Kullanıcı '{user_doc['username']}' zaten mevcut")
+
+        user_id = cursor.lastrowid
+        for kind in _RECORD_KINDS:
+            if user_doc.get(kind):
+                self._insert_records(conn, user_id, kind, user_doc[kind])
+        return user_id
+
+    @staticmethod
+    def _user_doc(row: sqlite3.Row, records: List[sqlite3.Row]) -> Dict[str, Any]:
+        """Satırlardan JSON backend'iyle aynı biçimde kullanıcı dokümanı kurar"""
+        user_doc = {
+            '_id': str(row['id']),
+            'username': row['username'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+        if row['sealed'] is not None:
+            user_doc['sealed'] = row['sealed']
+            user_doc['embedding_count'] = row['embedding_count']
+        else:
+            user_doc['embeddings'] = []
+        for record in records:
+            doc = json.loads(record['meta']) if record['meta'] else {}
+            doc['encrypted'] = base64.b64encode(record['encrypted']).decode('utf-8')
+            doc['hmac'] = base64.b64encode(record['hmac']).decode('utf-8')
+            user_doc.setdefault(record['kind'], []).append(doc)
+        if row['extra']:
+            user_doc.update(json.loads(row['extra']))
+        return user_doc
+
+    def _load_user(self, conn: sqlite3.Connection, username: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        if row is None:
+            return None
+        records = conn.execute(
+            'SELECT * FROM embeddings WHERE user_id = ? ORDER BY kind, position', (row['id'],)
+        ).fetchall()
+        return self._user_doc(row, records)
+
+    def create_user(self, username: str, embeddings: List[Dict[str, str]],
+                    prototypes: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        Yeni kullanıcı oluştur
+
+        Args:
+            username: Kullanıcı adı
+            embeddings: Şifrelenmiş embedding listesi
+                        [{'encrypted': str, 'hmac': str}, ...]
+            prototypes: Şifrelenmiş prototip listesi (centroid + kümeler, opsiyonel)
+
+        Returns:
+            User ID
+        """
+        now = datetime.utcnow().isoformat()
+        user_doc = {
+            'username': username,
+            'embeddings': embeddings,
+            'created_at': now,
+            'updated_at': now
+        }
+        if prototypes:
+            user_doc['prototypes'] = prototypes
+
+        with self._transaction() as conn:
+            user_id = str(self._insert_user(conn, user_doc))
+        self._remember(username, (int(user_id), 0))
+        self._notify('create', username, dict(user_doc, _id=user_id))
+        return user_id
+
+    def create_sealed_user(self, username: str, seal: Callable[[str], str],
+                           embedding_count: int,
+                           pose_indices: Optional[List[int]] = None) -> str:
+        """
+        Embedding'leri tek mühürlü blob olarak saklanan kullanıcı oluştur
+
+        Satır önce boş blob ile eklenip ID alınır, blob bu ID ile mühürlenip
+        aynı işlem içinde yazılır.
+
+        Args:
+            username: Kullanıcı adı
+            seal: seal(user_id) -> base64 blob (CryptoManager.seal_embeddings)
+            embedding_count: Blob'daki embedding sayısı
+            pose_indices: Embedding'lerin kaynak görüntü indeksleri (opsiyonel)
+
+        Returns:
+            User ID
+        """
+        now = datetime.utcnow().isoformat()
+        user_doc = {
+            'username': username,
+            'sealed': '',
+            'embedding_count': embedding_count,
+            'created_at': now,
+            'updated_at': now
+        }
+        if pose_indices is not None:
+            user_doc['pose_indices'] = pose_indices
+
+        with self._transaction() as conn:
+            user_id = str(self._insert_user(conn, user_doc))
+            user_doc['sealed'] = seal(user_id)
+            conn.execute('UPDATE users SET sealed = ? WHERE id = ?',
+                         (user_doc['sealed'], int(user_id)))
+        self._remember(username, (int(user_id), 0))
+        self._notify('create', username, dict(user_doc, _id=user_id))
+        return user_id
+
+    def update_user_records(self, updates: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[str]:
+        """
+        Kullanıcıların şifreli kayıt alanlarını toplu günceller (anahtar rotasyonu)
+
+        Plaintext değişmediği için updated_at korunur ve dinleyiciler
+        bilgilendirilmez. Kullanıcı okunduktan sonra değiştiyse atlanır.
+
+        Args:
+            updates: {username: (okunan user_doc, {'embeddings' | 'prototypes' | 'sealed': ...})}
+
+        Returns:
+            Güncellenen kullanıcı adları
+        """
+        applied = []
+        with self._transaction() as conn:
+            for username, (expected, fields) in updates.items():
+                user_doc = self._load_user(conn, username)
+                if user_doc is None or any(
+                    user_doc.get(key) != expected.get(key)
+                    for key in ('_id', 'updated_at', 'sealed', 'embeddings', 'prototypes')
+                ):
+                    continue
+
+                user_id = int(user_doc['_id'])
+                for kind in _RECORD_KINDS:
+                    if kind in fields:
+                        conn.execute('DELETE FROM embeddings WHERE user_id = ? AND kind = ?',
+                                     (user_id, kind))
+                        self._insert_records(conn, user_id, kind, fields[kind])
+                if 'sealed' in fields:
+                    conn.execute('UPDATE users SET sealed = ? WHERE id = ?',
+                                 (fields['sealed'], user_id))
+                conn.execute('UPDATE users SET version = version + 1 WHERE id = ?', (user_id,))
+                (version,) = conn.execute('SELECT version FROM users WHERE id = ?',
+                                          (user_id,)).fetchone()
+                applied.append((username, (user_id, version)))
+        for username, version in applied:
+            self._remember(username, version)
+        return [username for username, _ in applied]
+
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Kullanıcıyı username ile bul"""
+        return self._load_user(self._connection(), username)
+
+    def get_user_metadata(self, username: str) -> Optional[Dict[str, Any]]:
+        """Sadece users satırının metadata kolonları - sealed ve embeddings tablosu okunmaz"""
+        row = self._connection().execute(
+            f'SELECT {_METADATA_SELECT} FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        return self._user_metadata(row) if row is not None else None
+
+    def get_all_users(self) -> List[Dict[str, Any]]:
+        """Tüm kullanıcıları getir"""
+        conn = self._connection()
+        # Tek okuma işlemi: iki sorgu aynı snapshot'ı görür
+        conn.execute('BEGIN')
+        try:
+            rows = conn.execute('SELECT * FROM users ORDER BY id').fetchall()
+            records: Dict[int, List[sqlite3.Row]] = {}
+            for record in conn.execute('SELECT * FROM embeddings ORDER BY user_id, kind, position'):
+                records.setdefault(record['user_id'], []).append(record)
+        finally:
+            conn.execute('COMMIT')
+        return [self._user_doc(row, records.get(row['id'], [])) for row in rows]
+
+    @staticmethod
+    def _user_metadata(row: sqlite3.Row) -> Dict[str, Any]:
+        """Sadece users satırından metadata dokümanı (user_metadata ile aynı alanlar)"""
+        meta = {
+            '_id': str(row['id']),
+            'username': row['username'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+        if row['extra']:
+            meta.update(json.loads(row['extra']))
+        meta['embedding_count'] = row['embedding_count']
+        return meta
+
+    def query_users(self, username_prefix: Optional[str] = None,
+                    created_since: Optional[str] = None,
+                    created_until: Optional[str] = None,
+                    sort: str = 'username', descending: bool = False,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    metadata_only: bool = True) -> Page:
+        """Filtrelenmiş, sıralı kullanıcı sayfası (bkz. StorageBackend.query_users)"""
+        if sort not in USER_SORT_KEYS:
+            raise ValueError(f"Bilinmeyen sıralama: {sort}")
+        after = user_cursor_key(decode_cursor(cursor), sort, descending)
+
+        clauses, params = [], []
+        if username_prefix:
+            clauses.append('username >= ? AND username < ?')
+            params += [username_prefix, prefix_end(username_prefix)]
+        if created_since:
+            clauses.append('created_at >= ?')
+            params.append(created_since)
+        if created_until:
+            clauses.append('created_at < ?')
+            params.append(created_until)
+        if after is not None:
+            clauses.append(f"({sort}, username) {'<' if descending else '>'} (?, ?)")
+            params += list(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order = 'DESC' if descending else 'ASC'
+
+        conn = self._connection()
+        conn.execute('BEGIN')
+        try:
+            columns = _METADATA_SELECT if metadata_only else '*'
+            rows = conn.execute(
+                f'SELECT {columns} FROM users {where} ORDER BY {sort} {order}, username {order} LIMIT ?',
+                params + [limit + 1]
+            ).fetchall()
+            more = len(rows) > limit
+            rows = rows[:limit]
+            records: Dict[int, List[sqlite3.Row]] = {}
+            if rows and not metadata_only:
+                ids = [row['id'] for row in rows]
+                for record in conn.execute(
+                    f"SELECT * FROM embeddings WHERE user_id IN ({', '.join('?' * len(ids))}) "
+                    'ORDER BY user_id, kind, position', ids
+                ):
+                    records.setdefault(record['user_id'], []).append(record)
+        finally:
+            conn.execute('COMMIT')
+
+        if metadata_only:
+            page = [self._user_metadata(row) for row in rows]
+        else:
+            page = [self._user_doc(row, records.get(row['id'], [])) for row in rows]
+        if not more or not rows:
+            return page, None
+        return page, encode_cursor({'sort': sort, 'desc': descending,
+                                    'key': [rows[-1][sort], rows[-1]['username']]})
+
+    def user_stats(self) -> Dict[str, int]:
+        """Kullanıcı ve embedding sayısı (sadece users tablosundan)"""
+        row = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(embedding_count), 0) FROM users'
+        ).fetchone()
+        return {'users': row[0], 'embeddings': row[1]}
+
+    def delete_user(self, username: str) -> bool:
+        """Kullanıcıyı sil (embedding satırları cascade ile silinir)"""
+        with self._transaction() as conn:
+            deleted = conn.execute('DELETE FROM users WHERE username = ?', (username,)).rowcount
+        if not deleted:
+            return False
+        self._remember(username, None)
+        self._notify('delete', username)
+        return True
+
+    def import_json(self, json_path: str, batch_size: int = 500) -> int:
+        """
+        JSON veritabanını akış halinde içe aktarır
+
+        Kullanıcılar batch_size'lık işlemlerle yazılır; var olan kullanıcı
+        adları atlanır. Mühürlü blob'lar kullanıcı ID'sine bağlı olduğu için
+        ID'ler korunur, çakışan ID'li kullanıcı atlanır.
+
+        Args:
+            json_path: Kaynak facesecure_data.json yolu
+            batch_size: İşlem başına kullanıcı sayısı
+
+        Returns:
+            İçe aktarılan kullanıcı sayısı
+        """
+        from utils.migrate_sealed import JSONStreamReader
+
+        imported = 0
+        counter = 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            reader = JSONStreamReader(f)
+            for key in reader.members():
+                if key == 'users':
+                    batch = []
+                    for _ in reader.members():
+                        batch.append(reader.value())
+                        if len(batch) >= batch_size:
+                            imported += self._import_users(batch)
+                            batch = []
+                    imported += self._import_users(batch)
+                elif key == 'failed_attempts':
+                    batch = []
+                    for attempt in reader.items():
+                        batch.append(tuple(attempt.get(column) for column in _ATTEMPT_COLUMNS))
+                        if len(batch) >= batch_size:
+                            self._insert_attempts(batch)
+                            batch = []
+                    self._insert_attempts(batch)
+                elif key == 'user_id_counter':
+                    counter = reader.value()
+                else:
+                    reader.value()
+
+        # Silinmiş kullanıcıların ID'leri yeniden verilmesin
+        with self._transaction() as conn:
+            updated = conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?',
+                                   (int(counter), 'users')).rowcount
+            if not updated and counter:
+                conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                             ('users', int(counter)))
+        return imported
+
+    def _import_users(self, user_docs: List[Dict[str, Any]]) -> int:
+        imported = 0
+        with self._transaction() as conn:
+            for user_doc in user_docs:
+                exists = conn.execute(
+                    'SELECT 1 FROM users WHERE username = ? OR id = ?',
+                    (user_doc['username'], int(user_doc['_id']))
+                ).fetchone()
+                if exists:
+                    print(f"⚠️  Kullanıcı atlandı (ad veya ID mevcut): {user_doc['username']}")
+                    continue
+                self._insert_user(conn, user_doc)
+                imported += 1
+        return imported
+
+    def _insert_attempts(self, rows: List[Tuple[Any, ...]]):
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO failed_attempts ({', '.join(_ATTEMPT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def _store_failed_attempt(self, log_doc: Dict[str, Any]):
+        self._insert_attempts([tuple(log_doc[column] for column in _ATTEMPT_COLUMNS)])
+
+    @staticmethod
+    def _attempt_filters(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        """attempt_matches filtreleri -> SQL koşulları (username/ip/timestamp indeksli)"""
+        clauses, params = [], []
+        for key, clause in (('username', 'username = ?'),
+                            ('ip_address', 'ip_address = ?'),
+                            ('reason', 'instr(reason, ?) > 0'),
+                            ('since', 'timestamp >= ?'),
+                            ('until', 'timestamp < ?')):
+            if filters.get(key) is not None:
+                clauses.append(clause)
+                params.append(filters[key])
+        return clauses, params
+
+    def _query_stored_attempts(self, filters: Dict[str, Any], limit: int,
+                               position: Any) -> Tuple[List[Dict[str, Any]], Any]:
+        """Filtreye uyan denemeler, (timestamp, id) üzerinden keyset sayfalama"""
+        if limit <= 0:
+            return [], position
+        clauses, params = self._attempt_filters(filters)
+        if position is not None:
+            clauses.append('(timestamp, id) < (?, ?)')
+            params += list(position)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f"SELECT id, {', '.join(_ATTEMPT_COLUMNS)} FROM failed_attempts {where} "
+            'ORDER BY timestamp DESC, id DESC LIMIT ?',
+            params + [limit + 1]
+        ).fetchall()
+        page = [{column: row[column] for column in _ATTEMPT_COLUMNS} for row in rows[:limit]]
+        if len(rows) <= limit:
+            return page, None
+        last = rows[limit - 1]
+        return page, [last['timestamp'], last['id']]
+
+    def _count_stored_attempts(self, filters: Dict[str, Any]) -> int:
+        clauses, params = self._attempt_filters(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self._connection().execute(
+            f'SELECT COUNT(*) FROM failed_attempts {where}', params
+        ).fetchone()[0]
+
+    def close(self):
+        """Bekleyen denemeleri yazar ve tüm thread bağlantılarını kapatır"""
+        if self.attempt_log is not None:
+            self.attempt_log.flush()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='FaceSecure JSON -> SQLite içe aktarma')
+    parser.add_argument('input', nargs='?', default='facesecure_data.json',
+                        help='Kaynak JSON veritabanı')
+    parser.add_argument('output', nargs='?', default='facesecure.db', help='Hedef SQLite dosyası')
+    parser.add_argument('--batch-size', type=int, default=500, help='İşlem başına kullanıcı')
+    args = parser.parse_args(argv)
+
+    storage = SQLiteStorage(args.output)
+    try:
+        count = storage.import_json(args.input, batch_size=args.batch_size)
+    finally:
+        storage.close()
+    print(f"✅ {count} kullanıcı SQLite'a aktarıldı: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
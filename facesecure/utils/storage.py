@@ -0,0 +1,417 @@
+"""
+Kullanıcı/deneme deposu arayüzü ve URI'ye göre backend seçimi
+
+Backend'ler:
+    DBManager      (utils.db)           - JSON dosyası (+ binary / WAL modları)
+    SQLiteStorage  (utils.sqlite_store) - indeksli SQLite veritabanı
+
+MONGO_URI ayarı backend'i seçer:
+    (boş)                        -> DBManager (JSON)
+    sqlite:///facesecure.db      -> SQLiteStorage (göreli yol)
+    sqlite:////var/lib/fs.db     -> SQLiteStorage (mutlak yol)
+
+API route'ları süreç başına tek handle (shared_storage) kullanır; başka
+süreçlerin (admin paneli, diğer worker'lar) yazdıkları refresh() ile
+ucuz bir değişiklik kontrolünden sonra sadece fark olarak yüklenir.
+
+Yönetim sorguları (query_users, query_failed_attempts) sayfalıdır: filtre ve
+sıralama backend'de uygulanır, sonraki sayfa opak bir cursor ile istenir
+(keyset - sayfalar arasında eklenen kayıtlar sayfaları kaydırmaz).
+"""
+import base64
+import json
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from utils.attempt_log import AttemptLog
+
+SQLITE_SCHEME = 'sqlite://'
+
+# (event, username, user_doc) - event: 'create' | 'update' | 'delete'
+StoreEvent = Tuple[str, str, Optional[Dict[str, Any]]]
+
+# (kayıtlar, sonraki sayfanın cursor'ı - son sayfada None)
+Page = Tuple[List[Dict[str, Any]], Optional[str]]
+
+# Şifreli kayıt alanları - metadata projeksiyonunda atlanır
+RECORD_FIELDS = ('embeddings', 'prototypes', 'sealed')
+
+# query_users sıralama anahtarları
+USER_SORT_KEYS = ('username', 'created_at')
+
+_shared_storages: Dict[Optional[str], 'StorageBackend'] = {}
+_shared_lock = threading.Lock()
+
+
+def embedding_count(user_doc: Dict[str, Any]) -> int:
+    """Kullanıcının embedding sayısı (mühürlü ve eski kayıt formatları için)"""
+    # Mühürlü kayıtlar ve metadata projeksiyonu sayıyı alan olarak taşır
+    if 'sealed' in user_doc or 'embeddings' not in user_doc:
+        return user_doc.get('embedding_count', 0)
+    return len(user_doc.get('embeddings', []))
+
+
+def sealed_blob(user_doc: Dict[str, Any], store=None) -> Union[str, bytes]:
+    """
+    Mühürlü kullanıcı kaydının blob'u
+
+    JSON/SQLite'ta 'sealed' base64 dizedir; binary formatta metadata sadece
+    {'slots': [...]} referansını tutar ve blob EmbeddingStore'dan okunur.
+
+    Raises:
+        ValueError: Slot referanslı kayıt için store verilmemişse
+    """
+    sealed = user_doc['sealed']
+    if isinstance(sealed, str):
+        return sealed
+    if store is None:
+        raise ValueError("Slot referanslı mühürlü kayıt için EmbeddingStore gerekli")
+    return store.read_blob(sealed['slots'])
+
+
+def user_metadata(user_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Şifreli kayıtlar olmadan kullanıcı dokümanı (+ embedding_count)"""
+    meta = {key: value for key, value in user_doc.items() if key not in RECORD_FIELDS}
+    meta['embedding_count'] = embedding_count(user_doc)
+    return meta
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Sayfa konumu -> URL'de taşınabilir opak cursor"""
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    encode_cursor'ın tersi (None / boş -> {})
+
+    Raises:
+        ValueError: Cursor bozuksa
+    """
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Geçersiz cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Geçersiz cursor")
+    return position
+
+
+def user_cursor_key(position: Dict[str, Any], sort: str,
+                    descending: bool) -> Optional[Tuple[str, str]]:
+    """
+    Kullanıcı cursor'ındaki (sıralama değeri, username) anahtarı
+
+    Raises:
+        ValueError: Cursor başka bir sıralamaya aitse
+    """
+    if not position:
+        return None
+    if position.get('sort') != sort or position.get('desc') != descending:
+        raise ValueError("Cursor farklı bir sıralamaya ait")
+    try:
+        value, username = position['key']
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Geçersiz cursor")
+    return str(value), str(username)
+
+
+def prefix_end(prefix: str) -> str:
+    """'ab' -> 'ac': prefix ile başlayan dizeler [prefix, prefix_end) aralığındadır"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class StorageBackend(ABC):
+    """DBManager ile aynı arayüzü sunan depolama backend'lerinin ortak tabanı"""
+
+    # Binary formatta slot referanslı kayıtlar için EmbeddingStore
+    embedding_store = None
+
+    # Ayarlıysa başarısız denemeler veritabanı yerine bu log'a asenkron yazılır
+    attempt_log: Optional[AttemptLog] = None
+
+    def __init__(self):
+        # Bu handle'ın değişiklik dinleyicileri - aynı süreçteki başka
+        # instance'ların (ör. CLI araçları, testler) olayları karışmaz
+        self._listeners: List[Callable] = []
+
+    def add_listener(self, callback: Callable):
+        """
+        Kullanıcı değişikliklerinde çağrılacak dinleyici ekle
+
+        Args:
+            callback: callback(event, username, user_doc)
+                      event: 'create' | 'update' | 'delete' ('delete' için user_doc None)
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable):
+        """Dinleyiciyi kaldır"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event: str, username: str, user_doc: Optional[Dict[str, Any]] = None):
+        """Dinleyicileri bilgilendir (hatalar kaydı engellemez)"""
+        for callback in list(self._listeners):
+            try:
+                callback(event, username, user_doc)
+            except Exception as e:
+                print(f"⚠️  Değişiklik dinleyicisi hatası ({event} {username}): {e}")
+
+    def refresh(self) -> List[StoreEvent]:
+        """
+        Başka süreç/instance'ların yaptığı değişiklikleri yükler
+
+        Değişiklik yoksa ucuz bir kontrolle döner; varsa sadece değişen
+        kullanıcılar için dinleyiciler bilgilendirilir.
+
+        Returns:
+            Uygulanan değişiklikler [(event, username, user_doc), ...]
+        """
+        return []
+
+    def _notify_changes(self, changes: List[StoreEvent]):
+        for event, username, user_doc in changes:
+            self._notify(event, username, user_doc)
+
+    @abstractmethod
+    def create_user(self, username: str, embeddings: List[Dict[str, str]],
+                    prototypes: Optional[List[Dict[str, str]]] = None) -> str:
+        """Embedding başına şifreli kayıtla kullanıcı oluşturur, user ID döndürür"""
+
+    @abstractmethod
+    def create_sealed_user(self, username: str, seal: Callable[[str], str],
+                           embedding_count: int,
+                           pose_indices: Optional[List[int]] = None) -> str:
+        """Tek mühürlü blob ile kullanıcı oluşturur, user ID döndürür"""
+
+    @abstractmethod
+    def update_user_records(self, updates: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[str]:
+        """Şifreli kayıt alanlarını karşılaştır-ve-değiştir ile günceller"""
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Kullanıcıyı username ile bul"""
+
+    def get_user_metadata(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Kullanıcının şifreli kayıtlar olmadan dokümanı (varlık kontrolü, listeler)
+
+        Returns:
+            user_metadata çıktısı veya None
+        """
+        user_doc = self.get_user_by_username(username)
+        return user_metadata(user_doc) if user_doc is not None else None
+
+    @abstractmethod
+    def get_all_users(self) -> List[Dict[str, Any]]:
+        """Tüm kullanıcıları getir"""
+
+    @abstractmethod
+    def delete_user(self, username: str) -> bool:
+        """Kullanıcıyı sil"""
+
+    @abstractmethod
+    def import_json(self, json_path: str) -> int:
+        """Eski JSON veritabanını içe aktarır, aktarılan kullanıcı sayısını döndürür"""
+
+    @abstractmethod
+    def query_users(self, username_prefix: Optional[str] = None,
+                    created_since: Optional[str] = None,
+                    created_until: Optional[str] = None,
+                    sort: str = 'username', descending: bool = False,
+                    limit: int = 100, cursor: Optional[str] = None,
+                    metadata_only: bool = True) -> Page:
+        """
+        Filtrelenmiş, sıralı kullanıcı sayfası
+
+        Args:
+            username_prefix: Kullanıcı adı öneki
+            created_since: Bu ISO zamandan itibaren oluşturulanlar (dahil)
+            created_until: Bu ISO zamandan önce oluşturulanlar (hariç)
+            sort: USER_SORT_KEYS'ten biri
+            descending: Azalan sıralama
+            limit: Sayfa boyutu
+            cursor: Önceki sayfanın döndürdüğü cursor
+            metadata_only: True ise şifreli kayıtlar yüklenmez (user_metadata)
+
+        Returns:
+            (kullanıcılar, sonraki cursor)
+
+        Raises:
+            ValueError: Bilinmeyen sıralama veya geçersiz cursor
+        """
+
+    @abstractmethod
+    def user_stats(self) -> Dict[str, int]:
+        """{'users': kullanıcı sayısı, 'embeddings': toplam embedding} - kayıtlar yüklenmeden"""
+
+    @abstractmethod
+    def _store_failed_attempt(self, log_doc: Dict[str, Any]):
+        """Deneme kaydını veritabanına yazar (attempt_log yoksa)"""
+
+    @abstractmethod
+    def _query_stored_attempts(self, filters: Dict[str, Any], limit: int,
+                               position: Any) -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        Veritabanındaki filtreye uyan denemeler, yeniden eskiye
+
+        Returns:
+            (kayıtlar, sonraki sayfa konumu - JSON'a yazılabilir, bittiyse None)
+        """
+
+    @abstractmethod
+    def _count_stored_attempts(self, filters: Dict[str, Any]) -> int:
+        """Veritabanındaki filtreye uyan deneme sayısı"""
+
+    def log_failed_attempt(self, username: Optional[str], ip_address: str,
+                           similarity_score: float, reason: str):
+        """
+        Başarısız doğrulama denemesini logla
+
+        attempt_log ayarlıysa kayıt kuyruğa atılır ve request beklemez.
+
+        Args:
+            username: Denenen kullanıcı adı (varsa)
+            ip_address: İstemci IP adresi
+            similarity_score: Benzerlik skoru
+            reason: Başarısızlık nedeni
+        """
+        log_doc = {
+            'username': username,
+            'ip_address': ip_address,
+            'similarity_score': similarity_score,
+            'reason': reason,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        if self.attempt_log is not None:
+            self.attempt_log.submit(log_doc)
+        else:
+            self._store_failed_attempt(log_doc)
+
+    def get_failed_attempts(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Son başarısız denemeleri getir (log'dakiler, sonra veritabanındaki eski kayıtlar)"""
+        return self.query_failed_attempts(limit=limit)[0]
+
+    def query_failed_attempts(self, username: Optional[str] = None,
+                              ip_address: Optional[str] = None,
+                              reason: Optional[str] = None,
+                              since: Optional[str] = None, until: Optional[str] = None,
+                              limit: int = 100, cursor: Optional[str] = None) -> Page:
+        """
+        Filtrelenmiş başarısız denemeler, yeniden eskiye, sayfa sayfa
+
+        Önce attempt_log segmentleri, sonra veritabanındaki eski kayıtlar taranır.
+
+        Args:
+            username: Kullanıcı adı (tam eşleşme)
+            ip_address: IP adresi (tam eşleşme)
+            reason: Neden metninde geçen ifade
+            since: Bu ISO zamandan itibaren (dahil)
+            until: Bu ISO zamandan önce (hariç)
+            limit: Sayfa boyutu
+            cursor: Önceki sayfanın döndürdüğü cursor
+
+        Returns:
+            (denemeler, sonraki cursor)
+
+        Raises:
+            ValueError: Geçersiz cursor
+        """
+        filters = {'username': username, 'ip_address': ip_address, 'reason': reason,
+                   'since': since, 'until': until}
+        position = decode_cursor(cursor)
+        attempts: List[Dict[str, Any]] = []
+        if self.attempt_log is not None and 'db' not in position:
+            log_position = position.get('log')
+            attempts, log_position = self.attempt_log.query(
+                limit, tuple(log_position) if log_position else None, **filters
+            )
+            if log_position is not None:
+                return attempts, encode_cursor({'log': list(log_position)})
+        stored, db_position = self._query_stored_attempts(
+            filters, limit - len(attempts), position.get('db')
+        )
+        attempts.extend(stored)
+        return attempts, encode_cursor({'db': db_position}) if db_position is not None else None
+
+    def count_failed_attempts(self, username: Optional[str] = None,
+                              ip_address: Optional[str] = None,
+                              reason: Optional[str] = None,
+                              since: Optional[str] = None,
+                              until: Optional[str] = None) -> int:
+        """Filtreye uyan başarısız deneme sayısı (log + veritabanı)"""
+        filters = {'username': username, 'ip_address': ip_address, 'reason': reason,
+                   'since': since, 'until': until}
+        total = self.attempt_log.count(**filters) if self.attempt_log is not None else 0
+        return total + self._count_stored_attempts(filters)
+
+    def close(self):
+        """Açık dosya/bağlantıları kapatır"""
+
+
+def diff_users(old: Dict[str, Dict[str, Any]],
+               new: Dict[str, Dict[str, Any]]) -> List[StoreEvent]:
+    """
+    İki {username: user_doc} durumu arasındaki kullanıcı değişiklikleri
+
+    Aynı adla yeniden oluşturulan kullanıcı (farklı _id) 'create' olarak döner.
+    """
+    changes: List[StoreEvent] = []
+    for username, user_doc in new.items():
+        previous = old.get(username)
+        if previous is None or previous.get('_id') != user_doc.get('_id'):
+            changes.append(('create', username, user_doc))
+        elif previous != user_doc:
+            changes.append(('update', username, user_doc))
+    changes.extend(('delete', username, None) for username in old if username not in new)
+    return changes
+
+
+def sqlite_path(uri: str) -> str:
+    """'sqlite:///a.db' -> 'a.db', 'sqlite:////abs/a.db' -> '/abs/a.db'"""
+    path = uri[len(SQLITE_SCHEME):]
+    if path.startswith('/'):
+        path = path[1:]
+    if not path:
+        raise ValueError(f"SQLite URI'sinde dosya yolu yok: {uri}")
+    return path
+
+
+def open_storage(uri: Optional[str] = None, **kwargs) -> StorageBackend:
+    """
+    URI'ye göre depolama backend'ini açar
+
+    Args:
+        uri: MONGO_URI değeri (None / boş -> JSON DBManager)
+        **kwargs: DBManager'a iletilen ek parametreler (json_path, storage_format, ...)
+
+    Returns:
+        StorageBackend örneği
+    """
+    if uri and uri.startswith(SQLITE_SCHEME):
+        from utils.sqlite_store import SQLiteStorage
+        return SQLiteStorage(sqlite_path(uri))
+
+    from utils.db import DBManager
+    return DBManager(uri, **kwargs)
+
+
+def shared_storage(uri: Optional[str] = None) -> StorageBackend:
+    """
+    Süreç içinde URI başına paylaşılan depo handle'ı
+
+    Aynı süreçteki route'lar aynı instance'a yazar; böylece birbirlerinin
+    değişikliklerini yeniden okumaları gerekmez.
+    """
+    with _shared_lock:
+        if uri not in _shared_storages:
+            _shared_storages[uri] = open_storage(uri)
+        return _shared_storages[uri]
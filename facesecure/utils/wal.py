@@ -0,0 +1,211 @@
+"""
+Append-only write-ahead log (JSONL) - DBManager'ın WAL modu için
+
+Log, nesil (generation) numaralı segment dosyalarına bölünür:
+    <base>.<generation>    ör. facesecure_data.json.wal.3
+
+Snapshot, hangi nesilden itibaren replay gerektiğini `wal_generation`
+alanında tutar. Sıkıştırma (compaction) yeni segmente geçer, snapshot'ı
+yazar ve ancak ondan sonra eski segmentleri siler; bu yüzden hiçbir
+kesinti noktasında kayıt kaybolmaz ya da iki kez uygulanmaz.
+"""
+import glob
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class WriteAheadLog:
+    """Grup halinde fsync yapan, segmentli JSONL log"""
+
+    def __init__(self, base_path: str, group_size: int = 1, group_interval: float = 0.0,
+                 before_sync: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            base_path: Segment dosyalarının ortak öneki
+            group_size: Kaç kayıtta bir fsync yapılacağı (1 -> her kayıtta)
+            group_interval: Bekleyen kayıtlar için en fazla fsync gecikmesi (saniye,
+                            0 -> sadece group_size ile)
+            before_sync: fsync'ten hemen önce çağrılır (ör. embedding dosyasını
+                         log'dan önce diske yazmak için)
+        """
+        self.base_path = base_path
+        self.group_size = max(group_size, 1)
+        self.group_interval = group_interval
+        self.before_sync = before_sync
+
+        # Snapshot'sız başlangıçta eski segmentlerin üzerine yazılmasın
+        existing = self.segments()
+        self.generation = existing[-1][0] if existing else 0
+        self._lock = threading.RLock()
+        self._file = None
+        self._pending = 0
+        self._timer: Optional[threading.Timer] = None
+
+    def segment_path(self, generation: int) -> str:
+        return f"{self.base_path}.{generation}"
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """Diskteki segmentler, nesil sırasıyla [(generation, path), ...]"""
+        found = []
+        for path in glob.glob(glob.escape(self.base_path) + '.*'):
+            suffix = path[len(self.base_path) + 1:]
+            if suffix.isdigit():
+                found.append((int(suffix), path))
+        return sorted(found)
+
+    @property
+    def size(self) -> int:
+        """Aktif segmentin byte cinsinden boyutu"""
+        with self._lock:
+            return self._file.tell() if self._file is not None else 0
+
+    def replay(self, from_generation: int) -> Iterator[Dict[str, Any]]:
+        """
+        from_generation ve sonraki segmentlerdeki kayıtları sırayla döndürür
+
+        Yarım yazılmış son satır (çökme) atılır ve dosya o noktadan kesilir.
+        Bittiğinde log en son nesilde eklemeye açılır.
+        """
+        generation = from_generation
+        for segment_generation, path in self.segments():
+            if segment_generation < from_generation:
+                continue
+            generation = segment_generation
+            with open(path, 'r+b') as f:
+                valid_size = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    valid_size += len(line)
+                    yield record
+                if valid_size != os.path.getsize(path):
+                    print(f"⚠️  WAL segmentinde yarım kayıt atıldı: {path}")
+                    f.truncate(valid_size)
+        self._open(generation)
+
+    def tail(self, generation: int,
+             offset: int) -> Optional[Tuple[List[Dict[str, Any]], Tuple[int, int]]]:
+        """
+        (generation, offset) konumundan sonra eklenen tam kayıtları okur
+
+        Başka bir sürecin eklediği kayıtları tüm log'u yeniden okumadan almak
+        için. Yazılmakta olan son satır (satır sonu yok) sonraki okumaya kalır.
+        Log en son nesilde eklemeye açılır.
+
+        Returns:
+            (kayıtlar, yeni konum) veya None - konum artık geçerli değil
+            (segment silinmiş/kısalmış ya da bozuk kayıt), tam replay gerekir
+        """
+        segments = self.segments()
+        if not any(g == generation and os.path.getsize(path) >= offset
+                   for g, path in segments):
+            return None
+        records = []
+        position = (generation, offset)
+        for segment_generation, path in segments:
+            if segment_generation < generation:
+                continue
+            start = offset if segment_generation == generation else 0
+            with open(path, 'rb') as f:
+                f.seek(start)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        return None
+                    start += len(line)
+            position = (segment_generation, start)
+        if position[0] != self.generation or self._file is None:
+            self._open(position[0])
+        return records, position
+
+    def _open(self, generation: int):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.generation = generation
+            self._file = open(self.segment_path(generation), 'ab')
+
+    def append(self, record: Dict[str, Any]):
+        """Kaydı log'a ekler; grup dolduysa fsync yapar"""
+        line = json.dumps(record, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+        with self._lock:
+            if self._file is None:
+                self._open(self.generation)
+            self._file.write(line)
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.group_size:
+                self._sync_locked()
+            elif self.group_interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.group_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending and self._file is not None:
+            if self.before_sync is not None:
+                self.before_sync()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def sync(self):
+        """Bekleyen kayıtları diske zorla"""
+        with self._lock:
+            self._sync_locked()
+
+    def rotate(self) -> int:
+        """
+        Yeni segmente geçer (sıkıştırma başlangıcı)
+
+        Returns:
+            Yeni aktif nesil - snapshot bu nesilden itibaren replay gerektirir
+        """
+        with self._lock:
+            self._sync_locked()
+            self._open(self.generation + 1)
+            return self.generation
+
+    def remove_before(self, generation: int):
+        """Snapshot'a katlanmış eski segmentleri siler"""
+        for segment_generation, path in self.segments():
+            if segment_generation < generation:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = 2):
+    """
+    JSON'u geçici dosyaya yazıp fsync sonrası yerine taşır (yarım dosya kalmaz)
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise